@@ -257,6 +257,27 @@
             });
         });
 
+        $('#show_query_stats').on('click', function() {
+            $.get('show_query_stats', function(data) {
+                bootbox.dialog({
+                    title: 'Database Query Timings',
+                    size: 'large',
+                    message: '<pre>'+$('<div>').text(data).html()+'</pre>',
+                    buttons: {
+                        reset: {
+                            label: "<i class=\"fa fa-ban\"></i> Reset",
+                            className: 'btn-warning',
+                            callback: function(){ $.get("reset_query_stats", function(e) {}); }
+                        },
+                        primary: {
+                            label: "Close",
+                            className: 'btn-primary'
+                        }
+                    }
+                });
+            });
+        });
+
         $('#show_jobs').on('click', function() {
             $.get('show_jobs', function(data) {
                 bootbox.dialog({
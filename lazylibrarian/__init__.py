@@ -38,6 +38,7 @@ STOPTHREADS = False  # Part of the scheduling state machine. Should move to a sc
 
 # These are globals
 UPDATE_MSG = ''
+JOB_PROGRESS = {}  # Progress of long running jobs by job name, shown in job status
 INFOSOURCES = {}
 TIMERS = {
             'NO_TOR_MSG': 0,
@@ -46,25 +47,14 @@ TIMERS = {
             'NO_CV_MSG': 0,
             'NO_DIRECT_MSG': 0,
             'NO_IRC_MSG': 0,
-            'LAST_GR': 0,
-            'LAST_LT': 0,
-            'LAST_CV': 0,
-            'LAST_BOK': 0,
             'BOK_TODAY': 0,
             'ANNA_REMAINING': 25,
-            'SLEEP_GR': 0.0,
-            'SLEEP_LT': 0.0,
-            'SLEEP_CV': 0.0,
-            'SLEEP_BOK': 0.0,
-            'LAST_HC': 0,
-            'SLEEP_HC': 0.0,
         }
 IGNORED_AUTHORS = 0
 PRIMARY_AUTHORS = 1
 SCAN_BOOKS = 0
-CACHE_HIT = 0
-CACHE_MISS = 0
 IRC_CACHE_EXPIRY = 2 * 3600
+CLEAN_CACHE_PENDING = False  # The last cache clean stopped at CACHE_CLEAN_SECONDS, so it runs again sooner
 MONTHNAMES = []
 SEASONS = []
 BOOKSTRAP_THEMELIST = []
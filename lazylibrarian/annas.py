@@ -29,6 +29,7 @@ from requests import get
 import lazylibrarian
 from lazylibrarian import database
 from lazylibrarian.blockhandler import BLOCKHANDLER
+from lazylibrarian.cachestore import get_counters
 from lazylibrarian.config2 import CONFIG
 from lazylibrarian.filesystem import DIRS, get_directory, path_isfile, remove_file
 from lazylibrarian.formatter import check_int, md5_utf8, plural, sanitize, size_in_bytes
@@ -439,10 +440,10 @@ def anna_search(book=None, searchtype='ebook', test=False):
                 valid_cache = True
 
         if valid_cache:
-            lazylibrarian.CACHE_HIT = int(lazylibrarian.CACHE_HIT) + 1
+            get_counters('IRCCache').hit()
             cachelogger.debug(f"CacheHandler: Found CACHED response {hashfilename} for {book['searchterm']}")
         else:
-            lazylibrarian.CACHE_MISS = int(lazylibrarian.CACHE_MISS) + 1
+            get_counters('IRCCache').miss()
             hashfilename = annas_search(book['searchterm'], language=language)
     else:
         hashfilename = annas_search(book['searchterm'], language=language)
@@ -254,6 +254,8 @@ cmd_dict = {'help': (0, 'list available commands. Time consuming commands take a
             'snatchResult': (1, '&bookid= &library= &mode= &provider= &url= [&size=] [&title=] '
                                 'snatch a specific search result'),
             'showStats': (0, '[&json] show database statistics'),
+            'showQueryStats': (0, '[&json] [&limit=] show database query timings, slowest first'),
+            'resetQueryStats': (1, 'clear database query timings'),
             'showJobs': (0, '[&json] show status of running jobs'),
             'restartJobs': (1, 'restart background jobs'),
             'showThreads': (0, 'show threaded processes'),
@@ -3011,6 +3013,19 @@ class Api:
         else:
             self.data = show_stats()
 
+    def _showquerystats(self, **kwargs):
+        TELEMETRY.record_usage_data()
+        limit = check_int(kwargs.get('limit'), 25)
+        if 'json' in kwargs:
+            self.data = database.PROFILER.get_stats(limit)
+        else:
+            self.data = database.PROFILER.report(limit)
+
+    def _resetquerystats(self):
+        TELEMETRY.record_usage_data()
+        database.PROFILER.reset()
+        self.data = 'OK'
+
     def _importalternate(self, **kwargs):
         TELEMETRY.record_usage_data()
         usedir = kwargs.get('dir', CONFIG.get_str('ALTERNATE_DIR'))
@@ -4,6 +4,7 @@
 #   Handle blocking behaviour, keep track of blocked providers, etc
 
 import logging
+import threading
 import time
 
 from lazylibrarian.configtypes import ConfigDict
@@ -18,6 +19,7 @@ class BlockHandler:
         self._config: ConfigDict | None = None
         self._newznab: ConfigDict | None = None
         self._torznab: ConfigDict | None = None
+        self._lock = threading.RLock()  # Providers are queried, and blocked, from several threads at once
 
     def set_config(self, config: ConfigDict, newznab: ConfigDict, torznab: ConfigDict):
         """ Set the configuration used for the BlockHandler. By providing them in this form,
@@ -32,10 +34,12 @@ class BlockHandler:
         self._torznab = torznab
 
     def remove_provider_entry(self, name: str) -> None:
-        self._provider_list.pop(name, None)
+        with self._lock:
+            self._provider_list.pop(name, None)
 
     def add_provider_entry(self, name: str, delay: int, reason: str) -> None:
-        self._provider_list[name] = {"resume": int(time.time()) + delay, "reason": reason}
+        with self._lock:
+            self._provider_list[name] = {"resume": int(time.time()) + delay, "reason": reason}
 
     def replace_provider_entry(self, name: str, delay: int, reason: str) -> None:
         # self.remove_provider_entry(name)
@@ -67,23 +71,25 @@ class BlockHandler:
 
     def clear_all(self) -> int:
         """ Clear all blocks, returning how many were on the list """
-        num = self.number_blocked()
-        self._provider_list.clear()
+        with self._lock:
+            num = self.number_blocked()
+            self._provider_list.clear()
         return num
 
     def check_day(self, pretend_day: str | None = None) -> bool:
         """ Reset api counters if it's a new day since last check. Returns True if values are reset.
          The pretend_day argument is used for testing. """
         daystr = pretend_day if pretend_day else today()
-        if self._nab_apicount_day != daystr:
-            self._nab_apicount_day = daystr
-            if self._newznab:
-                for provider in self._newznab:
-                    provider.set_int('APICOUNT', 0)
-            if self._torznab:
-                for provider in self._torznab:
-                    provider.set_int('APICOUNT', 0)
-            return True
+        with self._lock:
+            if self._nab_apicount_day != daystr:
+                self._nab_apicount_day = daystr
+                if self._newznab:
+                    for provider in self._newznab:
+                        provider.set_int('APICOUNT', 0)
+                if self._torznab:
+                    for provider in self._torznab:
+                        provider.set_int('APICOUNT', 0)
+                return True
         return False
 
     def is_blocked(self, name: str) -> bool:
@@ -91,16 +97,19 @@ class BlockHandler:
         self.check_day()
 
         timenow = int(time.time())
-        if name in self._provider_list:
-            entry = self._provider_list[name]
-            if timenow < int(entry['resume']):
-                return True
-            self._provider_list.pop(name, None)
+        with self._lock:
+            entry = self._provider_list.get(name)
+            if entry:
+                if timenow < int(entry['resume']):
+                    return True
+                self._provider_list.pop(name, None)
         return False
 
     def get_text_list_of_blocks(self) -> str:
         result = ''
-        for key, line in self._provider_list.items():
+        with self._lock:
+            blocks = list(self._provider_list.items())
+        for key, line in blocks:
             resume = int(line['resume']) - int(time.time())
             if resume > 0:
                 time_str = pretty_approx_time(resume)
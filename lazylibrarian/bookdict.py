@@ -128,7 +128,7 @@ def validate_bookdict(bookdict, current_db=None):
 
     if not current_db:
         db = database.DBConnection()
-        db.connection.create_collation('fuzzy', lazylibrarian.importer.collate_fuzzy)
+        db.create_collation('fuzzy', lazylibrarian.importer.collate_fuzzy)
     else:
         db = current_db
 
@@ -342,11 +342,11 @@ def add_bookdict_to_db(book, reason, source):
     this_key = id_key[source]
     new_value_dict[this_key] = book['bookid']
 
-    db.upsert("books", new_value_dict, control_value_dict)
-
+    with db.transaction():
+        db.upsert("books", new_value_dict, control_value_dict)
+        db.action('INSERT into bookauthors (AuthorID, BookID, Role) VALUES (?, ?, ?)',
+                  (book['authorid'], book['bookid'], ROLE['PRIMARY']), suppress='UNIQUE')
     author = db.match('SELECT authorname from authors where authorid=?', (book['authorid'],))
-    db.action('INSERT into bookauthors (AuthorID, BookID, Role) VALUES (?, ?, ?)',
-              (book['authorid'], book['bookid'], ROLE['PRIMARY']), suppress='UNIQUE')
 
     if CONFIG.get_bool('CONTRIBUTING_AUTHORS') and book.get('contributors'):
         for entry in book['contributors']:
@@ -364,51 +364,51 @@ def add_bookdict_to_db(book, reason, source):
     # Handle series data if present
     if CONFIG.get_bool('ADD_SERIES') and book.get('series'):
         for item in book['series']:
-            ser_name = item[0].strip()
-            ser_id = str(item[1]).strip()
-            src = id_key[source][:2].upper()
-            exists = db.match("SELECT * from series WHERE seriesid=?", (ser_id,))
-            if not exists:
-                if src:
-                    exists = db.match("SELECT * from series WHERE seriesname=? "
-                                      "and instr(seriesid, ?) = 1", (ser_name, src))
-                else:
-                    exists = db.match("SELECT * from series WHERE seriesname=? ", (ser_name,))
+            with db.transaction():
+                ser_name = item[0].strip()
+                ser_id = str(item[1]).strip()
+                src = id_key[source][:2].upper()
+                exists = db.match("SELECT * from series WHERE seriesid=?", (ser_id,))
+                if not exists:
+                    if src:
+                        exists = db.match("SELECT * from series WHERE seriesname=? "
+                                          "and instr(seriesid, ?) = 1", (ser_name, src))
+                    else:
+                        exists = db.match("SELECT * from series WHERE seriesname=? ", (ser_name,))
 
-                if exists:
-                    ser_id = exists['SeriesID']
-            if not exists:
-                logger.debug(f"New series: {ser_id}:{ser_name}: {CONFIG['NEWSERIES_STATUS']}")
-                db.action('INSERT INTO series (SeriesID, SeriesName, Status, '
-                          'Updated, Reason) VALUES (?,?,?,?,?)',
-                          (ser_id, ser_name, CONFIG['NEWSERIES_STATUS'], time.time(), ser_name))
-                db.commit()
-
-            # Add author to series
-            authmatch = db.match("SELECT * from seriesauthors WHERE "
-                                 "SeriesID=? and AuthorID=?", (ser_id, book['authorid']))
-            if not authmatch:
-                logger.debug(f"Adding {author['authorname']} as series author for {ser_name}")
-                db.action('INSERT INTO seriesauthors (SeriesID, AuthorID) VALUES (?, ?)',
-                          (ser_id, book['authorid']), suppress='UNIQUE')
-
-            # Add book to series
-            match = db.match("SELECT * from member WHERE SeriesID=? AND BookID=?",
-                             (ser_id, book['bookid']))
-            if not match:
-                logger.debug(f"Inserting new member [{item[2]}] for {ser_id}")
-                db.action(
-                    "INSERT INTO member (SeriesID, BookID, WorkID, SeriesNum) VALUES (?,?,?,?)",
-                    (ser_id, book['bookid'], '', item[2]), suppress='UNIQUE')
-
-            # Update series total
-            ser = db.match(
-                "select count(*) as counter from member where seriesid=?",
-                (ser_id,))
-            if ser:
-                counter = check_int(ser['counter'], 0)
-                db.action("UPDATE series SET Total=? WHERE SeriesID=?",
-                          (counter, ser_id))
+                    if exists:
+                        ser_id = exists['SeriesID']
+                if not exists:
+                    logger.debug(f"New series: {ser_id}:{ser_name}: {CONFIG['NEWSERIES_STATUS']}")
+                    db.action('INSERT INTO series (SeriesID, SeriesName, Status, '
+                              'Updated, Reason) VALUES (?,?,?,?,?)',
+                              (ser_id, ser_name, CONFIG['NEWSERIES_STATUS'], time.time(), ser_name))
+
+                # Add author to series
+                authmatch = db.match("SELECT * from seriesauthors WHERE "
+                                     "SeriesID=? and AuthorID=?", (ser_id, book['authorid']))
+                if not authmatch:
+                    logger.debug(f"Adding {author['authorname']} as series author for {ser_name}")
+                    db.action('INSERT INTO seriesauthors (SeriesID, AuthorID) VALUES (?, ?)',
+                              (ser_id, book['authorid']), suppress='UNIQUE')
+
+                # Add book to series
+                match = db.match("SELECT * from member WHERE SeriesID=? AND BookID=?",
+                                 (ser_id, book['bookid']))
+                if not match:
+                    logger.debug(f"Inserting new member [{item[2]}] for {ser_id}")
+                    db.action(
+                        "INSERT INTO member (SeriesID, BookID, WorkID, SeriesNum) VALUES (?,?,?,?)",
+                        (ser_id, book['bookid'], '', item[2]), suppress='UNIQUE')
+
+                # Update series total
+                ser = db.match(
+                    "select count(*) as counter from member where seriesid=?",
+                    (ser_id,))
+                if ser:
+                    counter = check_int(ser['counter'], 0)
+                    db.action("UPDATE series SET Total=? WHERE SeriesID=?",
+                              (counter, ser_id))
     if exists:
         added = 'updated'
     else:
@@ -419,13 +419,14 @@ def add_bookdict_to_db(book, reason, source):
 
 
 def add_author_books_to_db(resultqueue, bookstatus, audiostatus, entrystatus, entryreason, authorid,
-                           get_series_members=None, get_bookdict_for_bookid=None, cache_hits=0):
+                           get_series_members=None, get_bookdict_for_bookid=None, cache_hits=0,
+                           prefetch_books=None):
     """ There are some time.sleep() calls in the loops to stop the method hogging all the cpu,
         possibly the database calls? Needs more investigation """
     logger = logging.getLogger(__name__)
     searchinglogger = logging.getLogger('special.searching')
     db = database.DBConnection()
-    db.connection.create_collation('fuzzy', lazylibrarian.importer.collate_fuzzy)
+    db.create_collation('fuzzy', lazylibrarian.importer.collate_fuzzy)
     threadname = thread_name()
     authorname = ''
     auth_start = time.time()
@@ -646,7 +647,7 @@ def add_author_books_to_db(resultqueue, bookstatus, audiostatus, entrystatus, en
 
             if CONFIG.get_bool('ADD_SERIES') and get_series_members and get_bookdict_for_bookid:
                 try:
-                    add_series_entries(bookdict, get_series_members, get_bookdict_for_bookid)
+                    add_series_entries(bookdict, get_series_members, get_bookdict_for_bookid, prefetch_books)
                 except Exception as e:
                     logger.error(str(e))
             else:
@@ -725,9 +726,10 @@ def add_author_books_to_db(resultqueue, bookstatus, audiostatus, entrystatus, en
     return summary
 
 
-def add_series_entries(bookdict, get_series_members, get_bookdict_for_bookid):
+def add_series_entries(bookdict, get_series_members, get_bookdict_for_bookid, prefetch_books=None):
     # bookdict = standard keys
     # get_bookdict_for_bookid function returns standard bookdict and bool in_cache
+    # optional prefetch_books function fetches a list of bookids together, ready for get_bookdict_for_bookid
     # get_series_members returns a list of lists
     # [position, book_title, authorname, authorlink, book_id, pubyear, pubdate]
     logger = logging.getLogger(__name__)
@@ -804,6 +806,10 @@ def add_series_entries(bookdict, get_series_members, get_bookdict_for_bookid):
                 logger.debug(f"Found member {seriesmembers[0][1]} for series {ser_name}")
             else:
                 logger.debug(f"Found {len(seriesmembers)} members for series {ser_name}")
+            if prefetch_books:
+                # members not in the database are looked up below, fetch them together
+                prefetch_books([member[4] for member in seriesmembers
+                                if not db.match("SELECT BookID FROM books WHERE BookID=?", (str(member[4]),))])
             # position, book_title, author_name, hc_author_id, book_id
             for member in seriesmembers:
                 db.action("DELETE from member WHERE SeriesID=? AND SeriesNum=?",
@@ -37,6 +37,7 @@ from lazylibrarian.formatter import (
     thread_name,
     unaccented,
 )
+from lazylibrarian.ratelimit import rate_limit
 
 
 def set_all_book_authors():
@@ -380,15 +381,7 @@ def set_work_id(books=None):
 
 def librarything_wait():
     """ Wait for a second between librarything api calls """
-    logger = logging.getLogger(__name__)
-    time_now = time.time()
-    delay = time_now - lazylibrarian.TIMERS['LAST_LT']
-    if delay < 1.0:
-        sleep_time = 1.0 - delay
-        lazylibrarian.TIMERS['SLEEP_LT'] += sleep_time
-        logger.debug(f"LibraryThing sleep {sleep_time:.3f}, total {lazylibrarian.TIMERS['SLEEP_LT']:.3f}")
-        time.sleep(sleep_time)
-    lazylibrarian.TIMERS['LAST_LT'] = time_now
+    rate_limit('librarything')
 
 
 def get_all_series_authors():
@@ -867,7 +860,7 @@ def get_gb_info(isbn=None, author=None, title=None, expire=False):
         if results is None:  # there was an error
             return None
         if results and not cached:
-            time.sleep(1)
+            rate_limit('googlebooks')
         if results and 'items' in results:
             high_fuzz = 0
             high_parts = []
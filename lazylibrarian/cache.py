@@ -22,6 +22,7 @@ from abc import ABC
 from enum import Enum
 from http.client import responses
 from typing import Any
+from urllib.parse import urlsplit
 from xml.etree import ElementTree
 
 import requests
@@ -29,12 +30,23 @@ import requests
 import lazylibrarian
 from lazylibrarian import database
 from lazylibrarian.blockhandler import BLOCKHANDLER
+from lazylibrarian.cachestore import (
+    NEGATIVE,
+    CacheIndex,
+    CacheStore,
+    backend_name,
+    conditional_headers,
+    get_cache_index,
+    get_counters,
+    get_flight,
+    get_memory_tier,
+    get_store,
+    migrate_hex_dir,
+)
 from lazylibrarian.common import get_user_agent, proxy_list
 from lazylibrarian.config2 import CONFIG
 from lazylibrarian.filesystem import (
     DIRS,
-    listdir,
-    path_isdir,
     path_isfile,
     remove_file,
     splitext,
@@ -42,6 +54,7 @@ from lazylibrarian.filesystem import (
 )
 from lazylibrarian.formatter import (
     check_int,
+    human_size,
     make_bytestr,
     make_unicode,
     md5_utf8,
@@ -49,6 +62,8 @@ from lazylibrarian.formatter import (
     seconds_to_midnight,
     thread_name,
 )
+from lazylibrarian.ratelimit import rate_limit
+from lazylibrarian.sessions import http_get
 
 
 class ImageType(Enum):
@@ -64,26 +79,20 @@ service_blocked = ['goodreads', 'librarything', 'googleapis', 'openlibrary', 'ha
 
 
 def gr_api_sleep():
-    time_now = time.time()
-    delay = time_now - lazylibrarian.TIMERS['LAST_GR']
-    if delay < 1.0:
-        sleep_time = 1.0 - delay
-        lazylibrarian.TIMERS['SLEEP_GR'] += sleep_time
-        cachelogger = logging.getLogger('special.cache')
-        cachelogger.debug(f"GoodReads sleep {sleep_time:.3f}, total {lazylibrarian.TIMERS['SLEEP_GR']:.3f}")
-        time.sleep(sleep_time)
-    lazylibrarian.TIMERS['LAST_GR'] = time_now
+    rate_limit('goodreads')
 
 
 def init_hex_caches() -> bool:
     """ Initialize the directory structure for each of the caches that use a two-layer dir structure for efficiency.
+    The JSON, XML and HTML caches only do if they are using the files backend.
     Returns Success
     """
     logger = logging.getLogger()
     ok = True
     caches = ["WorkCache"]  # This one doesn't have its own handler class
-    for cache in [HTMLCacheRequest, JSONCacheRequest, XMLCacheRequest]:
-        caches.append(cache.cachedir_name())
+    if backend_name() == 'files':
+        for cache in [HTMLCacheRequest, JSONCacheRequest, XMLCacheRequest]:
+            caches.append(cache.cachedir_name())
     for item in caches:
         pth = DIRS.get_cachedir(item)
         subdirs = itertools.product("0123456789abcdef", repeat=2)
@@ -96,13 +105,35 @@ def init_hex_caches() -> bool:
     return ok
 
 
+def migrate_hex_caches() -> int:
+    """ Move responses left in the old hex directories into the cache stores.
+    Returns the number of entries moved """
+    logger = logging.getLogger(__name__)
+    moved = 0
+    for cache in [HTMLCacheRequest, JSONCacheRequest, XMLCacheRequest]:
+        try:
+            moved += migrate_hex_dir(get_store(cache.cachedir_name()))
+        except Exception as e:
+            logger.error(f"Error moving {cache.cachedir_name()} into its store: {type(e).__name__} {str(e)}")
+    return moved
+
+
+# Returned by fetch_url when a conditional request gets 304 Not Modified
+NOT_MODIFIED = 'Not Modified'
+
+# Cache entries that can be revalidated are kept this many times CACHE_AGE before they are cleaned
+VALIDATED_AGE_FACTOR = 4
+
+
 def fetch_url(url: str, headers: dict | None = None, retry=True, timeout=True,
-              raw: bool = False) -> (str | bytes, bool):
+              raw: bool = False, response_headers: dict | None = None) -> (str | bytes, bool):
     """ Return the result of fetching a URL and True if success
         Otherwise return error message and False
         Return data as raw/bytes, if raw == True
         Default to unicode, need to set raw=True for images/data
-        Allow one retry on timeout by default """
+        Allow one retry on timeout by default
+        If response_headers is a dict, the headers of a successful response are added to it
+        If headers has If-None-Match or If-Modified-Since and the page is unchanged, returns NOT_MODIFIED, True """
     logger = logging.getLogger(__name__)
     http.client.HTTPConnection.debuglevel = 1 if lazylibrarian.REQUESTSLOG else 0
     # for key in logging.Logger.manager.loggerDict:
@@ -142,7 +173,7 @@ def fetch_url(url: str, headers: dict | None = None, retry=True, timeout=True,
         if CONFIG['SSL_CERTS']:
             verify = CONFIG['SSL_CERTS']
     try:
-        r = requests.get(url, verify=verify, params=payload, headers=headers)
+        r = http_get(url, verify=verify, params=payload, headers=headers)
     except requests.exceptions.TooManyRedirects as e:
         # This is to work around an oddity (bug??) with verified https goodreads requests
         # Goodreads sometimes redirects back to the same page in a loop using code 301,
@@ -154,7 +185,7 @@ def fetch_url(url: str, headers: dict | None = None, retry=True, timeout=True,
             return f"TooManyRedirects {str(e)}", False
         logger.debug(f"Retrying - got TooManyRedirects on {url}")
         try:
-            r = requests.get(url, verify=False, params=payload, headers=headers)
+            r = http_get(url, verify=False, params=payload, headers=headers)
             logger.debug(f"TooManyRedirects retry status code {r.status_code}")
         except Exception as e:
             return f"Exception {type(e).__name__}: {str(e)}", False
@@ -164,13 +195,20 @@ def fetch_url(url: str, headers: dict | None = None, retry=True, timeout=True,
             return f"Timeout {str(e)}", False
         logger.debug(f"fetch_url: retrying - got timeout on {url}")
         try:
-            r = requests.get(url, verify=verify, params=payload, headers=headers)
+            r = http_get(url, verify=verify, params=payload, headers=headers)
         except Exception as e:
             return f"Exception {type(e).__name__}: {str(e)}", False
     except Exception as e:
         return f"Exception {type(e).__name__}: {str(e)}", False
 
+    if r.status_code == 304:  # Not Modified, only sent if we asked for it
+        if response_headers is not None:
+            response_headers.update(r.headers)
+        return NOT_MODIFIED, True
+
     if str(r.status_code).startswith('2'):  # (200 OK etc)
+        if response_headers is not None:
+            response_headers.update(r.headers)
         if raw:
             return r.content, True
         return r.text, True
@@ -223,8 +261,12 @@ def cache_img(img_type: ImageType, img_id: str, img_url: str, refresh=False) ->
     """ Cache the image from the given filename or URL in the local images cache
         linked to the id.
         On success, return the link to the cached file, True, was_in_cache
-        On error, return message, False, False """
+        On error, return message, False, False
+        Concurrent calls for the same image share one fetch """
+    return get_flight(img_type.value).do((img_id, img_url, refresh), _cache_img, img_type, img_id, img_url, refresh)
+
 
+def _cache_img(img_type: ImageType, img_id: str, img_url: str, refresh=False) -> (str, bool, bool):
     logger = logging.getLogger(__name__)
     logging.getLogger('urllib3.connectionpool').setLevel(logging.CRITICAL)
     had_cache = False
@@ -288,6 +330,8 @@ class CacheRequest(ABC):
         self.url = url
         self.use_cache = use_cache
         self.expire = expire
+        self.response_headers = {}
+        self.validators = {}
         self.logger = logging.getLogger()
         self.cachelogger = logging.getLogger('special.cache')
 
@@ -300,47 +344,80 @@ class CacheRequest(ABC):
     def cachedir_name(cls) -> str:
         return f"{cls.name()}Cache"
 
+    @classmethod
+    def store(cls) -> CacheStore:
+        return get_store(cls.cachedir_name())
+
     @abc.abstractmethod
-    def read_from_cache(self, hashfilename: str) -> (str, bool):
+    def read_from_cache(self, key: str) -> (str, bool):
         """ Read the source from cache """
 
+    def request_headers(self) -> dict | None:
+        """ The headers to fetch with: the default ones, plus the validators of an old entry if there is one """
+        if not self.validators:
+            return None
+        return {'User-Agent': get_user_agent(), **self.validators}
+
     def fetch_data(self) -> (str, bool):
         """ Fetch the data; called if it's not in the cache """
-        return fetch_url(self.url, headers=None)
+        return fetch_url(self.url, headers=self.request_headers(), response_headers=self.response_headers)
 
     @abc.abstractmethod
-    def load_from_result_and_cache(self, result: str, filename: str, docache: bool) -> (str, bool):
+    def load_from_result_and_cache(self, result: str, key: str, docache: bool) -> (str, bool):
         """ Load the value from result and store it in cache if docache is True """
 
     def get_cached_request(self) -> (Any, bool):
-        # hashfilename = hash of url
-        # if hashfilename exists in cache and isn't too old, return its contents
+        # key = hash of url
+        # if key is in the cache and isn't too old, return its contents
         # if not, read url and store the result in the cache
         # return the result, and boolean True if source was cache
-        cache_location = DIRS.get_cachedir(self.cachedir_name())
-        hashfilename, myhash = self.get_hashed_filename(cache_location)
+        # Concurrent requests for the same url share one lookup and fetch
+        key = self.get_key()
+        return get_flight(self.cachedir_name()).do((key, self.use_cache, self.expire), self.lookup, key)
+
+    def lookup(self, key: str) -> (Any, bool):
         # CACHE_AGE is in days, so get it to seconds
         expire_older_than = CONFIG.get_int('CACHE_AGE') * 24 * 60 * 60 if self.expire else 0
-        valid_cache = self.is_in_cache(expire_older_than, hashfilename, myhash)
+        counters = get_counters(self.cachedir_name())
+        if self.use_cache:
+            source = get_memory_tier(self.cachedir_name()).get(key, expire_older_than)
+            if source is not None:
+                counters.hit(memory=True)
+                self.cachelogger.debug(f"CacheHandler: Returning MEMORY response {key} for {self.url}")
+                return source, True
+
+        valid_cache = self.is_in_cache(expire_older_than, key)
 
         if valid_cache:
-            lazylibrarian.CACHE_HIT += 1
-            self.cachelogger.debug(f"CacheHandler: Returning CACHED response {hashfilename} for {self.url}")
-            source, ok = self.read_from_cache(hashfilename)
+            counters.hit()
+            self.cachelogger.debug(f"CacheHandler: Returning CACHED response {key} for {self.url}")
+            source, ok = self.read_from_cache(key)
             if not ok:
-                self.logger.debug(f"CacheHandler: Failed to read {hashfilename} for {self.url}")
+                self.logger.debug(f"CacheHandler: Failed to read {key} for {self.url}")
                 return None, False
         else:
-            lazylibrarian.CACHE_MISS += 1
+            counters.miss()
             for blk in service_blocked:
                 if blk in self.url and BLOCKHANDLER.is_blocked(blk):
                     return None, False
 
+            source_name = urlsplit(self.url).netloc or self.name()
+            if self.use_cache and NEGATIVE.is_negative(source_name, key):
+                return None, False
+
+            # If we still have an old copy that can be revalidated, only fetch it again if it changed
+            self.validators = conditional_headers(self.store().headers(key))
             result, success = self.fetch_data()
+            if success and self.validators and result == NOT_MODIFIED:
+                self.cachelogger.debug(f"CacheHandler: {key} not modified, refreshing for {self.url}")
+                counters.revalidated()
+                self.store().touch(key, self.response_headers)
+                return self.read_from_cache(key)
             if success:
-                self.cachelogger.debug(f"CacheHandler: Storing {self.name()} {myhash} for {self.url}")
-                source, result = self.load_from_result_and_cache(result, hashfilename, expire_older_than)
-            elif '404' in result:  # don't block on "not found"
+                self.cachelogger.debug(f"CacheHandler: Storing {self.name()} {key} for {self.url}")
+                source, result = self.load_from_result_and_cache(result, key, expire_older_than)
+            elif '404' in result:  # don't block on "not found", but don't ask again for a while
+                NEGATIVE.add(source_name, key, result)
                 return None, False
             else:
                 msg = f"Got error response for {self.url}: {result.split('<')[0]}"
@@ -357,23 +434,28 @@ class CacheRequest(ABC):
                 return None, False
         return source, valid_cache
 
-    def is_in_cache(self, expiry: int, hashfilename: str, myhash: str) -> bool:
-        if self.use_cache and path_isfile(hashfilename):
-            cache_modified_time = os.stat(hashfilename).st_mtime
-            time_now = time.time()
-            if self.expire and cache_modified_time < time_now - expiry:
-                # Cache entry is too old, delete it
-                cachelogger = logging.getLogger('special.cache')
-                cachelogger.debug(f"Expiring {myhash}")
-                os.remove(syspath(hashfilename))
-                return False
-            return True
-        return False
+    def is_in_cache(self, expiry: int, key: str) -> bool:
+        if not self.use_cache:
+            return False
+        store = self.store()
+        fetched = store.fetched(key)
+        if fetched and self.expire and fetched < time.time() - expiry:
+            # Cache entry is too old, delete it unless we can ask the server if it changed
+            if not conditional_headers(store.headers(key)):
+                self.cachelogger.debug(f"Expiring {key}")
+                store.delete(key)
+            return False
+        return bool(fetched)
+
+    def get_key(self) -> str:
+        return md5_utf8(self.url)
 
-    def get_hashed_filename(self, cache_location: str) -> (str, str):
-        myhash = md5_utf8(self.url)
-        hashfilename = os.path.join(cache_location, myhash[0], myhash[1], f"{myhash}.{self.name().lower()}")
-        return hashfilename, myhash
+    def store_result(self, key: str, body: bytes):
+        self.store().put(key, body, self.response_headers)
+
+    def remember(self, key: str, source, size: int, fetched: float = 0.0):
+        """ Keep the parsed source in memory, so the next request for it needn't read or parse the entry """
+        get_memory_tier(self.cachedir_name()).put(key, source, size, fetched)
 
 
 class XMLCacheRequest(CacheRequest):
@@ -381,9 +463,9 @@ class XMLCacheRequest(CacheRequest):
     def name(cls) -> str:
         return "XML"
 
-    def read_from_cache(self, hashfilename: str) -> (str, bool):
-        with open(syspath(hashfilename), "rb") as cachefile:
-            result = cachefile.read()
+    def read_from_cache(self, key: str) -> (str, bool):
+        entry = self.store().get(key)
+        result = entry.body if entry else b''
         source = None
         if result and result.startswith(b'<?xml'):
             try:
@@ -394,24 +476,25 @@ class XMLCacheRequest(CacheRequest):
                     result = result.decode('utf-16').encode('utf-8')
                     source = ElementTree.fromstring(result)
                 except (ElementTree.ParseError, UnicodeEncodeError, UnicodeDecodeError):
-                    self.logger.error(f"Error parsing xml from {hashfilename}")
+                    self.logger.error(f"Error parsing xml from {key}")
                     source = None
             except ElementTree.ParseError:
-                self.logger.error(f"Error parsing xml from {hashfilename}")
+                self.logger.error(f"Error parsing xml from {key}")
                 source = None
         if source is None:
-            self.logger.error(f"Error reading xml from {hashfilename}")
+            self.logger.error(f"Error reading xml from {key}")
             # normally delete bad data, but keep for inspection if debug logging cache
             if not self.cachelogger.isEnabledFor(logging.DEBUG):
-                remove_file(hashfilename)
+                self.store().delete(key)
             return None, False
+        self.remember(key, source, len(result), entry.fetched)
         return source, True
 
     def fetch_data(self) -> (str, bool):
         gr_api_sleep()
-        return fetch_url(self.url, raw=True, headers=None)
+        return fetch_url(self.url, raw=True, headers=self.request_headers(), response_headers=self.response_headers)
 
-    def load_from_result_and_cache(self, result: str, filename: str, docache: bool) -> (str, bool):
+    def load_from_result_and_cache(self, result: str, key: str, docache: bool) -> (str, bool):
         source = None
         result = make_bytestr(result)
         if result and result.startswith(b'<?xml'):
@@ -436,16 +519,17 @@ class XMLCacheRequest(CacheRequest):
                 source = None
 
         if source is not None:
-            with open(syspath(filename), "wb") as cachefile:
-                cachefile.write(result)
-                self.cachelogger.debug(f"Cached {len(source)} bytes xml {filename}")
+            self.store_result(key, result)
+            self.remember(key, source, len(result))
+            self.cachelogger.debug(f"Cached {len(source)} bytes xml {key}")
         else:
             self.logger.error(f"Error getting xml data from {self.url}")
             if result:
                 self.logger.error(f"Result: {result[:80]}")
-                with open(syspath(f"{filename}.err"), "wb") as cachefile:
+                filename = DIRS.get_cachefile('', f"{key}.xml.err")
+                with open(syspath(filename), "wb") as cachefile:
                     cachefile.write(result)
-                    self.logger.error(f"Cached {len(result)} bytes {filename}.err")
+                    self.logger.error(f"Cached {len(result)} bytes {filename}")
             return None, False
         return source, True
 
@@ -455,15 +539,17 @@ class HTMLCacheRequest(CacheRequest):
     def name(cls) -> str:
         return "HTML"
 
-    def read_from_cache(self, hashfilename: str) -> (str, bool):
-        with open(syspath(hashfilename), "rb") as cachefile:
-            source = cachefile.read()
-        return source, True
+    def read_from_cache(self, key: str) -> (str, bool):
+        entry = self.store().get(key)
+        if not entry:
+            return None, False
+        self.remember(key, entry.body, len(entry.body), entry.fetched)
+        return entry.body, True
 
-    def load_from_result_and_cache(self, result: str, filename, docache) -> (str, bool):
+    def load_from_result_and_cache(self, result: str, key, docache) -> (str, bool):
         source = make_bytestr(result)
-        with open(syspath(filename), "wb") as cachefile:
-            cachefile.write(source)
+        self.store_result(key, source)
+        self.remember(key, source, len(source))
         return source, True
 
 
@@ -472,22 +558,22 @@ class JSONCacheRequest(CacheRequest):
     def name(cls) -> str:
         return "JSON"
 
-    def read_from_cache(self, hashfilename: str) -> (str, bool):
+    def read_from_cache(self, key: str) -> (str, bool):
+        entry = self.store().get(key)
+        if not entry:
+            return None, False
         try:
-            try:
-                with open(hashfilename) as f:
-                    source = json.load(f)
-            finally:
-                f.close()
+            source = json.loads(entry.body)
         except ValueError:
-            self.logger.error(f"Error decoding json from {hashfilename}")
+            self.logger.error(f"Error decoding json from {key}")
             # normally delete bad data, but keep for inspection if debug logging cache
             # if not self.cachelogger.isEnabledFor(logging.DEBUG):
-            remove_file(hashfilename)
+            self.store().delete(key)
             return None, False
+        self.remember(key, source, len(entry.body), entry.fetched)
         return source, True
 
-    def load_from_result_and_cache(self, result: str, filename: str, docache) -> (str, bool):
+    def load_from_result_and_cache(self, result: str, key: str, docache) -> (str, bool):
         try:
             source = json.loads(result)
             if not docache:
@@ -496,8 +582,9 @@ class JSONCacheRequest(CacheRequest):
             self.logger.error(f"{type(e).__name__} decoding json from {self.url}")
             self.logger.debug(f"{e} : {result}")
             return None, False
-        with open(filename, "w") as outfile:
-            json.dump(source, outfile)
+        body = json.dumps(source).encode('utf-8')
+        self.store_result(key, body)
+        self.remember(key, source, len(body))
         return source, True
 
 
@@ -505,7 +592,8 @@ def clean_cache():
     """ Remove unused files from the cache - delete if expired or unused.
         Check JSONCache  WorkCache  XMLCache  SeriesCache Author  Book  Magazine  Comic  IRC
         Check covers and authorimages etc. referenced in the database exist
-        and change database entry if missing, expire old pastissues table entries """
+        and change database entry if missing, expire old pastissues table entries.
+        Stops after CACHE_CLEAN_SECONDS, if set, and carries on from there next time """
 
     threadname = thread_name()
     if "Thread" in threadname:
@@ -515,33 +603,47 @@ def clean_cache():
     db = database.DBConnection()
     result = []
     try:
-        db.upsert("jobs", {'Start': time.time()}, {'Name': 'CLEANCACHE'})
-        result = [
+        database.WRITE_QUEUE.upsert("jobs", {'Start': time.time()}, {'Name': 'CLEANCACHE'})
+        budget = CONFIG.get_int('CACHE_CLEAN_SECONDS')
+        deadline = time.time() + budget if budget else 0.0
+        cleaners = [
             # Remove files that are too old from cache directories
-            FileExpirer("IRCCache", False, check_int(lazylibrarian.IRC_CACHE_EXPIRY, 0)).clean(),
-            FileExpirer("JSONCache", True, CONFIG.get_int('CACHE_AGE') * 24 * 60 * 60).clean(),
-            FileExpirer("XMLCache", True, CONFIG.get_int('CACHE_AGE') * 24 * 60 * 60).clean(),
+            FileExpirer("IRCCache", False, check_int(lazylibrarian.IRC_CACHE_EXPIRY, 0)),
+            StoreExpirer("JSONCache", CONFIG.get_int('CACHE_AGE') * 24 * 60 * 60, VALIDATED_AGE_FACTOR),
+            StoreExpirer("XMLCache", CONFIG.get_int('CACHE_AGE') * 24 * 60 * 60, VALIDATED_AGE_FACTOR),
+            StoreExpirer("NegativeCache", CONFIG.get_int('NEGATIVE_CACHE_HOURS') * 60 * 60),
 
             # Remove files not referenced by relevant item in the DB
-            OrphanCleaner("WorkCache", True, db, 'BookID', 'books', '%s', True).clean(),
-            OrphanCleaner("SeriesCache", False, db, 'SeriesID', 'series', '%s', True).clean(),
-            OrphanCleaner("magazine", False, db, 'cover', 'issues', 'cache/magazine/%s', False).clean(),
+            OrphanCleaner("WorkCache", True, db, 'BookID', 'books', '%s', True),
+            OrphanCleaner("SeriesCache", False, db, 'SeriesID', 'series', '%s', True),
+            OrphanCleaner("magazine", False, db, 'cover', 'issues', 'cache/magazine/%s', False),
 
             # Remove files no longer referenced by the database
             UnreferencedCleaner("author", "Author cache", db, 'AuthorImg', 13,
-                                "authors where instr(AuthorImg, 'cache/author/') = 1").clean(),
+                                "authors where instr(AuthorImg, 'cache/author/') = 1"),
             UnreferencedCleaner("book", "Book cache", db, 'BookImg', 11,
-                                "books where instr(BookImg, 'cache/book/') = 1").clean(),
+                                "books where instr(BookImg, 'cache/book/') = 1"),
 
             # At this point there should be no more .jpg files in the root of the cachedir
             # Any that are still there are for books/authors deleted from database
-            ExtensionCleaner("root", ".jpg").clean(),
+            ExtensionCleaner("root", ".jpg"),
 
             # Verify the cover images referenced in the database are present, replace if not
-            DBCleaner("book", "Cover", db, "books", "BookImg", "BookName", "BookID", 'images/nocover.png').clean(),
+            DBCleaner("book", "Cover", db, "books", "BookImg", "BookName", "BookID", 'images/nocover.png'),
             DBCleaner("author", "Image", db, "authors", "AuthorImg", "AuthorName", "AuthorID",
-                      'images/nophoto.png').clean(),
+                      'images/nophoto.png'),
         ]
+        for cleaner in cleaners:
+            cleaner.deadline = deadline
+            result.append(cleaner.clean())
+        pending = any(cleaner.stopped for cleaner in cleaners)
+        if pending:
+            logger.info(f"Cache cleaning stopped after {budget} {plural(budget, 'second')}, "
+                        f"the rest will be done next time")
+        if pending != lazylibrarian.CLEAN_CACHE_PENDING:
+            lazylibrarian.CLEAN_CACHE_PENDING = pending
+            from lazylibrarian.scheduling import SchedulerCommand, schedule_job
+            schedule_job(SchedulerCommand.RESTART, 'clean_cache')
 
         expiry = CONFIG.get_int('CACHE_AGE')
         if expiry:
@@ -566,7 +668,7 @@ def clean_cache():
     except Exception as e:
         logger.error(str(e))
 
-    db.upsert("jobs", {'Finish': time.time()}, {'Name': 'CLEANCACHE'})
+    database.WRITE_QUEUE.upsert("jobs", {'Finish': time.time()}, {'Name': 'CLEANCACHE'})
     db.close()
     thread_name(threadname)
     return result
@@ -579,38 +681,51 @@ class CacheCleaner(ABC):
         self.cache: str = os.path.join(DIRS.CACHEDIR, basedir)
         self.cleaned: int = 0
         self.kept: int = 0
+        self.deadline: float = 0.0  # Stop when time.time() passes this, if set
+        self.stopped: bool = False
+
+    def out_of_time(self) -> bool:
+        if self.deadline and time.time() > self.deadline:
+            self.stopped = True
+        return self.stopped
+
+    def stopped_msg(self) -> str:
+        return ', stopped at the time limit' if self.stopped else ''
 
     @abc.abstractmethod
     def clean(self) -> str: pass
 
 
 class FileCleaner(CacheCleaner):
-    """ Cleaners that delete files from cache """
+    """ Cleaners that delete files from cache, working from the cache index rather than the directories """
 
     def __init__(self, basedir: str, hexdirs: bool):
         super().__init__(basedir)
         self.hexdirs: bool = hexdirs
 
     def clean(self) -> str:
-        """ Generic cleaning routine, iterates directories """
-        if path_isdir(self.cache):
-            if self.hexdirs:
-                subdirs = itertools.product("0123456789abcdef", repeat=2)
-                for i, j in subdirs:
-                    dirname = os.path.join(self.cache, i, j)
-                    for cached_file in listdir(dirname):
-                        self.clean_file(os.path.join(dirname, cached_file))
-            else:
-                for cached_file in listdir(self.cache):
-                    self.clean_file(os.path.join(self.cache, cached_file))
+        """ Generic cleaning routine, brings the index up to date then checks the files it selects """
+        index = get_cache_index()
+        if index.sync(self.basedir, self.hexdirs, self.deadline):
+            for subdir, name, owner in self.candidates(index):
+                if self.out_of_time():
+                    break
+                self.clean_file(index, subdir, name, owner)
+        else:
+            self.stopped = True
         msg = (f"Cleaned {self.cleaned} {self.name()} {plural(self.cleaned, 'file')} from {self.source()}, "
-               f"kept {self.kept}")
+               f"kept {self.kept}{self.stopped_msg()}")
         self.logger.debug(msg)
         return msg
 
-    def remove_if(self, filename, condition):
+    def candidates(self, index: CacheIndex) -> list[tuple[str, str, str]]:
+        """ Return the subdir, name and owner of the files that may need cleaning """
+        return index.files(self.basedir, self.hexdirs)
+
+    def remove_if(self, index: CacheIndex, subdir: str, name: str, condition):
         if condition:
-            remove_file(filename)
+            remove_file(index.path(self.basedir, subdir, name))
+            index.remove(self.basedir, subdir, name)
             self.cleaned += 1
         else:
             self.kept += 1
@@ -623,13 +738,13 @@ class FileCleaner(CacheCleaner):
         pass
 
     @abc.abstractmethod
-    def clean_file(self, filename):
+    def clean_file(self, index: CacheIndex, subdir: str, name: str, owner: str):
         pass
 
 
 class FileExpirer(FileCleaner):
-    """ Delete files in dirname that are older than expiry_seconds old.
-    Return a string with a summary for printing. """
+    """ Delete files in dirname that are older than expiry_seconds old. Only the files the index
+    says are old are checked. Return a string with a summary for printing. """
 
     def __init__(self, basedir: str, hexdirs: bool, expiry_sec: int):
         super().__init__(basedir, hexdirs)
@@ -639,10 +754,46 @@ class FileExpirer(FileCleaner):
     def name(self) -> str:
         return 'expired'
 
-    def clean_file(self, filename):
-        if path_isfile(filename):
-            cache_modified_time = os.stat(filename).st_mtime
-            self.remove_if(filename, cache_modified_time < self.time_now - self.expiry_sec)
+    def candidates(self, index: CacheIndex) -> list[tuple[str, str, str]]:
+        expired = index.older_than(self.basedir, self.hexdirs, self.time_now - self.expiry_sec)
+        self.kept = index.count(self.basedir, self.hexdirs) - len(expired)
+        return expired
+
+    def clean_file(self, index: CacheIndex, subdir: str, name: str, owner: str):
+        filename = index.path(self.basedir, subdir, name)
+        try:
+            info = os.stat(syspath(filename))
+        except OSError:
+            index.remove(self.basedir, subdir, name)
+            return
+        # The index may be out of date if the file was written again
+        if info.st_mtime >= self.time_now - self.expiry_sec:
+            index.update(self.basedir, subdir, name, info.st_mtime, info.st_size)
+        self.remove_if(index, subdir, name, info.st_mtime < self.time_now - self.expiry_sec)
+
+
+class StoreExpirer(CacheCleaner):
+    """ Delete entries in the store for basedir that are older than expiry_sec.
+    Entries that can be revalidated are kept for validated_factor times as long.
+    Return a string with a summary for printing, including how well the entries left compress. """
+
+    def __init__(self, basedir: str, expiry_sec: int, validated_factor: int = 1):
+        super().__init__(basedir)
+        self.expiry_sec = expiry_sec
+        self.validated_factor = validated_factor
+
+    def clean(self) -> str:
+        store = get_store(self.basedir)
+        time_now = time.time()
+        self.cleaned, self.kept = store.expire(time_now - self.expiry_sec,
+                                               time_now - self.expiry_sec * self.validated_factor)
+        msg = f"Cleaned {self.cleaned} expired {plural(self.cleaned, 'entry')} from {self.basedir}, kept {self.kept}"
+        raw, stored = store.sizes()
+        if stored < raw:
+            msg += (f", {human_size(raw)} stored in {human_size(stored)} ({raw / stored:.1f}:1, "
+                    f"{human_size(raw - stored)} saved)")
+        self.logger.debug(msg)
+        return msg
 
 
 class ExtensionCleaner(FileCleaner):
@@ -655,15 +806,15 @@ class ExtensionCleaner(FileCleaner):
     def name(self):
         return 'superfluous'
 
-    def clean_file(self, filename):
+    def clean_file(self, index: CacheIndex, subdir: str, name: str, owner: str):
         if self.ext:
-            self.remove_if(filename, filename.endswith(self.ext))
+            self.remove_if(index, subdir, name, name.endswith(self.ext))
 
 
 class OrphanCleaner(FileCleaner):
     """ Delete files in dirname that don't have a corresponding entry in the DB,
-    where the ID is the filename without the extension.
-    Return a string with a summary for printing. """
+    where the ID is the filename without the extension. The IDs in the DB are read once,
+    and each file's ID looked up in them. Return a string with a summary for printing. """
 
     def __init__(self, basedir: str, hexdirs: bool, db, field: str, table: str, matcher: str, dotsplit: bool):
         super().__init__(basedir, hexdirs)
@@ -672,6 +823,7 @@ class OrphanCleaner(FileCleaner):
         self.table = table
         self.matcher = matcher
         self.dotsplit = dotsplit
+        self.items = None
 
     def name(self) -> str:
         return 'orphan'
@@ -684,15 +836,16 @@ class OrphanCleaner(FileCleaner):
         fname, extn = splitext(name)
         return fname.split('_')[0] + extn
 
-    def clean_file(self, filename):
+    def candidates(self, index: CacheIndex) -> list[tuple[str, str, str]]:
+        self.items = {item[self.field] for item in self.db.iterate(f'SELECT {self.field} from {self.table}')}
+        return super().candidates(index)
+
+    def clean_file(self, index: CacheIndex, subdir: str, name: str, owner: str):
         try:
-            dbid = self.getid(filename)
-            query = f'select {self.field} from {self.table} where {self.field}=?'
-            match = self.matcher % dbid
-            item = self.db.match(query, (match,))
-            self.remove_if(filename, not item)
+            dbid = owner if self.dotsplit else self.getid(name)
+            self.remove_if(index, subdir, name, self.matcher % dbid not in self.items)
         except IndexError:
-            self.logger.error(f'Clean Cache: Error splitting {filename}')
+            self.logger.error(f'Clean Cache: Error splitting {name}')
 
 
 class UnreferencedCleaner(FileCleaner):
@@ -703,8 +856,7 @@ class UnreferencedCleaner(FileCleaner):
         self.taskname = taskname
         self.db = db
         fullquery = f'SELECT {field} from {query}'
-        res = db.select(fullquery)
-        self.items = [item[field][fieldcut:] for item in res]
+        self.items = {item[field][fieldcut:] for item in db.iterate(fullquery)}
         self.logger.debug(f"Checking {len(self.items)} {field} images")
 
     def name(self) -> str:
@@ -713,9 +865,8 @@ class UnreferencedCleaner(FileCleaner):
     def source(self) -> str:
         return self.taskname
 
-    def clean_file(self, filename):
-        name = os.path.basename(filename)
-        self.remove_if(filename, name not in self.items)
+    def clean_file(self, index: CacheIndex, subdir: str, name: str, owner: str):
+        self.remove_if(index, subdir, name, name not in self.items)
 
 
 class DBCleaner(CacheCleaner):
@@ -731,11 +882,17 @@ class DBCleaner(CacheCleaner):
         self.fname = fname
         self.fid = fid
         self.fallback = fallback
-        query = f'SELECT {fimg},{fname},{fid} from {table}'
-        self.items = db.select(query)
 
     def clean(self) -> str:
-        for item in self.items:
+        index = get_cache_index()
+        # Without the whole directory listed, covers that exist might look missing, so don't start
+        if not index.sync(self.basedir, False, self.deadline):
+            self.stopped = True
+        names = index.names(self.basedir)
+        query = f'SELECT {self.fimg},{self.fname},{self.fid} from {self.table}'
+        for item in self.db.iterate(query):
+            if self.out_of_time():
+                break
             keep = True
             imgfile = ''
             if item[self.fimg] is None or item[self.fimg] == '':
@@ -744,7 +901,7 @@ class DBCleaner(CacheCleaner):
                 # html uses '/' as separator, but os might not
                 imgname = item[self.fimg].rsplit('/')[-1]
                 imgfile = os.path.join(self.cache, imgname)
-                if not path_isfile(imgfile):
+                if imgname not in names:
                     keep = False
             if keep:
                 self.kept += 1
@@ -754,6 +911,7 @@ class DBCleaner(CacheCleaner):
                 updatequery = f"update {self.table} set {self.fimg}='{self.fallback}' where {self.fid}=?"
                 self.db.action(updatequery, (item[self.fid],))
 
-        msg = f"Cleaned {self.cleaned} missing {plural(self.cleaned, self.typestr)}, kept {self.kept}"
+        msg = (f"Cleaned {self.cleaned} missing {plural(self.cleaned, self.typestr)}, kept {self.kept}"
+               f"{self.stopped_msg()}")
         self.logger.debug(msg)
         return msg
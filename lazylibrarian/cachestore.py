@@ -0,0 +1,844 @@
+#  This file is part of Lazylibrarian.
+#  Lazylibrarian is free software':'you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  Lazylibrarian is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#  You should have received a copy of the GNU General Public License
+#  along with Lazylibrarian.  If not, see <http://www.gnu.org/licenses/>.
+
+# Purpose:
+#   Key/value stores holding the responses in the JSON, XML and HTML caches,
+#   an in-memory tier of parsed responses in front of them, hit/miss counters for each cache,
+#   single-flight coalescing of concurrent fetches for the same entry,
+#   and a negative cache of lookups that found nothing.
+#   Entry bodies are compressed on disk, with zstd if it's installed or zlib if not.
+#   Also an index of the files in the file caches, eg cover images, used when cleaning them
+
+import abc
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import stat
+import struct
+import threading
+import time
+import zlib
+from abc import ABC
+from collections import OrderedDict
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from lazylibrarian.config2 import CONFIG
+from lazylibrarian.filesystem import DIRS, listdir, path_isdir, remove_dir, remove_file, syspath
+from lazylibrarian.formatter import md5_utf8, plural
+
+# Response headers worth keeping with a cached body
+CACHE_HEADERS = ['Content-Type', 'Date', 'ETag', 'Last-Modified', 'Cache-Control', 'Expires']
+
+
+def cache_headers(headers) -> dict:
+    """ Return the response headers we keep, from a dict or a requests CaseInsensitiveDict """
+    if not headers:
+        return {}
+    lower = {key.lower(): value for key, value in headers.items()}
+    return {name: lower[name.lower()] for name in CACHE_HEADERS if name.lower() in lower}
+
+
+def conditional_headers(headers) -> dict:
+    """ Return the request headers that ask the server to only send the page if it changed
+    since the response with these headers, or {} if there are no validators """
+    headers = cache_headers(headers)
+    result = {}
+    if headers.get('ETag'):
+        result['If-None-Match'] = headers['ETag']
+    if headers.get('Last-Modified'):
+        result['If-Modified-Since'] = headers['Last-Modified']
+    return result
+
+
+# A compressed body starts with the marker, then a byte for the codec and the uncompressed length.
+# Anything else is stored as it was fetched, like all entries written before compression was added
+COMPRESSED_MARKER = b'\x00LLC'
+COMPRESSED_HEADER = struct.Struct('>4scQ')
+ZLIB = b'z'
+ZSTD = b's'
+# Bodies smaller than this are not worth compressing
+COMPRESS_MIN = 256
+
+
+def compress_body(body: bytes) -> bytes:
+    """ Return body as it should be stored, compressed if CACHE_COMPRESS is set and it gets smaller """
+    if not CONFIG.get_bool('CACHE_COMPRESS') or len(body) < COMPRESS_MIN or body.startswith(COMPRESSED_MARKER):
+        return body
+    if zstandard:
+        codec, data = ZSTD, zstandard.ZstdCompressor(level=3).compress(body)
+    else:
+        codec, data = ZLIB, zlib.compress(body, 6)
+    if len(data) + COMPRESSED_HEADER.size >= len(body):
+        return body
+    return COMPRESSED_HEADER.pack(COMPRESSED_MARKER, codec, len(body)) + data
+
+
+def decompress_body(stored: bytes) -> bytes:
+    """ Return the original body of a stored entry. Raises ValueError if it can't be decompressed """
+    if not stored.startswith(COMPRESSED_MARKER):
+        return stored
+    _, codec, size = COMPRESSED_HEADER.unpack_from(stored)
+    data = stored[COMPRESSED_HEADER.size:]
+    if codec == ZLIB:
+        try:
+            body = zlib.decompress(data)
+        except zlib.error as e:
+            raise ValueError(str(e)) from e
+    elif codec == ZSTD:
+        if not zstandard:
+            raise ValueError("Entry is zstd compressed but zstandard is not installed")
+        try:
+            body = zstandard.ZstdDecompressor().decompress(data, max_output_size=size)
+        except zstandard.ZstdError as e:
+            raise ValueError(str(e)) from e
+    else:
+        raise ValueError(f"Unknown compression {codec!r}")
+    if len(body) != size:
+        raise ValueError(f"Expected {size} bytes, got {len(body)}")
+    return body
+
+
+def raw_size(head: bytes, length: int) -> int:
+    """ Return the uncompressed size of a stored body of length bytes, given at least its first
+    COMPRESSED_HEADER.size bytes """
+    if head.startswith(COMPRESSED_MARKER) and len(head) >= COMPRESSED_HEADER.size:
+        return COMPRESSED_HEADER.unpack_from(head)[2]
+    return length
+
+
+class CacheEntry:
+    """ One cached response: the body, when it was fetched and some of its headers """
+    def __init__(self, key: str, body: bytes, fetched: float, headers: dict | None = None):
+        self.key = key
+        self.body = body
+        self.fetched = fetched
+        self.headers = headers or {}
+
+
+class CacheStore(ABC):
+    """ Where a cache keeps its entries. Keys are the md5 hash of the url """
+    def __init__(self, name: str):
+        self.name = name
+        self.logger = logging.getLogger(__name__)
+
+    @abc.abstractmethod
+    def get(self, key: str) -> CacheEntry | None:
+        """ Return the entry for key, or None """
+
+    @abc.abstractmethod
+    def fetched(self, key: str) -> float:
+        """ Return when the entry for key was fetched, 0 if there isn't one. Doesn't read the body """
+
+    @abc.abstractmethod
+    def put(self, key: str, body: bytes, headers=None, fetched: float = 0.0):
+        """ Store body for key, replacing any existing entry. fetched defaults to now """
+
+    def put_many(self, entries: list[CacheEntry], replace: bool = True):
+        """ Store several entries at once. If not replace, keys that are already stored are skipped """
+        for entry in entries:
+            if replace or not self.fetched(entry.key):
+                self.put(entry.key, entry.body, entry.headers, entry.fetched)
+
+    def headers(self, key: str) -> dict:
+        """ Return the stored headers for key, {} if there aren't any """
+        entry = self.get(key)
+        return entry.headers if entry else {}
+
+    def touch(self, key: str, headers=None, fetched: float = 0.0):
+        """ Mark the entry for key as fetched again, eg after the server said it's not modified.
+        Headers, if given, are merged with the stored ones """
+        entry = self.get(key)
+        if entry:
+            self.put(key, entry.body, {**entry.headers, **cache_headers(headers)}, fetched)
+
+    @abc.abstractmethod
+    def delete(self, key: str):
+        """ Remove the entry for key, if there is one """
+
+    @abc.abstractmethod
+    def expire(self, older_than: float, validated_older_than: float | None = None) -> tuple[int, int]:
+        """ Delete entries fetched before older_than. If validated_older_than is given, entries that
+        can be revalidated with ETag or Last-Modified are kept until then instead.
+        Returns how many were deleted and kept """
+
+    @abc.abstractmethod
+    def count(self) -> int:
+        """ Return the number of entries """
+
+    @abc.abstractmethod
+    def sizes(self) -> tuple[int, int]:
+        """ Return the total size of the entry bodies, and how much space they take when stored """
+
+    def entry(self, key: str, stored: bytes, fetched: float, headers: dict | None) -> CacheEntry | None:
+        """ Return the entry with a body read from the store, or None if it can't be decompressed,
+        in which case it is deleted so it gets fetched again """
+        try:
+            return CacheEntry(key, decompress_body(stored), fetched, headers)
+        except ValueError as e:
+            self.logger.warning(f"Deleting unreadable entry {key} from {self.name}: {e}")
+            self.delete(key)
+            return None
+
+    def is_valid(self) -> bool:
+        """ False if the store has to be opened again, eg the cache directory was deleted """
+        return True
+
+    def close(self):  # noqa: B027
+        """ Release anything the store holds open """
+
+    def get_fresh(self, key: str, expiry: int) -> CacheEntry | None:
+        """ Return the entry for key, unless it is more than expiry seconds old, in which case it is deleted """
+        entry = self.get(key)
+        if entry and expiry and entry.fetched < time.time() - expiry:
+            logging.getLogger('special.cache').debug(f"Expiring {key}")
+            self.delete(key)
+            return None
+        return entry
+
+
+class SqliteCacheStore(CacheStore):
+    """ All the entries in one sqlite file, with an index on fetch time for expiry """
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.filename = DIRS.get_cachefile('', f"{name}.db")
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(syspath(self.filename), timeout=20, check_same_thread=False,
+                                          isolation_level=None)
+        try:
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.execute("PRAGMA synchronous = NORMAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS entries (Key TEXT PRIMARY KEY, Fetched REAL NOT NULL, "
+                                    "Size INTEGER NOT NULL, Headers TEXT, Body BLOB NOT NULL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS entries_fetched ON entries (Fetched)")
+        except sqlite3.Error:
+            self.connection.close()
+            raise
+
+    def get(self, key: str) -> CacheEntry | None:
+        with self.lock:
+            row = self.connection.execute("SELECT Body,Fetched,Headers from entries WHERE Key=?", (key,)).fetchone()
+        if not row:
+            return None
+        return self.entry(key, row[0], row[1], json.loads(row[2]) if row[2] else None)
+
+    def fetched(self, key: str) -> float:
+        with self.lock:
+            row = self.connection.execute("SELECT Fetched from entries WHERE Key=?", (key,)).fetchone()
+        return row[0] if row else 0.0
+
+    def put(self, key: str, body: bytes, headers=None, fetched: float = 0.0):
+        self.put_many([CacheEntry(key, body, fetched, headers)])
+
+    def put_many(self, entries: list[CacheEntry], replace: bool = True):
+        rows = [(entry.key, entry.fetched or time.time(), len(entry.body),
+                 json.dumps(cache_headers(entry.headers)) if entry.headers else None, compress_body(entry.body))
+                for entry in entries]
+        with self.lock, self.connection:
+            self.connection.execute("BEGIN")
+            self.connection.executemany(f"INSERT OR {'REPLACE' if replace else 'IGNORE'} into entries "
+                                        f"(Key,Fetched,Size,Headers,Body) VALUES (?,?,?,?,?)", rows)
+
+    def headers(self, key: str) -> dict:
+        with self.lock:
+            row = self.connection.execute("SELECT Headers from entries WHERE Key=?", (key,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else {}
+
+    def touch(self, key: str, headers=None, fetched: float = 0.0):
+        headers = cache_headers(headers)
+        if headers:
+            headers = json.dumps({**self.headers(key), **headers})
+        with self.lock:
+            self.connection.execute("UPDATE entries SET Fetched=?, Headers=coalesce(?, Headers) WHERE Key=?",
+                                    (fetched or time.time(), headers or None, key))
+
+    def delete(self, key: str):
+        with self.lock:
+            self.connection.execute("DELETE from entries WHERE Key=?", (key,))
+
+    def expire(self, older_than: float, validated_older_than: float | None = None) -> tuple[int, int]:
+        cmd = "DELETE from entries WHERE Fetched<?"
+        args = (older_than,)
+        if validated_older_than is not None:
+            cmd += (" and (Fetched<? or Headers is NULL or "
+                    "(instr(Headers, '\"ETag\"')=0 and instr(Headers, '\"Last-Modified\"')=0))")
+            args += (validated_older_than,)
+        with self.lock:
+            cleaned = self.connection.execute(cmd, args).rowcount
+            kept = self.connection.execute("SELECT count(*) from entries").fetchone()[0]
+        return cleaned, kept
+
+    def count(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT count(*) from entries").fetchone()[0]
+
+    def sizes(self) -> tuple[int, int]:
+        with self.lock:
+            row = self.connection.execute("SELECT sum(Size), sum(length(Body)) from entries").fetchone()
+        return row[0] or 0, row[1] or 0
+
+    def is_valid(self) -> bool:
+        return os.path.exists(self.filename)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class FileCacheStore(CacheStore):
+    """ The original layout, one file per entry in a two-level hex directory tree named after the cache,
+    with the headers, if any, in a .hdr file alongside. Fetch time is the file's timestamp """
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.cachedir = DIRS.get_cachedir(name)
+        self.ext = name.replace('Cache', '').lower()
+
+    def filename(self, key: str) -> str:
+        return os.path.join(self.cachedir, key[0], key[1], f"{key}.{self.ext}")
+
+    def get(self, key: str) -> CacheEntry | None:
+        filename = self.filename(key)
+        try:
+            fetched = os.stat(syspath(filename)).st_mtime
+            with open(syspath(filename), 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None
+        headers = None
+        try:
+            with open(syspath(f"{filename}.hdr")) as f:
+                headers = json.load(f)
+        except (OSError, ValueError):
+            pass
+        return self.entry(key, body, fetched, headers)
+
+    def fetched(self, key: str) -> float:
+        try:
+            return os.stat(syspath(self.filename(key))).st_mtime
+        except OSError:
+            return 0.0
+
+    def headers(self, key: str) -> dict:
+        try:
+            with open(syspath(f"{self.filename(key)}.hdr")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def put(self, key: str, body: bytes, headers=None, fetched: float = 0.0):
+        filename = self.filename(key)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(syspath(filename), 'wb') as f:
+            f.write(compress_body(body))
+        if headers:
+            with open(syspath(f"{filename}.hdr"), 'w') as f:
+                json.dump(cache_headers(headers), f)
+        if fetched:
+            os.utime(syspath(filename), (fetched, fetched))
+
+    def delete(self, key: str):
+        filename = self.filename(key)
+        for name in [filename, f"{filename}.hdr"]:
+            if os.path.exists(name):
+                remove_file(name)
+
+    def entries(self):
+        """ Yield the name of each entry file """
+        for i, j in itertools.product("0123456789abcdef", repeat=2):
+            dirname = os.path.join(self.cachedir, i, j)
+            if path_isdir(dirname):
+                for name in listdir(dirname):
+                    if name.endswith(f".{self.ext}"):
+                        yield os.path.join(dirname, name)
+
+    def touch(self, key: str, headers=None, fetched: float = 0.0):
+        filename = self.filename(key)
+        if not os.path.exists(filename):
+            return
+        headers = cache_headers(headers)
+        if headers:
+            with open(syspath(f"{filename}.hdr"), 'w') as f:
+                json.dump({**self.headers(key), **headers}, f)
+        fetched = fetched or time.time()
+        os.utime(syspath(filename), (fetched, fetched))
+
+    def expire(self, older_than: float, validated_older_than: float | None = None) -> tuple[int, int]:
+        cleaned = 0
+        kept = 0
+        for filename in self.entries():
+            limit = older_than
+            if validated_older_than is not None and conditional_headers(
+                    self.headers(os.path.basename(filename).split('.')[0])):
+                limit = validated_older_than
+            if os.stat(syspath(filename)).st_mtime < limit:
+                self.delete(os.path.basename(filename).split('.')[0])
+                cleaned += 1
+            else:
+                kept += 1
+        return cleaned, kept
+
+    def count(self) -> int:
+        return sum(1 for _ in self.entries())
+
+    def sizes(self) -> tuple[int, int]:
+        raw = 0
+        stored = 0
+        for filename in self.entries():
+            try:
+                length = os.path.getsize(syspath(filename))
+                with open(syspath(filename), 'rb') as f:
+                    head = f.read(COMPRESSED_HEADER.size)
+            except OSError:
+                continue
+            raw += raw_size(head, length)
+            stored += length
+        return raw, stored
+
+
+class CacheCounters:
+    """ Hits, misses and evictions for one cache. Hits served from the memory tier are also counted in hits """
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.memory_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.revalidations = 0
+        self.coalesced = 0
+
+    def hit(self, memory: bool = False):
+        with self.lock:
+            self.hits += 1
+            if memory:
+                self.memory_hits += 1
+
+    def miss(self):
+        with self.lock:
+            self.misses += 1
+
+    def revalidated(self):
+        """ A stale entry was confirmed unchanged by the server. It was counted as a miss already """
+        with self.lock:
+            self.revalidations += 1
+
+    def joined(self):
+        """ A request waited for an identical one already in flight, rather than fetching it again """
+        with self.lock:
+            self.coalesced += 1
+
+    def evicted(self, count: int = 1):
+        with self.lock:
+            self.evictions += count
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            stats = {'hits': self.hits, 'memory_hits': self.memory_hits, 'misses': self.misses,
+                     'evictions': self.evictions, 'revalidated': self.revalidations, 'coalesced': self.coalesced}
+        tier = TIERS.get(self.name)
+        stats['entries'], stats['bytes'] = (len(tier), tier.size) if tier else (0, 0)
+        return stats
+
+
+class MemoryTier:
+    """ The most recently used parsed responses of one cache, kept until their approximate size,
+    the length of the cached body, adds up to more than CACHE_MEMORY MB.
+    Values are shared between callers, so must not be modified """
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: str, expiry: int = 0):
+        """ Return the value for key, or None if there isn't one or it was fetched more than expiry seconds ago """
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            value, size, fetched = item
+            if expiry and fetched < time.time() - expiry:
+                del self.entries[key]
+                self.size -= size
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value, size: int, fetched: float = 0.0):
+        max_bytes = CONFIG.get_int('CACHE_MEMORY') * 1024 * 1024
+        if value is None or size > max_bytes:
+            self.delete(key)
+            return
+        evicted = 0
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old:
+                self.size -= old[1]
+            self.entries[key] = (value, size, fetched or time.time())
+            self.size += size
+            while self.size > max_bytes:
+                _, (_, oldsize, _) = self.entries.popitem(last=False)
+                self.size -= oldsize
+                evicted += 1
+        if evicted:
+            get_counters(self.name).evicted(evicted)
+
+    def delete(self, key: str):
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old:
+                self.size -= old[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+class FlightCall:
+    """ A call in progress, and its outcome once done """
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """ Concurrent callers asking for the same key share one call: the first runs it,
+    the others wait for it to finish and get the same result, or exception """
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, func, *args, **kwargs):
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = FlightCall()
+        if not leader:
+            get_counters(self.name).joined()
+            call.done.wait()
+            if call.error:
+                raise call.error
+            return call.result
+        try:
+            call.result = func(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self) -> int:
+        with self.lock:
+            return len(self.calls)
+
+
+class NegativeCache:
+    """ Remembers lookups that found nothing, eg a 404 or no cover from a source, so they aren't
+    repeated for NEGATIVE_CACHE_HOURS. Entries live in the NegativeCache store, keyed on source and key """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+
+    @staticmethod
+    def ttl() -> int:
+        return CONFIG.get_int('NEGATIVE_CACHE_HOURS') * 60 * 60
+
+    def count(self, source: str, item: str):
+        with self.lock:
+            counters = self.counters.setdefault(source, {'added': 0, 'hits': 0})
+            counters[item] += 1
+
+    def is_negative(self, source: str, key: str) -> bool:
+        """ True if a lookup of key at source found nothing within the last NEGATIVE_CACHE_HOURS """
+        ttl = self.ttl()
+        if not ttl:
+            return False
+        fetched = get_store('NegativeCache').fetched(md5_utf8(f"{source}:{key}"))
+        if fetched and fetched >= time.time() - ttl:
+            self.count(source, 'hits')
+            logging.getLogger('special.cache').debug(f"Negative cache hit for {source} {key}")
+            return True
+        return False
+
+    def add(self, source: str, key: str, reason: str = ''):
+        """ Remember that looking up key at source found nothing """
+        if self.ttl():
+            get_store('NegativeCache').put(md5_utf8(f"{source}:{key}"), reason.encode('utf-8'))
+            self.count(source, 'added')
+
+    def remove(self, source: str, key: str):
+        get_store('NegativeCache').delete(md5_utf8(f"{source}:{key}"))
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {source: dict(counters) for source, counters in sorted(self.counters.items())}
+
+
+class CacheIndex:
+    """ The files in the file caches, eg cover images, IRC results and work pages, with their size,
+    modification time and the ID they belong to, so cleaning doesn't have to walk the directories
+    and stat every file. A directory is only listed again when its modification time changes.
+    Files are in the top directory of a cache, or in a two-level hex tree below it.
+    Times of files overwritten in place are not updated until they are next checked """
+    # A directory changed this close to when it was listed may have changed again without its time moving on
+    MARGIN = 2.0
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.filename = DIRS.get_cachefile('', 'CacheIndex.db')
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(syspath(self.filename), timeout=20, check_same_thread=False,
+                                          isolation_level=None)
+        try:
+            self.connection.execute("PRAGMA journal_mode = WAL")
+            self.connection.execute("PRAGMA synchronous = NORMAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS files (Cache TEXT NOT NULL, Dir TEXT NOT NULL, "
+                                    "Name TEXT NOT NULL, Owner TEXT, Fetched REAL NOT NULL, Size INTEGER NOT NULL, "
+                                    "PRIMARY KEY (Cache, Dir, Name))")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS files_fetched ON files (Cache, Fetched)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS dirs (Cache TEXT NOT NULL, Dir TEXT NOT NULL, "
+                                    "Modified REAL NOT NULL, Listed REAL NOT NULL, PRIMARY KEY (Cache, Dir))")
+        except sqlite3.Error:
+            self.connection.close()
+            raise
+
+    @staticmethod
+    def subdirs(hexdirs: bool) -> list[str]:
+        return [i + j for i, j in itertools.product("0123456789abcdef", repeat=2)] if hexdirs else ['']
+
+    @staticmethod
+    def path(cache: str, subdir: str, name: str = '') -> str:
+        """ Return the full path of name in subdir of cache, where subdir is '' or two hex digits """
+        return os.path.join(DIRS.CACHEDIR, cache, *subdir, name)
+
+    @staticmethod
+    def subdir_query(hexdirs: bool) -> str:
+        return "Dir!=''" if hexdirs else "Dir=''"
+
+    def sync(self, cache: str, hexdirs: bool, deadline: float = 0.0) -> bool:
+        """ Bring the index of cache up to date with the directories that changed since they were last listed.
+        Returns False if it stopped at deadline before all the directories were checked """
+        for subdir in self.subdirs(hexdirs):
+            if deadline and time.time() > deadline:
+                return False
+            self.sync_dir(cache, subdir)
+        return True
+
+    def sync_dir(self, cache: str, subdir: str):
+        dirname = self.path(cache, subdir)
+        try:
+            modified = os.stat(syspath(dirname)).st_mtime
+        except OSError:
+            modified = 0.0
+        with self.lock:
+            row = self.connection.execute("SELECT Modified,Listed from dirs WHERE Cache=? and Dir=?",
+                                          (cache, subdir)).fetchone()
+        if row and row[0] == modified and row[1] - modified > self.MARGIN:
+            return
+        listed = time.time()
+        names = set(listdir(dirname)) if modified else set()
+        with self.lock:
+            known = {item[0] for item in self.connection.execute("SELECT Name from files WHERE Cache=? and Dir=?",
+                                                                 (cache, subdir))}
+        added = []
+        for name in names - known:
+            try:
+                info = os.stat(syspath(os.path.join(dirname, name)))
+            except OSError:
+                continue
+            if stat.S_ISREG(info.st_mode):
+                added.append((cache, subdir, name, name.split('.')[0], info.st_mtime, info.st_size))
+        gone = [(cache, subdir, name) for name in known - names]
+        with self.lock, self.connection:
+            self.connection.execute("BEGIN")
+            self.connection.executemany("DELETE from files WHERE Cache=? and Dir=? and Name=?", gone)
+            self.connection.executemany("INSERT OR REPLACE into files (Cache,Dir,Name,Owner,Fetched,Size) "
+                                        "VALUES (?,?,?,?,?,?)", added)
+            self.connection.execute("INSERT OR REPLACE into dirs (Cache,Dir,Modified,Listed) VALUES (?,?,?,?)",
+                                    (cache, subdir, modified, listed))
+        if added or gone:
+            self.logger.debug(f"Indexed {len(added)} new, {len(gone)} removed in {os.path.join(cache, subdir)}")
+
+    def files(self, cache: str, hexdirs: bool) -> list[tuple[str, str, str]]:
+        """ Return the subdir, name and owner of each file in cache """
+        with self.lock:
+            return self.connection.execute(f"SELECT Dir,Name,Owner from files WHERE Cache=? and "
+                                           f"{self.subdir_query(hexdirs)}", (cache,)).fetchall()
+
+    def names(self, cache: str) -> set[str]:
+        """ Return the names of the files in the top directory of cache """
+        return {item[1] for item in self.files(cache, False)}
+
+    def older_than(self, cache: str, hexdirs: bool, fetched: float) -> list[tuple[str, str, str]]:
+        """ Return the subdir, name and owner of each file in cache last modified before fetched """
+        with self.lock:
+            return self.connection.execute(f"SELECT Dir,Name,Owner from files WHERE Cache=? and Fetched<? and "
+                                           f"{self.subdir_query(hexdirs)}", (cache, fetched)).fetchall()
+
+    def count(self, cache: str, hexdirs: bool) -> int:
+        with self.lock:
+            return self.connection.execute(f"SELECT count(*) from files WHERE Cache=? and "
+                                           f"{self.subdir_query(hexdirs)}", (cache,)).fetchone()[0]
+
+    def update(self, cache: str, subdir: str, name: str, fetched: float, size: int):
+        with self.lock:
+            self.connection.execute("UPDATE files SET Fetched=?, Size=? WHERE Cache=? and Dir=? and Name=?",
+                                    (fetched, size, cache, subdir, name))
+
+    def remove(self, cache: str, subdir: str, name: str):
+        with self.lock:
+            self.connection.execute("DELETE from files WHERE Cache=? and Dir=? and Name=?", (cache, subdir, name))
+
+    def is_valid(self) -> bool:
+        return os.path.exists(self.filename)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+BACKENDS = {'sqlite': SqliteCacheStore, 'files': FileCacheStore}
+STORES = {}
+STORES_LOCK = threading.Lock()
+COUNTERS = {}
+TIERS = {}
+FLIGHTS = {}
+
+
+def backend_name() -> str:
+    name = CONFIG['CACHE_BACKEND'].lower()
+    return name if name in BACKENDS else 'sqlite'
+
+
+def get_store(name: str) -> CacheStore:
+    """ Return the store for the cache called name, eg JSONCache, using the configured backend """
+    key = (backend_name(), DIRS.CACHEDIR, name)
+    with STORES_LOCK:
+        store = STORES.get(key)
+        if store is None or not store.is_valid():
+            if store:
+                store.close()
+            store = BACKENDS[key[0]](name)
+            STORES[key] = store
+    return store
+
+
+def get_cache_index() -> CacheIndex:
+    """ Return the index of the file caches in the current cache directory """
+    key = ('index', DIRS.CACHEDIR, 'CacheIndex')
+    with STORES_LOCK:
+        index = STORES.get(key)
+        if index is None or not index.is_valid():
+            if index:
+                index.close()
+            index = CacheIndex()
+            STORES[key] = index
+    return index
+
+
+def close_stores():
+    """ Close all the open stores and the cache index, and empty the memory tiers, eg before deleting the cache directory """
+    with STORES_LOCK:
+        stores = list(STORES.values())
+        STORES.clear()
+        tiers = list(TIERS.values())
+    for store in stores:
+        store.close()
+    for tier in tiers:
+        tier.clear()
+
+
+def get_memory_tier(name: str) -> MemoryTier:
+    """ Return the in-memory tier of parsed responses for the cache called name """
+    with STORES_LOCK:
+        tier = TIERS.get(name)
+        if tier is None:
+            tier = TIERS[name] = MemoryTier(name)
+    return tier
+
+
+def get_flight(name: str) -> SingleFlight:
+    """ Return the single-flight group for fetches into the cache called name """
+    with STORES_LOCK:
+        flight = FLIGHTS.get(name)
+        if flight is None:
+            flight = FLIGHTS[name] = SingleFlight(name)
+    return flight
+
+
+def get_counters(name: str) -> CacheCounters:
+    """ Return the hit/miss counters for the cache called name, eg JSONCache or IRCCache """
+    with STORES_LOCK:
+        counters = COUNTERS.get(name)
+        if counters is None:
+            counters = COUNTERS[name] = CacheCounters(name)
+    return counters
+
+
+def cache_stats() -> dict:
+    """ Return the counters of each cache, by name """
+    with STORES_LOCK:
+        counters = sorted(COUNTERS.items())
+    return {name: item.get_stats() for name, item in counters}
+
+
+def cache_totals() -> tuple[int, int]:
+    """ Return the hits and misses of all the caches together """
+    stats = cache_stats().values()
+    return sum(item['hits'] for item in stats), sum(item['misses'] for item in stats)
+
+
+def migrate_hex_dir(store: CacheStore, batch: int = 500) -> int:
+    """ Move the entries from the old hex directory tree of store's cache into store, keeping their timestamps.
+    Anything already in store is newer, so isn't replaced. The directory tree is removed afterwards.
+    Returns the number of entries moved """
+    if isinstance(store, FileCacheStore):
+        return 0
+    legacy = FileCacheStore(store.name)
+    if not path_isdir(legacy.cachedir):
+        return 0
+    logger = logging.getLogger(__name__)
+    logger.info(f"Moving {store.name} files into {store.__class__.__name__}")
+    moved = 0
+    entries = []
+    for filename in legacy.entries():
+        entry = legacy.get(os.path.basename(filename).split('.')[0])
+        if entry:
+            entries.append(entry)
+        if len(entries) >= batch:
+            store.put_many(entries, replace=False)
+            moved += len(entries)
+            entries = []
+    if entries:
+        store.put_many(entries, replace=False)
+        moved += len(entries)
+    remove_dir(legacy.cachedir, remove_contents=True)
+    logger.info(f"Moved {moved} {store.name} {plural(moved, 'entry')}")
+    return moved
+
+
+NEGATIVE = NegativeCache()
@@ -34,6 +34,7 @@ from lazylibrarian.formatter import (
     plural,
     strip_quotes,
 )
+from lazylibrarian.ratelimit import rate_limit
 from lazylibrarian.telemetry import TELEMETRY
 
 
@@ -739,12 +740,4 @@ def cx_issue(url, issuenum):
 
 
 def cv_api_sleep():
-    time_now = time.time()
-    delay = time_now - lazylibrarian.TIMERS['LAST_CV']
-    if delay < 1.0:
-        sleep_time = 1.0 - delay
-        lazylibrarian.TIMERS['SLEEP_CV'] += sleep_time
-        cachelogger = logging.getLogger('special.cache')
-        cachelogger.debug(f"ComicVine sleep {sleep_time:.3f}, total {lazylibrarian.TIMERS['SLEEP_CV']:.3f}")
-        time.sleep(sleep_time)
-    lazylibrarian.TIMERS['LAST_CV'] = time_now
+    rate_limit('comicvine')
@@ -223,7 +223,7 @@ def search_comics(comicid=None):
     db = database.DBConnection()
     # noinspection PyBroadException
     try:
-        db.upsert("jobs", {"Start": time.time()}, {"Name": thread_name()})
+        database.WRITE_QUEUE.upsert("jobs", {"Start": time.time()}, {"Name": thread_name()})
         cmd = "SELECT ComicID,Title, aka from comics WHERE Status='Active'"
         if comicid:
             # single comic search
@@ -286,7 +286,7 @@ def search_comics(comicid=None):
 
             time.sleep(CONFIG.get_int('SEARCH_RATELIMIT'))
         logger.info("ComicSearch for Wanted items complete")
-        db.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
+        database.WRITE_QUEUE.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
     except Exception:
         logger.error(f'Unhandled exception in search_comics: {traceback.format_exc()}')
     finally:
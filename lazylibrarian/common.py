@@ -553,20 +553,21 @@ def only_punctuation(value):
 
 
 def cron_dbbackup():
-    db = database.DBConnection()
     try:
-        db.upsert("jobs", {'Start': time.time()}, {'Name': 'BACKUP'})
+        database.WRITE_QUEUE.upsert("jobs", {'Start': time.time()}, {'Name': 'BACKUP'})
         dbbackup('scheduled')
     finally:
-        db.upsert("jobs", {'Finish': time.time()}, {'Name': 'BACKUP'})
-        db.close()
+        database.WRITE_QUEUE.upsert("jobs", {'Finish': time.time()}, {'Name': 'BACKUP'})
 
 
 def dbbackup(source='lazylibrarian'):
     db = database.DBConnection()
-    fname, err = db.backup()
+    try:
+        fname, err = db.backup(progress=lambda msg: lazylibrarian.JOB_PROGRESS.update(BACKUP=msg))
+    finally:
+        lazylibrarian.JOB_PROGRESS.pop('BACKUP', None)
+        db.close()
     backup_file = ''
-    err = ''
     if fname:
         backup_file = f"{source}_{time.asctime().replace(' ', '_').replace(':', '_')}.tgz"
         backup_file = os.path.join(DIRS.DATADIR, backup_file)
@@ -111,6 +111,7 @@ BASE_DEFAULTS: list[ConfigItem] = [
     ConfigBool('General', 'SSL_VERIFY', 1),
     ConfigRangedInt('General', 'HTTP_TIMEOUT', 30, 30, 100000),
     ConfigInt('General', 'HTTP_EXT_TIMEOUT', 90),
+    ConfigBool('General', 'DB_WRITE_QUEUE', 0),  # Queue small database writes for a single writer thread
 
     ConfigRangedInt('WebServer', 'HTTP_PORT', 5299, 21, 65535),
     ConfigStr('WebServer', 'HTTP_HOST', '0.0.0.0'),
@@ -159,6 +160,12 @@ BASE_DEFAULTS: list[ConfigItem] = [
     ConfigStr('General', 'EXT_PREPROCESS', ''),
     ConfigStr('General', 'GIT_PROGRAM', ''),
     ConfigInt('General', 'CACHE_AGE', 30),
+    ConfigStr('General', 'CACHE_BACKEND', 'sqlite'),
+    ConfigInt('General', 'CACHE_MEMORY', 32),
+    ConfigBool('General', 'CACHE_COMPRESS', 1),
+    ConfigInt('General', 'NEGATIVE_CACHE_HOURS', 24),
+    ConfigInt('General', 'CACHE_CLEAN_SECONDS', 600),
+    ConfigInt('General', 'PREFETCH_AHEAD', 3),
     ConfigInt('General', 'BACKUP_DB', 30),
     ConfigInt('General', 'TASK_AGE', 2),
     ConfigBool('General', 'OPF_TAGS', 1),
@@ -381,6 +388,9 @@ BASE_DEFAULTS: list[ConfigItem] = [
     # Interval is not used
     ConfigBool('SearchScan', 'DELAYSEARCH', 0),
     ConfigInt('SearchScan', 'SEARCH_RATELIMIT', 0),
+    ConfigInt('SearchScan', 'SEARCH_THREADS', 4),
+    ConfigInt('SearchScan', 'SEARCH_TIMEOUT', 300),
+    ConfigInt('SearchScan', 'SEARCH_BY_AUTHOR', 3),
     ConfigBool('LibraryScan', 'FULL_SCAN', 0),
     ConfigBool('LibraryScan', 'ADD_AUTHOR', 1),
     ConfigBool('LibraryScan', 'ADD_SERIES', 1),
@@ -525,6 +535,7 @@ BASE_DEFAULTS: list[ConfigItem] = [
     ConfigBool('API', 'HC_SYNC', 0),
     ConfigBool('API', 'HC_SYNCREADONLY', 0),
     ConfigInt('API', 'HC_SYNC_LIMIT', 10),
+    ConfigInt('API', 'HC_BATCH', 25),
     ConfigStr('API', 'GR_API', 'ckvsiSDsuqh7omh74ZZ6Q'),
     ConfigBool('API', 'GR_SYNC', 0),
     ConfigBool('API', 'GR_SYNCUSER', 0),
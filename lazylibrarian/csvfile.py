@@ -114,7 +114,7 @@ def restore_table(table, savedir=None, status=None):
 
         logger.debug(f'Reading file {csvfile}')
         csvreader = reader(open(csvfile, encoding='utf-8', newline=''))
-        count = 0
+        rows = []
         for row in csvreader:
             if csvreader.line_num == 1:
                 headers = row
@@ -130,8 +130,7 @@ def restore_table(table, savedir=None, status=None):
                                       "IssueStatus": item['IssueStatus'],
                                       "CoverPage": item['CoverPage'],
                                       "Language": item['Language']}
-                    db.upsert("magazines", new_value_dict, control_value_dict)
-                    count += 1
+                    rows.append((new_value_dict, control_value_dict))
 
                 elif table == 'users':
                     control_value_dict = {"UserID": item['UserID']}
@@ -144,11 +143,12 @@ def restore_table(table, savedir=None, status=None):
                                       "CalibreToRead": item['CalibreToRead'],
                                       "BookType": item['BookType']
                                       }
-                    db.upsert("users", new_value_dict, control_value_dict)
-                    count += 1
+                    rows.append((new_value_dict, control_value_dict))
                 else:
                     logger.error(f"Invalid table [{table}]")
                     return 0
+        db.upsert_many(table, rows)
+        count = len(rows)
         msg = f"Imported {count} {plural(count, 'item')} from {csvfile}"
         logger.info(msg)
         return count
@@ -16,32 +16,547 @@
 
 import logging
 import os
+import re
 import sqlite3
 import threading
 import time
 import traceback
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import contextmanager, suppress
+from functools import lru_cache
+from queue import Empty, Queue
 
 # DO NOT import from common in this module, circular import
 from lazylibrarian.filesystem import DIRS
 from lazylibrarian.processcontrol import get_info_on_caller
 
-db_lock = threading.Lock()
 
-
-class DBConnection:
+class TimedLock:
+    """ A re-entrant lock that keeps track of how long callers had to wait for it """
     def __init__(self):
+        self.lock = threading.RLock()
+        self.local = threading.local()
+        self.acquired = 0
+        self.contended = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def __enter__(self):
+        waited = 0.0
+        if not self.lock.acquire(blocking=False):
+            start = time.perf_counter()
+            self.lock.acquire()
+            waited = time.perf_counter() - start
+        self.local.waited = waited
+        # counters are only updated while holding the lock
+        self.acquired += 1
+        if waited:
+            self.contended += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.lock.release()
+
+    def last_wait(self) -> float:
+        """ How long the calling thread waited the last time it took the lock """
+        return getattr(self.local, 'waited', 0.0)
+
+    def get_stats(self) -> dict:
+        return {'acquired': self.acquired, 'contended': self.contended,
+                'wait_total': round(self.wait_total, 3), 'wait_max': round(self.wait_max, 3),
+                'wait_avg': round(self.wait_total / self.contended, 4) if self.contended else 0.0}
+
+
+@lru_cache(maxsize=2048)
+def query_template(query: str) -> str:
+    """ Reduce a query to a template by replacing literals with ?, so that queries built
+    with different values in the text are counted together """
+    # _action() turns double quotes into single ones, do the same so the templates match
+    template = re.sub(r"'(?:[^']|'')*'", '?', query.replace('"', "'"))
+    template = re.sub(r'\b\d+(?:\.\d+)?\b', '?', template)
+    template = re.sub(r'(?i)\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', 'IN (?...)', template)
+    return ' '.join(template.split())
+
+
+class QueryProfiler:
+    """ Timings per query template: count, total/p50/p99 latency, rows and time waiting for db_lock """
+    def __init__(self, max_templates: int = 500, max_samples: int = 500):
+        self.max_templates = max_templates
+        self.max_samples = max_samples
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.templates = {}
+
+    def record(self, query: str, elapsed: float, rows: int = 0, lock_wait: float = 0.0):
+        template = query_template(query)
+        with self.lock:
+            entry = self.templates.get(template)
+            if entry is None:
+                if len(self.templates) >= self.max_templates:
+                    # Don't let queries with unusual text fill memory, count them together
+                    template = 'other'
+                    entry = self.templates.get(template)
+                if entry is None:
+                    entry = {'count': 0, 'total': 0.0, 'rows': 0, 'lock_wait': 0.0,
+                             'samples': deque(maxlen=self.max_samples)}
+                    self.templates[template] = entry
+            entry['count'] += 1
+            entry['total'] += elapsed
+            entry['rows'] += rows
+            entry['lock_wait'] += lock_wait
+            entry['samples'].append(elapsed)
+
+    def add_rows(self, query: str, rows: int):
+        """ Add the rows fetched from a SELECT to its template """
+        template = query_template(query)
+        with self.lock:
+            entry = self.templates.get(template) or self.templates.get('other')
+            if entry:
+                entry['rows'] += rows
+
+    def reset(self):
+        with self.lock:
+            self.templates = {}
+            self.started = time.time()
+
+    @staticmethod
+    def percentile(samples: list, pct: int) -> float:
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+    def get_stats(self, limit: int = 0) -> list:
+        """ Return a list of dicts, one per template, slowest total time first """
+        with self.lock:
+            items = [(template, dict(entry), sorted(entry['samples'])) for template, entry in self.templates.items()]
+        result = []
+        for template, entry, samples in items:
+            result.append({'query': template, 'count': entry['count'],
+                           'total': round(entry['total'], 4),
+                           'p50': round(self.percentile(samples, 50), 4),
+                           'p99': round(self.percentile(samples, 99), 4),
+                           'rows': entry['rows'],
+                           'lock_wait': round(entry['lock_wait'], 4)})
+        result.sort(key=lambda x: x['total'], reverse=True)
+        if limit:
+            result = result[:limit]
+        return result
+
+    def report(self, limit: int = 25) -> list:
+        """ Return the stats as lines of text suitable for display """
+        stats = self.get_stats(limit)
+        lines = [f"Query timings since {time.ctime(self.started)}, times in seconds",
+                 f"{'Count':>8} {'Total':>9} {'p50':>7} {'p99':>7} {'Rows':>9} {'Lock':>8}  Query"]
+        for item in stats:
+            lines.append(f"{item['count']:>8} {item['total']:>9.3f} {item['p50']:>7.4f} {item['p99']:>7.4f} "
+                         f"{item['rows']:>9} {item['lock_wait']:>8.3f}  {item['query']}")
+        return lines
+
+
+PROFILER = QueryProfiler()
+
+AUTH_READ = {sqlite3.SQLITE_READ}
+AUTH_WRITE = {sqlite3.SQLITE_INSERT, sqlite3.SQLITE_UPDATE, sqlite3.SQLITE_DELETE}
+
+
+def table_access(connection: sqlite3.Connection, query: str, args=None) -> tuple[frozenset, frozenset]:
+    """ Return the (lowercase) names of the tables query reads and writes, as sqlite sees them
+    when compiling it, so tables used through views, triggers and cascading deletes are included.
+    Compiles EXPLAIN query, so nothing is run. Raises sqlite3.Error if query doesn't compile """
+    reads = set()
+    writes = set()
+
+    def authorizer(action, arg1, _arg2, _dbname, _source):
+        if arg1 and action in AUTH_READ:
+            reads.add(arg1.lower())
+        elif arg1 and action in AUTH_WRITE:
+            writes.add(arg1.lower())
+        return sqlite3.SQLITE_OK
+
+    connection.set_authorizer(authorizer)
+    try:
+        connection.execute(f'EXPLAIN {query}', args or ()).fetchall()
+    finally:
+        connection.set_authorizer(None)
+    return frozenset(reads), frozenset(writes)
+
+
+class QueryCache:
+    """ Results of SELECTs that are run often but read tables that rarely change, such as the counts
+    on the index, stats and OPDS pages. Each table has a generation number which goes up after every
+    committed write to it, a cached result is only used while all the tables it read are unchanged.
+    Least recently used results are dropped when there are more than max_entries """
+    def __init__(self, max_entries: int = 256, max_tables: int = 2048):
+        self.max_entries = max_entries
+        self.max_tables = max_tables
+        self.lock = threading.Lock()
+        self.generations = {}
+        # goes up when everything is invalidated at once
+        self.epoch = 0
+        self.entries = OrderedDict()
+        # tables read and written per (dbfile, query template)
+        self.tables = {}
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'evicted': 0}
+
+    def access(self, connection: sqlite3.Connection, dbfile: str, query: str, args=None):
+        """ Return the tables query reads and writes, or None if they can't be worked out """
+        key = (dbfile, query_template(query))
+        tables = self.tables.get(key)
+        if tables is None:
+            try:
+                tables = table_access(connection, query, args)
+            except sqlite3.Error:
+                return None
+            with self.lock:
+                if len(self.tables) >= self.max_tables:
+                    self.tables.clear()
+                self.tables[key] = tables
+        return tables
+
+    def generation(self, dbfile: str, tables) -> tuple:
+        """ The current generation of each table, to store with a result read from them """
+        with self.lock:
+            return self.current(dbfile, tables)
+
+    def current(self, dbfile: str, tables) -> tuple:
+        # call holding self.lock
+        return self.epoch, tuple(self.generations.get((dbfile, table), 0) for table in sorted(tables))
+
+    def changed(self, dbfile: str, tables):
+        """ Invalidate results that read any of tables, call once the change is committed """
+        with self.lock:
+            for table in tables:
+                key = (dbfile, table)
+                self.generations[key] = self.generations.get(key, 0) + 1
+
+    def get(self, dbfile: str, query: str, args, tables):
+        """ Return the cached rows for query, or None if not cached or out of date """
+        key = (dbfile, query, args)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                generation, rows = entry
+                if generation == self.current(dbfile, tables):
+                    self.entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return rows
+                del self.entries[key]
+                self.stats['stale'] += 1
+            self.stats['misses'] += 1
+        return None
+
+    def put(self, dbfile: str, query: str, args, generation: tuple, rows: list):
+        key = (dbfile, query, args)
+        with self.lock:
+            self.entries[key] = (generation, rows)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats['evicted'] += 1
+
+    def clear(self):
+        """ Forget everything, eg after a schema change """
+        with self.lock:
+            self.entries.clear()
+            self.tables.clear()
+            self.epoch += 1
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self.entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] * 100 / lookups, 1) if lookups else 0.0
+        return stats
+
+
+QUERY_CACHE = QueryCache()
+
+# Serialises all writes. Plain SELECTs don't take it, they use a separate read-only connection
+db_lock = TimedLock()
+
+# Connections unused for longer than this many seconds are closed by the pool
+POOL_MAX_IDLE = 300
+# How often, in seconds, the pool looks for idle connections and dead threads
+POOL_PRUNE_INTERVAL = 60
+SQLITE_HEADER = b'SQLite format 3\x00'
+# Pages copied per backup step, and seconds to pause between steps so other threads get a turn
+BACKUP_PAGES = 2048
+BACKUP_PAUSE = 0.01
+# Rows fetched at a time by DBConnection.iterate()
+ITERATE_CHUNK = 500
+# INSERT ... ON CONFLICT DO UPDATE needs sqlite 3.24
+HAS_UPSERT = sqlite3.sqlite_version_info >= (3, 24, 0)
+# Unique column sets per (dbfile, table), cleared on any schema change
+UNIQUE_KEYS: dict[tuple[str, str], list[set]] = {}
+# Columns held in the full text index for each table, kept in step by triggers created in dbupgrade
+FTS_COLUMNS = {'books': ['BookName', 'BookSub', 'AuthorName', 'SeriesName', 'BookGenre'],
+               'authors': ['AuthorName', 'AKA'],
+               'series': ['SeriesName']}
+# Columns to substring match if there is no full text index
+FTS_FALLBACK = {'books': ['BookName', 'BookSub', 'BookGenre'],
+                'authors': ['AuthorName', 'AKA'],
+                'series': ['SeriesName']}
+
+
+def fts5_available() -> bool:
+    """ Return True if this sqlite was built with the fts5 extension """
+    try:
+        conn = sqlite3.connect(':memory:')
+        conn.execute('CREATE VIRTUAL TABLE fts_test USING fts5(words)')
+        conn.close()
+        return True
+    except sqlite3.Error:
+        return False
+
+
+HAS_FTS5 = fts5_available()
+# remove_diacritics 2 also folds letters with more than one accent, needs sqlite 3.27
+FTS_TOKENIZE = "unicode61 remove_diacritics 2" if sqlite3.sqlite_version_info >= (3, 27, 0) else \
+    "unicode61 remove_diacritics 1"
+
+
+def fts_match(text: str) -> str:
+    """ Turn text typed by a user into an fts5 MATCH expression. Each word is quoted so
+        punctuation and fts operators are taken literally, and prefix matched so a partly
+        typed word still finds something. Single letters are only matched as whole words,
+        as a one letter prefix matches a large part of any library. All the words have to match """
+    return ' '.join(f'"{word}"*' if len(word) > 1 else f'"{word}"' for word in re.findall(r'\w+', text))
+
+
+def fts_filter(table: str, text: str) -> tuple[str, list]:
+    """ Return an sql condition and its args limiting table to rows matching text,
+        using the full text index if we have one, or a substring match if not """
+    match = fts_match(text) if HAS_FTS5 else ''
+    if match:
+        return f"{table}.rowid IN (SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH ?)", [match]
+    columns = FTS_FALLBACK[table]
+    cond = ' or '.join(f"instr(lower({table}.{column}), ?) > 0" for column in columns)
+    return f"({cond})", [text.lower()] * len(columns)
+
+
+def fts_join(table: str, text: str) -> tuple[str, list]:
+    """ Return a JOIN clause and its args limiting table to rows matching text.
+        The join is aliased fts and has a rank column, ORDER BY fts.rank for best match first.
+        Without a full text index all matches have the same rank """
+    match = fts_match(text) if HAS_FTS5 else ''
+    if match:
+        return (f" JOIN (SELECT rowid as ftsid, rank FROM {table}_fts WHERE {table}_fts MATCH ?) AS fts "
+                f"ON fts.ftsid = {table}.rowid ", [match])
+    cond, args = fts_filter(table, text)
+    return (f" JOIN (SELECT rowid as ftsid, 0 as rank FROM {table} WHERE {cond}) AS fts "
+            f"ON fts.ftsid = {table}.rowid ", args)
+
+
+def is_select(query: str) -> bool:
+    """ Return True if query is a plain SELECT, which can run on a read-only connection """
+    return query.lstrip()[:6].upper() == 'SELECT'
+
+
+def is_schema_change(query: str) -> bool:
+    """ Return True if query creates, drops or alters a table or index """
+    words = query.split(None, 1)
+    return bool(words) and words[0].upper() in ['CREATE', 'DROP', 'ALTER']
+
+
+class PooledConnection:
+    """ A sqlite connection owned by one thread, plus what the pool needs to know about it """
+    def __init__(self, connection: sqlite3.Connection, dbfile: str, thread: threading.Thread,
+                 readonly: bool = False):
+        self.connection = connection
+        self.dbfile = dbfile
+        self.readonly = readonly
+        self.thread = thread
+        self.users = 0
+        self.transaction_depth = 0
+        # tables written in the open transaction(), for QUERY_CACHE once it commits
+        self.changed_tables = set()
+        self.detached = False
+        self.last_used = time.time()
+        self.fileinfo = file_signature(dbfile)
+
+
+def file_signature(dbfile: str):
+    """ Return (device, inode, size, mtime) for dbfile, or None if it can't be read """
+    try:
+        st = os.stat(dbfile)
+    except OSError:
+        return None
+    return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def has_sqlite_header(dbfile: str) -> bool:
+    """ Return True if dbfile starts with the sqlite magic string """
+    try:
+        with open(dbfile, 'rb') as f:
+            return f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+    except OSError:
+        return False
+
+
+class ConnectionPool:
+    """ Keep one sqlite connection per thread and database file, so DBConnection() does not have
+    to connect and set up the PRAGMAs every time. Several DBConnection objects in the same thread
+    share the connection; it goes back to the pool when the last of them is closed.
+    Each thread can also have a read-only connection, used for SELECTs outside of db_lock """
+    def __init__(self, max_idle: int = POOL_MAX_IDLE, prune_interval: int = POOL_PRUNE_INTERVAL):
+        self.max_idle = max_idle
+        self.prune_interval = prune_interval
+        self.lock = threading.Lock()
+        self.entries: dict[tuple[int, str, bool], PooledConnection] = {}
+        self.last_prune = time.time()
+        self.logger = logging.getLogger(__name__)
+        self.stats = {'opened': 0, 'reused': 0, 'closed_idle': 0, 'closed_dead': 0, 'unhealthy': 0}
+
+    @staticmethod
+    def connect(dbfile: str, readonly: bool = False) -> sqlite3.Connection:
+        # The pool makes sure a connection is only used by one thread at a time, but it may
+        # have to close connections belonging to threads that have exited
+        connection = sqlite3.connect(dbfile, timeout=20, check_same_thread=False)
         try:
-            self.connection = sqlite3.connect(DIRS.get_dbfile(), timeout=20)
-            # Use write-ahead logging to do fewer disk writes
-            self.connection.execute("PRAGMA journal_mode = WAL")
-            # sync less often as using WAL mode
-            self.connection.execute("PRAGMA synchronous = NORMAL")
+            if readonly:
+                # WAL mode lets readers run alongside the writer. Make sure nothing writes this way
+                connection.execute("PRAGMA query_only = ON")
+            else:
+                # Use write-ahead logging to do fewer disk writes
+                connection.execute("PRAGMA journal_mode = WAL")
+                # sync less often as using WAL mode
+                connection.execute("PRAGMA synchronous = NORMAL")
             # 32,384 pages of cache
-            self.connection.execute(f"PRAGMA cache_size=-{32 * 1024}")
+            connection.execute(f"PRAGMA cache_size=-{32 * 1024}")
             # for cascade deletes
-            self.connection.execute("PRAGMA foreign_keys = ON")
-            self.connection.execute("PRAGMA temp_store = 2")  # memory
-            self.connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA foreign_keys = ON")
+            connection.execute("PRAGMA temp_store = 2")  # memory
+            connection.row_factory = sqlite3.Row
+        except Exception:
+            connection.close()
+            raise
+        return connection
+
+    def is_healthy(self, entry: PooledConnection) -> bool:
+        """ Check a pooled connection still points at the database file on disk.
+        The file may have been deleted, replaced or overwritten (restore, tests) since it was opened """
+        fileinfo = file_signature(entry.dbfile)
+        if not fileinfo or entry.fileinfo is None or fileinfo[:2] != entry.fileinfo[:2]:
+            return False
+        if fileinfo != entry.fileinfo:
+            # Size or timestamp changed, which is usually a checkpoint, but make sure it's still a database
+            if not has_sqlite_header(entry.dbfile):
+                return False
+            entry.fileinfo = fileinfo
+        return True
+
+    def acquire(self, dbfile: str, readonly: bool = False) -> PooledConnection:
+        """ Return the calling thread's connection to dbfile, opening one if needed """
+        key = (threading.get_ident(), dbfile, readonly)
+        discard = None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and not self.is_healthy(entry):
+                # Anyone still holding it keeps it until they close, new users get a fresh connection
+                self.entries.pop(key)
+                entry.detached = True
+                if not entry.users:
+                    discard = entry
+                self.stats['unhealthy'] += 1
+                entry = None
+                # the database was replaced, nothing cached from it is valid
+                QUERY_CACHE.clear()
+            if entry:
+                entry.users += 1
+                entry.last_used = time.time()
+                self.stats['reused'] += 1
+        if discard:
+            self.close_entry(discard)
+        if entry:
+            self.prune()
+            return entry
+
+        connection = self.connect(dbfile, readonly)
+        entry = PooledConnection(connection, dbfile, threading.current_thread(), readonly)
+        entry.users = 1
+        with self.lock:
+            self.entries[key] = entry
+            self.stats['opened'] += 1
+        self.prune()
+        return entry
+
+    def release(self, entry: PooledConnection):
+        """ The owning thread has finished with one use of this connection """
+        with self.lock:
+            entry.users = max(entry.users - 1, 0)
+            entry.last_used = time.time()
+            if entry.users:
+                return
+            if entry.detached:
+                self.close_entry(entry)
+            elif entry.connection.in_transaction:
+                # Closing a connection used to discard uncommitted work, keep it that way
+                entry.connection.rollback()
+
+    def prune(self, force: bool = False):
+        """ Close connections that have been idle too long, or whose thread has exited.
+        A dead thread's connection is closed even if still in use, as it was closed by another thread
+        or never closed, and no one else can release it """
+        now = time.time()
+        if not force and now - self.last_prune < self.prune_interval:
+            return
+        expired = []
+        with self.lock:
+            self.last_prune = now
+            for key, entry in list(self.entries.items()):
+                if not entry.thread.is_alive():
+                    self.stats['closed_dead'] += 1
+                elif entry.users:
+                    continue
+                elif now - entry.last_used > self.max_idle:
+                    self.stats['closed_idle'] += 1
+                else:
+                    continue
+                expired.append(self.entries.pop(key))
+        for entry in expired:
+            self.close_entry(entry)
+
+    def close_entry(self, entry: PooledConnection):
+        try:
+            entry.connection.close()
+        except sqlite3.Error as e:
+            self.logger.debug(f'Error closing pooled connection: {str(e)}')
+
+    def close_all(self):
+        """ Close every pooled connection, eg at shutdown """
+        with self.lock:
+            entries = list(self.entries.values())
+            self.entries.clear()
+        QUERY_CACHE.clear()
+        for entry in entries:
+            entry.detached = True
+            self.close_entry(entry)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+            stats['active'] = sum(1 for entry in self.entries.values() if entry.users)
+            stats['idle'] = len(self.entries) - stats['active']
+            stats['readers'] = sum(1 for entry in self.entries.values() if entry.readonly)
+        return stats
+
+
+POOL = ConnectionPool()
+
+
+class DBConnection:
+    def __init__(self):
+        try:
+            self.dbfile = DIRS.get_dbfile()
+            self.pooled = POOL.acquire(self.dbfile)
+            self.connection = self.pooled.connection
+            # read-only connection, opened on first use
+            self.pooled_reader = None
+            self.collations = {}
             try:
                 self.dblog = DIRS.get_logfile('database.log')
             except Exception:
@@ -58,7 +573,6 @@ class DBConnection:
             logger.debug(str(e))
             logger.debug(DIRS.get_dbfile())
             logger.debug(str(os.stat(DIRS.get_dbfile())))
-            self.connection.close()
             raise e
 
     def __del__(self):
@@ -68,51 +582,161 @@ class DBConnection:
 
     def close(self):
         self.dbcommslogger.debug('close')
-        with db_lock:
-            self.opened -= 1
-            try:
-                if self.threadid != threading.get_ident():
-                    # Don't attempt to close; an error will be thrown
-                    self.logger.error(f'The wrong thread is closing the db connection: {self.threadname}, '
-                                      f'opened by {threading.current_thread().name}')
-                else:
-                    self.connection.close()
-            except sqlite3.ProgrammingError as e:
-                self.logger.error(f'Error closing database, {str(e)}')
+        if self.opened <= 0:
+            return
+        self.opened -= 1
+        if self.threadid != threading.get_ident():
+            # Don't attempt to release; the connection belongs to the other thread
+            self.logger.error(f'The wrong thread is closing the db connection: {self.threadname}, '
+                              f'opened by {threading.current_thread().name}')
+        else:
+            POOL.release(self.pooled)
+            if self.pooled_reader:
+                POOL.release(self.pooled_reader)
+                self.pooled_reader = None
+
+    def create_collation(self, name: str, func):
+        """ Register a collation on this connection, and on the read connection if/when it is opened """
+        self.collations[name] = func
+        self.connection.create_collation(name, func)
+        if self.pooled_reader:
+            self.pooled_reader.connection.create_collation(name, func)
+
+    def reader(self) -> sqlite3.Connection:
+        """ Return the read-only connection for this thread, opening it if needed """
+        if not self.pooled_reader:
+            self.pooled_reader = POOL.acquire(self.dbfile, readonly=True)
+            for name, func in self.collations.items():
+                self.pooled_reader.connection.create_collation(name, func)
+        return self.pooled_reader.connection
 
     def commit(self):
         self.dbcommslogger.debug('commit')
         with db_lock:
+            if self.pooled.transaction_depth:
+                # transaction() commits when it ends
+                return
             self.connection.commit()
 
+    @contextmanager
+    def transaction(self):
+        """ Group writes into a single commit:
+            with db.transaction():
+                db.action(...)
+                db.upsert(...)
+        db_lock is held until the block ends, and everything is rolled back if it raises.
+        Nested blocks, in this or any other DBConnection in the same thread, join the outer one.
+        Note PRAGMA foreign_keys and VACUUM can't be used inside a transaction """
+        with db_lock:
+            pooled = self.pooled
+            pooled.transaction_depth += 1
+            try:
+                if pooled.transaction_depth == 1:
+                    if self.connection.in_transaction:
+                        # something left a transaction open, don't let it get mixed up with ours
+                        self.connection.commit()
+                    self.dbcommslogger.debug('begin')
+                    self.connection.execute('BEGIN IMMEDIATE')
+                yield self
+            except BaseException:
+                if pooled.transaction_depth == 1:
+                    self.dbcommslogger.debug('rollback')
+                    self.connection.rollback()
+                raise
+            else:
+                if pooled.transaction_depth == 1:
+                    self.dbcommslogger.debug('commit')
+                    self.connection.commit()
+                    QUERY_CACHE.changed(self.dbfile, pooled.changed_tables)
+            finally:
+                if pooled.transaction_depth == 1:
+                    pooled.changed_tables.clear()
+                pooled.transaction_depth -= 1
+
     # wrapper function with lock
     def action(self, query: str, args=None, suppress=None):
         if not query:
             return None
         with db_lock:
-            return self._action(query, args, suppress)
+            if is_schema_change(query):
+                UNIQUE_KEYS.clear()
+            return self._action(query, args, suppress, lock_wait=db_lock.last_wait())
 
-    def progress(self, status, remaining, total):
-        self.dbcommslogger.debug(f'Copied {total-remaining} of {total} pages...')
+    def executemany(self, query: str, args_list, suppress=None):
+        """ Run query once for each set of args in args_list, all in one transaction """
+        args_list = list(args_list)
+        if not query or not args_list:
+            return None
+        with self.transaction():
+            return self._action(query, args_list, suppress, many=True, lock_wait=db_lock.last_wait())
 
-    def backup(self):
-        filename = f"lazylibrarian_{time.asctime().replace(' ', '_').replace(':', '_')}.db"
-        filename = os.path.join(DIRS.DATADIR, filename)
-        _ = self.connection.execute('vacuum')
-        bck = sqlite3.connect(filename)
+    def read_action(self, query: str, args=None):
+        """ Run a SELECT without taking db_lock, using the read-only connection.
+        Anything else, or a SELECT inside an open write transaction, goes through action() """
+        if not query:
+            return None
+        if not is_select(query) or self.connection.in_transaction:
+            return self.action(query, args)
+        return self._action(query, args, connection=self.reader())
+
+    def backup(self, filename: str = '', progress=None) -> tuple[str, str]:
+        """ Copy the database to filename, default a timestamped file in DATADIR.
+        The copy is read from one snapshot held open on its own connection, so in WAL mode writers
+        carry on as normal and their commits don't restart the backup.
+        progress, if given, is called with a status message after each step.
+        Returns filename and an error message, filename is empty if the backup failed """
+        if not filename:
+            filename = f"lazylibrarian_{time.asctime().replace(' ', '_').replace(':', '_')}.db"
+            filename = os.path.join(DIRS.DATADIR, filename)
+        page_size = 4096
         msg = ''
-        with db_lock:
-            try:
-                self.connection.backup(bck, pages=1, progress=self.progress)
-            except Exception as err:
-                msg = str(err)
-        bck.close()
+        source = sqlite3.connect(self.dbfile, isolation_level=None)
+        bck = sqlite3.connect(filename)
+        try:
+            source.execute('BEGIN')
+            # reading a table starts the transaction, which fixes the snapshot we copy
+            source.execute('SELECT count(*) from sqlite_master').fetchone()
+            page_size = source.execute('PRAGMA page_size').fetchone()[0]
+            start = time.time()
+
+            def step(status, remaining, total):
+                done = total - remaining
+                elapsed = time.time() - start
+                rate = done * page_size / elapsed / 1048576 if elapsed else 0.0
+                eta = remaining * elapsed / done if done else 0.0
+                status_msg = f'Copied {done} of {total} pages, {rate:.1f}MB/s, eta {eta:.0f}s'
+                self.dbcommslogger.debug(status_msg)
+                if progress:
+                    progress(status_msg)
+                if remaining:
+                    # let other threads in
+                    time.sleep(BACKUP_PAUSE)
+
+            source.backup(bck, pages=BACKUP_PAGES, progress=step)
+            source.execute('COMMIT')
+        except Exception as err:
+            msg = str(err)
+        finally:
+            bck.close()
+            source.close()
+
         if msg:
+            with suppress(FileNotFoundError):
+                os.remove(filename)
             return '', msg
         return filename, msg
 
     # do not use directly, use through action() or upsert() which add lock
-    def _action(self, query: str, args=None, suppress=None):
+    def _action(self, query: str, args=None, suppress=None, connection=None, many=False, lock_wait=0.0):
+        if connection is None:
+            connection = self.connection
+        execute = connection.executemany if many else connection.execute
+        # inside transaction() the commit or rollback happens when the block ends
+        in_transaction = connection is self.connection and self.pooled.transaction_depth
+        if many:
+            logargs = f'{len(args)} rows'
+        else:
+            logargs = args
         sql_result = None
         attempt = 0
         start = time.time()
@@ -124,22 +748,26 @@ class DBConnection:
 
         while attempt < 5:
             try:
-                if not args:
+                if in_transaction:
+                    sql_result = execute(query, args) if args else execute(query)
+                elif not args:
                     # context manager adds commit() on success or rollback() on exception
-                    with self.connection:
-                        sql_result = self.connection.execute(query)
+                    with connection:
+                        sql_result = execute(query)
                 else:
-                    with self.connection:
-                        sql_result = self.connection.execute(query, args)
+                    with connection:
+                        sql_result = execute(query, args)
 
                 elapsed = time.time() - start
-                self.dbcommslogger.debug(f'#{attempt} {elapsed:.4f} {query} [{args}]')
+                self.dbcommslogger.debug(f'#{attempt} {elapsed:.4f} {query} [{logargs}]')
+                # rowcount is -1 for SELECTs, match() and select() add the rows they fetch
+                PROFILER.record(query, elapsed, max(sql_result.rowcount, 0), lock_wait)
                 break
 
             except sqlite3.OperationalError as e:
                 if "unable to open database file" in str(e) or "database is locked" in str(e):
                     elapsed = time.time() - start
-                    self.dbcommslogger.debug(f'#{attempt} {elapsed:.4f} {query} [{args}]')
+                    self.dbcommslogger.debug(f'#{attempt} {elapsed:.4f} {query} [{logargs}]')
                     self.dbcommslogger.debug(f'Database Error {str(e)}')
 
                     self.logger.warning(f'Database Error: {e}')
@@ -147,7 +775,7 @@ class DBConnection:
                     time.sleep(1)
                 else:
                     elapsed = time.time() - start
-                    self.dbcommslogger.debug(f'#{attempt} {elapsed:.4f} {query} [{args}]')
+                    self.dbcommslogger.debug(f'#{attempt} {elapsed:.4f} {query} [{logargs}]')
                     self.dbcommslogger.debug(f'Database OperationalError {str(e)}')
 
                     self.logger.error(f'Database OperationalError: {e}')
@@ -161,30 +789,31 @@ class DBConnection:
                 elapsed = time.time() - start
                 msg = str(e).lower()
                 if suppress and 'UNIQUE' in suppress and ('not unique' in msg or 'unique constraint failed' in msg):
-                    self.dbcommslogger.debug(f'#{attempt} {elapsed:.4f} {query} [{args}]')
+                    self.dbcommslogger.debug(f'#{attempt} {elapsed:.4f} {query} [{logargs}]')
                     self.dbcommslogger.debug(f'Suppressed {msg}')
-                    self.connection.commit()
+                    if not in_transaction:
+                        connection.commit()
                     break
-                self.dbcommslogger.debug(f'#{attempt} {elapsed:.4f} {query} [{args}]')
+                self.dbcommslogger.debug(f'#{attempt} {elapsed:.4f} {query} [{logargs}]')
                 self.dbcommslogger.debug(f'IntegrityError: {msg}')
 
                 self.logger.error(f'Database IntegrityError: {e}')
                 self.logger.error(f"Failed query: [{query}]")
-                self.logger.error(f"Failed args: [{str(args)}]")
+                self.logger.error(f"Failed args: [{str(logargs)}]")
                 raise
 
             except sqlite3.DatabaseError as e:
                 elapsed = time.time() - start
-                self.dbcommslogger.debug(f'#{attempt} {elapsed:.4f} {query} [{args}]')
+                self.dbcommslogger.debug(f'#{attempt} {elapsed:.4f} {query} [{logargs}]')
                 self.dbcommslogger.debug(f'DatabaseError: {str(e)}')
 
-                self.logger.error(f'Fatal error executing {query} :{args}: {e}')
+                self.logger.error(f'Fatal error executing {query} :{logargs}: {e}')
                 self.logger.error(f"{traceback.format_exc()}")
                 raise
 
             except Exception as e:
                 elapsed = time.time() - start
-                self.dbcommslogger.debug(f'#{attempt} {elapsed:.4f} {query} [{args}]')
+                self.dbcommslogger.debug(f'#{attempt} {elapsed:.4f} {query} [{logargs}]')
                 self.dbcommslogger.debug(f'CatchallError: {str(e)}')
 
                 self.logger.error(f'Exception executing {query} :: {e}')
@@ -193,12 +822,31 @@ class DBConnection:
             finally:
                 attempt += 1
 
+        if connection is self.connection and not is_select(query):
+            self.note_changes(query, args[0] if many else args)
         return sql_result
 
+    def note_changes(self, query: str, args=None):
+        """ Tell QUERY_CACHE which tables a write changed, now or when the transaction commits """
+        tables = None
+        if not is_schema_change(query):
+            tables = QUERY_CACHE.access(self.connection, self.dbfile, query, args)
+        if tables is None:
+            QUERY_CACHE.clear()
+        elif self.pooled.transaction_depth:
+            self.pooled.changed_tables.update(tables[1])
+        else:
+            QUERY_CACHE.changed(self.dbfile, tables[1])
+
     def match(self, query, args=None):
         try:
             # if there are no results, action() returns None and .fetchone() fails
-            sql_results = self.action(query, args).fetchone()
+            cursor = self.read_action(query, args)
+            sql_results = cursor.fetchone()
+            # finish the statement, an unfinished one would keep the reader on an old snapshot
+            cursor.close()
+            if sql_results:
+                PROFILER.add_rows(query, 1)
         except sqlite3.Error:
             return []
         if not sql_results:
@@ -209,7 +857,8 @@ class DBConnection:
     def select(self, query, args=None):
         try:
             # if there are no results, action() returns None and .fetchall() fails
-            sql_results = self.action(query, args).fetchall()
+            sql_results = self.read_action(query, args).fetchall()
+            PROFILER.add_rows(query, len(sql_results))
         except sqlite3.Error:
             return []
         if not sql_results:
@@ -217,26 +866,270 @@ class DBConnection:
 
         return sql_results
 
+    def cached_select(self, query, args=None):
+        """ select() for queries that are run often on tables that rarely change.
+        The result is kept in QUERY_CACHE until one of the tables it read is written to """
+        if not is_select(query) or self.connection.in_transaction:
+            return self.select(query, args)
+        args = tuple(args) if args else None
+        tables = QUERY_CACHE.access(self.reader(), self.dbfile, query, args)
+        if tables is None:
+            return self.select(query, args)
+        sql_results = QUERY_CACHE.get(self.dbfile, query, args, tables[0])
+        if sql_results is None:
+            # if a table changes while the query runs, the result is stored already out of date
+            generation = QUERY_CACHE.generation(self.dbfile, tables[0])
+            try:
+                sql_results = self.read_action(query, args).fetchall()
+                PROFILER.add_rows(query, len(sql_results))
+            except sqlite3.Error:
+                return []
+            QUERY_CACHE.put(self.dbfile, query, args, generation, sql_results)
+        # the rows are shared, the list isn't
+        return list(sql_results)
+
+    def cached_match(self, query, args=None):
+        """ match() using the query cache, see cached_select() """
+        sql_results = self.cached_select(query, args)
+        if not sql_results:
+            return []
+        return sql_results[0]
+
+    def iterate(self, query, args=None, chunk: int = 0):
+        """ Generator version of select(), for queries that may return whole tables.
+        Rows are fetched chunk at a time instead of all at once.
+        Outside a transaction the query runs on a read-only connection of its own, so the rows all
+        come from one snapshot, and writes made while iterating don't change what is returned or
+        hold up other reads in this thread. Errors are logged and end the iteration, as select() returns [] """
+        if not query:
+            return
+        chunk = chunk or ITERATE_CHUNK
+        connection = None
+        try:
+            if self.connection.in_transaction:
+                # has to see the transaction's own writes
+                cursor = self.action(query, args)
+            else:
+                connection = ConnectionPool.connect(self.dbfile, readonly=True)
+                for name, func in self.collations.items():
+                    connection.create_collation(name, func)
+                cursor = self._action(query, args, connection=connection)
+            while True:
+                rows = cursor.fetchmany(chunk)
+                if not rows:
+                    break
+                PROFILER.add_rows(query, len(rows))
+                yield from rows
+            cursor.close()
+        except sqlite3.Error:
+            return
+        finally:
+            if connection:
+                connection.close()
+
     @staticmethod
     def gen_params(my_dict):
-        return [f"{x} = ?" for x in list(my_dict.keys())]
+        return [f"{x} = ?" for x in my_dict]
+
+    def unique_keys(self, table_name: str) -> list[set]:
+        """ Return the sets of (lowercase) column names that are unique in table_name """
+        cache_key = (self.dbfile, table_name.lower())
+        if cache_key not in UNIQUE_KEYS:
+            keys = []
+            primary = {col['name'].lower() for col in self.connection.execute(f"PRAGMA table_info('{table_name}')")
+                       if col['pk']}
+            if primary:
+                keys.append(primary)
+            for index in self.connection.execute(f"PRAGMA index_list('{table_name}')").fetchall():
+                if index['unique']:
+                    columns = self.connection.execute(f"PRAGMA index_info('{index['name']}')")
+                    keys.append({col['name'].lower() for col in columns if col['name']})
+            UNIQUE_KEYS[cache_key] = keys
+        return UNIQUE_KEYS[cache_key]
 
     def upsert(self, table_name, value_dict, key_dict):
-        with db_lock:
-            changes_before = self.connection.total_changes
+        self.upsert_many(table_name, [(value_dict, key_dict)])
+
+    def upsert_many(self, table_name, rows):
+        """ Update or insert each (value_dict, key_dict) in rows, all in one transaction.
+        If the key columns are unique in the table this is a single INSERT ... ON CONFLICT DO UPDATE
+        per group of rows with the same columns, otherwise an UPDATE and, if nothing changed, an INSERT """
+        groups = {}
+        for value_dict, key_dict in rows:
+            groups.setdefault((tuple(value_dict.keys()), tuple(key_dict.keys())), []).append(
+                list(value_dict.values()) + list(key_dict.values()))
+        if not groups:
+            return
+        with self.transaction():
+            for (values, keys), args_list in groups.items():
+                if HAS_UPSERT and {key.lower() for key in keys} in self.unique_keys(table_name):
+                    self._upsert_group(table_name, values, keys, args_list)
+                else:
+                    for args in args_list:
+                        self._update_or_insert(table_name, values, keys, args)
+
+    def _upsert_group(self, table_name, values, keys, args_list):
+        query = (f"INSERT INTO {table_name} ({', '.join(values + keys)}) "
+                 f"VALUES ({', '.join(['?'] * len(values + keys))}) ON CONFLICT ({', '.join(keys)}) ")
+        if values:
+            query += f"DO UPDATE SET {', '.join([f'{col} = excluded.{col}' for col in values])}"
+        else:
+            query += "DO NOTHING"
+        if len(args_list) == 1:
+            # Same as the old INSERT, a clash on some other unique column is logged and ignored
+            self._action(query, args_list[0], suppress="UNIQUE")
+            return
+        try:
+            self._action(query, args_list, many=True)
+        except sqlite3.IntegrityError:
+            # A row clashed on some other unique column and stopped the batch,
+            # redo them one at a time so only the clashing rows are skipped
+            for args in args_list:
+                self._action(query, args, suppress="UNIQUE")
+
+    def _update_or_insert(self, table_name, values, keys, args):
+        changes_before = self.connection.total_changes
+
+        query = (f"UPDATE {table_name} SET {', '.join(self.gen_params(values))} "
+                 f"WHERE {' AND '.join(self.gen_params(keys))}")
+        self._action(query, args)
+
+        # Another thread can't jump in between the UPDATE and INSERT statements as we hold db_lock,
+        # but still use suppress=unique to log any conflicts
 
-            query = (f"UPDATE {table_name} SET {', '.join(self.gen_params(value_dict))} "
-                     f"WHERE {' AND '.join(self.gen_params(key_dict))}")
+        if self.connection.total_changes == changes_before:
+            query = f"INSERT INTO {table_name} ({', '.join(values + keys)}) VALUES ("
+            query += f"{', '.join(['?'] * len(values + keys))})"
+            self._action(query, args, suppress="UNIQUE")
+
+
+class WriteQueue:
+    """ Writes applied in the background by a single writer thread.
+    Anything queued while the writer is busy goes into its next transaction, so threads making
+    small updates (job times, search counters, status changes) don't each wait on db_lock.
+    Each write returns a Future, for callers that want the result or to know it has been committed.
+    Until start() is called, or after stop(), writes are done straight away in the calling thread.
+    Don't wait on a Future inside db.transaction(), the writer needs db_lock to finish it """
+    def __init__(self, max_batch: int = 500):
+        self.max_batch = max_batch
+        self.queue = Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.stats = {'queued': 0, 'written': 0, 'failed': 0, 'batches': 0}
+        self.logger = logging.getLogger(__name__)
+
+    def running(self) -> bool:
+        thread = self.thread
+        return bool(thread and thread.is_alive())
+
+    def start(self):
+        with self.lock:
+            if not self.running():
+                self.thread = threading.Thread(target=self.writer, name='DBWRITER', daemon=True)
+                self.thread.start()
+
+    def stop(self, timeout: float = 30.0):
+        """ Write everything queued so far, then stop the writer """
+        with self.lock:
+            thread = self.thread
+            if not thread:
+                return
+            # anything submitted from now on is written straight away
+            self.thread = None
+            self.queue.put(None)
+        thread.join(timeout)
+        if thread.is_alive():
+            self.logger.warning(f'Database writer still busy after {timeout}s, {self.queue.qsize()} pending')
+
+    def flush(self, timeout: float | None = None):
+        """ Wait until everything queued so far has been committed """
+        self.submit('').result(timeout)
+
+    def action(self, query: str, args=None, suppress=None) -> Future:
+        return self.submit('action', query, args, suppress)
+
+    def upsert(self, table_name: str, value_dict, key_dict) -> Future:
+        return self.submit('upsert', table_name, value_dict, key_dict)
+
+    def executemany(self, query: str, args_list, suppress=None) -> Future:
+        return self.submit('executemany', query, list(args_list), suppress)
+
+    def submit(self, method: str, *args) -> Future:
+        """ Queue a call to DBConnection.method(*args). An empty method just marks a point in the queue """
+        future = Future()
+        with self.lock:
+            self.stats['queued'] += 1
+            if self.running() and threading.current_thread() is not self.thread:
+                self.queue.put((future, method, args))
+                return future
+        # not running, or a write from inside the writer, do it now
+        self.write([(future, method, args)])
+        return future
+
+    def writer(self):
+        stopping = False
+        while not stopping:
+            item = self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self.queue.get_nowait()
+                except Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self.write(batch)
+
+    def write(self, batch: list):
+        """ Apply a batch of queued writes in one transaction. A write that fails only fails its own Future,
+        the results of the others are set once they have been committed """
+        done = []
+        written = 0
+        failed = 0
+        db = None
+        try:
+            db = DBConnection()
+            with db.transaction():
+                for future, method, args in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    if not method:
+                        done.append((future, None))
+                        continue
+                    try:
+                        done.append((future, getattr(db, method)(*args)))
+                        written += 1
+                    except Exception as e:
+                        failed += 1
+                        future.set_exception(e)
+        except Exception as e:
+            self.logger.error(f'Database writer: {type(e).__name__} {str(e)}')
+            for future, _, _ in batch:
+                if not future.done():
+                    failed += 1
+                    future.set_exception(e)
+            done = []
+            written = 0
+        finally:
+            if db:
+                db.close()
+        with self.lock:
+            self.stats['batches'] += 1
+            self.stats['written'] += written
+            self.stats['failed'] += failed
+        for future, result in done:
+            future.set_result(result)
 
-            self._action(query, list(value_dict.values()) + list(key_dict.values()))
+    def get_stats(self) -> dict:
+        with self.lock:
+            stats = dict(self.stats)
+        stats['pending'] = self.queue.qsize()
+        stats['running'] = self.running()
+        return stats
 
-            # This version of upsert is not thread safe, each action() is thread safe,
-            # but it's possible for another thread to jump in between the
-            # UPDATE and INSERT statements, so we use suppress=unique to log any conflicts
-            # -- update -- should be thread safe now, threading lock moved
 
-            if self.connection.total_changes == changes_before:
-                query = f"INSERT INTO {table_name} ("
-                query += f"{', '.join(list(value_dict.keys()) + list(key_dict.keys()))}) VALUES ("
-                query += f"{', '.join(['?'] * len(list(value_dict.keys()) + list(key_dict.keys())))})"
-                self._action(query, list(value_dict.values()) + list(key_dict.values()), suppress="UNIQUE")
+WRITE_QUEUE = WriteQueue()
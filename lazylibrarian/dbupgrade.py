@@ -126,8 +126,9 @@ from lazylibrarian.scheduling import SchedulerCommand, restart_jobs
 # 87 add hc_token to users table
 # 88 add bookauthors table
 # 89 add dnb_id to book table
+# 90 add full text search index for books, authors and series
 
-db_current_version = 89
+db_current_version = 90
 
 
 def upgrade_needed():
@@ -915,16 +916,17 @@ def db_v47(db, upgradelog):
     tot = len(res)
     if tot:
         upgradelog.write(f"{time.ctime()} v47: Upgrading {tot} genres\n")
-        for cnt, book in enumerate(res, start=1):
-            db.action('DELETE from genrebooks WHERE BookID=?', (book['bookid'],))
-            lazylibrarian.UPDATE_MSG = f"Updating genres {cnt} of {tot}"
-            for item in get_list(book['bookgenre'], ','):
-                match = db.match('SELECT GenreID from genres where GenreName=? COLLATE NOCASE', (item,))
-                if not match:
-                    db.action('INSERT into genres (GenreName) VALUES (?)', (item,))
-                    match = db.match('SELECT GenreID from genres where GenreName=?', (item,))
-                db.action('INSERT into genrebooks (GenreID, BookID) VALUES (?,?)',
-                          (match['GenreID'], book['bookid']), suppress='UNIQUE')
+        with db.transaction():
+            for cnt, book in enumerate(res, start=1):
+                db.action('DELETE from genrebooks WHERE BookID=?', (book['bookid'],))
+                lazylibrarian.UPDATE_MSG = f"Updating genres {cnt} of {tot}"
+                for item in get_list(book['bookgenre'], ','):
+                    match = db.match('SELECT GenreID from genres where GenreName=? COLLATE NOCASE', (item,))
+                    if not match:
+                        db.action('INSERT into genres (GenreName) VALUES (?)', (item,))
+                        match = db.match('SELECT GenreID from genres where GenreName=?', (item,))
+                    db.action('INSERT into genrebooks (GenreID, BookID) VALUES (?,?)',
+                              (match['GenreID'], book['bookid']), suppress='UNIQUE')
     upgradelog.write(f"{time.ctime()} v47: complete\n")
 
 
@@ -1225,13 +1227,14 @@ def update_schema(db, upgradelog):
         if tot:
             lazylibrarian.UPDATE_MSG = f"Copying authorid for {tot} authors"
             logger.debug(lazylibrarian.UPDATE_MSG)
-            cnt = 0
+            updates = []
             for auth in res:
                 gr_id = auth[0]
                 # name = auth[1]
                 if gr_id.isdigit():
-                    cnt += 1
-                    db.action("UPDATE authors SET gr_id=? WHERE authorid=?", (gr_id, gr_id))
+                    updates.append((gr_id, gr_id))
+            db.executemany("UPDATE authors SET gr_id=? WHERE authorid=?", updates)
+            cnt = len(updates)
             lazylibrarian.UPDATE_MSG = f"Copied authorid for {cnt} authors (from {tot})"
             upgradelog.write(f"{time.ctime()} v70: {lazylibrarian.UPDATE_MSG}\n")
     if not has_column(db, 'books', 'gr_id'):
@@ -1242,12 +1245,13 @@ def update_schema(db, upgradelog):
         if tot:
             lazylibrarian.UPDATE_MSG = f"Copying bookid for {tot} books"
             logger.debug(lazylibrarian.UPDATE_MSG)
-            cnt = 0
+            updates = []
             for book in res:
                 gr_id = book[0]
                 if gr_id.isdigit():
-                    cnt += 1
-                    db.action("UPDATE books SET gr_id=? WHERE bookid=?", (gr_id, gr_id))
+                    updates.append((gr_id, gr_id))
+            db.executemany("UPDATE books SET gr_id=? WHERE bookid=?", updates)
+            cnt = len(updates)
             lazylibrarian.UPDATE_MSG = f"Copied bookid for {cnt} books (from {tot})"
             logger.debug(lazylibrarian.UPDATE_MSG)
             upgradelog.write(f"{time.ctime()} v70: {lazylibrarian.UPDATE_MSG}\n")
@@ -1289,8 +1293,8 @@ def update_schema(db, upgradelog):
         if len(res):
             lazylibrarian.UPDATE_MSG = f"Copying authorid for {len(res)} authors"
             logger.debug(lazylibrarian.UPDATE_MSG)
-            for author in res:
-                db.action("UPDATE authors SET ol_id=? WHERE authorid=?", (author['authorid'], author['authorid']))
+            db.executemany("UPDATE authors SET ol_id=? WHERE authorid=?",
+                           [(author['authorid'], author['authorid']) for author in res])
             lazylibrarian.UPDATE_MSG = f"Copied authorid for {len(res)} authors"
             logger.debug(lazylibrarian.UPDATE_MSG)
 
@@ -1347,16 +1351,20 @@ def update_schema(db, upgradelog):
         if len(res):
             lazylibrarian.UPDATE_MSG = f"Populating new fields in books table for {len(res)} books"
             logger.debug(lazylibrarian.UPDATE_MSG)
+            updates = {'ol_id': [], 'gr_id': [], 'gb_id': []}
             for book in res:
                 if book['bookid'] and book['bookid'].startswith('OL') and book['bookid'].endswith('W'):
-                    db.action("UPDATE books SET ol_id=? WHERE bookid=?", (book['bookid'], book['bookid']))
+                    updates['ol_id'].append((book['bookid'], book['bookid']))
                 elif book['bookid'] and book['bookid'].isnumeric():
-                    db.action("UPDATE books SET gr_id=? WHERE bookid=?", (book['bookid'], book['bookid']))
+                    updates['gr_id'].append((book['bookid'], book['bookid']))
                 elif book['bookid']:
                     if set(book['bookid']) <= allowed:
-                        db.action("UPDATE books SET gb_id=? WHERE bookid=?", (book['bookid'], book['bookid']))
+                        updates['gb_id'].append((book['bookid'], book['bookid']))
                 else:
                     logger.warning(f"Unable to determine bookid type for {book['bookid']}")
+            with db.transaction():
+                for column, args_list in updates.items():
+                    db.executemany(f"UPDATE books SET {column}=? WHERE bookid=?", args_list)
             lazylibrarian.UPDATE_MSG = f"Processed {len(res)} books"
             logger.debug(lazylibrarian.UPDATE_MSG)
 
@@ -1383,9 +1391,8 @@ def update_schema(db, upgradelog):
                         item = str(item).strip('"')
                         new_list.append(item)
                     new_set = set(new_list)
-                    for item in new_set:
-                        cmd = f'INSERT into {reading_list} (UserID, BookID) VALUES (?,?)'
-                        db.action(cmd, (userid, item))
+                    cmd = f'INSERT into {reading_list} (UserID, BookID) VALUES (?,?)'
+                    db.executemany(cmd, [(userid, item) for item in new_set])
         if cnt:
             lazylibrarian.UPDATE_MSG = f"Processed {cnt} reading lists"
             logger.debug(lazylibrarian.UPDATE_MSG)
@@ -1430,9 +1437,8 @@ def update_schema(db, upgradelog):
         # status_id = 1 want-to-read, 2 currently_reading, 3 read, 4 owned, 5 dnf
         for tbl in [['toread', 1], ['reading', 2], ['haveread', 3], ['abandoned', 5]]:
             res = db.select(f"SELECT * from {tbl[0]}")
-            for item in res:
-                db.action("INSERT into readinglists (UserID, BookID, Status) VALUES (?, ?, ?)",
-                          (item['UserID'], item['BookID'], tbl[1]), suppress='UNIQUE')
+            db.executemany("INSERT OR IGNORE into readinglists (UserID, BookID, Status) VALUES (?, ?, ?)",
+                           [(item['UserID'], item['BookID'], tbl[1]) for item in res])
             db.action(f"DROP table {tbl[0]}")
 
     res = db.match("SELECT sql FROM sqlite_master WHERE type='table' AND name='series'")
@@ -1509,7 +1515,89 @@ def update_schema(db, upgradelog):
         upgradelog.write(f"{time.ctime()} v89: {lazylibrarian.UPDATE_MSG}\n")
         db.action('ALTER TABLE books ADD COLUMN dnb_id TEXT')
 
+    if database.HAS_FTS5 and not has_column(db, "books_fts", "BookName"):
+        changes += 1
+        lazylibrarian.UPDATE_MSG = 'Adding full text search index'
+        upgradelog.write(f"{time.ctime()} v90: {lazylibrarian.UPDATE_MSG}\n")
+        create_fts(db)
+        rebuild_fts(db)
+
     if changes:
         upgradelog.write(f"{time.ctime()} Changed: {changes}\n")
     logger.debug(f"Schema changes: {changes}")
     return changes
+
+
+# Select the text we index for each book. Authors and series come from the link tables,
+# so a book in more than one series or with contributing authors can be found by any of them
+FTS_BOOK_TEXT = ("SELECT books.rowid, BookName, BookSub, "
+                 "(SELECT group_concat(AuthorName, ' ') FROM bookauthors,authors "
+                 "WHERE bookauthors.BookID=books.BookID and authors.AuthorID=bookauthors.AuthorID), "
+                 "(SELECT group_concat(SeriesName, ' ') FROM member,series "
+                 "WHERE member.BookID=books.BookID and series.SeriesID=member.SeriesID), "
+                 "BookGenre FROM books")
+
+
+def fts_refresh_books(where):
+    """ Trigger body to re-index the books selected by where """
+    return (f"DELETE FROM books_fts WHERE rowid IN (SELECT rowid FROM books WHERE {where}); "
+            f"INSERT INTO books_fts (rowid, {', '.join(database.FTS_COLUMNS['books'])}) "
+            f"{FTS_BOOK_TEXT} WHERE {where}; ")
+
+
+def create_fts(db):
+    """ Create fts5 tables for books, authors and series, and the triggers that keep them
+        up to date. Index rowids are the rowids of the indexed tables """
+    for table, columns in database.FTS_COLUMNS.items():
+        db.action(f"DROP TABLE IF EXISTS {table}_fts")
+        db.action(f"CREATE VIRTUAL TABLE {table}_fts USING fts5({', '.join(columns)}, "
+                  f"tokenize='{database.FTS_TOKENIZE}', prefix='2 3')")
+
+    # the triggers look up books by author and by series
+    db.action("CREATE INDEX IF NOT EXISTS bookauthors_index_authorid ON bookauthors(AuthorID)")
+    db.action("CREATE INDEX IF NOT EXISTS member_index_bookid ON member(BookID)")
+
+    triggers = {
+        'books_fts_insert': "AFTER INSERT ON books BEGIN " + fts_refresh_books("books.rowid=new.rowid"),
+        'books_fts_update': ("AFTER UPDATE OF BookName, BookSub, BookGenre ON books BEGIN " +
+                             fts_refresh_books("books.rowid=new.rowid")),
+        'books_fts_delete': "AFTER DELETE ON books BEGIN DELETE FROM books_fts WHERE rowid=old.rowid; ",
+        'bookauthors_fts_insert': ("AFTER INSERT ON bookauthors BEGIN " +
+                                   fts_refresh_books("books.BookID=new.BookID")),
+        'bookauthors_fts_update': ("AFTER UPDATE ON bookauthors BEGIN " +
+                                   fts_refresh_books("books.BookID IN (old.BookID, new.BookID)")),
+        'bookauthors_fts_delete': ("AFTER DELETE ON bookauthors BEGIN " +
+                                   fts_refresh_books("books.BookID=old.BookID")),
+        'member_fts_insert': "AFTER INSERT ON member BEGIN " + fts_refresh_books("books.BookID=new.BookID"),
+        'member_fts_update': ("AFTER UPDATE ON member BEGIN " +
+                              fts_refresh_books("books.BookID IN (old.BookID, new.BookID)")),
+        'member_fts_delete': "AFTER DELETE ON member BEGIN " + fts_refresh_books("books.BookID=old.BookID"),
+        'authorname_fts_update': ("AFTER UPDATE OF AuthorName ON authors BEGIN " + fts_refresh_books(
+                                  "books.BookID IN (SELECT BookID FROM bookauthors WHERE AuthorID=new.AuthorID)")),
+        'seriesname_fts_update': ("AFTER UPDATE OF SeriesName ON series BEGIN " + fts_refresh_books(
+                                  "books.BookID IN (SELECT BookID FROM member WHERE SeriesID=new.SeriesID)")),
+    }
+    for table in ['authors', 'series']:
+        columns = database.FTS_COLUMNS[table]
+        insert = (f"INSERT INTO {table}_fts (rowid, {', '.join(columns)}) "
+                  f"VALUES (new.rowid, {', '.join(f'new.{column}' for column in columns)}); ")
+        delete = f"DELETE FROM {table}_fts WHERE rowid=old.rowid; "
+        triggers[f'{table}_fts_insert'] = f"AFTER INSERT ON {table} BEGIN {insert}"
+        triggers[f'{table}_fts_update'] = f"AFTER UPDATE OF {', '.join(columns)} ON {table} BEGIN {delete}{insert}"
+        triggers[f'{table}_fts_delete'] = f"AFTER DELETE ON {table} BEGIN {delete}"
+
+    for name, trigger in triggers.items():
+        db.action(f"DROP TRIGGER IF EXISTS {name}")
+        db.action(f"CREATE TRIGGER {name} {trigger}END")
+
+
+def rebuild_fts(db):
+    """ (Re)populate the full text index from the indexed tables """
+    with db.transaction():
+        for table, columns in database.FTS_COLUMNS.items():
+            db.action(f"DELETE FROM {table}_fts")
+            if table == 'books':
+                db.action(f"INSERT INTO books_fts (rowid, {', '.join(columns)}) {FTS_BOOK_TEXT}")
+            else:
+                db.action(f"INSERT INTO {table}_fts (rowid, {', '.join(columns)}) "
+                          f"SELECT rowid, {', '.join(columns)} FROM {table}")
@@ -27,12 +27,11 @@ import time
 import traceback
 from base64 import b64decode, b64encode
 
-import requests
-
 import lazylibrarian
 from lazylibrarian.config2 import CONFIG
 from lazylibrarian.filesystem import make_dirs, path_isdir, syspath
 from lazylibrarian.formatter import make_unicode
+from lazylibrarian.sessions import http_post
 
 delugeweb_authtime = 0
 delugeweb_auth = {}
@@ -180,8 +179,8 @@ def get_torrent_status(torrentid, data):
             post_json = {"method": "web.get_torrent_status",
                          "params": [torrentid, data],
                          "id": 22}
-            response = requests.post(delugeweb_url, json=post_json, cookies=cookies,
-                                     verify=deluge_verify_cert, headers=headers, timeout=timeout)
+            response = http_post(delugeweb_url, json=post_json, cookies=cookies,
+                                 verify=deluge_verify_cert, headers=headers, timeout=timeout)
             dlcommslogger.debug(f'Status code: {response.status_code}')
             dlcommslogger.debug(str(response.text))
 
@@ -207,8 +206,8 @@ def remove_torrent(torrentid, remove_data=False):
         dlcommslogger.debug(f'Deluge: Removing torrent {str(torrentid)}')
         post_json = {"method": "core.remove_torrent", "params": [torrentid, remove_data], "id": 25}
 
-        response = requests.post(delugeweb_url, json=post_json, cookies=cookies,
-                                 verify=deluge_verify_cert, headers=headers, timeout=timeout)
+        response = http_post(delugeweb_url, json=post_json, cookies=cookies,
+                             verify=deluge_verify_cert, headers=headers, timeout=timeout)
         dlcommslogger.debug(f'Status code: {response.status_code}')
         dlcommslogger.debug(response.text)
 
@@ -265,8 +264,8 @@ def _get_auth():
     post_json = {"method": "auth.login", "params": [delugeweb_password], "id": 1}
 
     try:
-        response = requests.post(delugeweb_url, json=post_json, cookies={}, timeout=timeout,
-                                 verify=deluge_verify_cert, headers=headers)
+        response = http_post(delugeweb_url, json=post_json, cookies={}, timeout=timeout,
+                             verify=deluge_verify_cert, headers=headers)
         dlcommslogger.debug(f'Status code: {response.status_code}')
         dlcommslogger.debug(response.text)
         if response.status_code == 200:
@@ -281,8 +280,8 @@ def _get_auth():
     if force_https and not delugeweb_url.startswith('https:'):
         try:
             dlcommslogger.debug('Deluge: Connection failed, let\'s try HTTPS just in case')
-            response = requests.post(delugeweb_url.replace('http:', 'https:'), json=post_json, timeout=timeout,
-                                     cookies={}, verify=deluge_verify_cert, headers=headers)
+            response = http_post(delugeweb_url.replace('http:', 'https:'), json=post_json, timeout=timeout,
+                                 cookies={}, verify=deluge_verify_cert, headers=headers)
             dlcommslogger.debug(f'Status code: {response.status_code}')
             dlcommslogger.debug(response.text)
             # If the response didn't fail, change delugeweb_url for the rest of this session
@@ -315,8 +314,8 @@ def _get_auth():
     post_json = {"method": "web.connected", "params": [], "id": 10}
 
     try:
-        response = requests.post(delugeweb_url, json=post_json, cookies=cookies,
-                                 verify=deluge_verify_cert, headers=headers)
+        response = http_post(delugeweb_url, json=post_json, cookies=cookies,
+                             verify=deluge_verify_cert, headers=headers)
         dlcommslogger.debug(f'Status code: {response.status_code}')
         dlcommslogger.debug(response.text)
 
@@ -332,8 +331,8 @@ def _get_auth():
         post_json = {"method": "web.get_hosts", "params": [], "id": 11}
 
         try:
-            response = requests.post(delugeweb_url, json=post_json, verify=deluge_verify_cert,
-                                     cookies=cookies, headers=headers)
+            response = http_post(delugeweb_url, json=post_json, verify=deluge_verify_cert,
+                                 cookies=cookies, headers=headers)
             dlcommslogger.debug(f'Status code: {response.status_code}')
             dlcommslogger.debug(response.text)
 
@@ -351,8 +350,8 @@ def _get_auth():
         post_json = {"method": "web.connect", "params": [delugeweb_hosts[0][0]], "id": 11}
 
         try:
-            response = requests.post(delugeweb_url, json=post_json, cookies=cookies,
-                                     verify=deluge_verify_cert, headers=headers)
+            response = http_post(delugeweb_url, json=post_json, cookies=cookies,
+                                 verify=deluge_verify_cert, headers=headers)
             dlcommslogger.debug(f'Status code: {response.status_code}')
             dlcommslogger.debug(response.text)
 
@@ -363,8 +362,8 @@ def _get_auth():
         post_json = {"method": "web.connected", "params": [], "id": 10}
 
         try:
-            response = requests.post(delugeweb_url, json=post_json, verify=deluge_verify_cert,
-                                     cookies=cookies, headers=headers)
+            response = http_post(delugeweb_url, json=post_json, verify=deluge_verify_cert,
+                                 cookies=cookies, headers=headers)
             dlcommslogger.debug(f'Status code: {response.status_code}')
             dlcommslogger.debug(response.text)
 
@@ -393,8 +392,8 @@ def _add_torrent_magnet(result):
 
     try:
         post_json = {"method": "core.add_torrent_magnet", "params": [result['url'], {}], "id": 2}
-        response = requests.post(delugeweb_url, json=post_json, cookies=cookies,
-                                 verify=deluge_verify_cert, headers=headers, timeout=timeout)
+        response = http_post(delugeweb_url, json=post_json, cookies=cookies,
+                             verify=deluge_verify_cert, headers=headers, timeout=timeout)
         dlcommslogger.debug(f'Status code: {response.status_code}')
         dlcommslogger.debug(response.text)
 
@@ -423,8 +422,8 @@ def _add_torrent_url(result):
 
     try:
         post_json = {"method": "core.add_torrent_url", "params": [result['url'], {}], "id": 32}
-        response = requests.post(delugeweb_url, json=post_json, cookies=cookies,
-                                 verify=deluge_verify_cert, headers=headers, timeout=timeout)
+        response = http_post(delugeweb_url, json=post_json, cookies=cookies,
+                             verify=deluge_verify_cert, headers=headers, timeout=timeout)
 
         dlcommslogger.debug(f'Status code: {response.status_code}')
         dlcommslogger.debug(response.text)
@@ -463,8 +462,8 @@ def _add_torrent_file(result):
                      "params": [result['name'] + '.torrent', content, {}],
                      "id": 2}
 
-        response = requests.post(delugeweb_url, json=post_json, cookies=cookies,
-                                 verify=deluge_verify_cert, headers=headers, timeout=timeout)
+        response = http_post(delugeweb_url, json=post_json, cookies=cookies,
+                             verify=deluge_verify_cert, headers=headers, timeout=timeout)
 
         dlcommslogger.debug(f'Status code: {response.status_code}')
         dlcommslogger.debug(response.text)
@@ -508,8 +507,8 @@ def set_torrent_label(retid, label):
         # check if label already exists and create it if not
         post_json = {"method": 'label.get_labels', "params": [], "id": 3}
 
-        response = requests.post(delugeweb_url, json=post_json, cookies=cookies,
-                                 verify=deluge_verify_cert, headers=headers, timeout=timeout)
+        response = http_post(delugeweb_url, json=post_json, cookies=cookies,
+                             verify=deluge_verify_cert, headers=headers, timeout=timeout)
         dlcommslogger.debug(f'Status code: {response.status_code}')
         dlcommslogger.debug(response.text)
 
@@ -528,8 +527,8 @@ def set_torrent_label(retid, label):
                 try:
                     dlcommslogger.debug(f'Deluge: {label} label doesn\'t exist in Deluge, let\'s add it')
                     post_json = {"method": 'label.add', "params": [label], "id": 4}
-                    response = requests.post(delugeweb_url, json=post_json, cookies=cookies,
-                                             verify=deluge_verify_cert, headers=headers, timeout=timeout)
+                    response = http_post(delugeweb_url, json=post_json, cookies=cookies,
+                                         verify=deluge_verify_cert, headers=headers, timeout=timeout)
                     dlcommslogger.debug(f'Status code: {response.status_code}')
                     dlcommslogger.debug(response.text)
                     logger.debug(f'Deluge: {label} label added to Deluge')
@@ -550,8 +549,8 @@ def set_torrent_label(retid, label):
             # add label to torrent
             post_json = {"method": 'label.set_torrent', "params": [retid, label], "id": 5}
 
-            response = requests.post(delugeweb_url, json=post_json, cookies=cookies,
-                                     verify=deluge_verify_cert, headers=headers, timeout=timeout)
+            response = http_post(delugeweb_url, json=post_json, cookies=cookies,
+                                 verify=deluge_verify_cert, headers=headers, timeout=timeout)
             dlcommslogger.debug(f'Status code: {response.status_code}')
             dlcommslogger.debug(response.text)
             logger.debug(f'Deluge: {label} label added to torrent')
@@ -581,8 +580,8 @@ def set_seed_ratio(result):
 
         post_json = {"method": "core.set_torrent_stop_at_ratio", "params": [result['hash'], True], "id": 5}
 
-        response = requests.post(delugeweb_url, json=post_json, cookies=cookies,
-                                 verify=deluge_verify_cert, headers=headers, timeout=timeout)
+        response = http_post(delugeweb_url, json=post_json, cookies=cookies,
+                             verify=deluge_verify_cert, headers=headers, timeout=timeout)
         dlcommslogger.debug(f'Status code: {response.status_code}')
         dlcommslogger.debug(response.text)
 
@@ -593,8 +592,8 @@ def set_seed_ratio(result):
 
         post_json = {"method": "core.set_torrent_stop_ratio", "params": [result['hash'], float(ratio)], "id": 6}
 
-        response = requests.post(delugeweb_url, json=post_json, cookies=cookies,
-                                 verify=deluge_verify_cert, headers=headers, timeout=timeout)
+        response = http_post(delugeweb_url, json=post_json, cookies=cookies,
+                             verify=deluge_verify_cert, headers=headers, timeout=timeout)
         dlcommslogger.debug(f'Status code: {response.status_code}')
         dlcommslogger.debug(response.text)
 
@@ -619,8 +618,8 @@ def set_torrent_path(result):
     try:
         post_json = {"method": "core.set_torrent_move_completed", "params": [result['hash'], True], "id": 7}
 
-        response = requests.post(delugeweb_url, json=post_json, cookies=cookies,
-                                 verify=deluge_verify_cert, headers=headers, timeout=timeout)
+        response = http_post(delugeweb_url, json=post_json, cookies=cookies,
+                             verify=deluge_verify_cert, headers=headers, timeout=timeout)
         dlcommslogger.debug(f'Status code: {response.status_code}')
         dlcommslogger.debug(response.text)
 
@@ -635,8 +634,8 @@ def set_torrent_path(result):
 
         post_json = {"method": "core.set_torrent_move_completed_path", "params": [result['hash'], dl_dir], "id": 8}
 
-        response = requests.post(delugeweb_url, json=post_json, cookies=cookies,
-                                 verify=deluge_verify_cert, headers=headers, timeout=timeout)
+        response = http_post(delugeweb_url, json=post_json, cookies=cookies,
+                             verify=deluge_verify_cert, headers=headers, timeout=timeout)
         dlcommslogger.debug(f'Status code: {response.status_code}')
         dlcommslogger.debug(response.text)
 
@@ -657,8 +656,8 @@ def torrent_pause(retid):
     try:
         post_json = {"method": "core.pause_torrent", "params": [retid], "id": 9}
 
-        response = requests.post(delugeweb_url, json=post_json, cookies=cookies,
-                                 verify=deluge_verify_cert, headers=headers, timeout=timeout)
+        response = http_post(delugeweb_url, json=post_json, cookies=cookies,
+                             verify=deluge_verify_cert, headers=headers, timeout=timeout)
         dlcommslogger.debug(f'Status code: {response.status_code}')
         dlcommslogger.debug(response.text)
 
@@ -21,6 +21,7 @@ import lazylibrarian
 from lazylibrarian import database
 from lazylibrarian.blockhandler import BLOCKHANDLER
 from lazylibrarian.cache import fetch_url
+from lazylibrarian.cachestore import NEGATIVE
 from lazylibrarian.config2 import CONFIG
 from lazylibrarian.formatter import (
     format_author_name,
@@ -31,6 +32,7 @@ from lazylibrarian.formatter import (
     size_in_bytes,
     url_fix,
 )
+from lazylibrarian.ratelimit import rate_limit
 from lazylibrarian.telemetry import TELEMETRY
 from lib.zlibrary import Zlibrary
 
@@ -62,19 +64,7 @@ def redirect_url(genhost, url):
 
 
 def bok_sleep():
-    cachelogger = logging.getLogger('special.cache')
-    time_now = time.time()
-    delay = time_now - lazylibrarian.TIMERS['LAST_BOK']
-    limit = CONFIG.get_int('SEARCH_RATELIMIT')
-    # make sure bok leaves at least a 2-second delay between calls to prevent "Too many requests from your IP"
-    if limit < 2.0:
-        limit = 2.0
-    if delay < limit:
-        sleep_time = limit - delay
-        lazylibrarian.TIMERS['SLEEP_BOK'] += sleep_time
-        cachelogger.debug(f"B-OK sleep {sleep_time:.3f}, total {lazylibrarian.TIMERS['SLEEP_BOK']:.3f}")
-        time.sleep(sleep_time)
-    lazylibrarian.TIMERS['LAST_BOK'] = time_now
+    rate_limit('bok')
 
 
 def session_get(sess, url, headers):
@@ -277,11 +267,16 @@ def direct_gen(book=None, prov=None, test=False):
         providerurl = url_fix(f"{host}/{search}")
         search_url = f"{providerurl}?{urlencode(params)}"
         next_page = False
+        if page == 1 and not test and NEGATIVE.is_negative(f"{provider} search", search_url):
+            logger.debug(f"No results found from {provider} for {sterm} recently, not searching again yet")
+            return results, errmsg
         result, success = fetch_url(search_url)
         if not success:
             # may return 404 if no results, not really an error
             if '404' in result:
                 logger.debug(f"No results found from {provider} for {sterm}, got 404 for {search_url}")
+                if page == 1:
+                    NEGATIVE.add(f"{provider} search", search_url, result)
             elif '111' in result:
                 # looks like libgen has ip based access limits
                 logger.error(f'Access forbidden. Please wait a while before trying {provider} again.')
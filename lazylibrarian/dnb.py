@@ -6,9 +6,7 @@
 
 import datetime
 import logging
-import os
 import re
-import time
 import traceback
 from queue import Queue
 from urllib.parse import quote
@@ -37,9 +35,9 @@ from lazylibrarian.bookdict import (
     validate_bookdict,
     warn_about_bookdict,
 )
+from lazylibrarian.cachestore import get_counters, get_store
 from lazylibrarian.common import get_user_agent
 from lazylibrarian.config2 import CONFIG
-from lazylibrarian.filesystem import DIRS, path_isfile, syspath
 from lazylibrarian.formatter import (
     get_list,
     is_valid_isbn,
@@ -50,6 +48,7 @@ from lazylibrarian.formatter import (
     thread_name,
     unaccented,
 )
+from lazylibrarian.sessions import http_get
 
 
 class DNB:
@@ -204,32 +203,26 @@ class DNB:
             query_url = self.QUERYURL % (limit, quote(query))
         self.logger.debug(f'DNB Query URL: {query_url}')
         try:
-            cache_location = DIRS.get_cachedir('XMLCache')
-            filename = query_url
-            hashfilename, myhash = self._get_hashed_filename(cache_location, filename)
+            store = get_store('XMLCache')
+            myhash = md5_utf8(query_url)
             # CACHE_AGE is in days, so get it to seconds
             expire_older_than = CONFIG.get_int('CACHE_AGE') * 24 * 60 * 60
-            valid_cache = self.is_in_cache(expire_older_than, hashfilename, myhash)
-            refresh = False
-            if valid_cache and not refresh:
-                lazylibrarian.CACHE_HIT += 1
-                self.logger.debug(f"CacheHandler: Returning CACHED response {hashfilename}")
-                source, ok = self._read_from_cache(hashfilename)
-                if ok:
-                    xml_data = etree.XML(source)
-                else:
-                    xml_data = ''
+            entry = store.get_fresh(myhash, expire_older_than)
+            valid_cache = entry is not None
+            if valid_cache:
+                get_counters('XMLCache').hit()
+                self.logger.debug(f"CacheHandler: Returning CACHED response {myhash}")
+                xml_data = etree.XML(entry.body)
             else:
-                lazylibrarian.CACHE_MISS += 1
+                get_counters('XMLCache').miss()
                 if BLOCKHANDLER.is_blocked('DNB'):
                     return [], False
 
-                response = requests.get(query_url, headers=headers, timeout=timeout)
+                response = http_get(query_url, headers=headers, timeout=timeout)
                 response.raise_for_status()
 
                 self.logger.debug(f"CacheHandler: Storing xml {myhash}")
-                with open(syspath(hashfilename), "wb") as cachefile:
-                    cachefile.write(response.content)
+                store.put(myhash, response.content, headers=response.headers)
                 xml_data = etree.XML(response.content)
 
             num_records = xml_data.xpath("./zs:numberOfRecords",
@@ -246,34 +239,6 @@ class DNB:
             self.logger.error(f'DNB query error: {e}')
             return [], False  # Return empty list, not None
 
-    def is_in_cache(self, expiry: int, hashfilename: str, myhash: str) -> bool:
-        """Check if a cache file is valid."""
-        if path_isfile(hashfilename):
-            cache_modified_time = os.stat(hashfilename).st_mtime
-            time_now = time.time()
-            if expiry and cache_modified_time < time_now - expiry:
-                # Cache entry is too old, delete it
-                self.logger.debug(f"Expiring {myhash}")
-                os.remove(syspath(hashfilename))
-                return False
-            return True
-        return False
-
-    @staticmethod
-    def _read_from_cache(hashfilename: str) -> (str, bool):
-        """Read a cached API response from disk."""
-        source = ''
-        with open(syspath(hashfilename), "rb") as cachefile:
-            source = cachefile.read()
-        return source, True
-
-    @staticmethod
-    def _get_hashed_filename(cache_location: str, url: str) -> (str, str):
-        """Generate a hashed filename for caching."""
-        myhash = md5_utf8(url)
-        hashfilename = os.path.join(cache_location, myhash[0], myhash[1], f"{myhash}.xml")
-        return hashfilename, myhash
-
     def _parse_marc21_record(self, record):
         """Parse MARC21 XML record into book data"""
         ns = {'marc21': 'http://www.loc.gov/MARC21/slim'}
@@ -516,7 +481,7 @@ class DNB:
             url = url_elem.text.strip()
             if url.startswith(("http://deposit.dnb.de/", "https://deposit.dnb.de/")):
                 try:
-                    response = requests.get(url, timeout=30)
+                    response = http_get(url, timeout=30)
                     response.raise_for_status()
 
                     comments_text = response.text
@@ -589,7 +554,7 @@ class DNB:
         cover_url = self.COVERURL % book_data['isbn']
 
         try:
-            response = requests.get(cover_url, timeout=10)
+            response = http_get(cover_url, timeout=10)
             response.raise_for_status()
 
             content_type = response.headers.get('content-type').lower()
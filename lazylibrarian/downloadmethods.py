@@ -48,6 +48,7 @@ from lazylibrarian import (
 from lazylibrarian.annas import annas_download, block_annas
 from lazylibrarian.blockhandler import BLOCKHANDLER
 from lazylibrarian.cache import fetch_url
+from lazylibrarian.cachestore import get_store
 from lazylibrarian.common import get_user_agent, proxy_list
 from lazylibrarian.config2 import CONFIG
 from lazylibrarian.directparser import bok_grabs, bok_login, session_get
@@ -72,6 +73,7 @@ from lazylibrarian.formatter import (
     unaccented,
 )
 from lazylibrarian.ircbot import irc_query
+from lazylibrarian.sessions import http_get
 from lazylibrarian.soulseek import SLSKD
 from lazylibrarian.telemetry import record_usage_data
 from lib.bencode import bdecode, bencode
@@ -629,12 +631,9 @@ def direct_dl_method(bookid=None, dl_title=None, dl_url=None, library='eBook', p
                     redirect = True
 
             if not redirect:
-                cache_location = os.path.join(DIRS.CACHEDIR, "HTMLCache")
                 myhash = md5_utf8(dl_url)
-                hashfilename = os.path.join(cache_location, myhash[0], myhash[1], myhash + ".html")
-                with open(syspath(hashfilename), "wb") as cachefile:
-                    cachefile.write(r.content)
-                logger.debug(f"Saved error page: {hashfilename}")
+                get_store('HTMLCache').put(myhash, r.content, headers=r.headers)
+                logger.debug(f"Saved error page: {myhash}")
                 return False, res
 
     res = f'Failed to download file @ <a href="{dl_url}">{dl_url}</a>'
@@ -682,11 +681,11 @@ def tor_dl_method(bookid=None, tor_title=None, tor_url=None, library='eBook', la
         try:
             logger.debug(f"Fetching {tor_url}")
             if tor_url.startswith('https') and CONFIG.get_bool('SSL_VERIFY'):
-                r = requests.get(tor_url, headers=headers, timeout=90, proxies=proxies,
-                                 verify=CONFIG['SSL_CERTS']
-                                 if CONFIG['SSL_CERTS'] else True)
+                r = http_get(tor_url, headers=headers, timeout=90, proxies=proxies,
+                             verify=CONFIG['SSL_CERTS']
+                             if CONFIG['SSL_CERTS'] else True)
             else:
-                r = requests.get(tor_url, headers=headers, timeout=90, proxies=proxies, verify=False)
+                r = http_get(tor_url, headers=headers, timeout=90, proxies=proxies, verify=False)
             if str(r.status_code).startswith('2'):
                 torrent = r.content
                 if not len(torrent):
@@ -486,7 +486,7 @@ def sync_to_gr():
     db = database.DBConnection()
     # noinspection PyBroadException
     try:
-        db.upsert("jobs", {"Start": time.time()}, {"Name": "GRSYNC"})
+        database.WRITE_QUEUE.upsert("jobs", {"Start": time.time()}, {"Name": "GRSYNC"})
         if CONFIG.get_bool('GR_SYNCUSER'):
             user = db.match("SELECT * from users WHERE UserID=?", (CONFIG['GR_USER'],))
 
@@ -577,7 +577,7 @@ def sync_to_gr():
         return msg
 
     finally:
-        db.upsert("jobs", {"Finish": time.time()}, {"Name": "GRSYNC"})
+        database.WRITE_QUEUE.upsert("jobs", {"Finish": time.time()}, {"Name": "GRSYNC"})
         db.close()
         if new_books:
             threading.Thread(target=lazylibrarian.searchrss.search_rss_book, name='GRSYNCRSSBOOKS',
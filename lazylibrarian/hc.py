@@ -3,7 +3,6 @@ import enum
 import http.client
 import json
 import logging
-import os
 import platform
 import threading
 import time
@@ -23,9 +22,9 @@ from lazylibrarian.bookdict import (
     validate_bookdict,
     warn_about_bookdict,
 )
+from lazylibrarian.cachestore import CacheEntry, get_counters, get_store
 from lazylibrarian.common import get_readinglist, set_readinglist
 from lazylibrarian.config2 import CONFIG
-from lazylibrarian.filesystem import DIRS, path_isfile, syspath
 from lazylibrarian.formatter import (
     check_int,
     date_format,
@@ -37,6 +36,8 @@ from lazylibrarian.formatter import (
     plural,
     thread_name,
 )
+from lazylibrarian.ratelimit import get_limiter, rate_limit
+from lazylibrarian.sessions import http_post
 
 
 class ReadStatus(enum.Enum):
@@ -70,17 +71,9 @@ def test_auth(userid=None, token=None):
     return msg
 
 
-def hc_api_sleep(limit=1.1):  # official limit is 60 requests per minute. limit=1.1 gives us about 55
+def hc_api_sleep():
     """Sleep to respect HardCover API rate limits."""
-    time_now = time.time()
-    delay = time_now - lazylibrarian.TIMERS['LAST_HC']
-    if delay < limit:
-        sleep_time = limit - delay
-        lazylibrarian.TIMERS['SLEEP_HC'] += sleep_time
-        cachelogger = logging.getLogger('special.cache')
-        cachelogger.debug(f"HardCover sleep {sleep_time:.3f}, total {lazylibrarian.TIMERS['SLEEP_HC']:.3f}")
-        time.sleep(sleep_time)
-    lazylibrarian.TIMERS['LAST_HC'] = time_now
+    rate_limit('hardcover')
 
 
 def get_current_userid():
@@ -499,122 +492,145 @@ query FindAuthor { authors_by_pk(id: [authorid])
     mutation DelUserBook { delete_user_book (id: [bookid]) { id }}
 '''
 
-    def is_in_cache(self, expiry: int, hashfilename: str, myhash: str) -> bool:
-        """Check if a cache file is valid."""
-        if path_isfile(hashfilename):
-            cache_modified_time = os.stat(hashfilename).st_mtime
-            time_now = time.time()
-            if expiry and cache_modified_time < time_now - expiry:
-                # Cache entry is too old, delete it
-                self.cachelogger.debug(f"Expiring {myhash}")
-                os.remove(syspath(hashfilename))
-                return False
-            return True
-        return False
-
-    @staticmethod
-    def read_from_cache(hashfilename: str) -> (str, bool):
-        """Read a cached API response from disk."""
-        with open(syspath(hashfilename), "rb") as cachefile:
-            source = cachefile.read()
-        return source, True
-
-    @staticmethod
-    def get_hashed_filename(cache_location: str, url: str) -> (str, str):
-        """Generate a hashed filename for caching."""
-        myhash = md5_utf8(url)
-        hashfilename = os.path.join(cache_location, myhash[0], myhash[1], f"{myhash}.json")
-        return hashfilename, myhash
+    def cache_key(self, searchcmd: str) -> str:
+        """Return the JSONCache key for the result of searchcmd."""
+        return md5_utf8(f"{self.graphql_url}/{str({'query': searchcmd})}")
 
     def result_from_cache(self, searchcmd: str, refresh=False) -> (str, bool):
         """Get API result from cache or fetch if needed."""
-        headers = {'Content-Type': 'application/json',
-                   'User-Agent': self.user_agent,
-                   'authorization': self.apikey
-                   }
-        query = {'query': searchcmd}
-        cache_location = DIRS.get_cachedir('JSONCache')
-        filename = f"{self.graphql_url}/{str(query)}"
-        hashfilename, myhash = self.get_hashed_filename(cache_location, filename)
+        store = get_store('JSONCache')
+        myhash = self.cache_key(searchcmd)
         # CACHE_AGE is in days, so get it to seconds
         expire_older_than = CONFIG.get_int('CACHE_AGE') * 24 * 60 * 60
-        valid_cache = self.is_in_cache(expire_older_than, hashfilename, myhash)
+        entry = store.get_fresh(myhash, expire_older_than)
+        valid_cache = entry is not None
         if valid_cache and not refresh:
-            lazylibrarian.CACHE_HIT += 1
-            self.cachelogger.debug(f"CacheHandler: Returning CACHED response {hashfilename}")
-            source, ok = self.read_from_cache(hashfilename)
-            if ok:
-                res = json.loads(source)
-            else:
-                res = {}
+            get_counters('JSONCache').hit()
+            self.cachelogger.debug(f"CacheHandler: Returning CACHED response {myhash}")
+            res = json.loads(entry.body)
         else:
-            lazylibrarian.CACHE_MISS += 1
+            get_counters('JSONCache').miss()
             if BLOCKHANDLER.is_blocked(self.provider):
                 return {}, False
-            hc_api_sleep()
-            try:
-                http.client.HTTPConnection.debuglevel = 1 if lazylibrarian.REQUESTSLOG else 0
-                r = requests.post(self.graphql_url, json=query, headers=headers)
-                success = str(r.status_code).startswith('2')
-            except requests.exceptions.ConnectionError as e:
-                self.logger.error(str(e))
-                success = False
-                r = None
+            res, success, headers = self.post_query(searchcmd)
             if success:
-                res = r.json()
                 self.cachelogger.debug(f"CacheHandler: Storing json {myhash}")
-                with open(syspath(hashfilename), "w") as cachefile:
-                    cachefile.write(json.dumps(res))
-            else:
-                # expected failure codes...
-                # 401 expired or invalid api token
-                # 403 blocked action (invalid query type, depth limit exceeded, multiple queries)
-                # 429 rate limit of 60 per minute exceeded
-                # 500 internal server error
-                # On 429 error we should get headers
-                # RateLimit-Limit 60 (requests per minute)
-                # RateLimit-Remaining 0 (none left)
-                # RateLimit-Reset 1735843440 (unix seconds count when reset)
-                delay = 0
-                if r.status_code == 429:
-                    limit = r.headers.get('RateLimit-Limit', 'Unknown')
-                    remaining = r.headers.get('RateLimit-Remaining', 'Unknown')
-                    reset = r.headers.get('RateLimit-Reset', 'Unknown')
-                    sleep_time = 0.0
-                    reset = check_int(reset, 0)
-                    if reset:
-                        sleep_time = reset - time.time()
-                        reset = time.strftime("%H:%M:%S", time.localtime(reset))
-                    self.logger.debug(f"429 error. Limit {limit}, Remaining {remaining}, Reset {reset}")
-                    if sleep_time > 0.0:
-                        if sleep_time < 5.0:  # short waits just sleep a bit
-                            time.sleep(sleep_time)
-                            lazylibrarian.TIMERS['SLEEP_HC'] += sleep_time
-                        else:  # longer waits block provider and continue
-                            delay = int(sleep_time)
-                elif r.status_code in [401, 403]:
-                    # allow time for user to update
-                    delay = 24 * 3600
-                elif r.status_code == 500:
-                    # time for hardcover to fix error
-                    delay = 2 * 3600
-                else:
-                    # unexpected error code, short delay
-                    delay = 60
-                # noinspection PyBroadException
-                try:
-                    res = r.json()
-                    msg = str(r.status_code)
-                except Exception:
-                    res = {}
-                    msg = "Unknown reason"
-                if 'error' in res:
-                    msg = str(res['error'])
-                    self.logger.error(msg)
-                if delay:
-                    BLOCKHANDLER.block_provider(self.provider, msg, delay=delay)
+                store.put(myhash, json.dumps(res).encode('utf-8'), headers=headers)
         return res, valid_cache
 
+    def post_query(self, searchcmd: str, block=True) -> (dict, bool, dict):
+        """Send a GraphQL query to HardCover, within its rate limit.
+        Returns the result, whether it succeeded, and the response headers.
+        If block, errors block the provider for a while"""
+        headers = {'Content-Type': 'application/json',
+                   'User-Agent': self.user_agent,
+                   'authorization': self.apikey
+                   }
+        query = {'query': searchcmd}
+        hc_api_sleep()
+        try:
+            http.client.HTTPConnection.debuglevel = 1 if lazylibrarian.REQUESTSLOG else 0
+            r = http_post(self.graphql_url, json=query, headers=headers)
+            success = str(r.status_code).startswith('2')
+        except requests.exceptions.ConnectionError as e:
+            self.logger.error(str(e))
+            return {}, False, {}
+        if success:
+            return r.json(), True, r.headers
+        # expected failure codes...
+        # 401 expired or invalid api token
+        # 403 blocked action (invalid query type, depth limit exceeded, multiple queries)
+        # 429 rate limit of 60 per minute exceeded
+        # 500 internal server error
+        # On 429 error we should get headers
+        # RateLimit-Limit 60 (requests per minute)
+        # RateLimit-Remaining 0 (none left)
+        # RateLimit-Reset 1735843440 (unix seconds count when reset)
+        delay = 0
+        if r.status_code == 429:
+            limit = r.headers.get('RateLimit-Limit', 'Unknown')
+            remaining = r.headers.get('RateLimit-Remaining', 'Unknown')
+            reset = r.headers.get('RateLimit-Reset', 'Unknown')
+            sleep_time = 0.0
+            reset = check_int(reset, 0)
+            if reset:
+                sleep_time = reset - time.time()
+                reset = time.strftime("%H:%M:%S", time.localtime(reset))
+            self.logger.debug(f"429 error. Limit {limit}, Remaining {remaining}, Reset {reset}")
+            if sleep_time > 0.0:
+                if sleep_time < 5.0:  # short waits hold back the next calls a bit
+                    get_limiter('hardcover').hold(sleep_time)
+                else:  # longer waits block provider and continue
+                    delay = int(sleep_time)
+        elif r.status_code in [401, 403]:
+            # allow time for user to update
+            delay = 24 * 3600
+        elif r.status_code == 500:
+            # time for hardcover to fix error
+            delay = 2 * 3600
+        else:
+            # unexpected error code, short delay
+            delay = 60
+        # noinspection PyBroadException
+        try:
+            res = r.json()
+            msg = str(r.status_code)
+        except Exception:
+            res = {}
+            msg = "Unknown reason"
+        if 'error' in res:
+            msg = str(res['error'])
+            self.logger.error(msg)
+        if delay and block:
+            BLOCKHANDLER.block_provider(self.provider, msg, delay=delay)
+        return res, False, {}
+
+    def prefetch_by_pk(self, template: str, placeholder: str, idents, refresh=False) -> int:
+        """Look up template for each of idents not freshly cached, up to HC_BATCH at a time in one
+        aliased query, and cache each answer under the key of its own query, so the single lookups
+        that follow find it in the cache. Returns how many were fetched."""
+        batch_size = CONFIG.get_int('HC_BATCH')
+        if batch_size < 2 or BLOCKHANDLER.is_blocked(self.provider):
+            return 0
+        store = get_store('JSONCache')
+        expire_older_than = CONFIG.get_int('CACHE_AGE') * 24 * 60 * 60
+        pending = {}
+        for ident in idents:
+            key = self.cache_key(template.replace(placeholder, str(ident)))
+            if key in pending:
+                continue
+            if not refresh:
+                fetched = store.fetched(key)
+                if fetched and (not expire_older_than or fetched >= time.time() - expire_older_than):
+                    continue
+            pending[key] = str(ident)
+        if len(pending) < 2:  # a single lookup is no cheaper batched
+            return 0
+
+        # template is "query Name { root_by_pk(id: [placeholder]) { fields } }"
+        selection = template[template.index('{') + 1:template.rindex('}')]
+        root = selection.split('(')[0].strip()
+        pending = list(pending.items())
+        count = 0
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            aliases = ''.join(f"i{n}: {selection.replace(placeholder, ident)}"
+                              for n, (_, ident) in enumerate(batch))
+            res, success, headers = self.post_query(f"query Batch {{{aliases}}}", block=False)
+            if not success or res.get('errors') or not isinstance(res.get('data'), dict):
+                # leave the rest to the single lookups
+                self.logger.debug(f"HardCover batch of {len(batch)} {root} failed: "
+                                  f"{res.get('errors') or res.get('error', 'no data')}")
+                break
+            fetched = time.time()
+            entries = [CacheEntry(key, json.dumps({'data': {root: res['data'][f"i{n}"]}}).encode('utf-8'),
+                                  fetched, headers)
+                       for n, (key, _) in enumerate(batch) if f"i{n}" in res['data']]
+            self.cachelogger.debug(f"CacheHandler: Storing {len(entries)} json from batch of {root}")
+            store.put_many(entries)
+            count += len(entries)
+        return count
+
     def get_series_members(self, series_ident=None, series_title='', queue=None, refresh=False):
         """Get all books in a series from HardCover."""
         resultlist = []
@@ -1245,13 +1261,26 @@ query FindAuthor { authors_by_pk(id: [authorid])
 
                 resultlist.append(bookdict)
 
+            if CONFIG.get_bool('ADD_SERIES'):
+                # fetch the series of all the books together, ready for add_series_entries
+                skip = [item['SeriesID'] for item in
+                        db.select("SELECT SeriesID from series WHERE Status in ('Paused', 'Ignored')")]
+                series_ids = [series[1][2:] for bookdict in resultlist for series in bookdict['series']
+                              if series[1] not in skip]
+                self.prefetch_by_pk(self.HC_BOOK_SERIES_BY_PK, '[seriesid]', series_ids, refresh=refresh)
+
             resultqueue.put(resultlist)
             _ = add_author_books_to_db(resultqueue, bookstatus, audiostatus, entrystatus, reason, authorid,
-                                       self.get_series_members, self.get_bookdict_for_bookid, cache_hits=cache_hits)
+                                       self.get_series_members, self.get_bookdict_for_bookid, cache_hits=cache_hits,
+                                       prefetch_books=self.prefetch_books)
 
         finally:
             db.close()
 
+    def prefetch_books(self, bookids) -> int:
+        """Fetch the books with these HardCover ids together, ready for get_bookdict_for_bookid."""
+        return self.prefetch_by_pk(self.HC_BOOKID_BOOKS, '[bookid]', bookids)
+
     def get_bookdict_for_bookid(self, bookid=None):
         """Get a book's details from HardCover by ID."""
         bookidcmd = self.HC_BOOKID_BOOKS.replace('[bookid]', str(bookid))
@@ -1803,7 +1832,7 @@ query FindAuthor { authors_by_pk(id: [authorid])
                 msg = f"No hc_id for user {ll_userid_context}, first sync?"
                 self.logger.warning(msg)
 
-            db.upsert("jobs", {"Start": time.time()}, {"Name": "HCSYNC"})
+            database.WRITE_QUEUE.upsert("jobs", {"Start": time.time()}, {"Name": "HCSYNC"})
 
             # Get all the user's reading lists
             ll_haveread = get_readinglist('haveread', ll_userid_context)
@@ -1876,6 +1905,10 @@ query FindAuthor { authors_by_pk(id: [authorid])
             for mapp in hc_mapping:
                 books = self._fetch_hc_books_by_status(whoami, mapp[1], mapp[2])
                 stats['hc_books_found'] += len(books)
+                # fetch the books missing from the database together
+                missing = [item['book']['id'] for item in books
+                           if not db.match("SELECT bookid from books WHERE hc_id=?", (item['book']['id'],))]
+                self.prefetch_books(missing)
 
                 for item in books:
                     book_id = self._process_hc_book(item, db, remapped, sync_dict, stats, readonly)
@@ -2119,7 +2152,7 @@ query FindAuthor { authors_by_pk(id: [authorid])
             return f"User {ll_userid_context} HardCover sync failed: {str(e)}"
 
         finally:
-            db.upsert("jobs", {"Finish": time.time()}, {"Name": "HCSYNC"})
+            database.WRITE_QUEUE.upsert("jobs", {"Finish": time.time()}, {"Name": "HCSYNC"})
             db.close()
             self.logger.info(f"HCsync completed for {ll_userid_context}")
             for missed in miss:
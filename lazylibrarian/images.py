@@ -28,6 +28,7 @@ import lazylibrarian
 from lazylibrarian import database
 from lazylibrarian.blockhandler import BLOCKHANDLER
 from lazylibrarian.cache import ImageType, cache_img, fetch_url
+from lazylibrarian.cachestore import NEGATIVE, get_counters
 from lazylibrarian.config2 import CONFIG
 from lazylibrarian.filesystem import (
     DIRS,
@@ -294,7 +295,9 @@ def get_book_covers():
     return msg
 
 
-def cache_bookimg(img, bookid, src, suffix='', imgid=None):
+def cache_bookimg(img, bookid, src, suffix='', imgid=None, negative=''):
+    """ Cache img as the cover of bookid. If negative is given, and the source sent an empty image,
+    remember it has no cover for bookid """
     logger = logging.getLogger(__name__)
     if not imgid:
         imgid = bookid
@@ -312,6 +315,8 @@ def cache_bookimg(img, bookid, src, suffix='', imgid=None):
             data = f.read()
     if len(data) < 50:
         logger.debug(f"Got an empty {src} image for {bookid} [{img}]")
+        if success and negative:
+            NEGATIVE.add(negative, bookid)
     elif success:
         logger.debug(f"Caching {src} cover for {bookid}")
         return coverlink
@@ -320,6 +325,11 @@ def cache_bookimg(img, bookid, src, suffix='', imgid=None):
     return ''
 
 
+def cover_missing(source: str, bookid: str, src: str) -> bool:
+    """ True if searching all sources (no src given), and source recently found no cover for bookid """
+    return not src and NEGATIVE.is_negative(f"{source} cover", bookid)
+
+
 def get_book_cover(bookid=None, src=None, ignore=''):
     """ Return link to a local file containing a book cover image for a bookid, and which source used.
         Try 1. Local file cached from goodreads/googlebooks when book was imported
@@ -362,10 +372,10 @@ def get_book_cover(bookid=None, src=None, ignore=''):
             coverfile = os.path.join(cachedir, "book", f"{bookid}.jpg")
         if not src or src == 'cache' or src == 'current':
             if path_isfile(coverfile):  # use cached image if there is one
-                lazylibrarian.CACHE_HIT = int(lazylibrarian.CACHE_HIT) + 1
+                get_counters('book').hit()
                 return coverlink, 'cache'
             if src:
-                lazylibrarian.CACHE_MISS = int(lazylibrarian.CACHE_MISS) + 1
+                get_counters('book').miss()
                 return None, src
 
         if not src or src == 'cover' and 'cover' not in ignore:
@@ -401,12 +411,13 @@ def get_book_cover(bookid=None, src=None, ignore=''):
 
         # see if librarything has a cover
         if not src or src == 'librarything' and 'librarything' not in ignore:
-            if CONFIG['LT_DEVKEY']:
+            if CONFIG['LT_DEVKEY'] and not cover_missing('librarything', bookid, src):
                 cmd = "select BookISBN from books where bookID=?"
                 item = db.match(cmd, (bookid,))
                 if item and item['BookISBN']:
                     img = '/'.join([CONFIG['LT_URL'], f"devkey/{CONFIG['LT_DEVKEY']}/large/isbn/{item['BookISBN']}"])
-                    coverlink = cache_bookimg(img, bookid, src, suffix='_lt', imgid=imgid)
+                    coverlink = cache_bookimg(img, bookid, src, suffix='_lt', imgid=imgid,
+                                              negative='librarything cover')
                     if coverlink:
                         return coverlink, 'librarything'
                 else:
@@ -426,7 +437,7 @@ def get_book_cover(bookid=None, src=None, ignore=''):
 
         # see if hardcover has a cover
         if not src or src == 'hardcover' and 'hardcover' not in ignore:
-            if item['hc_id']:
+            if item['hc_id'] and not cover_missing('hardcover', bookid, src):
                 h_c = lazylibrarian.hc.HardCover()
                 bookdict, _ = h_c.get_bookdict_for_bookid(item['hc_id'])
                 img = bookdict.get('cover')
@@ -434,12 +445,14 @@ def get_book_cover(bookid=None, src=None, ignore=''):
                     coverlink = cache_bookimg(img, bookid, src, suffix='_hc', imgid=imgid)
                     if coverlink:
                         return coverlink, 'hardcover'
+                elif bookdict:  # no bookdict if hardcover is blocked or the lookup failed
+                    NEGATIVE.add('hardcover cover', bookid)
             if src:
                 return None, src
 
         # try to get a cover from goodreads
         if not src or src == 'goodreads' and 'goodreads' not in ignore:
-            if item['gr_id']:
+            if item['gr_id'] and not cover_missing('goodreads', bookid, src):
                 # if we have a goodreads bookid, we can call https://www.goodreads.com/book/show/{bookID}
                 # and scrape the page for og:image
                 # <meta property="og:image" content="https://i.gr-assets.com/images/S/photo.goodreads.com/books/
@@ -461,16 +474,20 @@ def get_book_cover(bookid=None, src=None, ignore=''):
                             return coverlink, 'goodreads'
                     else:
                         logger.debug(f"No image found in goodreads page for {bookid}")
+                        NEGATIVE.add('goodreads cover', bookid)
                 else:
                     logger.debug(f"Error getting goodreads page {booklink}, [{result}]")
             if src:
                 return None, src
 
         # try to get a cover from openlibrary
-        if not src or src == 'openlibrary' and 'openlibrary' not in ignore:
+        if (not src or src == 'openlibrary' and 'openlibrary' not in ignore) and \
+                not cover_missing('openlibrary', bookid, src):
+            failed = False
             if item and item['ol_id']:
                 baseurl = f"https://covers.openlibrary.org/b/olid/{item['ol_id']}-M.jpg"
                 result, success = fetch_url(baseurl, raw=True)
+                failed = not success
                 if success:
                     with tempfile.NamedTemporaryFile(delete_on_close=False) as f:
                         f.write(result)
@@ -509,12 +526,15 @@ def get_book_cover(bookid=None, src=None, ignore=''):
                 else:
                     logger.debug(f"OpenLibrary error: {result}")
                     BLOCKHANDLER.block_provider("openlibrary", result)
+                    failed = True
+            if item and (item['ol_id'] or item['BookISBN']) and not failed:
+                NEGATIVE.add('openlibrary cover', bookid)
             if src:
                 return None, src
 
         if not src or src == 'googleisbn' and 'googleapis' not in ignore:
             # try a google isbn page search...
-            if item and item['BookISBN']:
+            if item and item['BookISBN'] and not cover_missing('googleisbn', bookid, src):
                 url = f"https://www.googleapis.com/books/v1/volumes?q=isbn:{item['BookISBN']}"
                 result, success = fetch_url(url)
                 if success:
@@ -533,9 +553,10 @@ def get_book_cover(bookid=None, src=None, ignore=''):
                             return coverlink, 'googleisbn'
                     else:
                         logger.debug(f"No image found in google isbn page for {bookid}")
+                        NEGATIVE.add('googleisbn cover', bookid)
                 else:
                     logger.debug("Failed to fetch url from google")
-            else:
+            elif not item or not item['BookISBN']:
                 logger.debug(f"No isbn to search for {bookid}")
             if src:
                 return None, src
@@ -637,12 +658,12 @@ def get_author_image(authorid=None, refresh=False, max_num=1):
         coverfile = os.path.join(cachedir, "author", f"{authorid}.jpg")
 
     if path_isfile(coverfile) and max_num == 1 and not refresh:  # use cached image if there is one
-        lazylibrarian.CACHE_HIT = int(lazylibrarian.CACHE_HIT) + 1
+        get_counters('author').hit()
         logger.debug(f"get_author_image: Returning Cached response for {coverfile}")
         coverlink = coverfile.lstrip(datadir)
         return coverlink
 
-    lazylibrarian.CACHE_MISS = int(lazylibrarian.CACHE_MISS) + 1
+    get_counters('author').miss()
     if PIL and author:
         authorname = safe_unicode(author['AuthorName'])
         safeparams = quote_plus(make_utf8bytes(f"author {authorname}")[0])
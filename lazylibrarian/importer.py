@@ -393,7 +393,7 @@ def add_author_to_db(authorname=None, refresh=False, authorid='', addbooks=True,
 
     # noinspection PyBroadException
     try:
-        db.upsert("jobs", {"Start": time.time()}, {"Name": thread_name()})
+        database.WRITE_QUEUE.upsert("jobs", {"Start": time.time()}, {"Name": thread_name()})
         authorkeys = []
         for item in lazylibrarian.INFOSOURCES.keys():
             this_source = lazylibrarian.INFOSOURCES[item]
@@ -641,7 +641,7 @@ def add_author_to_db(authorname=None, refresh=False, authorid='', addbooks=True,
         logger.debug(msg)
         return None
     finally:
-        db.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
+        database.WRITE_QUEUE.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
         db.close()
 
 
@@ -729,7 +729,7 @@ def de_duplicate(authorid):
     logger = logging.getLogger(__name__)
     db = database.DBConnection()
     author = db.match("SELECT AuthorName from authors where AuthorID=?", (authorid,))
-    db.connection.create_collation('fuzzy', collate_fuzzy)
+    db.create_collation('fuzzy', collate_fuzzy)
     total = 0
     authorname = ''
     booktable_keys = ['BookSub', 'BookDesc', 'BookGenre', 'BookIsbn', 'BookPub', 'BookRate',
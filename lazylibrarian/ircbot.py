@@ -48,6 +48,7 @@ except ModuleNotFoundError:
 
 import lazylibrarian
 from lazylibrarian.blockhandler import BLOCKHANDLER
+from lazylibrarian.cachestore import get_counters
 from lazylibrarian.configtypes import ConfigDict
 from lazylibrarian.filesystem import DIRS, path_isfile, remove_file
 from lazylibrarian.formatter import check_int, md5_utf8, size_in_bytes, today
@@ -182,11 +183,11 @@ def irc_query(provider: ConfigDict, filename, searchterm, searchtype, cache=True
                 valid_cache = True
 
         if valid_cache:
-            lazylibrarian.CACHE_HIT = int(lazylibrarian.CACHE_HIT) + 1
+            get_counters('IRCCache').hit()
             cachelogger.debug(f"CacheHandler: Returning CACHED response {hashfilename} for {searchterm}")
             return None
 
-        lazylibrarian.CACHE_MISS = int(lazylibrarian.CACHE_MISS) + 1
+        get_counters('IRCCache').miss()
 
     bot = IrcBot(searchterm, cache_location, provider['CHANNEL'], provider['BOTNICK'], filename,
                  provider['SERVER'], 6667, searchtype)
@@ -29,6 +29,7 @@ import lazylibrarian
 from lazylibrarian import ROLE, database
 from lazylibrarian.bookrename import audio_rename, book_rename, delete_empty_folders, id3read
 from lazylibrarian.cache import ImageType, cache_img
+from lazylibrarian.cachestore import cache_totals
 from lazylibrarian.config2 import CONFIG
 from lazylibrarian.filesystem import (
     DIRS,
@@ -269,7 +270,7 @@ def find_book_in_db(author, book, ignored=None, library='eBook', reason='find_bo
     author = " ".join(author.split())
     logger.debug(f'Searching database for [{book}] by [{author}] {source}')
     db = database.DBConnection()
-    db.connection.create_collation('nopunctuation', collate_nopunctuation)
+    db.create_collation('nopunctuation', collate_nopunctuation)
     new_author = False
     try:
         check_exist_author = db.match('SELECT AuthorID FROM authors where AuthorName=? COLLATE NOCASE', (author,))
@@ -603,7 +604,7 @@ def library_scan(startdir=None, library='eBook', authid=None, remove=True):
         return 0
 
     db = database.DBConnection()
-    db.upsert("jobs", {"Start": time.time()}, {"Name": thread_name()})
+    database.WRITE_QUEUE.upsert("jobs", {"Start": time.time()}, {"Name": thread_name()})
     if startdir == destdir:
         lazylibrarian.AUTHORS_UPDATE = 1
     logger.debug(f"Counting directories: {startdir}")
@@ -644,19 +645,20 @@ def library_scan(startdir=None, library='eBook', authid=None, remove=True):
                 authors = db.select("SELECT AuthorID,AuthorName FROM authors WHERE instr(AuthorName, '  ') > 0")
                 if authors:
                     logger.info(f"Removing extra spaces from {len(authors)} {plural(len(authors), 'authorname')}")
-                    for author in authors:
-                        authorid = author["AuthorID"]
-                        authorname = ' '.join(author['AuthorName'].split())
-                        # Have we got author name both with-and-without extra spaces? If so, merge them
-                        duplicate = db.match(
-                            'Select AuthorID,AuthorName FROM authors WHERE AuthorName=?', (authorname,))
-                        if duplicate:
-                            db.action('DELETE from authors where authorname=?', (author['AuthorName'],))
-                            if author['AuthorID'] != duplicate['AuthorID']:
-                                db.action('UPDATE books set AuthorID=? WHERE AuthorID=?',
-                                          (duplicate['AuthorID'], author['AuthorID']))
-                        else:
-                            db.action('UPDATE authors set AuthorName=? WHERE AuthorID=?', (authorname, authorid))
+                    with db.transaction():
+                        for author in authors:
+                            authorid = author["AuthorID"]
+                            authorname = ' '.join(author['AuthorName'].split())
+                            # Have we got author name both with-and-without extra spaces? If so, merge them
+                            duplicate = db.match(
+                                'Select AuthorID,AuthorName FROM authors WHERE AuthorName=?', (authorname,))
+                            if duplicate:
+                                db.action('DELETE from authors where authorname=?', (author['AuthorName'],))
+                                if author['AuthorID'] != duplicate['AuthorID']:
+                                    db.action('UPDATE books set AuthorID=? WHERE AuthorID=?',
+                                              (duplicate['AuthorID'], author['AuthorID']))
+                            else:
+                                db.action('UPDATE authors set AuthorName=? WHERE AuthorID=?', (authorname, authorid))
             except Exception as e:
                 logger.error(f'{type(e).__name__} {str(e)}')
         else:
@@ -681,33 +683,36 @@ def library_scan(startdir=None, library='eBook', authid=None, remove=True):
                        "is not null and books.AuthorID = authors.AuthorID")
                 if startdir != destdir:
                     cmd += f" and instr(BookFile, '{startdir}') = 1"
-                books = db.select(cmd)
+                books = db.iterate(cmd)
                 status = CONFIG['NOTFOUND_STATUS']
                 logger.info(f'Missing eBooks will be marked as {status}')
+                missing = []
                 for book in books:
                     bookfile = book['BookFile']
 
                     if bookfile and not path_isfile(bookfile):
-                        db.action("update books set Status=?,BookFile='',BookLibrary='' where BookID=?",
-                                  (status, book['BookID']))
+                        missing.append((status, book['BookID']))
                         logger.warning(f"eBook {book['AuthorName']} - {book['BookName']} updated as not found on disk")
+                db.executemany("update books set Status=?,BookFile='',BookLibrary='' where BookID=?", missing)
 
             else:  # library == 'AudioBook':
                 cmd = ("select AuthorName, BookName, AudioFile, BookID from books,authors where AudioLibrary "
                        "is not null and books.AuthorID = authors.AuthorID")
                 if startdir != destdir:
                     cmd += f" and instr(AudioFile, '{startdir}') = 1"
-                books = db.select(cmd)
+                books = db.iterate(cmd)
                 status = CONFIG['NOTFOUND_STATUS']
                 logger.info(f'Missing AudioBooks will be marked as {status}')
+                missing = []
                 for book in books:
                     bookfile = book['AudioFile']
 
                     if bookfile and not path_isfile(bookfile):
-                        db.action("update books set AudioStatus=?,AudioFile='',AudioLibrary='' where BookID=?",
-                                  (status, book['BookID']))
+                        missing.append((status, book['BookID']))
                         logger.warning(
                             f"Audiobook {book['AuthorName']} - {book['BookName']} updated as not found on disk")
+                db.executemany("update books set AudioStatus=?,AudioFile='',AudioLibrary='' where BookID=?",
+                               missing)
 
         # to save repeat-scans of the same directory if it contains multiple formats of the same book,
         # keep track of which directories we've already looked at
@@ -1388,9 +1393,8 @@ def library_scan(startdir=None, library='eBook', authid=None, remove=True):
                 logger.debug(f"HIT: {bk}")
             for bk in remiss:
                 logger.debug(f"MISS: {bk}")
-            logger.debug(
-                f"Cache {lazylibrarian.CACHE_HIT} {plural(lazylibrarian.CACHE_HIT, 'hit')}, "
-                f"{lazylibrarian.CACHE_MISS} miss")
+            hits, misses = cache_totals()
+            logger.debug(f"Cache {hits} {plural(hits, 'hit')}, {misses} miss")
             cachesize = db.match("select count(*) as counter from languages")
             logger.debug(f"ISBN Language cache holds {cachesize['counter']} {plural(cachesize['counter'], 'entry')}")
 
@@ -1398,30 +1402,34 @@ def library_scan(startdir=None, library='eBook', authid=None, remove=True):
             images = db.select("select bookid, bookimg, bookname from books where instr(bookimg, 'http') = 1")
             if len(images):
                 logger.info(f"Caching {plural(len(images), 'cover')} for {len(images)} {plural(len(images), 'book')}")
+                updates = []
                 for item in images:
                     bookid = item['bookid']
                     bookimg = item['bookimg']
                     # bookname = item['bookname']
                     newimg, success, _ = cache_img(ImageType.BOOK, bookid, bookimg)
                     if success:
-                        db.action('update books set BookImg=? where BookID=?', (newimg, bookid))
+                        updates.append((newimg, bookid))
                     else:
                         logger.warning(f"Unable to cache image for BookID {bookid}")
-                        db.action('update books set BookImg=? where BookID=?', ('images/nocover.png', bookid))
+                        updates.append(('images/nocover.png', bookid))
+                db.executemany('update books set BookImg=? where BookID=?', updates)
 
             images = db.select("select AuthorID, AuthorImg, AuthorName from authors where instr(AuthorImg, 'http') = 1")
             if len(images):
                 logger.info(f"Caching {plural(len(images), 'image')} for {len(images)} {plural(len(images), 'author')}")
+                updates = []
                 for item in images:
                     authorid = item['authorid']
                     authorimg = item['authorimg']
                     # authorname = item['authorname']
                     newimg, success, _ = cache_img(ImageType.AUTHOR, img_id(), authorimg)
                     if success:
-                        db.action('update authors set AuthorImg=? where AuthorID=?', (newimg, authorid))
+                        updates.append((newimg, authorid))
                     else:
                         logger.warning(f"Unable to cache image for AuthorID {authorid}")
-                        db.action('update authors set AuthorImg=? where AuthorID=?', ('images/nophoto.png', authorid))
+                        updates.append(('images/nophoto.png', authorid))
+                db.executemany('update authors set AuthorImg=? where AuthorID=?', updates)
 
             cnt = len(delete_empty_folders(startdir))  # tidy up
             logger.debug(f"Deleted {cnt} empty {plural(cnt, 'folder')} in {startdir}")
@@ -1469,7 +1477,7 @@ def library_scan(startdir=None, library='eBook', authid=None, remove=True):
     finally:
         logger.debug(f"Processed folders: {len(processed_subdirectories)}, "
                      f"matched books: {len(rehit)}, unmatched: {len(remiss)}")
-        db.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
+        database.WRITE_QUEUE.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
         if '_SCAN' in thread_name():
             thread_name('WEBSERVER')
         db.close()
@@ -80,7 +80,7 @@ def magazine_scan(title=None):
             mag_path = os.path.dirname(mag_path)
 
         if CONFIG.get_bool('FULL_SCAN') and not onetitle:
-            mags = db.select('select * from Issues')
+            mags = db.iterate('select Title,IssueDate,IssueFile from Issues')
             # check all the issues are still there, delete entry if not
             for mag in mags:
                 title = mag['Title']
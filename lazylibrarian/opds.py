@@ -179,7 +179,7 @@ class OPDS:
             links.append(getlink(href=f'{self.searchroot}/opensearchbooks.xml',
                                  ftype='application/opensearchdescription+xml', rel='search', title='Search Books'))
 
-            res = db.match("select count(*) as counter from books where Status='Open'")
+            res = db.cached_match("select count(*) as counter from books where Status='Open'")
             if res['counter'] > 0:
                 entries.append(
                     {
@@ -193,7 +193,7 @@ class OPDS:
                     }
                 )
 
-            res = db.match("select count(*) as counter from books where AudioStatus='Open'")
+            res = db.cached_match("select count(*) as counter from books where AudioStatus='Open'")
             if res['counter'] > 0:
                 entries.append(
                     {
@@ -207,7 +207,7 @@ class OPDS:
                     }
                 )
 
-            res = db.match("SELECT count(*) as counter from comics WHERE LastAcquired != ''")
+            res = db.cached_match("SELECT count(*) as counter from comics WHERE LastAcquired != ''")
             if res['counter'] > 0:
                 entries.append(
                     {
@@ -221,7 +221,7 @@ class OPDS:
                     }
                 )
 
-            res = db.match("select count(*) as counter from issues where IssueFile != ''")
+            res = db.cached_match("select count(*) as counter from issues where IssueFile != ''")
             if res['counter'] > 0:
                 entries.append(
                     {
@@ -235,7 +235,7 @@ class OPDS:
                     }
                 )
 
-            res = db.match("select count(*) as counter from books where Status='Open' "
+            res = db.cached_match("select count(*) as counter from books where Status='Open' "
                            "and CAST(BookRate AS INTEGER) > 0")
             if res['counter'] > 0:
                 entries.append(
@@ -252,7 +252,7 @@ class OPDS:
 
             cmd = ("select count(*) as counter from books where AudioStatus='Open' "
                    "and CAST(BookRate AS INTEGER) > 0")
-            res = db.match(cmd)
+            res = db.cached_match(cmd)
             if res['counter'] > 0:
                 entries.append(
                     {
@@ -295,7 +295,7 @@ class OPDS:
                     )
 
             cmd = "SELECT count(*) as counter from authors WHERE Status != 'Ignored' and HaveEBooks > 0"
-            res = db.match(cmd)
+            res = db.cached_match(cmd)
             if res['counter'] > 0:
                 entries.append(
                     {
@@ -310,7 +310,7 @@ class OPDS:
                 )
 
             cmd = "SELECT count(*) as counter from authors WHERE Status != 'Ignored' and HaveAudioBooks > 0"
-            res = db.match(cmd)
+            res = db.cached_match(cmd)
             if res['counter'] > 0:
                 entries.append(
                     {
@@ -324,7 +324,7 @@ class OPDS:
                     }
                 )
 
-            res = db.match("SELECT count(*) as counter from series WHERE CAST(Have AS INTEGER) > 0")
+            res = db.cached_match("SELECT count(*) as counter from series WHERE CAST(Have AS INTEGER) > 0")
             if res['counter'] > 0:
                 entries.append(
                     {
@@ -342,7 +342,7 @@ class OPDS:
                    "as cnt from genres where cnt > 0")
             # cmd = "select distinct BookGenre from books where Status='Open' and BookGenre != ''
             # and BookGenre !='Unknown'"
-            res = db.select(cmd)
+            res = db.cached_select(cmd)
             if res and len(res) > 0:
                 entries.append(
                     {
@@ -356,7 +356,7 @@ class OPDS:
                     }
                 )
 
-            res = db.match("SELECT count(*) as counter from magazines WHERE LastAcquired != ''")
+            res = db.cached_match("SELECT count(*) as counter from magazines WHERE LastAcquired != ''")
             if res['counter'] > 0:
                 entries.append(
                     {
@@ -370,7 +370,7 @@ class OPDS:
                     }
                 )
 
-            res = db.match("SELECT count(*) as counter from comics WHERE LastAcquired != ''")
+            res = db.cached_match("SELECT count(*) as counter from comics WHERE LastAcquired != ''")
             if res['counter'] > 0:
                 entries.append(
                     {
@@ -586,13 +586,16 @@ class OPDS:
                              ftype='application/atom+xml; profile=opds-catalog; kind=navigation', rel='self'))
         links.append(getlink(href=f'{self.searchroot}/opensearchauthors.xml',
                              ftype='application/opensearchdescription+xml', rel='search', title='Search Authors'))
-        cmd = "SELECT AuthorName,AuthorID,HaveEBooks,TotalBooks,Updated,AuthorImg from Authors WHERE "
+        cmd = "SELECT AuthorName,AuthorID,HaveEBooks,TotalBooks,Updated,AuthorImg from Authors "
+        args = []
         if 'query' in kwargs:
-            cmd += f"instr(AuthorName, '{kwargs['query']}') > 0 AND "
-        cmd += "HaveEBooks > 0 order by AuthorName"
+            join, args = database.fts_join('authors', kwargs['query'])
+            cmd += join + "WHERE HaveEBooks > 0 order by fts.rank, AuthorName"
+        else:
+            cmd += "WHERE HaveEBooks > 0 order by AuthorName"
         db = database.DBConnection()
         try:
-            results = db.select(cmd)
+            results = db.select(cmd, tuple(args))
         finally:
             db.close()
         if limit:
@@ -663,13 +666,16 @@ class OPDS:
                              ftype='application/atom+xml; profile=opds-catalog; kind=navigation', rel='self'))
         links.append(getlink(href=f'{self.searchroot}/opensearchauthors.xml',
                              ftype='application/opensearchdescription+xml', rel='search', title='Search Authors'))
-        cmd = "SELECT AuthorName,AuthorID,HaveAudioBooks,TotalBooks,Updated,AuthorImg from Authors WHERE "
+        cmd = "SELECT AuthorName,AuthorID,HaveAudioBooks,TotalBooks,Updated,AuthorImg from Authors "
+        args = []
         if 'query' in kwargs:
-            cmd += f"instr(AuthorName, '{kwargs['query']}') > 0 AND "
-        cmd += "HaveAudioBooks > 0 order by AuthorName"
+            join, args = database.fts_join('authors', kwargs['query'])
+            cmd += join + "WHERE HaveAudioBooks > 0 order by fts.rank, AuthorName"
+        else:
+            cmd += "WHERE HaveAudioBooks > 0 order by AuthorName"
         db = database.DBConnection()
         try:
-            results = db.select(cmd)
+            results = db.select(cmd, tuple(args))
         finally:
             db.close()
         if limit:
@@ -883,13 +889,16 @@ class OPDS:
                              ftype='application/atom+xml; profile=opds-catalog; kind=navigation', rel='self'))
         links.append(getlink(href=f'{self.searchroot}/opensearchseries.xml',
                              ftype='application/opensearchdescription+xml', rel='search', title='Search Series'))
-        cmd = "SELECT SeriesName,SeriesID,Have,Total from Series WHERE CAST(Have AS INTEGER) > 0 "
+        cmd = "SELECT SeriesName,SeriesID,Have,Total from Series "
+        args = []
         if 'query' in kwargs:
-            cmd += f"AND instr(SeriesName, '{kwargs['query']}') > 0 "
-        cmd += "order by SeriesName"
+            join, args = database.fts_join('series', kwargs['query'])
+            cmd += join + "WHERE CAST(Have AS INTEGER) > 0 order by fts.rank, SeriesName"
+        else:
+            cmd += "WHERE CAST(Have AS INTEGER) > 0 order by SeriesName"
         db = database.DBConnection()
         try:
-            results = db.select(cmd)
+            results = db.select(cmd, tuple(args))
             if limit:
                 page = results[index:(index + limit)]
             else:
@@ -1112,11 +1121,14 @@ class OPDS:
         try:
             author = db.match("SELECT AuthorName from authors WHERE AuthorID=?", (kwargs['authorid'],))
             author = make_unicode(author['AuthorName'])
-            cmd = "SELECT BookName,BookDate,BookID,BookAdded,BookDesc,BookImg,BookFile from books WHERE "
+            cmd = "SELECT BookName,BookDate,BookID,BookAdded,BookDesc,BookImg,BookFile from books "
+            args = []
             if 'query' in kwargs:
-                cmd += f"instr(BookName, '{kwargs['query']}' > 0 AND "
-            cmd += "Status='Open' and AuthorID=? order by BookDate DESC"
-            results = db.select(cmd, (kwargs['authorid'],))
+                join, args = database.fts_join('books', kwargs['query'])
+                cmd += join + "WHERE Status='Open' and AuthorID=? order by fts.rank, BookDate DESC"
+            else:
+                cmd += "WHERE Status='Open' and AuthorID=? order by BookDate DESC"
+            results = db.select(cmd, tuple(args + [kwargs['authorid']]))
         finally:
             db.close()
         if limit:
@@ -1205,11 +1217,14 @@ class OPDS:
         try:
             author = db.match("SELECT AuthorName from authors WHERE AuthorID=?", (kwargs['authorid'],))
             author = make_unicode(author['AuthorName'])
-            cmd = "SELECT BookName,BookDate,BookID,BookAdded,BookDesc,BookImg,AudioFile from books WHERE "
+            cmd = "SELECT BookName,BookDate,BookID,BookAdded,BookDesc,BookImg,AudioFile from books "
+            args = []
             if 'query' in kwargs:
-                cmd += f"instr(BookName, '{kwargs['query']}') > 0 AND "
-            cmd += "AudioStatus='Open' and AuthorID=? order by BookDate DESC"
-            results = db.select(cmd, (kwargs['authorid'],))
+                join, args = database.fts_join('books', kwargs['query'])
+                cmd += join + "WHERE AudioStatus='Open' and AuthorID=? order by fts.rank, BookDate DESC"
+            else:
+                cmd += "WHERE AudioStatus='Open' and AuthorID=? order by BookDate DESC"
+            results = db.select(cmd, tuple(args + [kwargs['authorid']]))
         finally:
             db.close()
         if limit:
@@ -1546,17 +1561,24 @@ class OPDS:
         links.append(getlink(href=f'{self.searchroot}/opensearchbooks.xml',
                              ftype='application/opensearchdescription+xml', rel='search', title='Search Books'))
         cmd = ("select BookName,BookID,BookLibrary,BookDate,BookImg,BookDesc,BookRate,BookAdded,BookFile,AuthorID "
-               "from books where Status='Open' ")
+               "from books ")
+        args = []
+        rank = ''
         if 'query' in kwargs:
-            cmd += f"AND instr(BookName, '{kwargs['query']}') > 0 "
+            join, args = database.fts_join('books', kwargs['query'])
+            cmd += join
+            rank = 'fts.rank, '
+        cmd += "where Status='Open' "
         if sorder == 'Recent':
-            cmd += "order by BookLibrary DESC, BookName ASC"
+            cmd += f"order by {rank}BookLibrary DESC, BookName ASC"
         if sorder == 'Rated':
-            cmd += "and CAST(BookRate AS INTEGER) > 0 order by BookRate DESC, BookDate DESC"
+            cmd += f"and CAST(BookRate AS INTEGER) > 0 order by {rank}BookRate DESC, BookDate DESC"
+        if rank and sorder not in ['Recent', 'Rated']:
+            cmd += "order by fts.rank"
 
         db = database.DBConnection()
         try:
-            results = db.select(cmd)
+            results = db.select(cmd, tuple(args))
             self.dlcommslogger.debug(f"Initial select found {len(results)}")
 
             readfilter = None
@@ -1672,17 +1694,23 @@ class OPDS:
                              ftype='application/opensearchdescription+xml', rel='search', title='Search Books'))
 
         cmd = ("select BookName,BookID,AudioLibrary,BookDate,BookImg,BookDesc,BookRate,BookAdded,AuthorID"
-               " from books WHERE ")
+               " from books ")
+        args = []
+        rank = ''
         if 'query' in kwargs:
-            cmd += f"instr(BookName, '{kwargs['query']}') > 0 AND "
-        cmd += "AudioStatus='Open'"
+            join, args = database.fts_join('books', kwargs['query'])
+            cmd += join
+            rank = 'fts.rank, '
+        cmd += "WHERE AudioStatus='Open'"
         if sorder == 'Recent':
-            cmd += " order by AudioLibrary DESC, BookName ASC"
+            cmd += f" order by {rank}AudioLibrary DESC, BookName ASC"
         if sorder == 'Rated':
-            cmd += " order by BookRate DESC, BookDate DESC"
+            cmd += f" order by {rank}BookRate DESC, BookDate DESC"
+        if rank and sorder not in ['Recent', 'Rated']:
+            cmd += " order by fts.rank"
         db = database.DBConnection()
         try:
-            results = db.select(cmd)
+            results = db.select(cmd, tuple(args))
             if limit:
                 page = results[index:(index + limit)]
             else:
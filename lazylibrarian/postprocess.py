@@ -2789,7 +2789,7 @@ def process_dir(reset=False, startdir=None, ignoreclient=False, downloadid=None)
 
     db = database.DBConnection()
     try:
-        db.upsert("jobs", {"Start": time.time()}, {"Name": thread_name()})
+        database.WRITE_QUEUE.upsert("jobs", {"Start": time.time()}, {"Name": thread_name()})
 
         # Now we will get a list of wanted books that are snatched and ready for processing
         if downloadid:
@@ -3013,7 +3013,7 @@ def process_dir(reset=False, startdir=None, ignoreclient=False, downloadid=None)
         _manage_download_status(db, postprocesslogger)
 
         # Cleanup and scheduling
-        db.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
+        database.WRITE_QUEUE.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
         _check_and_schedule_next_run(db, logger, reset)
 
     except Exception:
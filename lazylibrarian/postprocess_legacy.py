@@ -1005,7 +1005,7 @@ def process_dir(reset=False, startdir=None, ignoreclient=False, downloadid=None)
     db = database.DBConnection()
     try:
         ppcount = 0
-        db.upsert("jobs", {"Start": time.time()}, {"Name": thread_name()})
+        database.WRITE_QUEUE.upsert("jobs", {"Start": time.time()}, {"Name": thread_name()})
         skipped_extensions = get_list(CONFIG['SKIPPED_EXT'])
         if startdir:
             templist = [startdir]
@@ -1888,7 +1888,7 @@ def process_dir(reset=False, startdir=None, ignoreclient=False, downloadid=None)
                     f" Progress {progress} {skipped}"
                     f" Status {book['Status']}")
 
-        db.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
+        database.WRITE_QUEUE.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
         # Check if postprocessor needs to run again
         snatched = db.select("SELECT * from wanted WHERE Status='Snatched'")
         seeding = db.select("SELECT * from wanted WHERE Status='Seeding'")
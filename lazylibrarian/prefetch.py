@@ -0,0 +1,110 @@
+#  This file is part of Lazylibrarian.
+#  Lazylibrarian is free software':'you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  Lazylibrarian is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#  You should have received a copy of the GNU General Public License
+#  along with Lazylibrarian.  If not, see <http://www.gnu.org/licenses/>.
+
+# Purpose:
+#   Warm the JSON and XML caches for the next authors and series due a scheduled refresh,
+#   so the refresh mostly reads from the cache instead of waiting on rate limited sources
+
+import logging
+import threading
+import time
+
+import lazylibrarian
+from lazylibrarian.bookwork import get_series_members
+from lazylibrarian.importer import get_all_author_details
+
+# Prefetched items not refreshed within this many seconds are forgotten
+PREFETCH_KEEP = 24 * 60 * 60
+
+
+def warm_author(authorid: str, authorname: str):
+    get_all_author_details(authorid, authorname)
+
+
+def warm_series(seriesid: str, seriesname: str):
+    get_series_members(seriesid, seriesname)
+
+
+WARMERS = {'author': warm_author, 'series': warm_series}
+
+
+class CachePrefetcher:
+    """ Fetches the source data for authors or series in a background thread, one thread per kind.
+    Items are fetched one after another, so each source's own rate limiting sets the pace.
+    Counts how many refreshes found their item prefetched """
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.threads = {}
+        self.warmed = {}  # When each item was prefetched, by kind and ID
+        self.counters = {}
+
+    def count(self, kind: str, item: str):
+        with self.lock:
+            counters = self.counters.setdefault(kind, {'warmed': 0, 'failed': 0, 'used': 0, 'missed': 0})
+            counters[item] += 1
+
+    def start(self, kind: str, items: list[tuple[str, str]]) -> bool:
+        """ Prefetch items, a list of (ID, name) of kind 'author' or 'series', skipping any already done.
+        Does nothing if a prefetch of that kind is still running. Returns True if one was started """
+        with self.lock:
+            thread = self.threads.get(kind)
+            if thread and thread.is_alive():
+                return False
+            warmed = self.warmed.setdefault(kind, {})
+            too_old = time.time() - PREFETCH_KEEP
+            for ident in [ident for ident, when in warmed.items() if when < too_old]:
+                del warmed[ident]
+            items = [item for item in items if item[0] not in warmed]
+            if not items:
+                return False
+            thread = threading.Thread(target=self.run, name=f"PREFETCH-{kind.upper()}", args=[kind, items],
+                                      daemon=True)
+            self.threads[kind] = thread
+        thread.start()
+        return True
+
+    def run(self, kind: str, items: list[tuple[str, str]]):
+        self.logger.debug(f"Prefetching {len(items)} {kind} {[item[1] for item in items]}")
+        for ident, name in items:
+            if lazylibrarian.STOPTHREADS:
+                break
+            try:
+                WARMERS[kind](ident, name)
+            except Exception as e:
+                self.logger.warning(f"Prefetch of {kind} {name} failed: {type(e).__name__} {e}")
+                self.count(kind, 'failed')
+                continue
+            with self.lock:
+                self.warmed.setdefault(kind, {})[ident] = time.time()
+            self.count(kind, 'warmed')
+
+    def used(self, kind: str, ident: str) -> bool:
+        """ Call when ident is refreshed, returns True if it had been prefetched """
+        with self.lock:
+            hit = self.warmed.get(kind, {}).pop(ident, None) is not None
+        self.count(kind, 'used' if hit else 'missed')
+        return hit
+
+    def wait(self, kind: str, timeout: float | None = None):
+        """ Wait for a running prefetch of kind to finish """
+        with self.lock:
+            thread = self.threads.get(kind)
+        if thread:
+            thread.join(timeout)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {kind: dict(counters) for kind, counters in sorted(self.counters.items())}
+
+
+PREFETCH = CachePrefetcher()
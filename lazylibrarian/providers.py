@@ -16,6 +16,7 @@ import os
 import re
 import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from copy import deepcopy
 from urllib.parse import urlencode, urlparse
 from xml.etree import ElementTree
@@ -342,7 +343,7 @@ def test_provider(name: str, host=None, api=None):
 def get_searchterm(book, search_type):
     authorname = clean_name(book['authorName'], "'")
     bookname = clean_name(book['bookName'], "'")
-    if search_type in ['book', 'audio'] or 'short' in search_type:
+    if search_type in ['book', 'audio', 'authorbook', 'authoraudio'] or 'short' in search_type:
         if bookname == authorname and book['bookSub']:
             # books like "Spike Milligan: Man of Letters"
             # where we split the title/subtitle on ':'
@@ -569,10 +570,86 @@ def get_capabilities(provider: ConfigDict, force=False):
     return updated
 
 
+def call_provider(name: str, start: float, function, args) -> tuple[list, str]:
+    """ Wait until time start, for the provider's rate limit, then return function(*args),
+    which returns (results, error). Exceptions are returned as the error """
+    delay = start - time.time()
+    if delay > 0:
+        time.sleep(delay)
+    try:
+        return function(*args)
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Error querying {name}: {type(e).__name__} {e}")
+        return [], f"{type(e).__name__} {e}"
+
+
+def query_providers(jobs: list) -> list[tuple[str, list, str]]:
+    """ Query several providers at once, up to SEARCH_THREADS at a time.
+    jobs is a list of (name, start, function, args), see call_provider.
+    Returns (name, results, error) in the order of jobs, however long each provider took.
+    Each provider has SEARCH_TIMEOUT seconds to answer, from when its query could start. Those that
+    don't are left to finish on their own and returned as an error. If every thread is stuck on one
+    of those, providers still waiting for a thread are not queried, and not returned as an error """
+    logger = logging.getLogger(__name__)
+    threads = min(CONFIG.get_int('SEARCH_THREADS'), len(jobs))
+    if threads <= 1:
+        return [(job[0], *call_provider(*job)) for job in jobs]
+
+    timeout = CONFIG.get_int('SEARCH_TIMEOUT') or None
+    deadlines = {}  # When each job must answer by, by index, set when a thread takes it
+
+    def run(index: int, name: str, start: float, function, args) -> tuple[list, str]:
+        if timeout:
+            deadlines[index] = max(time.time(), start) + timeout
+        return call_provider(name, start, function, args)
+
+    executor = ThreadPoolExecutor(max_workers=threads,
+                                  thread_name_prefix=f"{threading.current_thread().name}-PROVIDER")
+    try:
+        futures = [executor.submit(run, index, *job) for index, job in enumerate(jobs)]
+        pending = set(range(len(jobs)))
+        late = set()
+        if not timeout:
+            wait(futures)
+            pending.clear()
+        while pending:
+            running = [deadlines[index] for index in pending if index in deadlines]
+            if not running and sum(not futures[index].done() for index in late) >= threads:
+                break
+            # jobs taken by a thread while waiting are picked up within a second
+            wait_for = min(running) - time.time() if running else 1
+            wait([futures[index] for index in pending], timeout=max(wait_for, 0), return_when=FIRST_COMPLETED)
+            time_now = time.time()
+            for index in list(pending):
+                if futures[index].done():
+                    pending.remove(index)
+                elif deadlines.get(index, time_now + 1) <= time_now:
+                    pending.remove(index)
+                    late.add(index)
+        merged = []
+        for index, job in enumerate(jobs):
+            if index in late:
+                logger.warning(f"No answer from {job[0]} within {timeout} {plural(timeout, 'second')}")
+                merged.append((job[0], [], f"No answer within {timeout} {plural(timeout, 'second')}"))
+            elif index in pending:
+                logger.warning(f"{job[0]} not queried, all search threads are waiting on other providers")
+                merged.append((job[0], [], ''))
+            else:
+                merged.append((job[0], *futures[index].result()))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return merged
+
+
+def znab_query(book: dict, provider: ConfigDict, search_type: str, search_mode: str) -> tuple[list, str]:
+    # newznab_plus blocks the provider itself if it fails
+    return newznab_plus(book, provider, search_type, search_mode)[1], ''
+
+
 def iterate_over_znab_sites(book=None, search_type=None):
     """
-    Purpose of this function is to read the config file, and loop through all active NewsNab+ and Torznab
-    sites and return the compiled results list from all sites back to the caller
+    Purpose of this function is to read the config file, and query all active NewsNab+ and Torznab
+    sites at once and return the compiled results list from all sites back to the caller
     We get called with book[] and searchType of "book", "mag", "general" etc
     """
 
@@ -580,121 +657,70 @@ def iterate_over_znab_sites(book=None, search_type=None):
     iterateproviderslogger = logging.getLogger('special.iterateproviders')
     iterateproviderslogger.debug(f"ZNAB: Book:{book}, SearchType:{search_type}")
     resultslist = []
-    providers = 0
+    jobs = []
     last_used = []
     api_count = []
-    try:
-        for prov in CONFIG.providers('NEWZNAB'):
-            provider = deepcopy(prov)
-            dispname = provider['DISPNAME']
-            if not dispname:
-                dispname = provider['HOST']
-            iterateproviderslogger.debug(f"DLTYPES: {dispname}: {bool(provider['ENABLED'])} {provider['DLTYPES']}")
-            if provider['ENABLED'] and search_type:
-                ignored = False
-                if BLOCKHANDLER.is_blocked(provider['HOST']):
-                    logger.debug(f'{dispname} is BLOCKED')
-                    ignored = True
-                elif "book" in search_type and 'E' not in provider['DLTYPES']:
-                    logger.debug(f"Ignoring {dispname} for eBook")
-                    ignored = True
-                elif "audio" in search_type and 'A' not in provider['DLTYPES']:
-                    logger.debug(f"Ignoring {dispname} for AudioBook")
-                    ignored = True
-                elif "mag" in search_type and 'M' not in provider['DLTYPES']:
-                    logger.debug(f"Ignoring {dispname} for Magazine")
-                    ignored = True
-                elif "comic" in search_type and 'C' not in provider['DLTYPES']:
-                    logger.debug(f"Ignoring {dispname} for Comic")
-                    ignored = True
-                if not ignored:
-                    if provider.get_int('APILIMIT'):
-                        if 'APICOUNT' in provider:
-                            res = provider.get_int('APICOUNT')
-                        else:
-                            res = 0
-                        if res >= provider.get_int('APILIMIT'):
-                            BLOCKHANDLER.block_provider(provider['HOST'],
-                                                        f"Reached Daily API limit ({provider['APILIMIT']})",
-                                                        delay=seconds_to_midnight())
-                        else:
-                            api_count.append([prov, res + 1])
-
-                    if not BLOCKHANDLER.is_blocked(provider['HOST']):
-                        ratelimit = provider.get_int('RATELIMIT')
-                        if ratelimit:
-                            if provider.get_int('LASTUSED') > 0:
-                                delay = provider.get_int('LASTUSED') + ratelimit - time.time()
-                                if delay > 0:
-                                    time.sleep(delay)
-                            last_used.append([prov, int(time.time())])
-
-                        providers += 1
-                        logger.debug(f'Querying provider {dispname}')
-                        resultslist += newznab_plus(book, provider, search_type, "nzb")[1]
-    except RuntimeError:
-        logger.debug("Error iterating newznab")
-
-    for item in last_used:
-        logger.debug(f"Updating LASTUSED for {item[0]['NAME']}")
-        item[0].set_int('LASTUSED', item[1])
-    for item in api_count:
-        logger.debug(f"Updating APICOUNT for {item[0]['NAME']}")
-        item[0].set_int('APICOUNT', item[1])
-
-    last_used = []
-    api_count = []
-    try:
-        for prov in CONFIG.providers('TORZNAB'):
-            provider = deepcopy(prov)
-            dispname = provider['DISPNAME']
-            if not dispname:
-                dispname = provider['HOST']
-            iterateproviderslogger.debug(f"DLTYPES: {dispname}: {bool(provider['ENABLED'])} {provider['DLTYPES']}")
-            if provider['ENABLED'] and search_type:
-                ignored = False
-                if BLOCKHANDLER.is_blocked(provider['HOST']):
-                    logger.debug(f'{dispname} is BLOCKED')
-                    ignored = True
-                elif 'book' in search_type and 'E' not in provider['DLTYPES']:
-                    logger.debug(f"Ignoring {dispname} for eBook")
-                    ignored = True
-                elif "audio" in search_type and 'A' not in provider['DLTYPES']:
-                    logger.debug(f"Ignoring {dispname} for AudioBook")
-                    ignored = True
-                elif "mag" in search_type and 'M' not in provider['DLTYPES']:
-                    logger.debug(f"Ignoring {dispname} for Magazine")
-                    ignored = True
-                elif "comic" in search_type and 'C' not in provider['DLTYPES']:
-                    logger.debug(f"Ignoring {dispname} for Comic")
-                    ignored = True
-                if not ignored:
-                    if provider.get_int('APILIMIT'):
-                        if 'APICOUNT' in provider:
-                            res = provider.get_int('APICOUNT')
-                        else:
-                            res = 0
-                        if res >= provider.get_int('APILIMIT'):
-                            BLOCKHANDLER.block_provider(provider['HOST'],
-                                                        f"Reached Daily API limit ({provider['APILIMIT']})",
-                                                        delay=seconds_to_midnight())
-                        else:
-                            api_count.append([prov, res + 1])
-
-                    if not BLOCKHANDLER.is_blocked(provider['HOST']):
-                        ratelimit = provider.get_int('RATELIMIT')
-                        if ratelimit:
-                            if provider.get_int('LASTUSED') > 0:
-                                delay = provider.get_int('LASTUSED') + ratelimit - time.time()
-                                if delay > 0:
-                                    time.sleep(delay)
-                            last_used.append([prov, int(time.time())])
-
-                        providers += 1
-                        logger.debug(f'Querying provider {dispname}')
-                        resultslist += newznab_plus(book, provider, search_type, "torznab")[1]
-    except RuntimeError:
-        logger.debug("Error iterating torznab")
+    for provtype, search_mode in [('NEWZNAB', 'nzb'), ('TORZNAB', 'torznab')]:
+        try:
+            for prov in CONFIG.providers(provtype):
+                provider = deepcopy(prov)
+                dispname = provider['DISPNAME']
+                if not dispname:
+                    dispname = provider['HOST']
+                iterateproviderslogger.debug(f"DLTYPES: {dispname}: {bool(provider['ENABLED'])} "
+                                             f"{provider['DLTYPES']}")
+                if provider['ENABLED'] and search_type:
+                    ignored = False
+                    if BLOCKHANDLER.is_blocked(provider['HOST']):
+                        logger.debug(f'{dispname} is BLOCKED')
+                        ignored = True
+                    elif "book" in search_type and 'E' not in provider['DLTYPES']:
+                        logger.debug(f"Ignoring {dispname} for eBook")
+                        ignored = True
+                    elif "audio" in search_type and 'A' not in provider['DLTYPES']:
+                        logger.debug(f"Ignoring {dispname} for AudioBook")
+                        ignored = True
+                    elif "mag" in search_type and 'M' not in provider['DLTYPES']:
+                        logger.debug(f"Ignoring {dispname} for Magazine")
+                        ignored = True
+                    elif "comic" in search_type and 'C' not in provider['DLTYPES']:
+                        logger.debug(f"Ignoring {dispname} for Comic")
+                        ignored = True
+                    elif search_type.startswith('author') and not can_search_by_author(provider, search_type):
+                        logger.debug(f"Ignoring {dispname} for author search")
+                        ignored = True
+                    if not ignored:
+                        if provider.get_int('APILIMIT'):
+                            if 'APICOUNT' in provider:
+                                res = provider.get_int('APICOUNT')
+                            else:
+                                res = 0
+                            if res >= provider.get_int('APILIMIT'):
+                                BLOCKHANDLER.block_provider(provider['HOST'],
+                                                            f"Reached Daily API limit ({provider['APILIMIT']})",
+                                                            delay=seconds_to_midnight())
+                            else:
+                                api_count.append([prov, res + 1])
+
+                        if not BLOCKHANDLER.is_blocked(provider['HOST']):
+                            # the query waits until ratelimit seconds after the last one
+                            start = time.time()
+                            ratelimit = provider.get_int('RATELIMIT')
+                            if ratelimit:
+                                if provider.get_int('LASTUSED') > 0:
+                                    start = max(start, provider.get_int('LASTUSED') + ratelimit)
+                                last_used.append([prov, int(start)])
+
+                            logger.debug(f'Querying provider {dispname}')
+                            jobs.append((provider['HOST'], start, znab_query,
+                                         (book, provider, search_type, search_mode)))
+        except RuntimeError:
+            logger.debug(f"Error iterating {provtype.lower()}")
+
+    for name, results, error in query_providers(jobs):
+        if error:
+            BLOCKHANDLER.block_provider(name, error)
+        resultslist += results
 
     for item in last_used:
         logger.debug(f"Updating LASTUSED for {item[0]['NAME']}")
@@ -703,7 +729,7 @@ def iterate_over_znab_sites(book=None, search_type=None):
         logger.debug(f"Updating APICOUNT for {item[0]['NAME']}")
         item[0].set_int('APICOUNT', item[1])
 
-    return resultslist, providers
+    return resultslist, len(jobs)
 
 
 def iterate_over_torrent_sites(book=None, search_type=None):
@@ -712,6 +738,7 @@ def iterate_over_torrent_sites(book=None, search_type=None):
     iterateproviderslogger.debug(f"Torrents: Book:{book}, SearchType:{search_type}")
     resultslist = []
     providers = 0
+    jobs = []
 
     if search_type and search_type not in ['mag', 'comic'] and not search_type.startswith('general'):
         authorname, bookname = get_searchterm(book, search_type)
@@ -720,7 +747,9 @@ def iterate_over_torrent_sites(book=None, search_type=None):
         else:
             book['searchterm'] = f"{authorname} {bookname}"
 
-    for prov in ['KAT', 'TPB', 'TDL', 'LIME', 'ABB']:
+    searches = {'KAT': torrent_kat, 'TPB': torrent_tpb, 'TDL': torrent_tdl, 'LIME': torrent_lime,
+                'ABB': torrent_abb}
+    for prov, search in searches.items():
         iterateproviderslogger.debug(f"DLTYPES: {prov}: {CONFIG[prov]} {CONFIG[prov + '_DLTYPES']}")
         if CONFIG[prov]:
             ignored = False
@@ -742,26 +771,14 @@ def iterate_over_torrent_sites(book=None, search_type=None):
                 ignored = True
             if not ignored:
                 logger.debug(f'[iterate_over_torrent_sites] - {CONFIG[prov + "_HOST"]}')
-                if prov == 'KAT':
-                    results, error = torrent_kat(book)
-                elif prov == 'TPB':
-                    results, error = torrent_tpb(book)
-                elif prov == 'TDL':
-                    results, error = torrent_tdl(book)
-                elif prov == 'LIME':
-                    results, error = torrent_lime(book)
-                elif prov == 'ABB':
-                    results, error = torrent_abb(book)
-                else:
-                    results = ''
-                    error = ''
-                    logger.error(f'iterate_over_torrent_sites called with unknown provider [{prov}]')
+                jobs.append((prov, 0, search, (book,)))
 
-                if error:
-                    BLOCKHANDLER.block_provider(prov, error)
-                else:
-                    resultslist += results
-                    providers += 1
+    for prov, results, error in query_providers(jobs):
+        if error:
+            BLOCKHANDLER.block_provider(prov, error)
+        else:
+            resultslist += results
+            providers += 1
 
     return resultslist, providers
 
@@ -772,6 +789,7 @@ def iterate_over_direct_sites(book=None, search_type=None):
     iterateproviderslogger.debug(f"Direct: Book:{book}, SearchType:{search_type}")
     resultslist = []
     providers = 0
+    jobs = []
     book['searchtype'] = search_type
     if search_type not in ['mag', 'comic'] and not search_type.startswith('general'):
         authorname, bookname = get_searchterm(book, search_type)
@@ -802,12 +820,7 @@ def iterate_over_direct_sites(book=None, search_type=None):
                     ignored = True
                 if not ignored:
                     logger.debug(f"Querying {prov['NAME']}")
-                    results, error = direct_gen(book, prov['NAME'])
-                    if error:
-                        BLOCKHANDLER.block_provider(prov['NAME'], error)
-                    else:
-                        resultslist += results
-                        providers += 1
+                    jobs.append((prov['NAME'], 0, direct_gen, (book, prov['NAME'])))
     except RuntimeError:
         logger.debug("Error iterating gen")
 
@@ -833,21 +846,7 @@ def iterate_over_direct_sites(book=None, search_type=None):
             ignored = True
         if not ignored:
             logger.debug(f'Querying {prov}')
-            results, error = direct_bok(book, prov)
-            if error:
-                # use a short delay for site unavailable etc
-                delay = CONFIG.get_int('BLOCKLIST_TIMER')
-                dl_limit = CONFIG.get_int('BOK_DLLIMIT')
-                count = lazylibrarian.TIMERS['BOK_TODAY']
-                if count and count >= dl_limit:
-                    # rolling 24hr delay if limit reached
-                    grabs, oldest = bok_grabs()
-                    delay = oldest + 24 * 60 * 60 - time.time()
-                    error = f"Reached Daily download limit ({grabs}/{dl_limit})"
-                BLOCKHANDLER.block_provider('zlibrary', error, delay=delay)
-            else:
-                resultslist += results
-                providers += 1
+            jobs.append(('zlibrary', 0, direct_bok, (book, prov)))
 
     prov = 'SLSK'
     if CONFIG[prov]:
@@ -873,14 +872,7 @@ def iterate_over_direct_sites(book=None, search_type=None):
         if not ignored:
             logger.debug(f'Querying {search_type} {provider}')
             searchtype = 'audio' if 'audio' in search_type else 'ebook'
-            results, error = slsk_search(book, searchtype=searchtype)
-            if error:
-                # use a short delay for site unavailable etc
-                delay = CONFIG.get_int('BLOCKLIST_TIMER')
-                BLOCKHANDLER.block_provider(provider, error, delay=delay)
-            else:
-                resultslist += results
-                providers += 1
+            jobs.append((provider, 0, slsk_search, (book, searchtype)))
 
     prov = 'ANNA'
     if CONFIG[prov]:
@@ -910,18 +902,37 @@ def iterate_over_direct_sites(book=None, search_type=None):
                 searchtype = 'audio'
             if 'mag' in search_type:
                 searchtype = 'mag'
-            results, error = anna_search(book, searchtype)
-            if error:
-                dl_limit = CONFIG.get_int('ANNA_DLLIMIT')
-                count = lazylibrarian.TIMERS['ANNA_REMAINING']
-                if dl_limit and count <= 0:
-                    block_annas(dl_limit)
-                else:
-                    # use a short delay for site unavailable etc
-                    BLOCKHANDLER.block_provider(provider, error, delay=CONFIG.get_int('BLOCKLIST_TIMER'))
+            jobs.append((provider, 0, anna_search, (book, searchtype)))
+
+    for provider, results, error in query_providers(jobs):
+        if not error:
+            resultslist += results
+            providers += 1
+        elif provider == 'zlibrary':
+            # use a short delay for site unavailable etc
+            delay = CONFIG.get_int('BLOCKLIST_TIMER')
+            dl_limit = CONFIG.get_int('BOK_DLLIMIT')
+            count = lazylibrarian.TIMERS['BOK_TODAY']
+            if count and count >= dl_limit:
+                # rolling 24hr delay if limit reached
+                grabs, oldest = bok_grabs()
+                delay = oldest + 24 * 60 * 60 - time.time()
+                error = f"Reached Daily download limit ({grabs}/{dl_limit})"
+            BLOCKHANDLER.block_provider(provider, error, delay=delay)
+        elif provider == 'soulseek':
+            # use a short delay for site unavailable etc
+            delay = CONFIG.get_int('BLOCKLIST_TIMER')
+            BLOCKHANDLER.block_provider(provider, error, delay=delay)
+        elif provider == 'annas':
+            dl_limit = CONFIG.get_int('ANNA_DLLIMIT')
+            count = lazylibrarian.TIMERS['ANNA_REMAINING']
+            if dl_limit and count <= 0:
+                block_annas(dl_limit)
             else:
-                resultslist += results
-                providers += 1
+                # use a short delay for site unavailable etc
+                BLOCKHANDLER.block_provider(provider, error, delay=CONFIG.get_int('BLOCKLIST_TIMER'))
+        else:
+            BLOCKHANDLER.block_provider(provider, error)
 
     return resultslist, providers
 
@@ -2033,6 +2044,16 @@ def rss(host=None, feednr=None, priority=0, dispname=None, types='E', test=False
     return results
 
 
+def unsupported_search(error_msg: str, errorcode=0) -> bool:
+    """ Return True if errorMsg or errorcode is a known error response for an unsupported search function """
+    if 200 <= errorcode < 300:  # 200-299 are API call specific error codes
+        return True
+    errorlist = ['no such function', 'unknown parameter', 'unknown function', 'bad_gateway',
+                 'bad request', 'bad_request', 'incorrect parameter', 'does not support', 'validation failed']
+    errormsg = make_unicode(error_msg).lower()
+    return any(item in errormsg for item in errorlist)
+
+
 def cancel_search_type(search_type: str, error_msg: str, provider: ConfigDict, errorcode=0):
     """ See if errorMsg contains a known error response for an unsupported search function
     depending on which searchType. If it does, disable that searchtype for the relevant provider
@@ -2040,39 +2061,25 @@ def cancel_search_type(search_type: str, error_msg: str, provider: ConfigDict, e
     """
     logger = logging.getLogger(__name__)
 
-    if (provider['BOOKSEARCH'] and search_type in ["book", "shortbook", 'titlebook']) or \
-            (provider['AUDIOSEARCH'] and search_type in ["audio", "shortaudio"]):
-
-        match = (200 <= errorcode < 300)  # 200-299 are API call specific error codes
-
-        if not match:
-            errorlist = ['no such function', 'unknown parameter', 'unknown function', 'bad_gateway',
-                         'bad request', 'bad_request', 'incorrect parameter', 'does not support', 'validation failed']
-
-            errormsg = make_unicode(error_msg).lower()
-
-            for item in errorlist:
-                if item in errormsg:
-                    match = True
-                    break
-
-        if match:
-            if search_type in ["book", "shortbook", 'titlebook']:
-                msg = 'BOOKSEARCH'
-            elif search_type in ["audio", "shortaudio"]:
-                msg = 'AUDIOSEARCH'
-            else:
-                msg = ''
-
-            if msg:
-                for providertype in ['NEWZNAB', 'TORZNAB']:
-                    for prov in CONFIG.providers(providertype):
-                        if prov['HOST'] == provider['HOST'] and not prov['MANUAL']:
-                            logger.error(f"Disabled {msg}={prov[msg]} for {prov['DISPNAME']}")
-                            prov[msg] = ""
-                            # CONFIG.save_config_and_backup_old(section=prov['NAME'])
-                            return True
-            logger.error(f"Unable to disable searchtype [{search_type}] for {provider['DISPNAME']}")
+    if ((provider['BOOKSEARCH'] and search_type in ["book", "shortbook", 'titlebook']) or
+            (provider['AUDIOSEARCH'] and search_type in ["audio", "shortaudio"])) and \
+            unsupported_search(error_msg, errorcode):
+        if search_type in ["book", "shortbook", 'titlebook']:
+            msg = 'BOOKSEARCH'
+        elif search_type in ["audio", "shortaudio"]:
+            msg = 'AUDIOSEARCH'
+        else:
+            msg = ''
+
+        if msg:
+            for providertype in ['NEWZNAB', 'TORZNAB']:
+                for prov in CONFIG.providers(providertype):
+                    if prov['HOST'] == provider['HOST'] and not prov['MANUAL']:
+                        logger.error(f"Disabled {msg}={prov[msg]} for {prov['DISPNAME']}")
+                        prov[msg] = ""
+                        # CONFIG.save_config_and_backup_old(section=prov['NAME'])
+                        return True
+        logger.error(f"Unable to disable searchtype [{search_type}] for {provider['DISPNAME']}")
     return False
 
 
@@ -2167,6 +2174,9 @@ def newznab_plus(book: dict, provider: ConfigDict, search_type: str, search_mode
             errormsg = errormsg[:200]  # sometimes get huge error messages from jackett
             errorcode = int(rootxml.get('code', default=900))  # 900 is "Unknown Error"
             logger.error(f"{host} - {errormsg}")
+            if search_type.startswith('author') and unsupported_search(errormsg, errorcode):
+                author_search_failed(provider['HOST'], search_type, errormsg)
+                return True, results
             # maybe the host doesn't support the search type
             cancelled = cancel_search_type(search_type, errormsg, provider, errorcode)
             if not cancelled:  # it was some other problem
@@ -2197,7 +2207,7 @@ def newznab_plus(book: dict, provider: ConfigDict, search_type: str, search_mode
                     thisnzb = return_results_by_search_type(book, nzb, host, search_mode, provider.
                                                             get_int('DLPRIORITY'))
                     thisnzb['dispname'] = provider['DISPNAME']
-                    if search_type in ['book', 'shortbook', 'titlebook']:
+                    if search_type in ['book', 'shortbook', 'titlebook', 'authorbook']:
                         thisnzb['booksearch'] = provider['BOOKSEARCH']
 
                     if 'seeders' in thisnzb:
@@ -2244,6 +2254,26 @@ def newznab_plus(book: dict, provider: ConfigDict, search_type: str, search_mode
     return True, results
 
 
+# (host, search_type) of providers that don't support author searches, not searched by author again
+NO_AUTHOR_SEARCH = set()
+
+
+def author_search_failed(host: str, search_type: str, error: str):
+    """ Call when host says it doesn't support an author search. Stop searching it by author,
+    but don't block it, so it is still searched book by book """
+    logging.getLogger(__name__).warning(f"Author search failed at {host}, searching book by book instead: {error}")
+    NO_AUTHOR_SEARCH.add((host, search_type))
+
+
+def can_search_by_author(provider: ConfigDict, search_type: str) -> bool:
+    """ Return True if provider has a book or audio search that takes an author without a title """
+    if (provider['HOST'], search_type) in NO_AUTHOR_SEARCH:
+        return False
+    if search_type == 'authoraudio':
+        return bool(provider['AUDIOSEARCH'] and provider['AUDIOCAT'])
+    return bool(provider['BOOKSEARCH'] and provider['BOOKCAT'] and provider['BOOKSEARCH'] != 'bibliotik')
+
+
 def return_search_structure(provider: ConfigDict, api_key, book, search_type, search_mode):
     logger = logging.getLogger(__name__)
     params = None
@@ -2289,6 +2319,17 @@ def return_search_structure(provider: ConfigDict, api_key, book, search_type, se
                 "q": make_utf8bytes(f"{authorname} {bookname}")[0],
                 "cat": provider['AUDIOCAT']
             }
+    elif search_type in ["authorbook", "authoraudio"]:
+        # all the author's books in one search, only for providers that can search by author
+        if can_search_by_author(provider, search_type):
+            authorname, _ = get_searchterm(book, search_type)
+            prefix = 'BOOK' if search_type == 'authorbook' else 'AUDIO'
+            params = {
+                "t": provider[f"{prefix}SEARCH"],
+                "apikey": api_key,
+                "author": make_utf8bytes(authorname)[0],
+                "cat": provider[f"{prefix}CAT"]
+            }
     elif search_type == "mag":
         if provider['MAGSEARCH'] and provider['MAGCAT']:  # if specific magsearch, use it
             params = {
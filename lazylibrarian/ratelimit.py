@@ -0,0 +1,120 @@
+#  This file is part of Lazylibrarian.
+#  Lazylibrarian is free software':'you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  Lazylibrarian is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#  You should have received a copy of the GNU General Public License
+#  along with Lazylibrarian.  If not, see <http://www.gnu.org/licenses/>.
+
+# Purpose:
+#   Rate limits for the metadata sources, shared by all threads, so calls to a host
+#   stay within its terms however many threads are making them
+
+import logging
+import threading
+import time
+
+from lazylibrarian.config2 import CONFIG
+
+
+def bok_interval() -> float:
+    # make sure bok leaves at least a 2-second delay between calls to prevent "Too many requests from your IP"
+    return max(CONFIG.get_int('SEARCH_RATELIMIT'), 2.0)
+
+
+# Seconds between calls, or a function returning them, and how many calls can be made at once
+# after a quiet spell, for each source
+RATE_LIMITS = {
+    'goodreads': (1.0, 1),
+    'librarything': (1.0, 1),
+    'comicvine': (1.0, 1),
+    'hardcover': (1.1, 1),  # official limit is 60 requests per minute, this gives us about 55
+    'googlebooks': (1.0, 1),
+    'bok': (bok_interval, 1),
+}
+
+
+class TokenBucket:
+    """ A token is added every interval seconds, up to burst tokens, and each call takes one.
+    Each caller reserves the next free slot under the lock, then sleeps outside it,
+    so waiting threads are served in the order they arrived and the limit is never overshot """
+    def __init__(self, name: str, interval, burst: int = 1):
+        self.name = name
+        self.interval = interval
+        self.burst = max(burst, 1)
+        self.lock = threading.Lock()
+        self.next_slot = 0.0  # When the bucket will next be full, less one token per call already reserved
+        self.calls = 0
+        self.waited = 0
+        self.waiting = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def get_interval(self) -> float:
+        return self.interval() if callable(self.interval) else self.interval
+
+    def acquire(self) -> float:
+        """ Wait until a call can be made. Returns how many seconds were spent waiting """
+        interval = self.get_interval()
+        with self.lock:
+            time_now = time.time()
+            slot = max(self.next_slot, time_now)
+            self.next_slot = slot + interval
+            wait = slot - (self.burst - 1) * interval - time_now
+            self.calls += 1
+            if wait > 0:
+                self.waited += 1
+                self.waiting += 1
+                self.wait_total += wait
+                self.wait_max = max(self.wait_max, wait)
+        if wait <= 0:
+            return 0.0
+        logging.getLogger('special.cache').debug(f"{self.name} sleep {wait:.3f}, total {self.wait_total:.3f}")
+        try:
+            time.sleep(wait)
+        finally:
+            with self.lock:
+                self.waiting -= 1
+        return wait
+
+    def hold(self, seconds: float):
+        """ Make no more calls for seconds, eg when the server says its limit was reached """
+        with self.lock:
+            self.next_slot = max(self.next_slot, time.time() + seconds + (self.burst - 1) * self.get_interval())
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {'calls': self.calls, 'waited': self.waited, 'waiting': self.waiting,
+                    'wait_total': self.wait_total, 'wait_max': self.wait_max}
+
+
+LIMITERS = {}
+LIMITERS_LOCK = threading.Lock()
+
+
+def get_limiter(name: str) -> TokenBucket:
+    """ Return the rate limiter for the source called name, eg goodreads """
+    with LIMITERS_LOCK:
+        limiter = LIMITERS.get(name)
+        if limiter is None:
+            interval, burst = RATE_LIMITS.get(name, (1.0, 1))
+            limiter = LIMITERS[name] = TokenBucket(name, interval, burst)
+    return limiter
+
+
+def rate_limit(name: str) -> float:
+    """ Wait until the source called name can be called again. Returns the seconds spent waiting """
+    return get_limiter(name).acquire()
+
+
+def limiter_stats() -> dict:
+    """ Return the counters of each rate limiter, by name, including those not used yet """
+    for name in RATE_LIMITS:
+        get_limiter(name)
+    with LIMITERS_LOCK:
+        limiters = sorted(LIMITERS.items())
+    return {name: limiter.get_stats() for name, limiter in limiters}
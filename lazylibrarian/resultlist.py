@@ -14,9 +14,11 @@
 #  along with Lazylibrarian.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
+import threading
+import time
 import traceback
 
-from rapidfuzz import fuzz
+from rapidfuzz import fuzz, process
 
 from lazylibrarian import database
 from lazylibrarian.common import only_punctuation
@@ -32,6 +34,139 @@ from lazylibrarian.notifiers import custom_notify_snatch, notify_snatch
 from lazylibrarian.providers import get_searchterm
 from lazylibrarian.scheduling import SchedulerCommand, schedule_job
 
+# Punctuation to replace in result titles before matching them
+TITLE_REPLACE = {'...': '', '.': ' ', ' & ': ' ', ' = ': ' ', '?': '', '$': 's', ' + ': ' ', '"': '',
+                 ',': ' ', '*': '', '(': '', ')': '', '[': '', ']': '', '#': '', '\'': '',
+                 ':': '', '!': '', '-': ' ', r'\s\s': ' '}
+
+# Words are indexed by this many letters, and a word is rare if it is in no more than
+# INDEX_RARE_MIN results, or a tenth of them if that is more
+INDEX_WORD_LENGTH = 5
+INDEX_RARE_MIN = 10
+
+# Reload the blacklist if it is older than this, for searches that don't load it when they start
+BLACKLIST_MAX_AGE = 10 * 60
+
+
+class Blacklist:
+    """ The urls and (provider, title) pairs in the wanted table, so search results can be checked against
+    them without a database query each. Loaded once per search run, and updated as results are snatched
+    or fail. Each entry holds (provider, status) of the wanted row """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded = 0.0
+        self.processed = {}
+        self.failed = {}
+
+    def load(self):
+        """ Read the wanted table, replacing anything already loaded """
+        processed = {}
+        failed = {}
+        db = database.DBConnection()
+        try:
+            for row in db.select("SELECT NZBurl, NZBtitle, NZBprov, Status from wanted"):
+                self.add_entry(processed, failed, row['NZBurl'], row['NZBtitle'], row['NZBprov'], row['Status'])
+        finally:
+            db.close()
+        with self.lock:
+            self.processed = processed
+            self.failed = failed
+            self.loaded = time.time()
+        logging.getLogger(__name__).debug(f"Blacklist loaded {len(processed)} processed, {len(failed)} failed")
+
+    def refresh(self, max_age=BLACKLIST_MAX_AGE):
+        """ Load the wanted table if it has not been loaded within max_age seconds """
+        if self.loaded < time.time() - max_age:
+            self.load()
+
+    @staticmethod
+    def add_entry(processed: dict, failed: dict, url, title, prov, status):
+        info = (prov, status)
+        for key in [('url', url), ('url', url, title), ('title', prov, title)]:
+            processed[key] = info
+            if status == 'Failed':
+                failed[key] = info
+
+    def add(self, url, title, prov, status):
+        """ Record a new or changed wanted entry """
+        with self.lock:
+            self.add_entry(self.processed, self.failed, url, title, prov, status)
+
+    def by_url(self, url, title=None, failed=False) -> tuple | None:
+        """ Return (provider, status) of a wanted entry with this url, and title if given, or None.
+        If failed, only failed entries count """
+        key = ('url', url) if title is None else ('url', url, title)
+        return (self.failed if failed else self.processed).get(key)
+
+    def by_title(self, prov, title, failed=False) -> tuple | None:
+        """ Return (provider, status) of a wanted entry with this provider and title, or None.
+        If failed, only failed entries count """
+        return (self.failed if failed else self.processed).get(('title', prov, title))
+
+
+BLACKLIST = Blacklist()
+
+
+def match_titles(resultlist, prefix) -> list[str]:
+    """ Return the title of each result, normalised for matching. Each result keeps its normalised
+    title, so a result list that is matched against many books is only normalised once """
+    titles = []
+    for res in resultlist:
+        result_title = res.get('match_title')
+        if result_title is None:
+            result_title = unaccented(replace_all(res[f"{prefix}title"], TITLE_REPLACE), only_ascii=False).strip()
+            result_title = ' '.join(result_title.split())  # remove extra whitespace
+            res['match_title'] = result_title
+        titles.append(result_title)
+    return titles
+
+
+def token_set_ratios(query: str, choices: list[str]) -> list[float]:
+    """ Return fuzz.token_set_ratio of query against each of choices, scored in one call.
+    processor=None as older rapidfuzz lowercases and strips punctuation by default in process.extract """
+    scores = [0.0] * len(choices)
+    for _, score, index in process.extract(query, choices, scorer=fuzz.token_set_ratio, processor=None,
+                                           limit=None):
+        scores[index] = score
+    return scores
+
+
+def index_words(text: str) -> set[str]:
+    """ Return the words of text to index, shortened so plurals and most misspellings still match """
+    return {word[:INDEX_WORD_LENGTH] for word in text.lower().split() if len(word) > 1}
+
+
+class ResultIndex:
+    """ An inverted index of the words in the titles of a result list, built once per search run,
+    so each book is only scored against the results that share a rare word with its author or title.
+    Words in more than a tenth of the results are too common to narrow the search, and words in none
+    of them cannot. A book with no rare words found in the results is scored against every result """
+    def __init__(self, resultlist, prefix):
+        self.resultlist = resultlist
+        self.words = {}
+        for index, result_title in enumerate(match_titles(resultlist, prefix)):
+            for word in index_words(result_title):
+                self.words.setdefault(word, []).append(index)
+        self.rare = max(INDEX_RARE_MIN, len(resultlist) // 10)
+        self.scored = 0
+
+    def candidates(self, book) -> list:
+        """ Return the results that could match book, in their original order """
+        text = ' '.join([book['authorName'] or '', book['bookName'] or '', book.get('bookSub') or ''])
+        text = unaccented(replace_all(text, TITLE_REPLACE), only_ascii=False)
+        indexes = set()
+        rare_words = False
+        for word in index_words(text):
+            found = self.words.get(word, [])
+            if 0 < len(found) <= self.rare:
+                rare_words = True
+                indexes.update(found)
+        if not rare_words:
+            self.scored += len(self.resultlist)
+            return self.resultlist
+        self.scored += len(indexes)
+        return [self.resultlist[index] for index in sorted(indexes)]
+
 
 def process_result_list(resultlist, book, searchtype, source):
     """ Separated this out into two functions
@@ -65,14 +200,10 @@ def find_best_result(resultlist, book, searchtype, source):
     # noinspection PyBroadException
     logger = logging.getLogger(__name__)
     fuzzlogger = logging.getLogger('special.fuzz')
-    db = database.DBConnection()
     highest = None
     try:
+        BLACKLIST.refresh()
         # '0': '', '1': '', '2': '', '3': '', '4': '', '5': '', '6': '', '7': '', '8': '', '9': '',
-        dictrepl = {'...': '', '.': ' ', ' & ': ' ', ' = ': ' ', '?': '', '$': 's', ' + ': ' ', '"': '',
-                    ',': ' ', '*': '', '(': '', ')': '', '[': '', ']': '', '#': '', '\'': '',
-                    ':': '', '!': '', '-': ' ', r'\s\s': ' '}
-
         dic = {'...': '', '.': ' ', ' & ': ' ', ' = ': ' ', '?': '', '$': 's', ' + ': ' ', '"': '',
                ',': '', '*': '', ':': '.', ';': '', '\'': ''}
 
@@ -105,21 +236,20 @@ def find_best_result(resultlist, book, searchtype, source):
         logger.debug(f'Searching {len(resultlist)} {source} results for best {auxinfo} match')
         matches = []
         ignored_messages = []
-        for res in resultlist:
-            result_title = unaccented(replace_all(res[f"{prefix}title"], dictrepl),
-                                      only_ascii=False).strip()
-            result_title = ' '.join(result_title.split())  # remove extra whitespace
-            only_title = result_title.replace(author, '')
+        # score all the results at once, then go through them one by one
+        result_titles = match_titles(resultlist, prefix)
+        only_titles = [result_title.replace(author, '') for result_title in result_titles]
+        book_matches = token_set_ratios(title.replace(author, ''), only_titles)
+        author_matches = token_set_ratios(author, result_titles)
+        for res, result_title, only_title, book_match, author_match in zip(resultlist, result_titles, only_titles,
+                                                                           book_matches, author_matches,
+                                                                           strict=True):
             if not only_title or only_punctuation(only_title):
                 book_match = fuzz.token_set_ratio(title, result_title)
-            else:
-                book_match = fuzz.token_set_ratio(title.replace(author, ''), only_title)
             if 'booksearch' in res and res['booksearch'] == 'bibliotik':
                 # bibliotik only returns book title, not author name
                 fuzzlogger.debug("bibliotik, ignoring author fuzz")
                 author_match = 100
-            else:
-                author_match = fuzz.token_set_ratio(author, result_title)
 
             fuzzlogger.debug(f"{source.upper()} author/book Match: {author_match}/{book_match} {result_title} "
                              f"at {res[prefix + 'prov']}")
@@ -131,43 +261,32 @@ def find_best_result(resultlist, book, searchtype, source):
                 rejected = True
                 logger.debug(f"Rejecting {result_title}, no URL found")
 
+            # irc urls are only blacklisted for the same title
+            url_title = res['tor_title'] if res.get('tor_type', '') == 'irc' else None
             if not rejected and CONFIG.get_bool('BLACKLIST_FAILED'):
-                cmd = "SELECT * from wanted WHERE NZBurl=? and Status='Failed'"
-                args = (url,)
-                if res.get('tor_type', '') == 'irc':
-                    cmd += " and NZBTitle=?"
-                    args += (res['tor_title'],)
-                blacklisted = db.match(cmd, args)
+                blacklisted = BLACKLIST.by_url(url, url_title, failed=True)
                 if blacklisted:
                     logger.debug(f"Rejecting {res[prefix + 'title']}, url blacklisted (Failed) at "
-                                 f"{blacklisted['NZBprov']}")
+                                 f"{blacklisted[0]}")
                     rejected = True
                 if not rejected:
-                    blacklisted = db.match("SELECT * from wanted WHERE NZBprov=? and NZBtitle=? "
-                                           "and Status='Failed'",
-                                           (res[f"{prefix}prov"], res[f"{prefix}title"]))
+                    blacklisted = BLACKLIST.by_title(res[f"{prefix}prov"], res[f"{prefix}title"], failed=True)
                     if blacklisted:
                         logger.debug(f"Rejecting {res[prefix + 'title']}, title blacklisted (Failed) at "
-                                     f"{blacklisted['NZBprov']}")
+                                     f"{blacklisted[0]}")
                         rejected = True
 
             if not rejected and CONFIG.get_bool('BLACKLIST_PROCESSED'):
-                cmd = "SELECT * from wanted WHERE NZBurl=?"
-                args = (url,)
-                if res.get('tor_type', '') == 'irc':
-                    cmd += " and NZBTitle=?"
-                    args += (res['tor_title'],)
-                blacklisted = db.match(cmd, args)
+                blacklisted = BLACKLIST.by_url(url, url_title)
                 if blacklisted:
-                    logger.debug(f"Rejecting {res[prefix + 'title']}, url blacklisted ({blacklisted['Status']}) "
-                                 f"at {blacklisted['NZBprov']}")
+                    logger.debug(f"Rejecting {res[prefix + 'title']}, url blacklisted ({blacklisted[1]}) "
+                                 f"at {blacklisted[0]}")
                     rejected = True
                 if not rejected:
-                    blacklisted = db.match('SELECT * from wanted WHERE NZBprov=? and NZBtitle=?',
-                                           (res[f"{prefix}prov"], res[f"{prefix}title"]))
+                    blacklisted = BLACKLIST.by_title(res[f"{prefix}prov"], res[f"{prefix}title"])
                     if blacklisted:
-                        logger.debug(f"Rejecting {res[prefix + 'title']}, title blacklisted ({blacklisted['Status']}) "
-                                     f"at {blacklisted['NZBprov']}")
+                        logger.debug(f"Rejecting {res[prefix + 'title']}, title blacklisted ({blacklisted[1]}) "
+                                     f"at {blacklisted[0]}")
                         rejected = True
 
             if not rejected and source == 'rss':
@@ -313,7 +432,6 @@ def find_best_result(resultlist, book, searchtype, source):
     except Exception:
         logger.error(f'Unhandled exception in find_best_result: {traceback.format_exc()}')
 
-    db.close()
     return highest
 
 
@@ -355,6 +473,8 @@ def download_result(match, book):
             return 1  # someone else already found it
 
         db.upsert("wanted", new_value_dict, control_value_dict)
+        BLACKLIST.add(control_value_dict["NZBurl"], new_value_dict["NZBtitle"], new_value_dict["NZBprov"],
+                      new_value_dict["Status"])
         label = new_value_dict.get('Label', '')
         if new_value_dict['NZBmode'] == 'direct':
             snatch, res = direct_dl_method(new_value_dict["BookID"], new_value_dict["NZBtitle"],
@@ -392,6 +512,7 @@ def download_result(match, book):
             return 2  # we found it
         db.action("UPDATE wanted SET status='Failed',DLResult=? WHERE NZBurl=?",
                   (res, control_value_dict["NZBurl"]))
+        BLACKLIST.add(control_value_dict["NZBurl"], new_value_dict["NZBtitle"], new_value_dict["NZBprov"], 'Failed')
         return 0
     except Exception:
         logger.error(f'Unhandled exception in download_result: {traceback.format_exc()}')
@@ -19,6 +19,7 @@ import lazylibrarian
 from lazylibrarian.common import proxy_list
 from lazylibrarian.config2 import CONFIG
 from lazylibrarian.formatter import make_utf8bytes, versiontuple
+from lazylibrarian.sessions import http_get
 
 
 def check_link():
@@ -199,10 +200,10 @@ def sab_nzbd(title=None, nzburl=None, remove_data=False, search=None, nzo_ids=No
     try:
         timeout = CONFIG.get_int('HTTP_TIMEOUT')
         if url.startswith('https') and CONFIG.get_bool('SSL_VERIFY'):
-            r = requests.get(url, timeout=timeout, proxies=proxies,
-                             verify=CONFIG['SSL_CERTS'] if CONFIG['SSL_CERTS'] else True)
+            r = http_get(url, timeout=timeout, proxies=proxies,
+                         verify=CONFIG['SSL_CERTS'] if CONFIG['SSL_CERTS'] else True)
         else:
-            r = requests.get(url, timeout=timeout, proxies=proxies, verify=False)
+            r = http_get(url, timeout=timeout, proxies=proxies, verify=False)
         result = r.json()
     except requests.exceptions.Timeout:
         res = f"Timeout connecting to SAB with URL: {url}"
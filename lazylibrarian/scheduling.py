@@ -28,10 +28,14 @@ from apscheduler.schedulers.background import BackgroundScheduler
 import lazylibrarian
 from lazylibrarian import database
 from lazylibrarian.bookwork import add_series_members
+from lazylibrarian.cachestore import NEGATIVE, cache_stats, cache_totals
 from lazylibrarian.config2 import CONFIG
 from lazylibrarian.configtypes import ConfigScheduler
-from lazylibrarian.formatter import check_int, plural
+from lazylibrarian.formatter import plural
 from lazylibrarian.importer import add_author_to_db
+from lazylibrarian.prefetch import PREFETCH
+from lazylibrarian.ratelimit import limiter_stats
+from lazylibrarian.sessions import SESSIONS
 
 # Notification Types
 NOTIFY_SNATCH = 1
@@ -190,8 +194,11 @@ def adjust_schedule(scheduler: ConfigScheduler):
     logger = logging.getLogger(__name__)
     name = scheduler.get_schedule_name()
     if name in ['clean_cache']:
-        # Override the interval with the value from CACHE_AGE
+        # Override the interval with the value from CACHE_AGE,
+        # or come back tomorrow if the last run didn't finish in time
         cdays = CONFIG.get_int('CACHE_AGE')
+        if cdays and lazylibrarian.CLEAN_CACHE_PENDING:
+            cdays = 1
         scheduler.set_int(cdays)
 
     elif name in ['backup']:
@@ -291,10 +298,9 @@ def author_update(restart=True, only_overdue=True):
     logger = logging.getLogger(__name__)
     msg = ''
 
-    db = database.DBConnection()
     # noinspection PyBroadException
     try:
-        db.upsert("jobs", {"Start": time.time()}, {"Name": "AUTHORUPDATE"})
+        database.WRITE_QUEUE.upsert("jobs", {"Start": time.time()}, {"Name": "AUTHORUPDATE"})
         if CONFIG.get_int('CACHE_AGE'):
             overdue, total, name, ident, days = is_overdue('author')
             if not total:
@@ -303,11 +309,13 @@ def author_update(restart=True, only_overdue=True):
                 msg = f"Oldest author info ({name}) is {days} {plural(days, 'day')} old, no update due"
             else:
                 logger.info(f'Starting update for {name}:{ident}')
+                PREFETCH.used('author', ident)
                 _ = add_author_to_db(refresh=True, authorid=ident, reason=f"author_update {name}")
                 if lazylibrarian.STOPTHREADS:
                     return ''
                 msg = f'Updated author {name}'
             if total and restart and not lazylibrarian.STOPTHREADS:
+                PREFETCH.start('author', overdue_items('author', CONFIG.get_int('PREFETCH_AHEAD')))
                 schedule_job(SchedulerCommand.RESTART, "author_update")
         return msg
 
@@ -316,18 +324,16 @@ def author_update(restart=True, only_overdue=True):
         return "Unhandled exception in AuthorUpdate"
 
     finally:
-        db.upsert("jobs", {"Finish": time.time()}, {"Name": "AUTHORUPDATE"})
-        db.close()
+        database.WRITE_QUEUE.upsert("jobs", {"Finish": time.time()}, {"Name": "AUTHORUPDATE"})
 
 
 def series_update(restart=True, only_overdue=True):
     logger = logging.getLogger(__name__)
     msg = ''
 
-    db = database.DBConnection()
     # noinspection PyBroadException
     try:
-        db.upsert("jobs", {"Start": time.time()}, {"Name": "SERIESUPDATE"})
+        database.WRITE_QUEUE.upsert("jobs", {"Start": time.time()}, {"Name": "SERIESUPDATE"})
         if CONFIG.get_int('CACHE_AGE'):
             overdue, total, name, ident, days = is_overdue('series')
             if not total:
@@ -336,10 +342,12 @@ def series_update(restart=True, only_overdue=True):
                 msg = f"Oldest series info ({name}) is {days} {plural(days, 'day')} old, no update due"
             else:
                 logger.info(f'Starting series update for {name}')
+                PREFETCH.used('series', ident)
                 add_series_members(ident)
                 msg = f'Updated series {name}'
             logger.debug(msg)
             if total and restart and not lazylibrarian.STOPTHREADS:
+                PREFETCH.start('series', overdue_items('series', CONFIG.get_int('PREFETCH_AHEAD')))
                 schedule_job(SchedulerCommand.RESTART, "series_update")
         return msg
 
@@ -348,8 +356,7 @@ def series_update(restart=True, only_overdue=True):
         return "Unhandled exception in series_update"
 
     finally:
-        db.upsert("jobs", {"Finish": time.time()}, {"Name": "SERIESUPDATE"})
-        db.close()
+        database.WRITE_QUEUE.upsert("jobs", {"Finish": time.time()}, {"Name": "SERIESUPDATE"})
 
 
 def all_author_update(refresh=False):
@@ -450,6 +457,14 @@ def check_running_jobs():
     ensure_running('series_update')
 
 
+OVERDUE_QUERIES = {
+    'author': ("SELECT AuthorName,AuthorID,Updated from authors WHERE Status='Active' or Status='Loading'"
+               " or Status='Wanted' and AuthorID !='' order by Updated ASC"),
+    'series': ("SELECT SeriesName,SeriesID,Updated from Series where Status='Active' or Status='Wanted' "
+               "order by Updated ASC"),
+}
+
+
 def is_overdue(which="author") -> (int, int, str, str, int):
     """ Determines how many items of type 'author' or 'series'are overdue for an update, because
     the entries are older than CACHE_AGE.
@@ -481,18 +496,14 @@ def is_overdue(which="author") -> (int, int, str, str, int):
         logger = logging.getLogger(__name__)
         try:
             if which == 'author':
-                cmd = "SELECT AuthorName,AuthorID,Updated from authors WHERE Status='Active' or Status='Loading'"
-                cmd += " or Status='Wanted' and AuthorID !='' order by Updated ASC"
-                res = db.select(cmd)
+                res = db.select(OVERDUE_QUERIES['author'])
                 total = len(res)
                 if total:
                     name = res[0]['AuthorName']
                     ident = res[0]['AuthorID']
                     days, overdue = get_overdue_from_dbrows(res)
             if which == 'series':
-                cmd = ("SELECT SeriesName,SeriesID,Updated from Series where Status='Active' or Status='Wanted' "
-                       "order by Updated ASC")
-                res = db.select(cmd)
+                res = db.select(OVERDUE_QUERIES['series'])
                 total = len(res)
                 if total:
                     name = res[0]['SeriesName']
@@ -505,6 +516,25 @@ def is_overdue(which="author") -> (int, int, str, str, int):
     return overdue, total, name, ident, days
 
 
+def overdue_items(which="author", limit=1) -> list[tuple[str, str]]:
+    """ Return the ID and name of up to limit items of type 'author' or 'series' that are overdue
+    for an update, most overdue first """
+    maxage = CONFIG.get_int('CACHE_AGE')
+    if not maxage or limit <= 0:
+        return []
+    too_old = time.time() - maxage * 24 * 60 * 60
+    items = []
+    db = database.DBConnection()
+    try:
+        for row in db.select(OVERDUE_QUERIES[which]):
+            if len(items) >= limit or (row['Updated'] or 0) >= too_old:
+                break
+            items.append((row[1], row[0]))
+    finally:
+        db.close()
+    return items
+
+
 def ago(when):
     """ Return human-readable string of how long ago something happened
         when = seconds count """
@@ -556,7 +586,12 @@ def show_jobs(json=False):
             if res['Start'] > res['Finish']:
                 resultdict[jobname] = {}
                 resultdict[jobname]['last'] = f"Running since {ago(res['Start'])}"
-                jobinfo += f" (Running since {ago(res['Start'])})"
+                progress = lazylibrarian.JOB_PROGRESS.get(threadname)
+                if progress:
+                    resultdict[jobname]['progress'] = progress
+                    jobinfo += f" (Running since {ago(res['Start'])}, {progress})"
+                else:
+                    jobinfo += f" (Running since {ago(res['Start'])})"
             elif res['Finish']:
                 resultdict[jobname]['last'] = f"Last run {ago(res['Finish'])}"
                 jobinfo += f" (Last run {ago(res['Finish'])})"
@@ -602,37 +637,84 @@ def show_jobs(json=False):
 def show_stats(json=False):
     """ Return status of activity suitable for display, or json if requested """
     resultdict = {}
-    cache = {'hit': check_int(lazylibrarian.CACHE_HIT, 0), 'miss': check_int(lazylibrarian.CACHE_MISS, 0)}
-    sleep = {'goodreads': lazylibrarian.TIMERS['SLEEP_GR'], 'librarything': lazylibrarian.TIMERS['SLEEP_LT'],
-             'comicvine': lazylibrarian.TIMERS['SLEEP_CV'], 'hardcover': lazylibrarian.TIMERS['SLEEP_HC']}
+    hits, misses = cache_totals()
+    caches = cache_stats()
+    cache = {'hit': hits, 'miss': misses, 'caches': caches}
+    limits = limiter_stats()
+    sleep = {name: stats['wait_total'] for name, stats in limits.items()}
+    dbpool = database.POOL.get_stats()
+    dblock = database.db_lock.get_stats()
+    dbqueue = database.WRITE_QUEUE.get_stats()
+    dbcache = database.QUERY_CACHE.get_stats()
+    http = SESSIONS.get_stats()
+    negative = NEGATIVE.get_stats()
+    prefetch = PREFETCH.get_stats()
     resultdict['cache'] = cache
     resultdict['sleep'] = sleep
+    resultdict['ratelimit'] = limits
+    resultdict['dbpool'] = dbpool
+    resultdict['dblock'] = dblock
+    resultdict['dbqueue'] = dbqueue
+    resultdict['dbcache'] = dbcache
+    resultdict['http'] = http
+    resultdict['negative'] = negative
+    resultdict['prefetch'] = prefetch
     result = [
-        f"Cache {check_int(lazylibrarian.CACHE_HIT, 0)} {plural(check_int(lazylibrarian.CACHE_HIT, 0), 'hit')}, "
-        f"{check_int(lazylibrarian.CACHE_MISS, 0)} miss, ",
-        f"Sleep {lazylibrarian.TIMERS['SLEEP_GR']:.3f} goodreads, {lazylibrarian.TIMERS['SLEEP_LT']:.3f} librarything, "
-        f"{lazylibrarian.TIMERS['SLEEP_CV']:.3f} comicvine, {lazylibrarian.TIMERS['SLEEP_HC']:.3f} hardcover"]
+        f"Cache {hits} {plural(hits, 'hit')}, {misses} miss, ",
+        f"Sleep {', '.join(f'{total:.3f} {name}' for name, total in sleep.items())}",
+        f"DB pool {dbpool['active']} active, {dbpool['idle']} idle, {dbpool['opened']} opened, "
+        f"{dbpool['reused']} reused, {dbpool['closed_idle'] + dbpool['closed_dead']} expired, "
+        f"{dbpool['unhealthy']} unhealthy, {dbpool['readers']} readers",
+        f"DB lock {dblock['acquired']} writes, {dblock['contended']} waited, "
+        f"{dblock['wait_total']:.3f}s total wait, {dblock['wait_max']:.3f}s longest",
+        f"DB write queue {'running' if dbqueue['running'] else 'off'}, {dbqueue['written']} written in "
+        f"{dbqueue['batches']} {plural(dbqueue['batches'], 'transaction')}, {dbqueue['failed']} failed, "
+        f"{dbqueue['pending']} pending",
+        f"DB query cache {dbcache['entries']} {plural(dbcache['entries'], 'result')}, {dbcache['hits']} "
+        f"{plural(dbcache['hits'], 'hit')}, {dbcache['misses']} miss, {dbcache['hit_rate']}% hit rate, "
+        f"{dbcache['stale']} stale, {dbcache['evicted']} evicted",
+        f"HTTP sessions {http['hosts']} {plural(http['hosts'], 'host')}, {http['requests']} "
+        f"{plural(http['requests'], 'request')}, {http['opened']} connections opened, {http['reused']} reused"]
+    for name, stats in caches.items():
+        line = (f"{name} {stats['hits']} {plural(stats['hits'], 'hit')}, {stats['misses']} miss, "
+                f"{stats['revalidated']} not modified, {stats['coalesced']} coalesced, {stats['evictions']} evicted")
+        if stats['memory_hits'] or stats['entries']:
+            line += (f", {stats['memory_hits']} from memory, {stats['entries']} "
+                     f"{plural(stats['entries'], 'entry')} {stats['bytes'] // 1024}KB in memory")
+        result.append(line)
+    for source, stats in negative.items():
+        result.append(f"Not found {source} {stats['added']} recorded, {stats['hits']} "
+                      f"{plural(stats['hits'], 'lookup')} skipped")
+    for name, stats in limits.items():
+        if stats['calls']:
+            result.append(f"Rate limit {name} {stats['calls']} {plural(stats['calls'], 'call')}, {stats['waited']} "
+                          f"waited, {stats['wait_max']:.3f}s longest, {stats['waiting']} waiting now")
+    for kind, stats in prefetch.items():
+        refreshed = stats['used'] + stats['missed']
+        rate = round(stats['used'] * 100 / refreshed) if refreshed else 0
+        result.append(f"Prefetch {kind} {stats['warmed']} warmed, {stats['failed']} failed, {stats['used']} of "
+                      f"{refreshed} {plural(refreshed, 'update')} prefetched, {rate}% hit rate")
 
     db = database.DBConnection()
     try:
-        snatched = db.match("SELECT count(*) as counter from wanted WHERE Status = 'Snatched'")
+        snatched = db.cached_match("SELECT count(*) as counter from wanted WHERE Status = 'Snatched'")
         if snatched['counter']:
             resultdict['snatched'] = snatched['counter']
             result.append(f"{snatched['counter']} Snatched {plural(snatched['counter'], 'item')}")
         result.append("No Snatched items")
 
         series_stats = []
-        res = db.match("SELECT count(*) as counter FROM series")
+        res = db.cached_match("SELECT count(*) as counter FROM series")
         series_stats.append(['Series', res['counter']])
-        res = db.match("SELECT count(*) as counter FROM series WHERE Total>0 and Have=0")
+        res = db.cached_match("SELECT count(*) as counter FROM series WHERE Total>0 and Have=0")
         series_stats.append(['Empty', res['counter']])
-        res = db.match("SELECT count(*) as counter FROM series WHERE Total>0 AND Have=Total")
+        res = db.cached_match("SELECT count(*) as counter FROM series WHERE Total>0 AND Have=Total")
         series_stats.append(['Full', res['counter']])
-        res = db.match("SELECT count(*) as counter FROM series WHERE Status='Ignored'")
+        res = db.cached_match("SELECT count(*) as counter FROM series WHERE Status='Ignored'")
         series_stats.append(['Ignored', res['counter']])
-        res = db.match("SELECT count(*) as counter FROM series WHERE Total=0")
+        res = db.cached_match("SELECT count(*) as counter FROM series WHERE Total=0")
         series_stats.append(['Blank', res['counter']])
-        res = db.match("SELECT count(*) as counter FROM series WHERE Updated>0")
+        res = db.cached_match("SELECT count(*) as counter FROM series WHERE Updated>0")
         series_stats.append(['Monitor', res['counter']])
         overdue = is_overdue('series')[0]
         series_stats.append(['Overdue', overdue])
@@ -643,13 +725,13 @@ def show_stats(json=False):
 
         mag_stats = []
         if CONFIG.get_bool('MAG_TAB'):
-            res = db.match("SELECT count(*) as counter FROM magazines")
+            res = db.cached_match("SELECT count(*) as counter FROM magazines")
             mag_stats.append(['Magazine', res['counter']])
-            res = db.match("SELECT count(*) as counter FROM issues")
+            res = db.cached_match("SELECT count(*) as counter FROM issues")
             mag_stats.append(['Issues', res['counter']])
             cmd = ("select (select count(*) as counter from issues where magazines.title = issues.title) "
                    "as counter from magazines where counter=0")
-            res = db.match(cmd)
+            res = db.cached_match(cmd)
             mag_stats.append(['Empty', len(res)])
             magstats = {}
             for item in mag_stats:
@@ -658,15 +740,15 @@ def show_stats(json=False):
 
         if CONFIG.get_bool('COMIC_TAB'):
             comicstats = {}
-            res = db.match("SELECT count(*) as counter FROM comics")
+            res = db.cached_match("SELECT count(*) as counter FROM comics")
             mag_stats.append(['Comics', res['counter']])
             comicstats['Comics'] = res['counter']
-            res = db.match("SELECT count(*) as counter FROM comicissues")
+            res = db.cached_match("SELECT count(*) as counter FROM comicissues")
             mag_stats.append(['Issues', res['counter']])
             comicstats['Issues'] = res['counter']
             cmd = ("select (select count(*) as counter from comicissues where comics.comicid = comicissues.comicid) "
                    "as counter from comics where counter=0")
-            res = db.match(cmd)
+            res = db.cached_match(cmd)
             mag_stats.append(['Empty', len(res)])
             comicstats['Empty'] = len(res)
             resultdict['comic_stats'] = comicstats
@@ -674,10 +756,10 @@ def show_stats(json=False):
         book_stats = []
         audio_stats = []
         missing_stats = []
-        res = db.match("SELECT count(*) as counter FROM books")
+        res = db.cached_match("SELECT count(*) as counter FROM books")
         book_stats.append(['eBooks', res['counter']])
         audio_stats.append(['Audio', res['counter']])
-        res = db.select("SELECT Status,count(*) as counter from books group by Status")
+        res = db.cached_select("SELECT Status,count(*) as counter from books group by Status")
         statusdict = {}
         for item in res:
             statusdict[item['Status']] = item['counter']
@@ -688,7 +770,7 @@ def show_stats(json=False):
             bookstats[item[0]] = item[1]
         resultdict['book_stats'] = bookstats
 
-        res = db.select("SELECT AudioStatus,count(*) as counter from books group by AudioStatus")
+        res = db.cached_select("SELECT AudioStatus,count(*) as counter from books group by AudioStatus")
         statusdict = {}
         for item in res:
             statusdict[item['AudioStatus']] = item['counter']
@@ -702,20 +784,20 @@ def show_stats(json=False):
         for column in ['BookGenre', 'BookDesc']:
             cmd = ("SELECT count(*) as counter FROM books WHERE Status != 'Ignored' "
                    "and (%s is null or %s = '')")
-            res = db.match(cmd % (column, column))
+            res = db.cached_match(cmd % (column, column))
             missing_stats.append([column.replace('Book', 'No'), res['counter']])
         cmd = "SELECT count(*) as counter FROM books WHERE Status != 'Ignored' and BookGenre='Unknown'"
-        res = db.match(cmd)
+        res = db.cached_match(cmd)
         missing_stats.append(['X_Genre', res['counter']])
         cmd = "SELECT count(*) as counter FROM books WHERE Status != 'Ignored' and BookDesc='No Description'"
-        res = db.match(cmd)
+        res = db.cached_match(cmd)
         missing_stats.append(['X_Desc', res['counter']])
         for column in ['BookISBN', 'BookLang']:
             cmd = "SELECT count(*) as counter FROM books WHERE (%s is null or %s = '' or %s = 'Unknown')"
-            res = db.match(cmd % (column, column, column))
+            res = db.cached_match(cmd % (column, column, column))
             missing_stats.append([column.replace('Book', 'No'), res['counter']])
         cmd = "SELECT count(*) as counter FROM genres"
-        res = db.match(cmd)
+        res = db.cached_match(cmd)
         missing_stats.append(['Genres', res['counter']])
         missingstats = {}
         for item in missing_stats:
@@ -726,14 +808,14 @@ def show_stats(json=False):
             audio_stats = []
 
         author_stats = []
-        res = db.match("SELECT count(*) as counter FROM authors")
+        res = db.cached_match("SELECT count(*) as counter FROM authors")
         author_stats.append(['Authors', res['counter']])
         for status in ['Active', 'Wanted', 'Ignored', 'Paused']:
-            res = db.match(f"SELECT count(*) as counter FROM authors WHERE Status='{status}'")
+            res = db.cached_match(f"SELECT count(*) as counter FROM authors WHERE Status='{status}'")
             author_stats.append([status, res['counter']])
-        res = db.match("SELECT count(*) as counter FROM authors WHERE HaveEBooks+HaveAudioBooks=0")
+        res = db.cached_match("SELECT count(*) as counter FROM authors WHERE HaveEBooks+HaveAudioBooks=0")
         author_stats.append(['Empty', res['counter']])
-        res = db.match("SELECT count(*) as counter FROM authors WHERE TotalBooks=0")
+        res = db.cached_match("SELECT count(*) as counter FROM authors WHERE TotalBooks=0")
         author_stats.append(['Blank', res['counter']])
         overdue = is_overdue('author')[0]
         author_stats.append(['Overdue', overdue])
@@ -28,7 +28,7 @@ from lazylibrarian.providers import (
     iterate_over_torrent_sites,
     iterate_over_znab_sites,
 )
-from lazylibrarian.resultlist import download_result, find_best_result
+from lazylibrarian.resultlist import BLACKLIST, ResultIndex, download_result, find_best_result
 from lazylibrarian.telemetry import TELEMETRY
 
 
@@ -78,6 +78,76 @@ def warn_mode(mode):
     logger.warning(f'No {mode} providers are available. Check config and blocklist')
 
 
+def search_due(db, book, force) -> bool:
+    """ Return False if DELAYSEARCH says book has failed too often to search for it this time """
+    logger = logging.getLogger(__name__)
+    if not CONFIG.get_bool('DELAYSEARCH') or force:
+        return True
+    res = db.match('SELECT * FROM failedsearch WHERE BookID=? AND Library=?',
+                   (book['bookid'], book['library']))
+    if not res:
+        logger.debug(f"SearchDelay: {book['library']} {book['bookid']} has not failed before")
+        return True
+    skipped = check_int(res['Count'], 0)
+    interval = check_int(res['Interval'], 0)
+    if skipped < interval:
+        logger.debug(f"SearchDelay: {book['library']} {book['bookid']} not due ({skipped}/{interval})")
+        database.WRITE_QUEUE.action("UPDATE failedsearch SET Count=? WHERE BookID=? AND Library=?",
+                                    (skipped + 1, book['bookid'], book['library']))
+        return False
+    logger.debug(f"SearchDelay: {book['library']} {book['bookid']} due this time ({skipped}/{interval})")
+    return True
+
+
+def search_by_author(searchlist) -> dict:
+    """ Where at least SEARCH_BY_AUTHOR of the books in searchlist are by the same author, ask each
+    newznab/torznab provider that can search by author for all their books in one query, and match
+    the results against each of those books here instead of searching for them one at a time.
+    Returns the good enough matches by (bookid, library) """
+    logger = logging.getLogger(__name__)
+    matches = {}
+    min_books = CONFIG.get_int('SEARCH_BY_AUTHOR')
+    if not min_books or not CONFIG.use_nzb():
+        return matches
+
+    groups = {}
+    for book in searchlist:
+        groups.setdefault((book['authorName'], book['library']), []).append(book)
+    authors = 0
+    api_calls = 0
+    api_saved = 0
+    for (authorname, library), books in groups.items():
+        if len(books) < min_books or not authorname:
+            continue
+        if lazylibrarian.STOPTHREADS:
+            break
+        searchtype = 'audio' if library == 'AudioBook' else 'book'
+        author = {'bookid': '', 'bookName': '', 'bookSub': '', 'authorName': authorname,
+                  'library': library, 'searchterm': authorname}
+        resultlist, nprov = iterate_over_znab_sites(author, f"author{searchtype}")
+        if not nprov:  # no provider can search by author
+            continue
+        authors += 1
+        api_calls += nprov
+        found = 0
+        for book in books:
+            match = find_best_result(resultlist, book, searchtype, 'nzb') if resultlist else None
+            if good_enough(match):
+                logger.info(f"Found NZB result by author: {searchtype} {round(match[0], 2)}%, "
+                            f"{match[1]['NZBprov']} priority {match[3]}")
+                matches[(book['bookid'], library)] = match
+                found += 1
+        # each book found this way saves at least one query per provider
+        api_saved += found * nprov
+        logger.debug(f"Author search for {library} {authorname} found {found} of {len(books)} from "
+                     f"{len(resultlist)} {plural(len(resultlist), 'result')}")
+    if authors:
+        logger.info(f"Searched {authors} {plural(authors, 'author')} for {len(matches)} of {len(searchlist)} "
+                    f"{plural(len(searchlist), 'book')} with {api_calls} API {plural(api_calls, 'call')}, "
+                    f"saving {api_saved - api_calls} API {plural(api_saved - api_calls, 'call')}")
+    return matches
+
+
 def search_book(books=None, library=None):
     """
     books is a list of new books to add, or None for backlog search
@@ -103,7 +173,7 @@ def search_book(books=None, library=None):
             else:
                 thread_name("SEARCHBOOKS")
 
-        db.upsert("jobs", {"Start": time.time()}, {"Name": thread_name()})
+        database.WRITE_QUEUE.upsert("jobs", {"Start": time.time()}, {"Name": thread_name()})
         searchlist = []
         searchbooks = []
 
@@ -133,7 +203,7 @@ def search_book(books=None, library=None):
 
         if len(searchbooks) == 0:
             logger.debug("No books to search for")
-            db.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
+            database.WRITE_QUEUE.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
             return
 
         nprov = CONFIG.total_active_providers()
@@ -145,7 +215,7 @@ def search_book(books=None, library=None):
             else:
                 msg += " (check you have some enabled)"
             logger.debug(msg)
-            db.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
+            database.WRITE_QUEUE.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
             return
 
         modelist = []
@@ -234,32 +304,27 @@ def search_book(books=None, library=None):
                     (library == 'eBook' and 'E' not in dltypes) or \
                     (library is None and ('E' in dltypes or 'A' in dltypes)):
                 warn_mode('rss')
+        rss_index = ResultIndex(rss_resultlist or [], 'tor_')
+
+        # one read of the wanted table for all the results in this run
+        BLACKLIST.load()
+        for book in searchlist:
+            book['due'] = search_due(db, book, force)
+        author_matches = search_by_author([book for book in searchlist if book['due']])
 
         book_count = 0
         for book in searchlist:
             if lazylibrarian.STOPTHREADS and threadname == "SEARCHALLBOOKS":
                 logger.debug(f"Aborting {threadname}")
                 break
-            do_search = True
-            if CONFIG.get_bool('DELAYSEARCH') and not force:
-                res = db.match('SELECT * FROM failedsearch WHERE BookID=? AND Library=?',
-                               (book['bookid'], book['library']))
-                if not res:
-                    logger.debug(f"SearchDelay: {book['library']} {book['bookid']} has not failed before")
-                else:
-                    skipped = check_int(res['Count'], 0)
-                    interval = check_int(res['Interval'], 0)
-                    if skipped < interval:
-                        logger.debug(f"SearchDelay: {book['library']} {book['bookid']} not due ({skipped}/{interval})")
-                        db.action("UPDATE failedsearch SET Count=? WHERE BookID=? AND Library=?",
-                                  (skipped + 1, book['bookid'], book['library']))
-                        do_search = False
-                    else:
-                        logger.debug(
-                            f"SearchDelay: {book['library']} {book['bookid']} due this time ({skipped}/{interval})")
+            do_search = book['due']
 
             matches = []
-            if do_search:
+            # books found by searching for their author don't need searching for on their own
+            author_match = author_matches.get((book['bookid'], book['library']))
+            if author_match:
+                matches.append(author_match)
+            elif do_search:
                 # first attempt, try author/title in category "book"
                 if book['library'] == 'AudioBook':
                     searchtype = 'audio'
@@ -325,7 +390,7 @@ def search_book(books=None, library=None):
                             matches.append(match)
 
                 if CONFIG.use_rss() and rss_resultlist:
-                    match = find_best_result(rss_resultlist, book, searchtype, 'rss')
+                    match = find_best_result(rss_index.candidates(book), book, searchtype, 'rss')
                     if not good_enough(match):
                         logger.info(f"RSS search for {book['library']} {book['searchterm']} returned no results.")
                     else:
@@ -399,7 +464,7 @@ def search_book(books=None, library=None):
                                 matches.append(match)
 
                     if CONFIG.use_rss() and rss_resultlist:
-                        match = find_best_result(rss_resultlist, book, searchtype, 'rss')
+                        match = find_best_result(rss_index.candidates(book), book, searchtype, 'rss')
                         if not good_enough(match):
                             logger.info(
                                 f"RSS short search for {book['library']} {book['searchterm']} returned no results.")
@@ -511,7 +576,7 @@ def search_book(books=None, library=None):
                                 matches.append(match)
 
                     if CONFIG.use_rss():
-                        match = find_best_result(rss_resultlist, book, searchtype, 'rss')
+                        match = find_best_result(rss_index.candidates(book), book, searchtype, 'rss')
                         if not good_enough(match):
                             logger.info(
                                 f"RSS title search for {book['library']} {book['searchterm']} returned no results.")
@@ -532,8 +597,8 @@ def search_book(books=None, library=None):
                     f"{highest[1]['NZBtitle']}")
                 if download_result(highest, book) > 1:
                     book_count += 1  # we found it
-                db.action("DELETE from failedsearch WHERE BookID=? AND Library=?",
-                          (book['bookid'], book['library']))
+                database.WRITE_QUEUE.action("DELETE from failedsearch WHERE BookID=? AND Library=?",
+                                            (book['bookid'], book['library']))
             elif CONFIG.get_bool('DELAYSEARCH') and not force and do_search and len(modelist):
                 res = db.match('SELECT * FROM failedsearch WHERE BookID=? AND Library=?',
                                (book['bookid'], book['library']))
@@ -542,9 +607,9 @@ def search_book(books=None, library=None):
                 else:
                     interval = 0
 
-                db.upsert("failedsearch",
-                          {'Count': 0, 'Interval': interval + 1, 'Time': time.time()},
-                          {'BookID': book['bookid'], 'Library': book['library']})
+                database.WRITE_QUEUE.upsert("failedsearch",
+                                            {'Count': 0, 'Interval': interval + 1, 'Time': time.time()},
+                                            {'BookID': book['bookid'], 'Library': book['library']})
 
             time.sleep(CONFIG.get_int('SEARCH_RATELIMIT'))
 
@@ -553,6 +618,6 @@ def search_book(books=None, library=None):
     except Exception:
         logger.error(f'Unhandled exception in search_book: {traceback.format_exc()}')
     finally:
-        db.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
+        database.WRITE_QUEUE.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
         db.close()
         thread_name("WEBSERVER")
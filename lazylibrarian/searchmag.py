@@ -67,7 +67,7 @@ def search_magazines(mags=None, reset=False, backissues=False):
     # noinspection PyBroadException
     try:
 
-        db.upsert("jobs", {"Start": time.time()}, {"Name": thread_name()})
+        database.WRITE_QUEUE.upsert("jobs", {"Start": time.time()}, {"Name": thread_name()})
         searchlist = []
 
         if not mags:  # backlog search
@@ -83,7 +83,7 @@ def search_magazines(mags=None, reset=False, backissues=False):
 
         if len(searchmags) == 0:
             logger.debug("No magazines to search for")
-            db.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
+            database.WRITE_QUEUE.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
             thread_name("WEBSERVER")
             return
 
@@ -506,7 +506,7 @@ def search_magazines(mags=None, reset=False, backissues=False):
     except Exception:
         logger.error(f'Unhandled exception in search_magazines: {traceback.format_exc()}')
     finally:
-        db.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
+        database.WRITE_QUEUE.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
         db.close()
         thread_name("WEBSERVER")
 
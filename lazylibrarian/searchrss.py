@@ -36,7 +36,7 @@ from lazylibrarian.importer import add_author_name_to_db, import_book, search_fo
 from lazylibrarian.librarysync import find_book_in_db
 from lazylibrarian.notifiers import custom_notify_snatch, notify_snatch
 from lazylibrarian.providers import iterate_over_rss_sites, iterate_over_wishlists
-from lazylibrarian.resultlist import process_result_list
+from lazylibrarian.resultlist import BLACKLIST, ResultIndex, process_result_list
 from lazylibrarian.scheduling import SchedulerCommand, schedule_job
 from lazylibrarian.telemetry import TELEMETRY
 
@@ -134,7 +134,7 @@ def search_wishlist():
     search_start = time.time()
     db = database.DBConnection()
     try:
-        db.upsert("jobs", {"Start": time.time()}, {"Name": thread_name()})
+        database.WRITE_QUEUE.upsert("jobs", {"Start": time.time()}, {"Name": thread_name()})
         try:
             resultlist, wishproviders = iterate_over_wishlists()
             if not wishproviders:
@@ -369,7 +369,7 @@ def search_wishlist():
         except Exception:
             logger.error(f'Unhandled exception in search_wishlist: {traceback.format_exc()}')
         finally:
-            db.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
+            database.WRITE_QUEUE.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
 
         logger.debug(f"Wishlist found eBook:{len(new_books)}, Audio:{len(new_audio)}")
 
@@ -539,6 +539,9 @@ def search_rss_book(books=None, library=None):
                          "library": "AudioBook",
                          "searchterm": searchterm})
 
+        BLACKLIST.load()
+        # index the feed once, so each book is only scored against the items sharing a word with it
+        index = ResultIndex(resultlist, 'tor_')
         rss_count = 0
         for book in searchlist:
             if lazylibrarian.STOPTHREADS and threadname == "SEARCHALLRSS":
@@ -548,20 +551,22 @@ def search_rss_book(books=None, library=None):
                 searchtype = 'audio'
             else:
                 searchtype = 'book'
-            found = process_result_list(resultlist, book, searchtype, 'rss')
+            candidates = index.candidates(book)
+            found = process_result_list(candidates, book, searchtype, 'rss')
 
             # if you can't find the book, try title without any "(extended details, series etc.)"
             if not found and '(' in book['bookName']:  # anything to shorten?
                 searchtype = f"short{searchtype}"
-                found = process_result_list(resultlist, book, searchtype, 'rss')
+                found = process_result_list(candidates, book, searchtype, 'rss')
 
             if not found:
                 logger.info(f"rss Searches for {book['library']} {book['searchterm']} returned no results.")
             if found > 1:
                 rss_count += 1
 
+        logger.debug(f"Scored {index.scored} of {len(resultlist) * len(searchlist)} rss book and item pairs")
         logger.info(f"rss Search for Wanted items complete, found {rss_count} {plural(rss_count, 'book')}")
-        db.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
+        database.WRITE_QUEUE.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
 
     except Exception:
         logger.error(f'Unhandled exception in search_rss_book: {traceback.format_exc()}')
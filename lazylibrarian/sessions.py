@@ -0,0 +1,125 @@
+#  This file is part of Lazylibrarian.
+#  Lazylibrarian is free software':'you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  Lazylibrarian is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#  You should have received a copy of the GNU General Public License
+#  along with Lazylibrarian.  If not, see <http://www.gnu.org/licenses/>.
+
+# Purpose:
+#   Shared requests sessions, one per host, so repeated calls reuse keep-alive connections
+
+import logging
+import threading
+from collections import OrderedDict
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from lazylibrarian.common import proxy_list
+
+# Most sessions we keep open, the least recently used host is closed after that
+MAX_SESSIONS = 64
+# Connections kept open per host
+POOL_SIZE = 10
+
+
+class SessionRegistry:
+    """ A requests.Session for each scheme://host and proxy setting.
+    Sessions don't keep cookies, so callers behave as they did with bare requests.get/post,
+    passing any cookies and headers they need on each call """
+    def __init__(self, max_sessions: int = MAX_SESSIONS):
+        self.logger = logging.getLogger(__name__)
+        self.max_sessions = max_sessions
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict()
+        self.opened = 0  # Connections opened by sessions that have since been closed
+        self.requests = 0  # and requests made by them
+        self.created = 0
+
+    @staticmethod
+    def host(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}".lower()
+
+    def get(self, url: str) -> requests.Session:
+        """ Return the session for the host in url, using the current proxy settings """
+        proxies = proxy_list()
+        key = (self.host(url), tuple(sorted(proxies.items())) if proxies else ())
+        with self.lock:
+            session = self.sessions.get(key)
+            if session:
+                self.sessions.move_to_end(key)
+                return session
+            session = requests.Session()
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            if proxies:
+                session.proxies.update(proxies)
+            self.sessions[key] = session
+            self.created += 1
+            while len(self.sessions) > self.max_sessions:
+                _, old = self.sessions.popitem(last=False)
+                self.retire(old)
+        return session
+
+    @staticmethod
+    def pool_counts(session: requests.Session) -> tuple[int, int]:
+        """ Return the connections opened and requests made by the connection pools of session """
+        opened = 0
+        made = 0
+        for adapter in set(session.adapters.values()):
+            managers = [adapter.poolmanager, *adapter.proxy_manager.values()]
+            for manager in managers:
+                for key in manager.pools.keys():
+                    pool = manager.pools.get(key)
+                    if pool:
+                        opened += pool.num_connections
+                        made += pool.num_requests
+        return opened, made
+
+    def retire(self, session: requests.Session):
+        """ Close session, keeping its counts. Call with the lock held """
+        opened, made = self.pool_counts(session)
+        self.opened += opened
+        self.requests += made
+        session.close()
+
+    def close_all(self):
+        with self.lock:
+            while self.sessions:
+                _, session = self.sessions.popitem()
+                self.retire(session)
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            opened = self.opened
+            made = self.requests
+            for session in self.sessions.values():
+                counts = self.pool_counts(session)
+                opened += counts[0]
+                made += counts[1]
+            hosts = len(self.sessions)
+        return {'hosts': hosts, 'sessions': self.created, 'requests': made, 'opened': opened,
+                'reused': max(made - opened, 0)}
+
+
+SESSIONS = SessionRegistry()
+
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    """ requests.get using the shared session for the host """
+    return SESSIONS.get(url).get(url, **kwargs)
+
+
+def http_post(url: str, **kwargs) -> requests.Response:
+    """ requests.post using the shared session for the host """
+    return SESSIONS.get(url).post(url, **kwargs)
@@ -18,6 +18,7 @@ import time
 
 import lazylibrarian
 from lazylibrarian.blockhandler import BLOCKHANDLER
+from lazylibrarian.cachestore import get_counters
 from lazylibrarian.config2 import CONFIG
 from lazylibrarian.filesystem import DIRS, path_isfile, remove_file, splitext
 from lazylibrarian.formatter import check_int, get_list, md5_utf8, plural
@@ -78,10 +79,10 @@ def slsk_search(book=None, searchtype='ebook', test=False):
                 valid_cache = True
 
         if valid_cache:
-            lazylibrarian.CACHE_HIT = int(lazylibrarian.CACHE_HIT) + 1
+            get_counters('IRCCache').hit()
             cachelogger.debug(f"CacheHandler: Found CACHED response {hashfilename} for {book['searchterm']}")
         else:
-            lazylibrarian.CACHE_MISS = int(lazylibrarian.CACHE_MISS) + 1
+            get_counters('IRCCache').miss()
             hashfilename = slsk.search(book['searchterm'], searchtype=searchtype, test=test)
     else:
         hashfilename = slsk.search(book['searchterm'], searchtype=searchtype, test=test)
@@ -23,6 +23,7 @@ import sqlite3
 import subprocess
 import sys
 import tarfile
+import threading
 import time
 import traceback
 from shutil import move, rmtree
@@ -35,7 +36,8 @@ import urllib3
 import lazylibrarian
 from lazylibrarian import database, dnb, gb, gr, hc, ol, versioncheck
 from lazylibrarian.blockhandler import BLOCKHANDLER
-from lazylibrarian.cache import fetch_url, init_hex_caches
+from lazylibrarian.cache import fetch_url, init_hex_caches, migrate_hex_caches
+from lazylibrarian.cachestore import close_stores
 from lazylibrarian.cleanup import UNBUNDLER
 from lazylibrarian.common import docker, log_header
 from lazylibrarian.config2 import CONFIG, LLConfigHandler
@@ -53,6 +55,7 @@ from lazylibrarian.scheduling import (
     shutdownscheduler,
     startscheduler,
 )
+from lazylibrarian.sessions import SESSIONS
 
 
 class StartupLazyLibrarian:
@@ -251,26 +254,13 @@ class StartupLazyLibrarian:
                 self.logger.error(msg)
 
         _ = init_hex_caches()
+        threading.Thread(target=migrate_hex_caches, name="CACHEMIGRATE", daemon=True).start()
         makocache = DIRS.get_mako_cachedir()
         self.logger.debug("Clearing mako cache")
         with contextlib.suppress(FileNotFoundError):
             rmtree(makocache)
         os.makedirs(makocache)
         remove_file(os.path.join(DIRS.CACHEDIR, 'alive.png'))
-        # keep track of last api calls so we don't call more than once per second
-        # to respect api terms, but don't wait un-necessarily either
-        # keep track of how long we slept
-        time_now = int(time.time())
-        lazylibrarian.TIMERS['LAST_LT'] = time_now
-        lazylibrarian.TIMERS['LAST_GR'] = time_now
-        lazylibrarian.TIMERS['LAST_CV'] = time_now
-        lazylibrarian.TIMERS['LAST_BOK'] = time_now
-        lazylibrarian.TIMERS['SLEEP_GR'] = 0.0
-        lazylibrarian.TIMERS['SLEEP_LT'] = 0.0
-        lazylibrarian.TIMERS['SLEEP_CV'] = 0.0
-        lazylibrarian.TIMERS['SLEEP_BOK'] = 0.0
-        lazylibrarian.TIMERS['LAST_HC'] = time_now
-        lazylibrarian.TIMERS['SLEEP_HC'] = 0.0
 
     def init_database(self):
         # Initialize the database
@@ -756,11 +746,17 @@ class StartupLazyLibrarian:
         if columns:  # check for no such table
             db.action("UPDATE jobs SET Finish=Start WHERE Finish<Start")
         db.close()
+        if CONFIG.get_bool('DB_WRITE_QUEUE'):
+            database.WRITE_QUEUE.start()
         if not lazylibrarian.STOPTHREADS:
             restart_jobs(command=SchedulerCommand.START)
 
     def shutdown(self, restart=False, update=False, doquit=False, testing=False):
         shutdownscheduler()
+        database.WRITE_QUEUE.stop()
+        database.POOL.close_all()
+        close_stores()
+        SESSIONS.close_all()
         if not testing and not (update and doquit):  # commandline update, don't save config as no filename
             if self.logger.isEnabledFor(logging.DEBUG):  # TODO add a separate setting
                 CONFIG.create_access_summary(syspath(DIRS.get_logfile('configaccess.log')))
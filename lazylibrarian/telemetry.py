@@ -273,9 +273,8 @@ def telemetry_send() -> str:
     if "Thread" in threadname:
         thread_name("TELEMETRYSEND")
     logger = logging.getLogger(__name__)
-    db = database.DBConnection()
     try:
-        db.upsert("jobs", {"Start": time.time()}, {"Name": thread_name()})
+        database.WRITE_QUEUE.upsert("jobs", {"Start": time.time()}, {"Name": thread_name()})
         TELEMETRY.set_install_data(CONFIG, testing=False)
         TELEMETRY.set_config_data(CONFIG)
         if CONFIG['TELEMETRY_SERVER'] == '':
@@ -289,7 +288,6 @@ def telemetry_send() -> str:
                 result = result.splitlines()[0]  # Return only the first line
         logger.debug(f'Telemetry data sending: {result}, {status}')
     finally:
-        db.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
-        db.close()
+        database.WRITE_QUEUE.upsert("jobs", {"Finish": time.time()}, {"Name": thread_name()})
         thread_name(threadname)
     return result
@@ -15,7 +15,6 @@ import re
 import traceback
 from urllib.parse import quote, quote_plus, urlencode
 
-import requests
 from bs4 import BeautifulSoup
 
 import lib.feedparser as feedparser
@@ -30,6 +29,7 @@ from lazylibrarian.formatter import (
     unaccented,
     url_fix,
 )
+from lazylibrarian.sessions import http_get
 from lazylibrarian.telemetry import TELEMETRY
 
 
@@ -113,7 +113,7 @@ def torrent_abb(book=None, test=False):
 def extract_magnet_link(details_url):
     logger = logging.getLogger(__name__)
     try:
-        response = requests.get(details_url, headers={'User-Agent': f'{get_user_agent()}'})
+        response = http_get(details_url, headers={'User-Agent': f'{get_user_agent()}'})
         if response.status_code != 200:
             logger.error(f"Failed to fetch details page. Status Code: {response.status_code}")
             return None
@@ -14,10 +14,9 @@ import logging
 import time
 from urllib.parse import urlparse, urlunparse
 
-import requests
-
 from lazylibrarian.common import proxy_list
 from lazylibrarian.config2 import CONFIG
+from lazylibrarian.sessions import http_get, http_post
 
 # This is just a simple script to send torrents to transmission. The
 # intention is to turn this into a class where we can check the state
@@ -358,11 +357,11 @@ def torrent_action(method, arguments):
         dlcommslogger.debug('Requesting session_id')
         try:
             if host_url.startswith('https') and CONFIG.get_bool('SSL_VERIFY'):
-                response = requests.get(host_url, auth=auth, proxies=proxies, timeout=timeout,
-                                        verify=CONFIG['SSL_CERTS']
-                                        if CONFIG['SSL_CERTS'] else True)
+                response = http_get(host_url, auth=auth, proxies=proxies, timeout=timeout,
+                                    verify=CONFIG['SSL_CERTS']
+                                    if CONFIG['SSL_CERTS'] else True)
             else:
-                response = requests.get(host_url, auth=auth, proxies=proxies, timeout=timeout, verify=False)
+                response = http_get(host_url, auth=auth, proxies=proxies, timeout=timeout, verify=False)
         except Exception as e:
             res = f'Transmission {type(e).__name__}: {str(e)}'
             logger.error(res)
@@ -392,8 +391,8 @@ def torrent_action(method, arguments):
     if not tr_version or not rpc_version:
         headers = {'x-transmission-session-id': session_id}
         data = {'method': 'session-get', 'arguments': {'fields': ['version', 'rpc-version']}}
-        response = requests.post(host_url, json=data, headers=headers, proxies=proxies,
-                                 auth=auth, timeout=timeout)
+        response = http_post(host_url, json=data, headers=headers, proxies=proxies,
+                             auth=auth, timeout=timeout)
 
         if response and str(response.status_code).startswith('2'):
             res = response.json()
@@ -406,14 +405,14 @@ def torrent_action(method, arguments):
     data = {'method': method, 'arguments': arguments}
     dlcommslogger.debug(f'Transmission request {str(data)}')
     try:
-        response = requests.post(host_url, json=data, headers=headers, proxies=proxies,
-                                 auth=auth, timeout=timeout)
+        response = http_post(host_url, json=data, headers=headers, proxies=proxies,
+                             auth=auth, timeout=timeout)
         if response.status_code == 409:
             session_id = response.headers['x-transmission-session-id']
             logger.debug(f"Retrying with new session_id {session_id}")
             headers = {'x-transmission-session-id': session_id}
-            response = requests.post(host_url, json=data, headers=headers, proxies=proxies,
-                                     auth=auth, timeout=timeout)
+            response = http_post(host_url, json=data, headers=headers, proxies=proxies,
+                                 auth=auth, timeout=timeout)
         if not str(response.status_code).startswith('2'):
             res = f"Expected a response from Transmission, got {response.status_code}"
             logger.error(res)
@@ -225,7 +225,7 @@ def check_for_updates():
     db = database.DBConnection()
     columns = db.match('PRAGMA table_info(jobs)')
     if columns:
-        db.upsert("jobs", {"Start": time.time()}, {"Name": "VERSIONCHECK"})
+        database.WRITE_QUEUE.upsert("jobs", {"Start": time.time()}, {"Name": "VERSIONCHECK"})
     db.close()
 
     logger.debug('Setting Install Type, Current & Latest Version and Commit status')
@@ -272,7 +272,7 @@ def check_for_updates():
     db = database.DBConnection()
     columns = db.match('PRAGMA table_info(jobs)')
     if columns:
-        db.upsert("jobs", {"Finish": time.time()}, {"Name": "VERSIONCHECK"})
+        database.WRITE_QUEUE.upsert("jobs", {"Finish": time.time()}, {"Name": "VERSIONCHECK"})
     db.close()
 
 
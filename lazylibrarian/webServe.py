@@ -651,7 +651,7 @@ class WebInterface:
             if lazylibrarian.PRIMARY_AUTHORS:
                 # is the author a primary author for any book...
                 bookauthors = []
-                res = db.select(f"SELECT AuthorID from bookauthors WHERE role={ROLE['PRIMARY']}")
+                res = db.cached_select(f"SELECT AuthorID from bookauthors WHERE role={ROLE['PRIMARY']}")
                 for author in res:
                     bookauthors.append(author['AuthorID'])
                 cmd += " and AuthorID in (" + ", ".join(f"'{w}'" for w in bookauthors) + ")"
@@ -663,11 +663,22 @@ class WebInterface:
                     myauthors.append(author['WantID'])
                 cmd += " and AuthorID in (" + ", ".join(f"'{w}'" for w in myauthors) + ")"
 
+            args = []
+            if sSearch:
+                # words in author name or aka, or an exact status, or part of the latest book title
+                serversidelogger.debug(f"filter {sSearch}")
+                cond, args = database.fts_filter('authors', sSearch)
+                cmd += f" and ({cond} or Status=? COLLATE NOCASE or instr(lower(LastBook), ?) > 0)"
+                args.extend([sSearch, sSearch.lower()])
+
             cmd += " order by AuthorName COLLATE NOCASE"
 
-            serversidelogger.debug(f"get_index {cmd}")
+            serversidelogger.debug(f"get_index {cmd}: {str(args)}")
 
-            rowlist = db.select(cmd)
+            if sSearch:
+                rowlist = db.select(cmd, tuple(args))
+            else:
+                rowlist = db.cached_select(cmd)
             # At his point we want to sort and filter _before_ adding the html as it's much quicker
             # turn the sqlite rowlist into a list of lists
             if len(rowlist):
@@ -747,11 +758,8 @@ class WebInterface:
                     nrow.append(bar)
                     nrow.extend(arow[11:])
                     rows.append(nrow)  # add each rowlist to the masterlist
-                if sSearch:
-                    serversidelogger.debug(f"filter {sSearch}")
-                    filtered = [x for x in rows if sSearch.lower() in str(x).lower()]
-                else:
-                    filtered = rows
+                # any search has already been applied by the query
+                filtered = rows
 
                 sortcolumn = int(iSortCol_0) - 1
                 if sortcolumn == 2:
@@ -1546,6 +1554,13 @@ class WebInterface:
             if author_id:
                 cmd += " and seriesauthors.AuthorID=?"
                 args.append(author_id)
+            if sSearch:
+                # words in series or author name, or an exact status
+                serversidelogger.debug(f"filter {sSearch}")
+                series_cond, series_args = database.fts_filter('series', sSearch)
+                author_cond, author_args = database.fts_filter('authors', sSearch)
+                cmd += f" and ({series_cond} or {author_cond} or series.Status=? COLLATE NOCASE)"
+                args.extend(series_args + author_args + [sSearch])
 
             myseries = []
             db = database.DBConnection()
@@ -1560,10 +1575,10 @@ class WebInterface:
 
             serversidelogger.debug(f"get_series {cmd}: {str(args)}")
 
-            if args:
+            if sSearch:
                 rowlist = db.select(cmd, tuple(args))
             else:
-                rowlist = db.select(cmd)
+                rowlist = db.cached_select(cmd, tuple(args))
             db.close()
 
             # turn the sqlite rowlist into a list of lists
@@ -1572,11 +1587,8 @@ class WebInterface:
                     entry = list(row)  # turn sqlite objects into lists
                     rows.append(entry)  # add the rowlist to the masterlist
 
-                if sSearch:
-                    serversidelogger.debug(f"filter {sSearch}")
-                    filtered = [x for x in rows if sSearch.lower() in str(x).lower()]
-                else:
-                    filtered = rows
+                # any search has already been applied by the query
+                filtered = rows
 
                 sortcolumn = int(iSortCol_0)
                 serversidelogger.debug(f"sortcolumn {sortcolumn}")
@@ -3097,6 +3109,16 @@ class WebInterface:
                         bookauthors.append(bk['BookID'])
                     cmd += " and books.BookID in (" + ", ".join(f"'{w}'" for w in bookauthors) + ")"
 
+            if sSearch:
+                # words in title, subtitle, author, series or genre, or an exact status, id, language or date
+                serversidelogger.debug(f"filter [{sSearch}]")
+                cond, fts_args = database.fts_filter('books', sSearch)
+                cmd += (f" and ({cond} or {status_type}=? COLLATE NOCASE or books.BookID=? "
+                        "or bookauthors.AuthorID=? or BookLang=? or instr(BookDate, ?) > 0 "
+                        "or instr(lower(ScanResult), ?) > 0)")
+                args.extend(fts_args)
+                args.extend([sSearch, sSearch, sSearch, sSearch, sSearch, sSearch.lower()])
+
             cmd += (" GROUP BY bookimg, authorname, bookname, bookrate, bookdate, books.status, books.bookid, "
                     "booklang, booksub, booklink, workpage, bookauthors.authorid, booklibrary, audiostatus, "
                     "audiolibrary, bookgenre, bookadded, scanresult, lt_workid")
@@ -3121,26 +3143,8 @@ class WebInterface:
                     rows.append(entry)  # add each rowlist to the masterlist
                 serversidelogger.debug("get_books surname/definite completed")
 
-                if sSearch:
-                    serversidelogger.debug(f"filter [{sSearch}]")
-                    if library is not None:
-                        search_fields = ['AuthorName', 'BookName', 'BookDate', 'Status', 'BookID',
-                                         'BookLang', 'BookSub', 'AuthorID', 'BookGenre',
-                                         'ScanResult']
-                        if library == 'AudioBook':
-                            search_fields[3] = 'AudioStatus'
-
-                        filtered = []
-                        for row in rowlist:
-                            _dict = dict(row)
-                            for key in search_fields:
-                                if _dict[key] and sSearch.lower() in _dict[key].lower():
-                                    filtered.append(list(row))
-                                    break
-                    else:
-                        filtered = [x for x in rows if sSearch.lower() in str(x).lower()]
-                else:
-                    filtered = rows
+                # any search has already been applied by the query
+                filtered = rows
 
                 # table headers and column headers do not match at this point
                 sortcolumn = int(iSortCol_0)
@@ -7236,6 +7240,20 @@ class WebInterface:
             result = result + line + '\n'
         return result
 
+    @cherrypy.expose
+    @require_auth()
+    def show_query_stats(self):
+        self.check_permitted(lazylibrarian.perm_admin)
+        cherrypy.response.headers['Cache-Control'] = "max-age=0,no-cache,no-store"
+        # show database query timings, slowest first
+        return '\n'.join(database.PROFILER.report(limit=50))
+
+    @cherrypy.expose
+    @require_auth()
+    def reset_query_stats(self):
+        self.check_permitted(lazylibrarian.perm_admin)
+        database.PROFILER.reset()
+
     @cherrypy.expose
     @require_auth()
     def restart_jobs(self):
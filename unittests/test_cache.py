@@ -10,12 +10,24 @@ import mock
 import os
 import random
 import requests
+import threading
 import time
 
-import lazylibrarian
 from lazylibrarian import cache
 from lazylibrarian.blockhandler import BLOCKHANDLER
 from lazylibrarian.cache import ImageType
+from lazylibrarian.cachestore import (
+    NEGATIVE,
+    FileCacheStore,
+    close_stores,
+    compress_body,
+    decompress_body,
+    get_cache_index,
+    get_counters,
+    get_flight,
+    get_memory_tier,
+    get_store,
+)
 from lazylibrarian.config2 import CONFIG
 from lazylibrarian.database import DBConnection
 from lazylibrarian.dbupgrade import db_upgrade, upgrade_needed
@@ -28,6 +40,7 @@ class TestCache(LLTestCaseWithConfigandDIRS):
         # Create a test directory and test database
         super().setUp()
         self.logger.setLevel(logging.ERROR)
+        close_stores()
         remove_dir(DIRS.get_cachedir(''), remove_contents=True)
         self.testdir = DIRS.get_cachedir('test')
         DIRS.ensure_dir_is_writeable(self.testdir)
@@ -49,6 +62,7 @@ class TestCache(LLTestCaseWithConfigandDIRS):
         super().tearDown()
         remove_dir(self.testdir, remove_contents=True)
         remove_file(DIRS.get_dbfile())
+        close_stores()
         remove_dir(DIRS.get_cachedir(''), remove_contents=True)
 
     @classmethod
@@ -78,7 +92,7 @@ class TestCache(LLTestCaseWithConfigandDIRS):
         self.assertFalse(res, 'Expect blank URL to fail')
         self.assertEqual(msg, 'Blocked')
 
-    # This method will be used by the mock to replace requests.get
+    # This method will be used by the mock to replace http_get
     def mocked_requests_get(*args, **kwargs):
         class MockResponse:
             def __init__(self, content, status_code):
@@ -112,9 +126,9 @@ class TestCache(LLTestCaseWithConfigandDIRS):
 
         return MockResponse('', 404)
 
-    @mock.patch.object(requests, 'get', side_effect=mocked_requests_get)
+    @mock.patch.object(cache, 'http_get', side_effect=mocked_requests_get)
     def test_fetch_url_with_mock(self, mock_get):
-        """ Test fetch_url, mocking requests.get """
+        """ Test fetch_url, mocking the request """
         # Set up test conditions
         BLOCKHANDLER.clear_all()
         timeout = 30
@@ -304,15 +318,96 @@ class TestCache(LLTestCaseWithConfigandDIRS):
         self.assertTrue(ok, 'Could not re-initialize hex caches')
 
         # Check that a few dirs exist
-        for name in ['WorkCache/a/7', 'JSONCache/f/0', 'HTMLCache/0/f', 'XMLCache/6/6']:
+        for name in ['WorkCache/a/7', 'WorkCache/f/0']:
             self.assertTrue(path_isdir(DIRS.get_cachedir(name)), f'Cache dir structure missing fir {name}')
-        # Check that a few dirs don't exist
-        for name in ['RandomCache/a/7', 'JSONCache/g/0', 'HTMLCache/3/Z', 'XMLCache/B/T']:
+        # Check that a few dirs don't exist. The response caches keep their entries in a store by default
+        for name in ['RandomCache/a/7', 'WorkCache/g/0', 'JSONCache/f/0', 'HTMLCache/0/f', 'XMLCache/6/6']:
             self.assertFalse(path_isdir(DIRS.get_cachedir(name)), f'Cache dir structure has unexpected dir {name}')
 
+        # With the files backend, they get hex dirs as well
+        CONFIG.set_str('CACHE_BACKEND', 'files')
+        try:
+            ok = cache.init_hex_caches()
+            self.assertTrue(ok, 'Could not initialize hex caches for files backend')
+            for name in ['WorkCache/a/7', 'JSONCache/f/0', 'HTMLCache/0/f', 'XMLCache/6/6']:
+                self.assertTrue(path_isdir(DIRS.get_cachedir(name)), f'Cache dir structure missing fir {name}')
+        finally:
+            CONFIG.set_str('CACHE_BACKEND', 'sqlite')
+
+    def test_migrate_hex_caches(self):
+        """ Test moving entries from the old hex dirs into the stores """
+        legacy = FileCacheStore('JSONCache')
+        legacy.put('098f6bcd4621d373cade4e832627b4f6', b'{"test": "Old"}', fetched=time.time() - 1000)
+        legacy.put('5a105e8b9d40e1329780d62ea2265d8a', b'{"test": "Stale"}', fetched=time.time() - 1000)
+        store = get_store('JSONCache')
+        store.put('5a105e8b9d40e1329780d62ea2265d8a', b'{"test": "New"}')
+
+        moved = cache.migrate_hex_caches()
+        self.assertEqual(2, moved, 'Expected both legacy entries to be moved')
+        self.assertFalse(path_isdir(DIRS.get_cachedir('JSONCache')), 'Legacy dir should be removed')
+        entry = store.get('098f6bcd4621d373cade4e832627b4f6')
+        self.assertEqual(b'{"test": "Old"}', entry.body)
+        self.assertLess(entry.fetched, time.time() - 900, 'Migrated entry should keep its timestamp')
+        entry = store.get('5a105e8b9d40e1329780d62ea2265d8a')
+        self.assertEqual(b'{"test": "New"}', entry.body, 'Newer entry in store should not be replaced')
+        self.assertEqual(0, cache.migrate_hex_caches(), 'Nothing left to move')
+
+    def test_store_expirer(self):
+        store = get_store('JSONCache')
+        msg = cache.StoreExpirer('JSONCache', 1000).clean()
+        self.assertEqual('Cleaned 0 expired entries from JSONCache, kept 0', msg)
+        for inx in range(5):
+            store.put(f'old{inx}', b'{}', fetched=time.time() - 3600)
+        for inx in range(3):
+            store.put(f'new{inx}', b'{}', headers={'ETag': 'abc', 'X-Other': 'dropped'})
+        msg = cache.StoreExpirer('JSONCache', 1000).clean()
+        self.assertEqual('Cleaned 5 expired entries from JSONCache, kept 3', msg)
+        self.assertEqual({'ETag': 'abc'}, store.get('new1').headers, 'Only useful headers are stored')
+
+        # Entries that can be revalidated are kept longer
+        store.put('validated', b'{}', headers={'Last-Modified': 'yesterday'}, fetched=time.time() - 3600)
+        store.put('unvalidated', b'{}', fetched=time.time() - 3600)
+        msg = cache.StoreExpirer('JSONCache', 1000, 4).clean()
+        self.assertEqual('Cleaned 1 expired entry from JSONCache, kept 4', msg)
+        msg = cache.StoreExpirer('JSONCache', 1000, 2).clean()
+        self.assertEqual('Cleaned 1 expired entry from JSONCache, kept 3', msg)
+
+    def test_compressed_entries(self):
+        """ Test that bodies are compressed on disk, and uncompressed ones can still be read """
+        body = b'{"works": [' + b','.join(b'{"title": "Book %d"}' % inx for inx in range(200)) + b']}'
+        self.assertEqual(body, decompress_body(compress_body(body)))
+        self.assertLess(len(compress_body(body)), len(body) / 4, 'Expected the body to compress')
+        self.assertEqual(b'{}', compress_body(b'{}'), 'Small bodies are not compressed')
+        with self.assertRaises(ValueError):
+            decompress_body(compress_body(body)[:-10])
+
+        for store in [get_store('JSONCache'), FileCacheStore('XMLCache')]:
+            store.put('c0', body)
+            CONFIG.set_bool('CACHE_COMPRESS', False)
+            try:
+                store.put('d0', body)
+            finally:
+                CONFIG.set_bool('CACHE_COMPRESS', True)
+            self.assertEqual(body, store.get('c0').body)
+            self.assertEqual(body, store.get('d0').body, 'Uncompressed entries should still be read')
+            raw, stored = store.sizes()
+            self.assertEqual(2 * len(body), raw)
+            self.assertEqual(len(body) + len(compress_body(body)), stored)
+        remove_dir(DIRS.get_cachedir('XMLCache'), remove_contents=True)
+
+        # A damaged entry is dropped so it gets fetched again
+        store = get_store('JSONCache')
+        store.put('damaged', compress_body(body)[:-10])
+        self.assertIsNone(store.get('damaged'))
+        self.assertEqual(0.0, store.fetched('damaged'))
+
+        msg = cache.StoreExpirer('JSONCache', 1000).clean()
+        self.assertTrue(msg.startswith('Cleaned 0 expired entries from JSONCache, kept 2, '), msg)
+        self.assertIn('saved)', msg)
+
     @mock.patch.object(cache, 'fetch_url')
     def test_gr_xml_request(self, mock_fetch_url):
-        cache_hits = lazylibrarian.CACHE_HIT
+        cache_hits = get_counters('XMLCache').hits
         # Try some requests that work
         mock_fetch_url.return_value = ("<?xml version='1.0' encoding='utf-8'?><test>Hello</test>", True)
         data, in_cache = cache.gr_xml_request('testing', True, True)
@@ -342,9 +437,7 @@ class TestCache(LLTestCaseWithConfigandDIRS):
 
         # Save an cache file that is not valid XML and try to read it
         cr = cache.XMLCacheRequest('fakexml', True, True)
-        dirname = DIRS.get_cachedir(cr.cachedir_name())
-        filename, _ = cr.get_hashed_filename(dirname)
-        self.create_a_file(filename)  # Creates a simple text file, not an XML file
+        cr.store().put(cr.get_key(), b'Hello')  # A simple text entry, not XML
         with self.assertLogs(self.logger, logging.ERROR):
             data, in_cache = cache.gr_xml_request('fakexml', True, True)
         self.assertFalse(in_cache, 'Request should have failed')
@@ -352,11 +445,11 @@ class TestCache(LLTestCaseWithConfigandDIRS):
 
         # Todo: Find a way to trigger UnicodeEncodeError and test that it works ok
 
-        self.assertEqual(lazylibrarian.CACHE_HIT, cache_hits+2)
+        self.assertEqual(get_counters('XMLCache').hits, cache_hits+2)
 
     @mock.patch.object(cache, 'fetch_url')
     def test_json_request(self, mock_fetch_url):
-        cache_hits = lazylibrarian.CACHE_HIT
+        cache_hits = get_counters('JSONCache').hits
         # Try some requests that work
         mock_fetch_url.return_value = ('{"test": "Hello"}', True)
         data, in_cache = cache.json_request('testing', True, True)
@@ -383,9 +476,7 @@ class TestCache(LLTestCaseWithConfigandDIRS):
 
         # Save an invalid cache file and try to read it
         cr = cache.JSONCacheRequest('fakeit', True, True)
-        dirname = DIRS.get_cachedir(cr.cachedir_name())
-        filename, _ = cr.get_hashed_filename(dirname)
-        self.create_a_file(filename)  # Creates a simple text file, not a JSON file
+        cr.store().put(cr.get_key(), b'Hello')  # A simple text entry, not JSON
         with self.assertLogs(self.logger, logging.ERROR):
             data, in_cache = cache.json_request('fakeit', True, True)
         self.assertFalse(in_cache, 'Request should have failed')
@@ -397,11 +488,11 @@ class TestCache(LLTestCaseWithConfigandDIRS):
         self.assertFalse(in_cache, 'Data should not yet be cached')
         self.assertEqual(data, {"test": "Hello"}, 'Unexpected data')
 
-        self.assertEqual(lazylibrarian.CACHE_HIT, cache_hits+2)
+        self.assertEqual(get_counters('JSONCache').hits, cache_hits+2)
 
     @mock.patch.object(cache, 'fetch_url')
     def test_html_request(self, mock_fetch_url):
-        cache_hits = lazylibrarian.CACHE_HIT
+        cache_hits = get_counters('HTMLCache').hits
         # Try some requests that work
         mock_fetch_url.return_value = ('Hello', True)
         data, in_cache = cache.html_request('testing', True, True)
@@ -419,73 +510,223 @@ class TestCache(LLTestCaseWithConfigandDIRS):
         self.assertFalse(in_cache, 'Request should have failed')
         self.assertIsNone(data, 'Cannot be in cache')
 
-        self.assertEqual(lazylibrarian.CACHE_HIT, cache_hits+1)
+        self.assertEqual(get_counters('HTMLCache').hits, cache_hits+1)
+
+    @mock.patch.object(cache, 'fetch_url')
+    def test_memory_tier(self, mock_fetch_url):
+        counters = get_counters('JSONCache')
+        memory_hits = counters.memory_hits
+        mock_fetch_url.return_value = ('{"test": "Hello"}', True)
+        data, in_cache = cache.json_request('memory', True, True)
+        self.assertFalse(in_cache, 'Data should not yet be cached')
+        # The parsed result is served from memory, without reading the store
+        cr = cache.JSONCacheRequest('memory', True, True)
+        cr.store().put(cr.get_key(), b'not json')
+        data2, in_cache = cache.json_request('memory', True, True)
+        self.assertTrue(in_cache, 'Expected data to now be cached')
+        self.assertIs(data, data2, 'Expected the same parsed object from memory')
+        self.assertEqual(counters.memory_hits, memory_hits + 1)
+
+        # Entries older than the expiry are dropped from memory
+        tier = get_memory_tier('JSONCache')
+        tier.put('old', {'test': 'Old'}, 10, time.time() - 1000)
+        self.assertEqual({'test': 'Old'}, tier.get('old'))
+        self.assertIsNone(tier.get('old', 100), 'Entry should have expired')
+        self.assertIsNone(tier.get('old'), 'Expired entry should be removed')
+
+    @mock.patch.object(cache, 'fetch_url')
+    def test_revalidation(self, mock_fetch_url):
+        def fake_fetch(url, headers=None, raw=False, response_headers=None):
+            if headers and headers.get('If-None-Match') == '"v1"':
+                response_headers.update({'ETag': '"v1"', 'Date': 'today'})
+                return cache.NOT_MODIFIED, True
+            response_headers.update({'ETag': '"v1"', 'Content-Length': '17'})
+            return '{"test": "Hello"}', True
+
+        mock_fetch_url.side_effect = fake_fetch
+        counters = get_counters('JSONCache')
+        revalidations = counters.revalidations
+        data, in_cache = cache.json_request('revalidate', True, True)
+        self.assertFalse(in_cache, 'Data should not yet be cached')
+        cr = cache.JSONCacheRequest('revalidate', True, True)
+        store = cr.store()
+        self.assertEqual({'ETag': '"v1"'}, store.headers(cr.get_key()), 'Expected the validator to be stored')
+
+        # Make the entry stale. It is kept, and the server is asked if it changed
+        stale = time.time() - 2 * CONFIG.get_int('CACHE_AGE') * 24 * 60 * 60
+        store.touch(cr.get_key(), fetched=stale)
+        get_memory_tier('JSONCache').clear()
+        data, in_cache = cache.json_request('revalidate', True, True)
+        self.assertTrue(in_cache, 'Expected the unchanged entry to be used')
+        self.assertEqual({'test': 'Hello'}, data)
+        self.assertEqual('"v1"', mock_fetch_url.call_args.kwargs['headers']['If-None-Match'])
+        self.assertEqual(counters.revalidations, revalidations + 1)
+        self.assertGreater(store.fetched(cr.get_key()), time.time() - 100, 'Expected the entry to be refreshed')
+        self.assertEqual({'ETag': '"v1"', 'Date': 'today'}, store.headers(cr.get_key()))
+
+        # Stale entries without validators are still deleted
+        mock_fetch_url.side_effect = None
+        mock_fetch_url.return_value = ('Hello', False)
+        cr = cache.JSONCacheRequest('novalidator', True, True)
+        store.put(cr.get_key(), b'{}', fetched=stale)
+        self.assertFalse(cr.is_in_cache(100, cr.get_key()))
+        self.assertEqual(0, store.fetched(cr.get_key()), 'Expected the stale entry to be deleted')
+
+    @mock.patch.object(cache, 'fetch_url')
+    def test_single_flight(self, mock_fetch_url):
+        release = threading.Event()
+
+        def slow_fetch(url, headers=None, raw=False, response_headers=None):
+            release.wait(10)
+            return '{"test": "Hello"}', True
+
+        mock_fetch_url.side_effect = slow_fetch
+        counters = get_counters('JSONCache')
+        coalesced = counters.coalesced
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.json_request('flight', True, True)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        # Wait for the other four to queue behind the first fetch
+        for _ in range(100):
+            if counters.coalesced == coalesced + 4:
+                break
+            time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(1, mock_fetch_url.call_count, 'Expected one fetch for all the requests')
+        self.assertEqual(counters.coalesced, coalesced + 4)
+        self.assertEqual(5, len(results))
+        for data, _in_cache in results:
+            self.assertEqual({'test': 'Hello'}, data)
+        self.assertEqual(0, get_flight('JSONCache').in_flight())
+
+    def test_single_flight_error(self):
+        flight = get_flight('test')
+
+        def fail():
+            raise ValueError('Failed')
+
+        with self.assertRaises(ValueError):
+            flight.do('key', fail)
+        self.assertEqual(0, flight.in_flight(), 'Failed calls should not stay in flight')
+        self.assertEqual(42, flight.do('key', lambda: 42))
+
+    @mock.patch.object(cache, 'fetch_url')
+    def test_negative_cache(self, mock_fetch_url):
+        mock_fetch_url.return_value = ('Response status 404: Not Found', False)
+        data, in_cache = cache.json_request('http://example.com/missing', True, True)
+        self.assertIsNone(data)
+        self.assertEqual(1, mock_fetch_url.call_count)
+        # Not asked again while the negative entry is fresh
+        data, in_cache = cache.json_request('http://example.com/missing', True, True)
+        self.assertIsNone(data)
+        self.assertEqual(1, mock_fetch_url.call_count, 'Expected the 404 to be remembered')
+        self.assertEqual({'added': 1, 'hits': 1}, NEGATIVE.get_stats()['example.com'])
+        # A refresh asks anyway
+        _ = cache.json_request('http://example.com/missing', False, True)
+        self.assertEqual(2, mock_fetch_url.call_count, 'Refresh should ignore the negative cache')
+        # Other errors are not remembered
+        mock_fetch_url.return_value = ('Response status 500: Server Error', False)
+        _ = cache.json_request('http://example.com/broken', True, True)
+        _ = cache.json_request('http://example.com/broken', True, True)
+        self.assertEqual(4, mock_fetch_url.call_count)
+
+        NEGATIVE.add('test', 'key')
+        self.assertTrue(NEGATIVE.is_negative('test', 'key'))
+        NEGATIVE.remove('test', 'key')
+        self.assertFalse(NEGATIVE.is_negative('test', 'key'))
+        CONFIG.set_int('NEGATIVE_CACHE_HOURS', 0)
+        try:
+            NEGATIVE.add('test', 'key')
+            self.assertFalse(NEGATIVE.is_negative('test', 'key'), 'Negative cache should be off')
+        finally:
+            CONFIG.set_int('NEGATIVE_CACHE_HOURS', 24)
+
+    def test_memory_tier_eviction(self):
+        CONFIG.set_int('CACHE_MEMORY', 1)
+        try:
+            tier = get_memory_tier('HTMLCache')
+            counters = get_counters('HTMLCache')
+            evictions = counters.evictions
+            for inx in range(3):
+                tier.put(f'key{inx}', inx, 300 * 1024)
+            _ = tier.get('key0')  # Make key0 recently used
+            tier.put('key3', 3, 300 * 1024)
+            tier.put('key4', 4, 300 * 1024)
+            self.assertEqual(3, len(tier), 'Expected the tier to keep under 1MB')
+            self.assertLessEqual(tier.size, 1024 * 1024)
+            self.assertEqual(0, tier.get('key0'), 'Recently used entry should be kept')
+            self.assertIsNone(tier.get('key1'), 'Least recently used entry should be evicted')
+            self.assertEqual(counters.evictions, evictions + 2)
+            # An entry bigger than the whole tier isn't kept
+            tier.put('huge', 6, 2 * 1024 * 1024)
+            self.assertIsNone(tier.get('huge'))
+        finally:
+            CONFIG.set_int('CACHE_MEMORY', 32)
 
     def test_JSONCacheRequest(self):
         """ Test JSON cache, but don't actually fetch anything """
         # Loop over the two behaviour-changing inputs
         for use_cache, expire in [(True, True), (True, False), (False, True), (False, False)]:
             cr = cache.JSONCacheRequest(url='test', use_cache=use_cache, expire=expire)
-            cache_location = DIRS.get_cachedir(cr.cachedir_name())
-            hashfilename, myhash = cr.get_hashed_filename(cache_location)
-            self.assertEqual(myhash, '098f6bcd4621d373cade4e832627b4f6', 'Unexpected hash')
-            self.assertEndsWith(hashfilename, '098f6bcd4621d373cade4e832627b4f6.json')
+            key = cr.get_key()
+            self.assertEqual(key, '098f6bcd4621d373cade4e832627b4f6', 'Unexpected hash')
             # Run a battery of tests
-            self.subtest_in_cache(cr, expire, hashfilename, myhash, use_cache, '{"test": "Hello"}', {'test': 'Hello'})
+            self.subtest_in_cache(cr, expire, key, use_cache, '{"test": "Hello"}', {'test': 'Hello'})
 
     def test_HTMLCacheRequest(self):
         """ Test HTML cache, but don't actually fetch anything """
         for use_cache, expire in [(True, True), (True, False), (False, True), (False, False)]:
             cr = cache.HTMLCacheRequest(url='test', use_cache=use_cache, expire=expire)
-            cache_location = DIRS.get_cachedir(cr.cachedir_name())
-            hashfilename, myhash = cr.get_hashed_filename(cache_location)
-            self.assertEqual(myhash, '098f6bcd4621d373cade4e832627b4f6', 'Unexpected hash')
-            self.assertEndsWith(hashfilename, '098f6bcd4621d373cade4e832627b4f6.html')
+            key = cr.get_key()
+            self.assertEqual(key, '098f6bcd4621d373cade4e832627b4f6', 'Unexpected hash')
             # Run a battery of tests
-            self.subtest_in_cache(cr, expire, hashfilename, myhash, use_cache, 'Hello', b'Hello')
+            self.subtest_in_cache(cr, expire, key, use_cache, 'Hello', b'Hello')
 
     def test_XMLCacheRequest(self):
         """ Test XML cache, but don't actually fetch anything """
         for use_cache, expire in [(True, True), (True, False), (False, True), (False, False)]:
             cr = cache.XMLCacheRequest(url='test', use_cache=use_cache, expire=expire)
-            cache_location = DIRS.get_cachedir(cr.cachedir_name())
-            hashfilename, myhash = cr.get_hashed_filename(cache_location)
-            self.assertEqual(myhash, '098f6bcd4621d373cade4e832627b4f6', 'Unexpected hash')
-            self.assertEndsWith(hashfilename, '098f6bcd4621d373cade4e832627b4f6.xml')
+            key = cr.get_key()
+            self.assertEqual(key, '098f6bcd4621d373cade4e832627b4f6', 'Unexpected hash')
             # Run a battery of tests
             xmlstr = "<?xml version='1.0' encoding='utf-8'?><test>Hello</test>"
-            self.subtest_in_cache(cr, expire, hashfilename, myhash, use_cache, xmlstr, None)
+            self.subtest_in_cache(cr, expire, key, use_cache, xmlstr, None)
 
-    def subtest_in_cache(self, cr: cache.CacheRequest, expire: bool, hashfilename: str, myhash: str, use_cache: bool,
+    def subtest_in_cache(self, cr: cache.CacheRequest, expire: bool, key: str, use_cache: bool,
                          datastr: str, expected_read: Any):
         """ A subtest that is used for each of JSON, XML and HTML """
         # Test that it's not yet in cache
-        in_cache = cr.is_in_cache(0, hashfilename, myhash)
+        in_cache = cr.is_in_cache(0, key)
         self.assertFalse(in_cache, 'Test file cannot be in cache yet')
-        # Manually create the file and test for it
-        cr.load_from_result_and_cache(datastr, hashfilename, True)
+        # Manually create the entry and test for it
+        cr.load_from_result_and_cache(datastr, key, True)
         # Set the timestamp to a predictable while ago to test aging out
-        self.settimestamp_to_ago(hashfilename, 1000)
-        in_cache = cr.is_in_cache(10000, hashfilename, myhash)
+        entry = cr.store().get(key)
+        cr.store().put(key, entry.body, fetched=time.time() - 1000)
+        in_cache = cr.is_in_cache(10000, key)
         if use_cache:
             self.assertTrue(in_cache, f'Test file should now be in cache {expire}/{use_cache}')
         else:
             self.assertFalse(in_cache, f'Cache is disabled; file should not be in cache {expire}/{use_cache}')
         # Test, and potentially expire the file
-        in_cache = cr.is_in_cache(10, hashfilename, myhash)
+        in_cache = cr.is_in_cache(10, key)
         if expire or not use_cache:
             self.assertFalse(in_cache, f'Test file should have been deleted from cache {expire}/{use_cache}')
         else:
             self.assertTrue(in_cache, f'Files should not be deleted when expire is off {expire}/{use_cache}')
         if in_cache:
-            source, ok = cr.read_from_cache(hashfilename)
+            source, ok = cr.read_from_cache(key)
             self.assertTrue(ok, f'Expect to read the file if it is in cache  {expire}/{use_cache}')
             if expected_read:
                 self.assertEqual(source, expected_read, f'Cache contents is wrong  {expire}/{use_cache}')
 
     def test_clean_cache(self):
         results = cache.clean_cache()
-        self.assertEqual(12, len(results), 'Expected 12 cleaning results')
+        self.assertEqual(13, len(results), 'Expected 13 cleaning results')
         # No need to test with actual data as the detailed unit tests below cover those cases
 
     def test_cache_cleaner(self):
@@ -554,6 +795,56 @@ class TestCache(LLTestCaseWithConfigandDIRS):
         msg = fe.clean()
         self.assertEqual(f'Cleaned 50 expired files from test, kept 30', msg)
 
+    def test_cache_index(self):
+        """ Test that directories are only listed again when they change """
+        index = get_cache_index()
+        self.create_test_files('MyID%s.jpg', 3)
+        old = time.time() - 3600
+        os.utime(self.testdir, (old, old))
+        self.assertTrue(index.sync('test', False))
+        self.assertEqual([('', 'MyID0.jpg', 'MyID0'), ('', 'MyID1.jpg', 'MyID1'), ('', 'MyID2.jpg', 'MyID2')],
+                         sorted(index.files('test', False)))
+
+        # A file added without the directory time changing is not seen
+        self.create_test_files('Other%s.jpg', 1)
+        os.utime(self.testdir, (old, old))
+        index.sync('test', False)
+        self.assertEqual(3, index.count('test', False), 'Unchanged directory should not be listed')
+        os.utime(self.testdir)
+        index.sync('test', False)
+        self.assertEqual({'MyID0.jpg', 'MyID1.jpg', 'MyID2.jpg', 'Other0.jpg'}, index.names('test'))
+
+        # Expiry checks the file again before deleting it, in case it was written since it was indexed
+        self.create_test_files('Old%s.jpg', 2, 3600)
+        index.sync('test', False)
+        os.utime(os.path.join(self.testdir, 'Old1.jpg'))
+        msg = cache.FileExpirer('test', False, 1000).clean()
+        self.assertEqual('Cleaned 1 expired file from test, kept 5', msg)
+        self.assertEqual(0, len(index.older_than('test', False, time.time() - 1000)))
+
+    def test_cleaner_time_limit(self):
+        """ Test that cleaners stop at their deadline, and carry on next time """
+        self.create_hex_dirs()
+        self.create_test_files('oldies_%s.jpg', 20, 3600, True)
+        fe = cache.FileExpirer('test', True, 1000)
+        fe.deadline = time.time() - 1
+        msg = fe.clean()
+        self.assertEqual('Cleaned 0 expired files from test, kept 0, stopped at the time limit', msg)
+        self.assertTrue(fe.stopped)
+        msg = cache.FileExpirer('test', True, 1000).clean()
+        self.assertEqual('Cleaned 20 expired files from test, kept 0', msg)
+
+        db = DBConnection()
+        try:
+            db.action('INSERT into books (BookID,BookImg) VALUES (?,?)', ('MyID1', 'test/missing.jpg'))
+            dc = cache.DBCleaner("test", "Cover", db, "books", "BookImg", "BookName", "BookID", "images/nocover.png")
+            dc.deadline = time.time() - 1
+            msg = dc.clean()
+            self.assertEqual('Cleaned 0 missing Covers, kept 0, stopped at the time limit', msg)
+            self.assertEqual('test/missing.jpg', db.match('SELECT BookImg from books')['BookImg'])
+        finally:
+            db.close()
+
     def test_extension_cleaner(self):
         # Empty a directory with nothing in it
         fe = cache.ExtensionCleaner('test', 'doc')
@@ -5,11 +5,23 @@
 
 import logging
 import mock
+import os
 import sqlite3
 import threading
 import time
 
-from lazylibrarian.database import DBConnection
+from lazylibrarian.database import (
+    HAS_FTS5,
+    POOL,
+    PROFILER,
+    QUERY_CACHE,
+    DBConnection,
+    WriteQueue,
+    db_lock,
+    fts_filter,
+    fts_join,
+    query_template,
+)
 from lazylibrarian.dbupgrade import db_upgrade, upgrade_needed
 from lazylibrarian.filesystem import DIRS, remove_file
 from unittests.unittesthelpers import LLTestCaseWithConfigandDIRS
@@ -28,9 +40,13 @@ class DatabaseTest(LLTestCaseWithConfigandDIRS):
             pass  # Ignore
         curr_ver = upgrade_needed()
         db_upgrade(curr_ver, restartjobs=False)
+        # Start each test without pooled connections, some tests overwrite the database file
+        POOL.close_all()
 
     def tearDown(self) -> None:
         """ Delete the test database after each test """
+        # Pooled connections outlive DBConnection.close(), so release them before the file goes
+        POOL.close_all()
         remove_file(DIRS.get_dbfile())
 
     def test_init(self):
@@ -49,7 +65,7 @@ class DatabaseTest(LLTestCaseWithConfigandDIRS):
     def test_version_and_integrity(self):
         db = DBConnection()
         result = db.match('PRAGMA user_version')
-        self.assertEqual(result[0], 89, 'Unit tests developed for v89; please upgrade')
+        self.assertEqual(result[0], 90, 'Unit tests developed for v90; please upgrade')
         check = db.match('PRAGMA integrity_check')
         self.assertEqual('ok', check[0], 'Database integrity check failed')
         db.close()
@@ -75,9 +91,16 @@ class DatabaseTest(LLTestCaseWithConfigandDIRS):
                   'sync', 'failedsearch', 'genrebooks', 'comicissues', 'sent_file', 'pastissues',
                   'subscribers', 'unauthorised', 'users', 'readinglists', 'series', 'member',
                   'seriesauthors', 'bookauthors']
+        fts = []
+        if HAS_FTS5:
+            for table in ['books', 'authors', 'series']:
+                fts.extend([f'{table}_fts{shadow}' for shadow in
+                            ['', '_data', '_idx', '_content', '_docsize', '_config']])
         db = DBConnection()
         tables = self.get_table_list(db)
-        self.assertListEqual(expect, tables, 'Unexpected table mismatch')
+        self.assertListEqual(expect, tables[:len(expect)], 'Unexpected table mismatch')
+        # vacuum can move the fts tables around
+        self.assertCountEqual(fts, tables[len(expect):], 'Unexpected full text table mismatch')
         db.close()
 
     def test_job_schedule_upsert(self):
@@ -221,7 +244,423 @@ class DatabaseTest(LLTestCaseWithConfigandDIRS):
         self.assertIsNone(res, 'Empty query should return None')
         db.close()
 
+    def test_pool_reuses_connection(self):
+        """ Test that a thread gets its pooled connection back, and nested users share it """
+        db1 = DBConnection()
+        db2 = DBConnection()
+        self.assertIs(db1.connection, db2.connection, 'Same thread should share a connection')
+        db2.close()
+        db1.close()
+        db3 = DBConnection()
+        self.assertIs(db1.connection, db3.connection, 'Expected the pooled connection to be reused')
+        db3.close()
+        stats = POOL.get_stats()
+        self.assertEqual(1, stats['idle'])
+        self.assertEqual(0, stats['active'])
+        self.assertGreaterEqual(stats['reused'], 2)
+
+    def test_pool_per_thread(self):
+        """ Test that each thread gets its own connection, and dead threads are pruned """
+        connections = []
+
+        def open_db():
+            db = DBConnection()
+            connections.append(db.connection)
+            db.close()
+
+        thread = threading.Thread(target=open_db)
+        thread.start()
+        thread.join()
+        db = DBConnection()
+        self.assertIsNot(db.connection, connections[0], 'Threads must not share a connection')
+        db.close()
+        before = POOL.get_stats()
+        POOL.prune(force=True)
+        after = POOL.get_stats()
+        self.assertEqual(before['closed_dead'] + 1, after['closed_dead'], 'Expected dead thread to be pruned')
+        self.assertEqual(1, after['idle'])
+
+    def test_pool_closed_by_other_thread(self):
+        """ Test that a connection closed by another thread is pruned once its thread has exited """
+        opened = []
+
+        def open_db():
+            opened.append(DBConnection())
+
+        thread = threading.Thread(target=open_db)
+        thread.start()
+        thread.join()
+        with self.assertLogs('lazylibrarian.database', level='ERROR'):
+            opened[0].close()
+        self.assertEqual(1, POOL.get_stats()['active'], 'The wrong thread cannot release the connection')
+        before = POOL.get_stats()
+        POOL.prune(force=True)
+        after = POOL.get_stats()
+        self.assertEqual(before['closed_dead'] + 1, after['closed_dead'], 'Expected dead thread to be pruned')
+        self.assertEqual(0, after['active'])
+
+    def test_pool_idle_expiry(self):
+        """ Test that connections idle for too long are closed """
+        db = DBConnection()
+        db.close()
+        with mock.patch.object(POOL, 'max_idle', 0):
+            time.sleep(0.01)
+            POOL.prune(force=True)
+        self.assertEqual(0, POOL.get_stats()['idle'], 'Expected idle connection to be closed')
+
+    def test_pool_rollback_on_release(self):
+        """ Test that uncommitted work is discarded when the last user closes, as it was before pooling """
+        db = DBConnection()
+        db.connection.execute('INSERT into genres (GenreName) VALUES (?)', ('uncommitted',))
+        db.close()
+        db = DBConnection()
+        res = db.match('SELECT GenreID from genres where GenreName=?', ('uncommitted',))
+        self.assertEqual([], res, 'Expected uncommitted insert to be rolled back')
+        db.close()
+
+    def test_select_uses_reader(self):
+        """ Test that SELECTs run on the read-only connection without taking db_lock """
+        db = DBConnection()
+        db.action('INSERT into genres (GenreName) VALUES (?)', ('reader',))
+        with db_lock:
+            # Would deadlock if match() needed the writer lock
+            res = db.match('SELECT GenreName from genres where GenreName=?', ('reader',))
+        self.assertEqual('reader', res['GenreName'], 'Expected reader to see committed write')
+        self.assertIsNotNone(db.pooled_reader, 'Expected a read connection to be opened')
+        with self.assertRaises(sqlite3.OperationalError):
+            db.reader().execute('DELETE from genres')
+        db.close()
+
+    def test_select_in_transaction_sees_own_writes(self):
+        """ Test that a SELECT during an open write transaction uses the writer connection """
+        db = DBConnection()
+        db.connection.execute('INSERT into genres (GenreName) VALUES (?)', ('pending',))
+        res = db.match('SELECT GenreName from genres where GenreName=?', ('pending',))
+        self.assertEqual('pending', res['GenreName'], 'Expected to see uncommitted write')
+        db.connection.rollback()
+        db.close()
+
+    def test_reader_collation(self):
+        """ Test that collations registered on the db are available to the read connection """
+        db = DBConnection()
+        db.create_collation('reverse', lambda a, b: (a < b) - (a > b))
+        db.action('INSERT into genres (GenreName) VALUES (?)', ('a',))
+        db.action('INSERT into genres (GenreName) VALUES (?)', ('b',))
+        res = db.select('SELECT GenreName from genres ORDER by GenreName COLLATE reverse')
+        self.assertEqual(['b', 'a'], [row['GenreName'] for row in res])
+        db.close()
+
+    def test_iterate(self):
+        """ Test that iterate() streams all the rows of one snapshot while writes go ahead """
+        db = DBConnection()
+        db.executemany('INSERT into genres (GenreName) VALUES (?)', [(f'Genre #{i}',) for i in range(25)])
+        names = []
+        for row in db.iterate('SELECT GenreName from genres ORDER by GenreID', chunk=10):
+            names.append(row['GenreName'])
+            db.action('INSERT into genres (GenreName) VALUES (?)', (f"After {row['GenreName']}",))
+        self.assertEqual([f'Genre #{i}' for i in range(25)], names)
+        self.assertEqual(50, db.match('SELECT count(*) from genres')[0])
+        # a bad query ends the iteration like select() returns []
+        self.assertEqual([], list(db.iterate('SELECT nosuchcolumn from genres')))
+        db.close()
+
+    def test_lock_contention_stats(self):
+        """ Test that waiting for the writer lock is measured """
+        before = db_lock.get_stats()
+
+        def hold_lock():
+            with db_lock:
+                time.sleep(0.1)
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        time.sleep(0.02)
+        db = DBConnection()
+        db.action('INSERT into genres (GenreName) VALUES (?)', ('waited',))
+        db.close()
+        thread.join()
+        after = db_lock.get_stats()
+        self.assertEqual(before['contended'] + 1, after['contended'], 'Expected one contended write')
+        self.assertGreater(after['wait_total'], before['wait_total'])
+
+    def test_transaction_commit_and_rollback(self):
+        """ Test that transaction() commits once at the end, or rolls everything back """
+        db = DBConnection()
+        with db.transaction():
+            db.action('INSERT into genres (GenreName) VALUES (?)', ('one',))
+            db.upsert("jobs", {"Start": 1}, {"Name": 'Txn'})
+            with db.transaction():  # nested blocks join the outer one
+                db.action('INSERT into genres (GenreName) VALUES (?)', ('two',))
+            self.assertTrue(db.connection.in_transaction, 'Nested block should not commit')
+        self.assertFalse(db.connection.in_transaction)
+        res = db.select('SELECT GenreName from genres ORDER by GenreName')
+        self.assertEqual(['one', 'two'], [row['GenreName'] for row in res])
+
+        with self.assertRaises(ValueError), db.transaction():
+            db.action('INSERT into genres (GenreName) VALUES (?)', ('three',))
+            raise ValueError('abort')
+        res = db.match('SELECT GenreID from genres where GenreName=?', ('three',))
+        self.assertEqual([], res, 'Expected insert to be rolled back')
+        db.close()
 
+    def test_executemany(self):
+        """ Test running one statement for many rows """
+        db = DBConnection()
+        db.executemany('INSERT into genres (GenreName) VALUES (?)', [(f'genre{i}',) for i in range(50)])
+        res = db.match('SELECT count(*) as counter from genres')
+        self.assertEqual(50, res['counter'])
+        self.assertIsNone(db.executemany('INSERT into genres (GenreName) VALUES (?)', []))
+        db.close()
 
+    def test_upsert_many(self):
+        """ Test upsert_many with and without a unique key on the key columns """
+        db = DBConnection()
+        self.assertIn({'bookid'}, db.unique_keys('books'))
+        self.assertEqual([], db.unique_keys('jobs'))
+        rows = [({"BookName": f'Book {i}', "Status": 'Skipped'}, {"BookID": f'id{i}'}) for i in range(10)]
+        db.upsert_many("books", rows)
+        rows = [({"Status": 'Wanted'}, {"BookID": f'id{i}'}) for i in range(5, 15)]
+        db.upsert_many("books", rows)
+        res = db.select('SELECT BookID,BookName,Status from books ORDER by BookID')
+        books = {row['BookID']: row for row in res}
+        self.assertEqual(15, len(books))
+        self.assertEqual(('Book 0', 'Skipped'), (books['id0']['BookName'], books['id0']['Status']))
+        self.assertEqual(('Book 5', 'Wanted'), (books['id5']['BookName'], books['id5']['Status']),
+                         'Update should keep columns not in the value dict')
+        self.assertEqual('Wanted', books['id14']['Status'])
+
+        db.upsert_many("jobs", [({"Start": 1}, {"Name": 'A'}), ({"Start": 2}, {"Name": 'B'})])
+        db.upsert_many("jobs", [({"Finish": 3}, {"Name": 'A'})])
+        res = db.select('SELECT Name,Start,Finish from jobs ORDER by Name')
+        self.assertEqual([('A', 1, 3), ('B', 2, 0)], [tuple(row) for row in res])
+        db.close()
 
+    def test_upsert_many_unique_clash(self):
+        """ Test that a clash on another unique column only skips that row """
+        db = DBConnection()
+        rows = [({"UserName": 'alice'}, {"UserID": 'u1'}),
+                ({"UserName": 'admin'}, {"UserID": 'u2'}),  # admin already exists under another UserID
+                ({"UserName": 'bob'}, {"UserID": 'u3'})]
+        db.upsert_many("users", rows)
+        res = db.select("SELECT UserID from users WHERE UserID in ('u1', 'u2', 'u3') ORDER by UserID")
+        self.assertEqual(['u1', 'u3'], [row['UserID'] for row in res])
+        db.close()
+
+    def test_query_template(self):
+        """ Test that queries differing only in literals share a template """
+        self.assertEqual("SELECT * from books WHERE BookID=? and Status=?",
+                         query_template("SELECT * from books WHERE BookID=123 and Status='Wanted'"))
+        self.assertEqual(query_template("select * from authors where AuthorName=\"Bob\""),
+                         query_template("select * from authors where AuthorName='Alice'"))
+        self.assertEqual("DELETE from books WHERE BookID IN (?...)",
+                         query_template("DELETE from books WHERE BookID IN (?,?,?)"))
+        self.assertEqual(query_template("DELETE from books WHERE BookID IN (?,?)"),
+                         query_template("DELETE from books WHERE BookID IN (?,?,?,?)"))
+
+    def test_query_profiler(self):
+        """ Test that queries are timed and counted per template """
+        PROFILER.reset()
+        db = DBConnection()
+        for i in range(3):
+            db.action("INSERT into jobs (Name, Start) VALUES (?, ?)", (f'job{i}', i))
+        db.match("SELECT * from jobs WHERE Name='job1'")
+        db.select("SELECT * from jobs WHERE Name='job2' or Name='job0'")
+        db.close()
+        stats = {entry['query']: entry for entry in PROFILER.get_stats()}
+        insert = stats["INSERT into jobs (Name, Start) VALUES (?, ?)"]
+        self.assertEqual(3, insert['count'])
+        self.assertEqual(3, insert['rows'])
+        self.assertLessEqual(insert['p50'], insert['p99'])
+        self.assertEqual(1, stats["SELECT * from jobs WHERE Name=?"]['rows'])
+        self.assertEqual(2, stats["SELECT * from jobs WHERE Name=? or Name=?"]['rows'])
+        self.assertTrue(PROFILER.report(limit=2))
+        PROFILER.reset()
+        self.assertEqual([], PROFILER.get_stats())
+
+    def test_query_cache(self):
+        """ Test that cached results are reused until a table they read is written to """
+        QUERY_CACHE.clear()
+        start = QUERY_CACHE.get_stats()
+        db = DBConnection()
+        db.action("INSERT into magazines (Title) VALUES ('Mag')")
+        db.action("INSERT into issues (Title, IssueID) VALUES ('Mag', 'i1')")
+        count = "SELECT count(*) as counter from issues"
+        self.assertEqual(1, db.cached_match(count)['counter'])
+        self.assertEqual(1, db.cached_match(count)['counter'])
+        # a write to another table leaves it cached
+        db.action("INSERT into genres (GenreName) VALUES ('Fantasy')")
+        self.assertEqual(1, db.cached_match(count)['counter'])
+        stats = QUERY_CACHE.get_stats()
+        self.assertEqual(2, stats['hits'] - start['hits'])
+        self.assertEqual(1, stats['misses'] - start['misses'])
+
+        # a cascading delete changes issues too
+        db.action("DELETE from magazines WHERE Title='Mag'")
+        self.assertEqual(0, db.cached_match(count)['counter'])
+        self.assertEqual(1, QUERY_CACHE.get_stats()['stale'] - start['stale'])
+
+        # writes in a transaction only invalidate results once it commits
+        generation = QUERY_CACHE.generation(db.dbfile, ['issues'])
+        with db.transaction():
+            db.action("INSERT into magazines (Title) VALUES ('Mag')")
+            db.action("INSERT into issues (Title, IssueID) VALUES ('Mag', 'i2')")
+            # sees its own writes, not the cached result
+            self.assertEqual(1, db.cached_match(count)['counter'])
+            self.assertEqual(generation, QUERY_CACHE.generation(db.dbfile, ['issues']))
+        self.assertNotEqual(generation, QUERY_CACHE.generation(db.dbfile, ['issues']))
+        self.assertEqual(1, db.cached_match(count)['counter'])
+        db.close()
+
+    def test_query_cache_eviction(self):
+        """ Test that the least recently used results are dropped when the cache is full """
+        QUERY_CACHE.clear()
+        db = DBConnection()
+        with mock.patch.object(QUERY_CACHE, 'max_entries', 2):
+            start = QUERY_CACHE.get_stats()
+            for name in ['a', 'b', 'a', 'c', 'a', 'b']:
+                db.cached_select("SELECT * from genres WHERE GenreName=?", (name,))
+            stats = QUERY_CACHE.get_stats()
+        # b was least recently used when c was added
+        self.assertEqual(2, stats['hits'] - start['hits'])
+        self.assertEqual(2, stats['evicted'] - start['evicted'])
+        self.assertEqual(2, stats['entries'])
+        db.close()
+
+    def add_fts_testbook(self, db):
+        db.action("INSERT into authors (AuthorID, AuthorName) VALUES ('a1', 'Émile Zola')")
+        db.action("INSERT into authors (AuthorID, AuthorName) VALUES ('a2', 'Terry Pratchett')")
+        db.action("INSERT into books (BookID, AuthorID, BookName, BookSub, BookGenre) "
+                  "VALUES ('b1', 'a1', 'Germinal', 'A novel', 'Classics')")
+        db.action("INSERT into books (BookID, AuthorID, BookName, BookGenre) "
+                  "VALUES ('b2', 'a2', 'Mort', 'Fantasy')")
+        db.action("INSERT into books (BookID, AuthorID, BookName, BookGenre) "
+                  "VALUES ('b3', 'a2', 'Guards! Guards!', 'Fantasy')")
+        db.executemany("INSERT into bookauthors (BookID, AuthorID, Role) VALUES (?, ?, 1)",
+                       [('b1', 'a1'), ('b2', 'a2'), ('b3', 'a2')])
+        db.action("INSERT into series (SeriesID, SeriesName) VALUES (1, 'Discworld')")
+        db.executemany("INSERT into member (SeriesID, BookID, SeriesNum) VALUES (1, ?, ?)",
+                       [('b2', '4'), ('b3', '8')])
+
+    def fts_books(self, db, text):
+        cond, args = fts_filter('books', text)
+        res = db.select(f"SELECT BookID from books WHERE {cond} ORDER by BookID", tuple(args))
+        return [row['BookID'] for row in res]
+
+    def test_fts_index_follows_changes(self):
+        """ Test that the full text index is kept up to date by the triggers """
+        if not HAS_FTS5:
+            self.skipTest('sqlite has no fts5')
+        db = DBConnection()
+        self.add_fts_testbook(db)
+        self.assertEqual(['b1'], self.fts_books(db, 'germ'))
+        self.assertEqual(['b1'], self.fts_books(db, 'emile zola'), 'Expect accents to be ignored')
+        self.assertEqual(['b2', 'b3'], self.fts_books(db, 'discworld'))
+        self.assertEqual(['b3'], self.fts_books(db, 'pratchett guards'))
+        self.assertEqual(['b2', 'b3'], self.fts_books(db, 'FANTASY'))
+        self.assertEqual([], self.fts_books(db, 'OR "NEAR'), 'Expect fts operators to be taken literally')
+
+        db.action("UPDATE authors SET AuthorName='Sir Terry Pratchett' WHERE AuthorID='a2'")
+        self.assertEqual(['b2', 'b3'], self.fts_books(db, 'sir terry'))
+        db.action("UPDATE series SET SeriesName='Disc World' WHERE SeriesID=1")
+        self.assertEqual([], self.fts_books(db, 'discworld'))
+        self.assertEqual(['b2', 'b3'], self.fts_books(db, 'disc world'))
+        db.action("DELETE from member WHERE BookID='b2'")
+        self.assertEqual(['b3'], self.fts_books(db, 'disc world'))
+        db.upsert("books", {"BookName": 'Mort: A Discworld Novel'}, {"BookID": 'b2'})
+        self.assertEqual(['b2'], self.fts_books(db, 'novel mort'))
+        db.action("DELETE from authors WHERE AuthorID='a2'")
+        self.assertEqual([], self.fts_books(db, 'mort'))
+        self.assertEqual(['b1'], self.fts_books(db, 'novel'))
+
+        cond, args = fts_filter('authors', 'zol')
+        res = db.select(f"SELECT AuthorID from authors WHERE {cond}", tuple(args))
+        self.assertEqual(['a1'], [row['AuthorID'] for row in res])
+        db.close()
 
+    def test_fts_join_ranks_matches(self):
+        """ Test that fts_join orders better matches first """
+        db = DBConnection()
+        self.add_fts_testbook(db)
+        join, args = fts_join('books', 'guards')
+        res = db.select(f"SELECT BookID from books {join} ORDER by fts.rank", tuple(args))
+        self.assertEqual(['b3'], [row['BookID'] for row in res])
+        if HAS_FTS5:
+            db.action("UPDATE books SET BookSub='Fantasy' WHERE BookID='b2'")
+            join, args = fts_join('books', 'fantasy')
+            res = db.select(f"SELECT BookID from books {join} ORDER by fts.rank", tuple(args))
+            self.assertEqual(['b2', 'b3'], [row['BookID'] for row in res])
+        db.close()
+
+    def test_write_queue_not_started(self):
+        """ Test that writes are done straight away until the writer is started """
+        queue = WriteQueue()
+        future = queue.upsert("jobs", {"Start": 1}, {"Name": 'Test'})
+        self.assertTrue(future.done())
+        db = DBConnection()
+        self.assertEqual(1, db.match("SELECT Start from jobs WHERE Name='Test'")['Start'])
+        db.close()
+
+    def test_write_queue(self):
+        """ Test that queued writes are all committed, and a failing write only fails itself """
+        queue = WriteQueue()
+        queue.start()
+        try:
+            futures = [queue.action('INSERT into genres (GenreName) VALUES (?)', (f'Genre #{i}',))
+                       for i in range(50)]
+            bad = queue.action('INSERT into genres (GenreName) VALUES (?)', ('Genre #1',))
+            futures.append(queue.upsert("jobs", {"Finish": 2}, {"Name": 'Test'}))
+            queue.flush(timeout=10)
+            for future in futures:
+                self.assertIsNone(future.exception(timeout=0))
+            self.assertIsInstance(bad.exception(timeout=0), sqlite3.IntegrityError)
+            db = DBConnection()
+            self.assertEqual(50, db.match('SELECT count(*) from genres')[0])
+            self.assertEqual(2, db.match("SELECT Finish from jobs WHERE Name='Test'")['Finish'])
+            db.close()
+        finally:
+            queue.stop()
+        stats = queue.get_stats()
+        self.assertFalse(stats['running'])
+        self.assertEqual(51, stats['written'])
+        self.assertEqual(1, stats['failed'])
+        self.assertLessEqual(stats['batches'], 53)
+
+    def test_write_queue_stop_flushes(self):
+        """ Test that stopping the writer commits everything already queued """
+        queue = WriteQueue()
+        queue.start()
+        # hold db_lock so writes pile up in the queue
+        with db_lock:
+            queue.action('INSERT into genres (GenreName) VALUES (?)', ('first',))
+            futures = [queue.executemany('INSERT into genres (GenreName) VALUES (?)', [(f'g{i}',), (f'h{i}',)])
+                       for i in range(10)]
+        queue.stop()
+        self.assertTrue(all(future.done() for future in futures))
+        db = DBConnection()
+        self.assertEqual(21, db.match('SELECT count(*) from genres')[0])
+        db.close()
+        # once stopped, writes are done straight away again
+        self.assertTrue(queue.action("DELETE from genres").done())
+
+    def test_backup(self):
+        """ Test a backup copies a consistent snapshot while other writes go ahead """
+        db = DBConnection()
+        db.executemany('INSERT into genres (GenreName) VALUES (?)', [(f'Genre #{i}',) for i in range(2000)])
+        steps = []
+
+        def write_during_backup(msg):
+            steps.append(msg)
+            db.action('INSERT into genres (GenreName) VALUES (?)', (f'During #{len(steps)}',))
+
+        filename = os.path.join(DIRS.DATADIR, 'test-backup.db')
+        with mock.patch('lazylibrarian.database.BACKUP_PAGES', 5):
+            fname, msg = db.backup(filename, progress=write_during_backup)
+        self.assertEqual((filename, ''), (fname, msg))
+        self.assertGreater(len(steps), 1)
+        self.assertIn('MB/s', steps[0])
+        copy = sqlite3.connect(fname)
+        self.assertEqual(2000, copy.execute('SELECT count(*) from genres').fetchone()[0])
+        copy.close()
+        remove_file(fname)
+        self.assertEqual(2000 + len(steps), db.match('SELECT count(*) from genres')[0])
+        db.close()
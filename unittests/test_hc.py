@@ -0,0 +1,98 @@
+#  This file is part of Lazylibrarian.
+#
+# Purpose:
+#   Test functions in hc.py
+
+import json
+import logging
+import re
+
+import mock
+
+from lazylibrarian import cache, database
+from lazylibrarian.bookdict import add_series_entries
+from lazylibrarian.cachestore import close_stores, get_store
+from lazylibrarian.config2 import CONFIG
+from lazylibrarian.dbupgrade import db_upgrade, upgrade_needed
+from lazylibrarian.filesystem import DIRS, remove_dir, remove_file
+from lazylibrarian.hc import HardCover
+from unittests.unittesthelpers import LLTestCaseWithConfigandDIRS
+
+
+class HardCoverTest(LLTestCaseWithConfigandDIRS):
+    def setUp(self):
+        super().setUp()
+        self.logger.setLevel(logging.ERROR)
+        close_stores()
+        remove_dir(DIRS.get_cachedir(''), remove_contents=True)
+        cache.init_hex_caches()
+        DIRS.DBFILENAME = "test-db.db"
+        try:
+            remove_file(DIRS.get_dbfile())
+        except FileNotFoundError:
+            pass
+        db_upgrade(upgrade_needed(), restartjobs=False)
+        self.logger.setLevel(logging.INFO)
+
+    def tearDown(self):
+        close_stores()
+        super().tearDown()
+
+    def test_prefetch_by_pk(self):
+        hc = HardCover()
+        queries = []
+
+        def post_query(searchcmd, block=True):
+            queries.append(searchcmd)
+            self.assertFalse(block, 'A failed batch should not block HardCover')
+            aliases = re.findall(r'(i\d+): ', searchcmd)
+            return {'data': {alias: {'id': n, 'title': f"Book {n}"} for n, alias in enumerate(aliases)}}, True, {}
+
+        CONFIG.set_int('HC_BATCH', 2)
+        with mock.patch.object(hc, 'post_query', side_effect=post_query):
+            self.assertEqual(3, hc.prefetch_by_pk(hc.HC_BOOKID_BOOKS, '[bookid]', ['11', '12', '13', '12']))
+            self.assertEqual(2, len(queries), 'Expected 3 books in batches of 2')
+            self.assertTrue(queries[0].startswith('query Batch {i0: '))
+            self.assertIn('i1:  books_by_pk(id: 12)', queries[0])
+
+            # Each book is cached as if it had been looked up on its own
+            store = get_store('JSONCache')
+            entry = store.get(hc.cache_key(hc.HC_BOOKID_BOOKS.replace('[bookid]', '13')))
+            self.assertEqual({'data': {'books_by_pk': {'id': 0, 'title': 'Book 0'}}}, json.loads(entry.body))
+            results, in_cache = hc.result_from_cache(hc.HC_BOOKID_BOOKS.replace('[bookid]', '12'))
+            self.assertTrue(in_cache)
+            self.assertEqual('Book 1', results['data']['books_by_pk']['title'])
+
+            # Only books not already cached are fetched
+            self.assertEqual(0, hc.prefetch_by_pk(hc.HC_BOOKID_BOOKS, '[bookid]', ['11', '12', '14']))
+            self.assertEqual(2, len(queries), 'A single lookup should not be batched')
+            self.assertEqual(2, hc.prefetch_by_pk(hc.HC_BOOKID_BOOKS, '[bookid]', ['11', '14', '15']))
+            self.assertEqual(3, len(queries))
+        CONFIG.set_int('HC_BATCH', 25)
+
+    def test_prefetch_by_pk_failed(self):
+        hc = HardCover()
+        post_query = mock.Mock(return_value=({'errors': [{'message': 'Too deep'}]}, True, {}))
+        with mock.patch.object(hc, 'post_query', post_query):
+            self.assertEqual(0, hc.prefetch_by_pk(hc.HC_BOOK_SERIES_BY_PK, '[seriesid]', ['1', '2', '3']))
+        self.assertEqual(1, post_query.call_count, 'Expected no more batches after an error')
+        store = get_store('JSONCache')
+        self.assertFalse(store.fetched(hc.cache_key(hc.HC_BOOK_SERIES_BY_PK.replace('[seriesid]', '1'))))
+
+    def test_add_series_entries_prefetch(self):
+        bookdict = {'source': 'HardCover', 'series': [('Discworld', 'HC7', '4')], 'authorid': 'HCA1',
+                    'authorname': 'Terry Pratchett', 'bookid': '40', 'status': 'Skipped', 'audiostatus': 'Skipped'}
+        members = [['4', 'Mort', 'Terry Pratchett', 'HCA1', '40'], ['5', 'Sourcery', 'Terry Pratchett', 'HCA1', '50']]
+        get_series_members = mock.Mock(return_value=members)
+        get_bookdict_for_bookid = mock.Mock(return_value=({}, False))
+        prefetch_books = mock.Mock(return_value=1)
+        db = database.DBConnection()
+        try:
+            db.action("INSERT INTO authors (AuthorID, AuthorName) VALUES ('HCA1', 'Terry Pratchett')")
+            db.action("INSERT INTO books (AuthorID, BookID, BookName) VALUES ('HCA1', '40', 'Mort')")
+            db.action("INSERT INTO series (SeriesID, SeriesName, Status) VALUES ('HC7', 'Discworld', 'Active')")
+        finally:
+            db.close()
+        add_series_entries(bookdict, get_series_members, get_bookdict_for_bookid, prefetch_books)
+        prefetch_books.assert_called_once_with(['50'])
+        get_series_members.assert_called_once_with('HC7', 'Discworld')
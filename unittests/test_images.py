@@ -10,6 +10,10 @@ import logging
 import os
 from typing import List
 
+import mock
+
+from lazylibrarian import database, images
+from lazylibrarian.cachestore import NEGATIVE
 from lazylibrarian.filesystem import DIRS
 from lazylibrarian.images import get_book_cover, crawl_image
 from unittests.unittesthelpers import LLTestCaseWithStartup
@@ -25,6 +29,24 @@ class TestImages(LLTestCaseWithStartup):
         # for source in sources:
         #     covers = get_book_cover('', source)
 
+    def test_get_book_cover_negative(self):
+        db = database.DBConnection()
+        try:
+            db.action("INSERT INTO authors (AuthorID, AuthorName) VALUES ('A1', 'Cover Author')")
+            db.action("INSERT INTO books (AuthorID, BookID, BookName, gr_id) VALUES ('A1', 'B1', 'Cover Book', '99')")
+        finally:
+            db.close()
+        NEGATIVE.remove('goodreads cover', 'B1')
+        with mock.patch.object(images, 'fetch_url', return_value=('Service Unavailable', False)), \
+                mock.patch.object(images, 'crawl_image', return_value=(None, '')):
+            self.assertEqual((None, ''), get_book_cover('B1'))
+            self.assertFalse(NEGATIVE.is_negative('goodreads cover', 'B1'), 'A failed lookup should be tried again')
+        with mock.patch.object(images, 'fetch_url', return_value=('<html>No cover here</html>', True)), \
+                mock.patch.object(images, 'crawl_image', return_value=(None, '')):
+            self.assertEqual((None, ''), get_book_cover('B1'))
+            self.assertTrue(NEGATIVE.is_negative('goodreads cover', 'B1'), 'Goodreads answered with no cover')
+        NEGATIVE.remove('goodreads cover', 'B1')
+
     def test_crawl_image(self):
         """ Test function only used in get_book_cover """
         crawler_names = ['bing', 'google']
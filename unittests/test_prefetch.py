@@ -0,0 +1,37 @@
+#  This file is part of Lazylibrarian.
+#
+# Purpose:
+#   Test functions in prefetch.py
+
+import mock
+
+from lazylibrarian import prefetch
+from lazylibrarian.prefetch import CachePrefetcher
+from unittests.unittesthelpers import LLTestCaseWithConfigandDIRS
+
+
+class PrefetchTest(LLTestCaseWithConfigandDIRS):
+
+    def test_prefetch(self):
+        fetched = []
+
+        def warm(ident, name):
+            if ident == 'bad':
+                raise ValueError('No such author')
+            fetched.append(name)
+
+        with mock.patch.dict(prefetch.WARMERS, {'author': warm}):
+            prefetcher = CachePrefetcher()
+            self.assertTrue(prefetcher.start('author', [('1', 'One'), ('bad', 'Bad'), ('2', 'Two')]))
+            prefetcher.wait('author', 10)
+            self.assertEqual(['One', 'Two'], fetched)
+            self.assertFalse(prefetcher.start('author', [('1', 'One')]), 'Already prefetched')
+
+            self.assertTrue(prefetcher.used('author', '1'))
+            self.assertFalse(prefetcher.used('author', '3'))
+            self.assertEqual({'author': {'warmed': 2, 'failed': 1, 'used': 1, 'missed': 1}}, prefetcher.get_stats())
+
+            # Once used, an item is prefetched again next time
+            self.assertTrue(prefetcher.start('author', [('1', 'One'), ('2', 'Two')]))
+            prefetcher.wait('author', 10)
+            self.assertEqual(['One', 'Two', 'One'], fetched)
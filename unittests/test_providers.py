@@ -3,12 +3,16 @@
 # Purpose:
 #   Testing parsing XML from providers
 
+import time
 import unittest
 from xml.etree import ElementTree
 
-from lazylibrarian.config2 import wishlist_type
+import mock
+
+from lazylibrarian.blockhandler import BLOCKHANDLER
+from lazylibrarian.config2 import CONFIG, wishlist_type
 from lazylibrarian import providers
-from unittests.unittesthelpers import LLTestCase
+from unittests.unittesthelpers import LLTestCase, LLTestCaseWithConfigandDIRS
 
 
 class ProvidersTest(LLTestCase):
@@ -191,5 +195,116 @@ class ProvidersTest(LLTestCase):
             self.assertEqual(wishlist_type(p[0]), p[1])
 
 
+class QueryProvidersTest(LLTestCaseWithConfigandDIRS):
+
+    @staticmethod
+    def search(name, seconds):
+        time.sleep(seconds)
+        if name == 'bad':
+            raise ValueError('Bad provider')
+        return [name], ''
+
+    def test_query_providers(self):
+        start = time.time()
+        jobs = [(name, 0, self.search, (name, seconds)) for name, seconds in
+                [('slow', 0.3), ('bad', 0), ('fast', 0.1), ('late', 0)]]
+        jobs[3] = ('late', start + 0.2, self.search, ('late', 0))
+        merged = providers.query_providers(jobs)
+        self.assertLess(time.time() - start, 0.55, 'Expected the providers to be queried at once')
+        self.assertEqual([('slow', ['slow'], ''), ('bad', [], 'ValueError Bad provider'),
+                          ('fast', ['fast'], ''), ('late', ['late'], '')], merged,
+                         'Expected the results in the order of the jobs')
+
+    def test_query_providers_timeout(self):
+        CONFIG.set_int('SEARCH_TIMEOUT', 1)
+        try:
+            start = time.time()
+            merged = providers.query_providers([('hung', 0, self.search, ('hung', 3)),
+                                                ('fast', 0, self.search, ('fast', 0))])
+            self.assertLess(time.time() - start, 2, 'Expected not to wait for a hung provider')
+            self.assertEqual([('hung', [], 'No answer within 1 second'), ('fast', ['fast'], '')], merged)
+        finally:
+            CONFIG.set_int('SEARCH_TIMEOUT', 300)
+
+    def test_query_providers_queued(self):
+        CONFIG.set_int('SEARCH_TIMEOUT', 1)
+        CONFIG.set_int('SEARCH_THREADS', 2)
+        try:
+            merged = providers.query_providers([('hung', 0, self.search, ('hung', 2)),
+                                                ('slow', 0, self.search, ('slow', 0.8)),
+                                                ('queued', 0, self.search, ('queued', 0.5))])
+            self.assertEqual([('hung', [], 'No answer within 1 second'), ('slow', ['slow'], ''),
+                              ('queued', ['queued'], '')], merged,
+                             'Expected the timeout to start when a queued provider is queried')
+
+            merged = providers.query_providers([('hung', 0, self.search, ('hung', 2)),
+                                                ('stuck', 0, self.search, ('stuck', 2)),
+                                                ('queued', 0, self.search, ('queued', 0))])
+            self.assertEqual([('hung', [], 'No answer within 1 second'), ('stuck', [], 'No answer within 1 second'),
+                              ('queued', [], '')], merged, 'A provider never queried should not be an error')
+        finally:
+            CONFIG.set_int('SEARCH_TIMEOUT', 300)
+            CONFIG.set_int('SEARCH_THREADS', 4)
+
+    def test_query_providers_serial(self):
+        CONFIG.set_int('SEARCH_THREADS', 1)
+        try:
+            start = time.time()
+            merged = providers.query_providers([('one', 0, self.search, ('one', 0.1)),
+                                                ('two', 0, self.search, ('two', 0.1))])
+            self.assertGreater(time.time() - start, 0.2)
+            self.assertEqual([('one', ['one'], ''), ('two', ['two'], '')], merged)
+        finally:
+            CONFIG.set_int('SEARCH_THREADS', 4)
+
+
+class AuthorSearchTest(LLTestCaseWithConfigandDIRS):
+
+    def test_author_search_structure(self):
+        provider = {'HOST': 'http://indexer.test', 'BOOKSEARCH': 'book', 'BOOKCAT': '7020', 'AUDIOSEARCH': '',
+                    'AUDIOCAT': '3030', 'GENERALSEARCH': 'search', 'EXTENDED': ''}
+        author = {'bookid': '', 'bookName': '', 'bookSub': '', 'authorName': 'L. E. Modesitt Jr.',
+                  'library': 'eBook', 'searchterm': 'L. E. Modesitt Jr.'}
+        params = providers.return_search_structure(provider, 'key', author, 'authorbook', 'nzb')
+        self.assertEqual({'t': 'book', 'apikey': 'key', 'author': b'Modesitt', 'cat': '7020'}, params)
+        self.assertIsNone(providers.return_search_structure(provider, 'key', author, 'authoraudio', 'nzb'),
+                          'Expected no author search without an audio search')
+        provider['BOOKSEARCH'] = 'bibliotik'
+        self.assertFalse(providers.can_search_by_author(provider, 'authorbook'))
+
+    def test_author_search_failed(self):
+        provider = {'HOST': 'http://indexer.test', 'API': 'key', 'BOOKSEARCH': 'book', 'BOOKCAT': '7020',
+                    'AUDIOSEARCH': '', 'AUDIOCAT': '', 'GENERALSEARCH': 'search', 'EXTENDED': ''}
+        author = {'bookid': '', 'bookName': '', 'bookSub': '', 'authorName': 'Terry Pratchett',
+                  'library': 'eBook', 'searchterm': 'Terry Pratchett'}
+        error = b'<error code="201" description="Incorrect parameter"/>'
+        try:
+            with mock.patch.object(providers, 'fetch_url', return_value=(error, True)):
+                self.assertEqual((True, []), providers.newznab_plus(author, provider, 'authorbook', 'nzb'))
+            self.assertFalse(BLOCKHANDLER.is_blocked(provider['HOST']), 'Expected the book searches to go ahead')
+            self.assertEqual('book', provider['BOOKSEARCH'], 'Expected the book search to stay enabled')
+            self.assertFalse(providers.can_search_by_author(provider, 'authorbook'))
+        finally:
+            providers.NO_AUTHOR_SEARCH.clear()
+            BLOCKHANDLER.remove_provider_entry(provider['HOST'])
+
+    def test_author_search_error(self):
+        provider = {'HOST': 'http://indexer.test', 'API': 'key', 'BOOKSEARCH': 'book', 'BOOKCAT': '7020',
+                    'AUDIOSEARCH': '', 'AUDIOCAT': '', 'GENERALSEARCH': 'search', 'EXTENDED': ''}
+        author = {'bookid': '', 'bookName': '', 'bookSub': '', 'authorName': 'Terry Pratchett',
+                  'library': 'eBook', 'searchterm': 'Terry Pratchett'}
+        for reply in [(b'429 Too Many Requests', False), (b'Connection timed out', False),
+                      (b'<error code="100" description="Incorrect user credentials"/>', True)]:
+            try:
+                with mock.patch.object(providers, 'fetch_url', return_value=reply):
+                    providers.newznab_plus(author, provider, 'authorbook', 'nzb')
+                self.assertTrue(BLOCKHANDLER.is_blocked(provider['HOST']), f'Expected {reply[0]} to block')
+                self.assertTrue(providers.can_search_by_author(provider, 'authorbook'),
+                                f'{reply[0]} does not mean author search is unsupported')
+            finally:
+                providers.NO_AUTHOR_SEARCH.clear()
+                BLOCKHANDLER.remove_provider_entry(provider['HOST'])
+
+
 if __name__ == '__main__':
     unittest.main()
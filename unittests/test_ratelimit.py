@@ -0,0 +1,54 @@
+#  This file is part of Lazylibrarian.
+#
+# Purpose:
+#   Test functions in ratelimit.py
+
+import threading
+import time
+
+from lazylibrarian.ratelimit import TokenBucket
+from unittests.unittesthelpers import LLTestCaseWithConfigandDIRS
+
+
+class RateLimitTest(LLTestCaseWithConfigandDIRS):
+
+    def test_spacing_across_threads(self):
+        bucket = TokenBucket('test', 0.05)
+        called = []
+        lock = threading.Lock()
+
+        def call():
+            for _ in range(3):
+                bucket.acquire()
+                with lock:
+                    called.append(time.time())
+
+        threads = [threading.Thread(target=call) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        called.sort()
+        self.assertEqual(12, len(called))
+        gaps = [later - earlier for earlier, later in zip(called[:-1], called[1:], strict=True)]
+        self.assertGreater(min(gaps), 0.04, 'Calls from different threads should still be spaced out')
+        stats = bucket.get_stats()
+        self.assertEqual(12, stats['calls'])
+        self.assertEqual(11, stats['waited'])
+        self.assertEqual(0, stats['waiting'])
+        self.assertGreater(stats['wait_total'], 0.5)
+
+    def test_burst(self):
+        bucket = TokenBucket('test', 10, burst=3)
+        self.assertEqual([0.0, 0.0, 0.0], [bucket.acquire() for _ in range(3)], 'Expected a burst of 3 calls')
+        bucket = TokenBucket('test', 0.1, burst=3)
+        for _ in range(3):
+            bucket.acquire()
+        self.assertGreater(bucket.acquire(), 0.05, 'Burst used up, expected to wait for a token')
+
+    def test_hold(self):
+        bucket = TokenBucket('test', 0.01)
+        bucket.hold(0.2)
+        start = time.time()
+        bucket.acquire()
+        self.assertGreater(time.time() - start, 0.15, 'Expected to wait until the hold ends')
@@ -0,0 +1,114 @@
+#  This file is part of Lazylibrarian.
+#
+# Purpose:
+#   Test functions in resultlist.py
+
+import logging
+
+from rapidfuzz import fuzz
+
+from lazylibrarian import database
+from lazylibrarian.config2 import CONFIG
+from lazylibrarian.dbupgrade import db_upgrade, upgrade_needed
+from lazylibrarian.filesystem import DIRS, remove_file
+from lazylibrarian.resultlist import (
+    BLACKLIST,
+    Blacklist,
+    ResultIndex,
+    find_best_result,
+    match_titles,
+    token_set_ratios,
+)
+from unittests.unittesthelpers import LLTestCaseWithConfigandDIRS
+
+
+class ResultListTest(LLTestCaseWithConfigandDIRS):
+    def setUp(self):
+        super().setUp()
+        self.logger.setLevel(logging.ERROR)
+        DIRS.DBFILENAME = "test-db.db"
+        try:
+            remove_file(DIRS.get_dbfile())
+        except FileNotFoundError:
+            pass
+        db_upgrade(upgrade_needed(), restartjobs=False)
+        self.logger.setLevel(logging.INFO)
+        db = database.DBConnection()
+        try:
+            for url, title, prov, status in [('http://a/1', 'Mort', 'indexer', 'Failed'),
+                                              ('http://a/2', 'Eric', 'indexer', 'Snatched'),
+                                              ('!bot 3', 'Sourcery', 'irc', 'Failed')]:
+                db.action("INSERT INTO wanted (NZBurl, NZBtitle, NZBprov, Status) VALUES (?,?,?,?)",
+                          (url, title, prov, status))
+        finally:
+            db.close()
+
+    def test_blacklist(self):
+        blacklist = Blacklist()
+        blacklist.load()
+        self.assertEqual(('indexer', 'Failed'), blacklist.by_url('http://a/1', failed=True))
+        self.assertIsNone(blacklist.by_url('http://a/2', failed=True))
+        self.assertEqual(('indexer', 'Snatched'), blacklist.by_url('http://a/2'))
+        self.assertEqual(('indexer', 'Failed'), blacklist.by_title('indexer', 'Mort', failed=True))
+        self.assertIsNone(blacklist.by_title('other', 'Mort'))
+        self.assertEqual(('irc', 'Failed'), blacklist.by_url('!bot 3', 'Sourcery', failed=True))
+        self.assertIsNone(blacklist.by_url('!bot 3', 'Eric'), 'irc urls only match with the same title')
+
+        blacklist.add('http://a/2', 'Eric', 'indexer', 'Failed')
+        self.assertEqual(('indexer', 'Failed'), blacklist.by_title('indexer', 'Eric', failed=True))
+
+    def test_find_best_result_blacklisted(self):
+        def result(url, title):
+            return {'nzburl': url, 'nzbtitle': title, 'nzbprov': 'indexer', 'nzbsize': 1048576 * 2,
+                    'nzbmode': 'nzb', 'priority': 0}
+
+        book = {'bookid': '1', 'bookName': 'Mort', 'bookSub': '', 'authorName': 'Terry Pratchett',
+                'library': 'eBook', 'searchterm': 'Terry Pratchett Mort'}
+        BLACKLIST.load()
+        CONFIG.set_bool('BLACKLIST_FAILED', True)
+        CONFIG.set_bool('BLACKLIST_PROCESSED', False)
+        match = find_best_result([result('http://a/1', 'Terry Pratchett - Mort'),
+                                  result('http://a/4', 'Terry Pratchett - Mort epub')], book, 'book', 'nzb')
+        self.assertEqual('http://a/4', match[2]['NZBurl'], 'Expected the failed url to be rejected')
+        self.assertIsNone(find_best_result([result('http://a/5', 'Mort')], book, 'book', 'nzb'),
+                          'Expected the failed title to be rejected')
+
+    def test_token_set_ratios(self):
+        resultlist = [{'nzbtitle': title} for title in
+                      ['Terry Pratchett - Mort (epub)', 'Pratchett, Terry: Eric', '', 'T. Pratchett...Sourcery!',
+                       'Unrelated  Title']]
+        titles = match_titles(resultlist, 'nzb')
+        self.assertEqual('Terry Pratchett Mort epub', titles[0])
+        self.assertEqual(titles[0], resultlist[0]['match_title'], 'Expected the normalised title to be kept')
+        for query in ['Terry Pratchett', 'Mort', '', 'Sourcery']:
+            self.assertEqual([fuzz.token_set_ratio(query, title) for title in titles],
+                             token_set_ratios(query, titles), 'Expected the same scores as one at a time')
+
+    def test_result_index(self):
+        resultlist = [{'tor_title': title} for title in
+                      ['Terry Pratchett - Mort (epub)', 'Pratchet, Terry: Eric', 'Neil Gaiman - Coraline',
+                       'Unrelated Title'] + [f"Some Book {n} epub" for n in range(20)]]
+        index = ResultIndex(resultlist, 'tor_')
+
+        def book(author, title):
+            return {'bookid': '1', 'bookName': title, 'bookSub': '', 'authorName': author, 'library': 'eBook'}
+
+        found = index.candidates(book('Terry Pratchett', 'Sourcery'))
+        self.assertEqual(resultlist[:2], found, 'Expected only the results sharing a word, misspelt or not')
+        self.assertEqual([resultlist[2]], index.candidates(book('Neil Gaiman', 'The Epub Book')),
+                         'Common words should not make a result a candidate')
+        self.assertEqual(resultlist, index.candidates(book('', 'Some Book')),
+                         'Expected every result for a book with no rare words')
+        self.assertEqual(resultlist, index.candidates(book('Iain Banks', 'Excession')),
+                         'Expected every result for a book with no words in the index')
+        self.assertEqual(2 + 1 + len(resultlist) * 2, index.scored)
+
+    def test_result_index_unindexed_words(self):
+        resultlist = [{'tor_title': f"Frank Herbert - Dune {n}"} for n in range(11)]
+        resultlist += [{'tor_title': 'Frank Herbert - Dune [epub]'}]
+        resultlist += [{'tor_title': f"Other Writer - Story {n}"} for n in range(20)]
+        index = ResultIndex(resultlist, 'tor_')
+        book = {'bookid': '1', 'bookName': 'Dune', 'bookSub': 'Deluxe Edition', 'authorName': 'Frank Herbert',
+                'library': 'eBook'}
+        self.assertEqual(resultlist, index.candidates(book),
+                         'Words not in any result should not stop the book matching the whole list')
@@ -0,0 +1,45 @@
+#  This file is part of Lazylibrarian.
+#
+# Purpose:
+#   Test functions in searchbook.py
+
+import mock
+
+from lazylibrarian import searchbook
+from lazylibrarian.config2 import CONFIG
+from unittests.unittesthelpers import LLTestCaseWithConfigandDIRS
+
+
+class SearchBookTest(LLTestCaseWithConfigandDIRS):
+
+    @staticmethod
+    def wanted(bookid, authorname, bookname, library='eBook'):
+        return {'bookid': bookid, 'bookName': bookname, 'bookSub': '', 'authorName': authorname,
+                'library': library, 'searchterm': f"{authorname} {bookname}"}
+
+    def test_search_by_author(self):
+        searchlist = [self.wanted('1', 'Terry Pratchett', 'Mort'),
+                      self.wanted('2', 'Terry Pratchett', 'Sourcery'),
+                      self.wanted('3', 'Terry Pratchett', 'Eric'),
+                      self.wanted('4', 'Terry Pratchett', 'Mort', 'AudioBook'),
+                      self.wanted('5', 'Iain Banks', 'Excession')]
+        results = [{'nzbtitle': 'Terry Pratchett - Mort'}, {'nzbtitle': 'Terry Pratchett - Eric'}]
+        searches = []
+
+        def iterate(book, search_type):
+            searches.append((book['authorName'], search_type))
+            return results, 2
+
+        def best(resultlist, book, searchtype, source):
+            for result in resultlist:
+                if result['nzbtitle'].endswith(book['bookName']):
+                    return [100, {'NZBprov': 'test'}, source, 0]
+            return None
+
+        with mock.patch.object(searchbook, 'iterate_over_znab_sites', side_effect=iterate), \
+                mock.patch.object(searchbook, 'find_best_result', side_effect=best), \
+                mock.patch.object(CONFIG, 'use_nzb', return_value=True):
+            matches = searchbook.search_by_author(searchlist)
+        self.assertEqual([('Terry Pratchett', 'authorbook')], searches,
+                         'Expected one author search, only for the author with 3 wanted eBooks')
+        self.assertEqual({('1', 'eBook'), ('3', 'eBook')}, set(matches))
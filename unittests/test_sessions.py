@@ -0,0 +1,84 @@
+#  This file is part of Lazylibrarian.
+#
+# Purpose:
+#   Test functions in sessions.py
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from lazylibrarian.config2 import CONFIG
+from lazylibrarian.sessions import SessionRegistry
+from unittests.unittesthelpers import LLTestCaseWithConfigandDIRS
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'Hello'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Set-Cookie', 'session=abc')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class SessionsTest(LLTestCaseWithConfigandDIRS):
+
+    def setUp(self):
+        super().setUp()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        super().tearDown()
+
+    def test_session_per_host(self):
+        registry = SessionRegistry()
+        first = registry.get('https://example.com/one')
+        self.assertIs(first, registry.get('HTTPS://Example.com/two?x=1'), 'Expected one session per host')
+        self.assertIsNot(first, registry.get('http://example.com/one'), 'Expected a session per scheme')
+        self.assertIsNot(first, registry.get('https://example.org/one'), 'Expected a session per host')
+        CONFIG.set_str('PROXY_HOST', 'http://proxy:3128')
+        CONFIG.set_str('PROXY_TYPE', 'http, https')
+        try:
+            proxied = registry.get('https://example.com/one')
+            self.assertIsNot(first, proxied, 'Expected a new session when the proxy changes')
+            self.assertEqual('http://proxy:3128', proxied.proxies['https'])
+        finally:
+            CONFIG.set_str('PROXY_HOST', '')
+        registry.close_all()
+
+    def test_lru_limit(self):
+        registry = SessionRegistry(max_sessions=2)
+        first = registry.get('https://one.com')
+        registry.get('https://two.com')
+        registry.get('https://one.com')
+        registry.get('https://three.com')
+        self.assertEqual(2, registry.get_stats()['hosts'])
+        self.assertIs(first, registry.get('https://one.com'), 'Recently used session should be kept')
+        self.assertEqual(3, registry.get_stats()['sessions'])
+        registry.close_all()
+
+    def test_connection_reuse(self):
+        registry = SessionRegistry()
+        for _ in range(5):
+            r = registry.get(self.url).get(f'{self.url}/test', timeout=10)
+            self.assertEqual(b'Hello', r.content)
+        self.assertEqual(0, len(registry.get(self.url).cookies), 'Sessions should not keep cookies')
+        stats = registry.get_stats()
+        self.assertEqual(5, stats['requests'])
+        self.assertEqual(1, stats['opened'], 'Expected one keep-alive connection')
+        self.assertEqual(4, stats['reused'])
+        # Counts are kept when sessions are closed
+        registry.close_all()
+        stats = registry.get_stats()
+        self.assertEqual(0, stats['hosts'])
+        self.assertEqual(4, stats['reused'])
@@ -12,6 +12,7 @@ from shutil import rmtree
 from typing import List
 
 import lazylibrarian
+from lazylibrarian.database import POOL
 from lazylibrarian.dbupgrade import upgrade_needed, db_upgrade
 from lazylibrarian.configenums import Access
 from lazylibrarian.filesystem import DIRS, path_isdir
@@ -69,6 +70,7 @@ class LLTestCase(unittest.TestCase):
         # Delete the database that was created for unit testing
         if len(DIRS.get_dbfile()):
             logging.getLogger(None).debug("Deleting unit test database")
+            POOL.close_all()
             try:
                 os.remove(DIRS.get_dbfile())
                 os.remove(DIRS.get_dbfile() + "-shm")